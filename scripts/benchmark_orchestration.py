@@ -0,0 +1,546 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the orchestration overhead of the sparsify auto pipeline.
+
+Runner creation, argument conversion and serialization, history recording,
+deployment directory assembly and CLI startup are timed with stub train and export
+hooks, so the results only reflect sparsify's own code. Integration specific
+benchmarks whose libraries are not installed are reported as skipped. Results can
+be written to a JSON file and compared against a previous run to catch
+orchestration regressions.
+
+Usage: python scripts/benchmark_orchestration.py [OPTIONS]
+
+Options:
+  --iterations INTEGER   Number of timed iterations per benchmark  [default: 5]
+  --benchmarks TEXT      Optional names, or name prefixes, of the benchmarks to run
+  --artifact-mb INTEGER  Total size of the fake deployment artifacts  [default: 256]
+  --output PATH          Optional JSON file to write the results to
+  --baseline PATH        Optional JSON results of a previous run. Exits with an
+                         error if a benchmark got slower by more than --tolerance
+  --tolerance FLOAT      Allowed fractional slowdown against the baseline
+                         [default: 0.25]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from unittest import mock
+
+
+_ROOT = Path(__file__).resolve().parents[1]
+_HISTORY_SIZES = [10, 100, 1000]
+_SERIALIZE_FIELDS = [50, 200]
+_ARTIFACT_FILES = 8
+# tasks whose real config_to_args is timed, if their integration is installed
+_CONFIG_TO_ARGS_TASKS = [
+    "text_classification",
+    "image_classification",
+    "object_detection",
+]
+# console script target and arguments of each CLI startup benchmark
+_CLI_COMMANDS = {
+    "sparsify.run --help": ("sparsify.cli.run", "main", ["--help"]),
+    "sparsify.run one-shot --help": (
+        "sparsify.cli.run",
+        "main",
+        ["one-shot", "--help"],
+    ),
+    "sparsify.run sparse-transfer --help": (
+        "sparsify.cli.run",
+        "main",
+        ["sparse-transfer", "--help"],
+    ),
+}
+_CLI_CODE = """
+import sys
+from {module} import {function}
+sys.argv = {argv!r}
+try:
+    {function}()
+except SystemExit as err:
+    sys.exit(err.code)
+"""
+
+
+def time_call(
+    function: Callable[[], Any],
+    iterations: int,
+    setup: Optional[Callable[[], None]] = None,
+) -> Dict[str, float]:
+    """
+    :param function: function to time
+    :param iterations: number of timed calls
+    :param setup: optional function called, untimed, before each call
+    :return: median, min and max wall time of the calls in ms
+    """
+    times = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "max_ms": max(times),
+        "iterations": iterations,
+    }
+
+
+def benchmark_task_runner_create(
+    work_dir: Path, iterations: int
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Time `TaskRunner.create` of a stub runner, including the hardware analysis and
+    tuning of its constructor
+    """
+    from sparsify.auto.tasks import runner as runner_module
+    from sparsify.schemas import SparsificationTrainingConfig
+
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset=str(work_dir), base_model=None, recipe=None
+    )
+    with _stub_runner_registered(config.task):
+        return {
+            "task_runner_create": time_call(
+                lambda: runner_module.TaskRunner.create(config), iterations
+            )
+        }
+
+
+def benchmark_config_to_args(
+    work_dir: Path, iterations: int
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Time `config_to_args` of the integration runners on small local datasets
+    """
+    from sparsify.auto.tasks import runner as runner_module
+    from sparsify.schemas import SparsificationTrainingConfig
+
+    results = {}
+    for task in _CONFIG_TO_ARGS_TASKS:
+        name = f"config_to_args/{task}"
+        try:
+            runner_module._dynamically_register_integration_runner(task)
+            runner_class = runner_module._TASK_RUNNER_IMPLS[
+                runner_module.TASK_REGISTRY[task]
+            ]
+        except ImportError as err:
+            results[name] = {"skipped": f"integration not installed: {err}"}
+            continue
+
+        dataset = _create_dataset(work_dir / task, task)
+        results[name] = time_call(
+            lambda: runner_class.config_to_args(
+                SparsificationTrainingConfig(
+                    task=task, dataset=dataset, base_model=None, recipe=None
+                )
+            ),
+            iterations,
+        )
+    return results
+
+
+def benchmark_serialize_to_cli_string(
+    work_dir: Path, iterations: int
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Time `BaseArgs.serialize_to_cli_string` of args with a mix of value, bool,
+    bool-value list and unset fields
+    """
+    from pydantic import create_model
+    from sparsify.auto.tasks import BaseArgs
+
+    results = {}
+    for num_fields in _SERIALIZE_FIELDS:
+        field_values = [
+            "path/to/file",
+            1e-3,
+            True,
+            False,
+            [True, 300],
+            None,
+        ]
+        fields = {
+            f"arg_{idx}_name": (Any, field_values[idx % len(field_values)])
+            for idx in range(num_fields)
+        }
+        args = create_model(f"BenchmarkArgs{num_fields}", __base__=BaseArgs, **fields)()
+        results[f"serialize_to_cli_string/fields_{num_fields}"] = time_call(
+            lambda: args.serialize_to_cli_string(underscores_to_dashes=True),
+            iterations * 100,
+        )
+    return results
+
+
+def benchmark_save_history(
+    work_dir: Path, iterations: int
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Time `save_history` as a stage grows, as it is called after every trial. The
+    total time to record every trial and the time of the last call are reported
+    """
+    from sparsify.auto.utils import save_history
+    from sparsify.schemas import APIArgs, Metrics, SparsificationTrainingConfig
+
+    api_args = APIArgs(task="image_classification", dataset=str(work_dir))
+    config = SparsificationTrainingConfig(
+        task="image_classification",
+        dataset=str(work_dir),
+        base_model=None,
+        recipe=None,
+        kwargs={"epochs": 10, "lr": 1e-3, "batch_size": 64},
+    )
+    metrics = Metrics(
+        metrics={"accuracy": 0.75, "latency": 10.0}, objective_key="accuracy"
+    )
+
+    results = {}
+    for num_trials in _HISTORY_SIZES:
+        history = [(config, metrics)] * num_trials
+        total_times, last_times = [], []
+        for iteration in range(iterations):
+            target_directory = work_dir / f"history_{num_trials}_{iteration}" / "stage"
+            target_directory.mkdir(parents=True)
+            start = time.perf_counter()
+            for trial_idx in range(1, num_trials + 1):
+                last_start = time.perf_counter()
+                save_history(
+                    history[:trial_idx], api_args, "stage", str(target_directory)
+                )
+            end = time.perf_counter()
+            total_times.append((end - start) * 1000)
+            last_times.append((end - last_start) * 1000)
+        results[f"save_history/trials_{num_trials}"] = {
+            "median_ms": statistics.median(total_times),
+            "last_call_median_ms": statistics.median(last_times),
+            "iterations": iterations,
+        }
+    return results
+
+
+def benchmark_create_deployment_directory(
+    work_dir: Path, iterations: int, artifact_mb: int
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Time `create_deployment_directory` of a stub runner, which moves the artifacts,
+    and assembling a deployment directory by copy, on fake artifacts of the given
+    total size
+    """
+    from sparsify.auto.tasks import runner as runner_module
+    from sparsify.auto.utils import assemble_deployment_directory
+    from sparsify.schemas import SparsificationTrainingConfig
+
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset=str(work_dir), base_model=None, recipe=None
+    )
+    source = work_dir / "artifacts"
+    train_directory = work_dir / "train"
+    deploy_directory = work_dir / "deploy"
+
+    def _setup():
+        for directory in (train_directory, deploy_directory):
+            _rmtree(directory)
+            directory.mkdir(parents=True)
+        _link_tree(source, train_directory / "deployment")
+
+    _create_artifacts(source, artifact_mb)
+    with _stub_runner_registered(config.task):
+        runner = runner_module.TaskRunner.create(config)
+        moved = time_call(
+            lambda: runner.create_deployment_directory(
+                str(train_directory), str(deploy_directory)
+            ),
+            iterations,
+            setup=_setup,
+        )
+
+    def _setup_copy():
+        _rmtree(deploy_directory)
+        deploy_directory.mkdir(parents=True)
+
+    copied = time_call(
+        lambda: assemble_deployment_directory(
+            str(source), str(deploy_directory), move=False
+        ),
+        iterations,
+        setup=_setup_copy,
+    )
+    return {
+        f"create_deployment_directory/move_{artifact_mb}mb": moved,
+        f"assemble_deployment_directory/copy_{artifact_mb}mb": copied,
+    }
+
+
+def benchmark_cli_startup(work_dir: Path, iterations: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Time CLI commands that exit without running anything, e.g. --help, each in a
+    fresh interpreter
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in [str(_ROOT / "src"), env.get("PYTHONPATH")] if path
+    )
+    results = {}
+    for name, (module, function, args) in _CLI_COMMANDS.items():
+        code = _CLI_CODE.format(
+            module=module, function=function, argv=[name.split()[0]] + args
+        )
+        failure = []
+
+        def _run():
+            result = subprocess.run(
+                [sys.executable, "-c", code], env=env, capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                failure.append(result.stderr.strip().splitlines()[-1])
+
+        results[f"cli_startup/{name}"] = time_call(_run, iterations)
+        if failure:
+            results[f"cli_startup/{name}"] = {"error": failure[0]}
+    return results
+
+
+_BENCHMARKS = {
+    "task_runner_create": benchmark_task_runner_create,
+    "config_to_args": benchmark_config_to_args,
+    "serialize_to_cli_string": benchmark_serialize_to_cli_string,
+    "save_history": benchmark_save_history,
+    "create_deployment_directory": benchmark_create_deployment_directory,
+    "cli_startup": benchmark_cli_startup,
+}
+
+
+def run_benchmarks(
+    iterations: int,
+    names: Optional[List[str]] = None,
+    artifact_mb: int = 256,
+) -> Dict[str, Any]:
+    """
+    :param iterations: number of timed iterations per benchmark
+    :param names: optional names, or name prefixes, of the benchmarks to run
+    :param artifact_mb: total size of the fake deployment artifacts in MB
+    :return: the environment of the run and the results by benchmark name
+    """
+    results = {}
+    for group, benchmark in _BENCHMARKS.items():
+        if names and not any(group.startswith(name) for name in names):
+            continue
+        kwargs = (
+            {"artifact_mb": artifact_mb}
+            if benchmark is benchmark_create_deployment_directory
+            else {}
+        )
+        with tempfile.TemporaryDirectory() as work_dir:
+            try:
+                results.update(benchmark(Path(work_dir), iterations, **kwargs))
+            except Exception as err:
+                results[group] = {"error": f"{err.__class__.__name__}: {err}"}
+    return {"environment": _environment(), "results": results}
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """
+    :param results: results of this run by benchmark name
+    :param baseline: results of a previous run by benchmark name
+    :param tolerance: allowed fractional slowdown of the median time
+    :return: descriptions of the benchmarks that regressed
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name, {})
+        if "median_ms" not in result or "median_ms" not in previous:
+            continue
+        if result["median_ms"] > previous["median_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {result['median_ms']:.2f}ms, "
+                f"baseline {previous['median_ms']:.2f}ms"
+            )
+    return regressions
+
+
+@contextmanager
+def _stub_runner_registered(task: str) -> Iterator[None]:
+    # registers a runner with stub hooks for the task, without importing its
+    # integration
+    from sparsify.auto.tasks import runner as runner_module
+
+    task_name = runner_module.TASK_REGISTRY[task]
+    with mock.patch.object(
+        runner_module, "_dynamically_register_integration_runner", lambda task: None
+    ), mock.patch.dict(
+        runner_module._TASK_RUNNER_IMPLS, {task_name: _stub_runner_class(task_name)}
+    ):
+        yield
+
+
+def _stub_runner_class(task_name):
+    from sparsify.auto.tasks import BaseArgs, TaskRunner
+
+    class _StubArgs(BaseArgs):
+        output_dir: str = ""
+
+    class _StubRunner(TaskRunner):
+        export_model_kwarg = "model_path"
+        task = task_name
+
+        @classmethod
+        def config_to_args(cls, config):
+            return _StubArgs(), _StubArgs()
+
+        def train_hook(self, **kwargs):
+            pass
+
+        def export_hook(self, **kwargs):
+            pass
+
+        def tune_args_for_hardware(self, hardware_specs):
+            pass
+
+        def update_run_directory_args(self):
+            pass
+
+        def _get_default_deployment_directory(self, train_directory: str) -> str:
+            return os.path.join(train_directory, "deployment")
+
+    return _StubRunner
+
+
+def _create_dataset(directory: Path, task: str) -> str:
+    if task == "text_classification":
+        directory.mkdir(parents=True)
+        for split in ("train", "validation"):
+            (directory / f"{split}.csv").write_text(
+                "sentence,label\n" + "a short sentence,1\n" * 32
+            )
+        return str(directory)
+
+    from PIL import Image
+
+    for split in ("train", "val"):
+        for idx in range(8):
+            if task == "object_detection":
+                image_path = directory / "images" / split / f"{idx}.png"
+                label_path = directory / "labels" / split / f"{idx}.txt"
+                label_path.parent.mkdir(parents=True, exist_ok=True)
+                label_path.write_text("0 0.5 0.5 0.2 0.2\n")
+            else:
+                image_path = directory / split / f"class_{idx % 2}" / f"{idx}.png"
+            image_path.parent.mkdir(parents=True, exist_ok=True)
+            Image.new("RGB", (32, 32)).save(image_path)
+    if task == "object_detection":
+        (directory / "classes.txt").write_text("object\n")
+    return str(directory)
+
+
+def _create_artifacts(directory: Path, artifact_mb: int):
+    # one large model file and smaller config files, as in a deployment directory
+    directory.mkdir(parents=True)
+    sizes = [artifact_mb * 1024**2 // 2] + [
+        artifact_mb * 1024**2 // (2 * (_ARTIFACT_FILES - 1))
+    ] * (_ARTIFACT_FILES - 1)
+    block = os.urandom(1024**2)
+    for idx, size in enumerate(sizes):
+        with open(
+            directory / ("model.onnx" if idx == 0 else f"file_{idx}.bin"), "wb"
+        ) as file:
+            for _ in range(size // len(block)):
+                file.write(block)
+            file.write(block[: size % len(block)])
+
+
+def _link_tree(source: Path, target: Path):
+    # hardlinks keep the setup of each iteration cheap, the timed move is the same
+    target.mkdir(parents=True)
+    for path in source.iterdir():
+        os.link(path, target / path.name)
+
+
+def _rmtree(directory: Path):
+    import shutil
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def _environment() -> Dict[str, Any]:
+    from sparsify.version import __version__
+
+    return {
+        "sparsify": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _print_results(results: Dict[str, Dict[str, Any]]):
+    for name, result in results.items():
+        if "median_ms" in result:
+            summary = f"median {result['median_ms']:10.2f}ms"
+            if "last_call_median_ms" in result:
+                summary += f"  last call {result['last_call_median_ms']:8.2f}ms"
+        else:
+            summary = result.get("skipped") or f"failed: {result.get('error')}"
+        print(f"{name:<55} {summary}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the orchestration overhead of the sparsify auto pipeline"
+    )
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--benchmarks", nargs="*", default=None)
+    parser.add_argument("--artifact-mb", type=int, default=256)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(_ROOT / "src"))
+    report = run_benchmarks(args.iterations, args.benchmarks, args.artifact_mb)
+    _print_results(report["results"])
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=4))
+
+    if args.baseline:
+        regressions = compare_to_baseline(
+            report["results"],
+            json.loads(args.baseline.read_text())["results"],
+            args.tolerance,
+        )
+        if regressions:
+            print("Orchestration regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
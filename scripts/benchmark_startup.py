@@ -0,0 +1,196 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the startup time of the console scripts declared in setup.py.
+
+Each entry point module is imported in a fresh interpreter, as the console script
+would, and the wall time of the import and the heavy dependencies it pulled in are
+reported. Results can be written to a JSON file and compared against a previous
+run to catch startup regressions.
+
+Usage: python scripts/benchmark_startup.py [OPTIONS]
+
+Options:
+  --iterations INTEGER  Number of fresh interpreters to time per entry point
+                        [default: 5]
+  --output PATH         Optional JSON file to write the results to
+  --baseline PATH       Optional JSON results of a previous run. Exits with an
+                        error if an entry point got slower by more than
+                        --tolerance
+  --tolerance FLOAT     Allowed fractional slowdown against the baseline
+                        [default: 0.25]
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+_ROOT = Path(__file__).resolve().parents[1]
+# dependencies the CLI should only import once a command needs them
+_HEAVY_MODULES = [
+    "torch",
+    "onnx",
+    "onnxruntime",
+    "deepsparse",
+    "sparseml",
+    "sparsezoo",
+    "sparsifyml",
+    "tensorboard",
+    "transformers",
+]
+# prints the wall time of the import in ms and the heavy modules it loaded
+_TIMING_CODE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+loaded = [name for name in {heavy_modules!r} if name in sys.modules]
+print(json.dumps({{"import_ms": elapsed, "heavy_modules": loaded}}))
+"""
+
+
+def parse_entry_points(setup_path: Path = _ROOT / "setup.py") -> Dict[str, str]:
+    """
+    :param setup_path: path to setup.py, which is parsed rather than executed
+    :return: console script name to the module it runs
+    """
+    tree = ast.parse(setup_path.read_text())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name == "_setup_entry_points":
+            returned = next(
+                child for child in ast.walk(node) if isinstance(child, ast.Return)
+            )
+            scripts = ast.literal_eval(returned.value)["console_scripts"]
+            break
+    else:
+        raise ValueError(f"No _setup_entry_points function found in {setup_path}")
+
+    entry_points = {}
+    for script in scripts:
+        name, target = script.split("=")
+        entry_points[name.strip()] = target.split(":")[0].strip()
+    return entry_points
+
+
+def time_import(module: str, iterations: int) -> Dict[str, Any]:
+    """
+    :param module: module to import
+    :param iterations: number of fresh interpreters to import the module in
+    :return: import and process wall times in ms, as the median over the
+        iterations, the heavy modules loaded, or the error if the import failed
+    """
+    code = _TIMING_CODE.format(module=module, heavy_modules=_HEAVY_MODULES)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in [str(_ROOT / "src"), env.get("PYTHONPATH")] if path
+    )
+    import_times = []
+    process_times = []
+    heavy_modules = []
+    for _ in range(iterations):
+        start = _perf_counter_ms()
+        result = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True
+        )
+        process_times.append(_perf_counter_ms() - start)
+        if result.returncode != 0:
+            return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+        timing = json.loads(result.stdout.strip().splitlines()[-1])
+        import_times.append(timing["import_ms"])
+        heavy_modules = timing["heavy_modules"]
+
+    return {
+        "module": module,
+        "import_ms": statistics.median(import_times),
+        "process_ms": statistics.median(process_times),
+        "heavy_modules": heavy_modules,
+    }
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """
+    :param results: results of this run by entry point
+    :param baseline: results of a previous run by entry point
+    :param tolerance: allowed fractional slowdown of the import time
+    :return: descriptions of the entry points that regressed
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name, {})
+        if "import_ms" not in result or "import_ms" not in previous:
+            continue
+        if result["import_ms"] > previous["import_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {result['import_ms']:.1f}ms, "
+                f"baseline {previous['import_ms']:.1f}ms"
+            )
+    return regressions
+
+
+def _perf_counter_ms() -> float:
+    return time.perf_counter() * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the import time of the sparsify console scripts"
+    )
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {
+        name: time_import(module, args.iterations)
+        for name, module in parse_entry_points().items()
+    }
+
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<30} failed to import: {result['error']}")
+            continue
+        heavy = ", ".join(result["heavy_modules"]) or "-"
+        print(
+            f"{name:<30} import {result['import_ms']:8.1f}ms  "
+            f"process {result['process_ms']:8.1f}ms  heavy modules: {heavy}"
+        )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4))
+
+    if args.baseline:
+        regressions = compare_to_baseline(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        if regressions:
+            print("Startup regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-# flake8: noqa
-# isort: skip_file
+from sparsify.utils.lazy import lazy_exports
 
-from .login import *
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {"login": ["login", "import_sparsifyml_authenticated", "authenticate"]},
+)
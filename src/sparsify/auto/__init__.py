@@ -17,9 +17,14 @@ Library for automated sparsification runs using the SparseML package and
 its integrations
 """
 
-# flake8: noqa
-# isort: skip_file
+from sparsify.utils.lazy import lazy_exports
 
-from .utils import *
-from .tasks import *
-from .scripts.main import main
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        "scripts.main": ["main"],
+        "utils": None,
+        "tasks": None,
+    },
+)
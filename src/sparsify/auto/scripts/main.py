@@ -13,29 +13,61 @@
 # limitations under the License.
 
 import logging
+import os
 from pathlib import Path
+from typing import Tuple
 
 import yaml
 
-from sparsify.auto.tasks import TaskRunner
+from sparsify.auto.tasks import (
+    MAX_CONCURRENT_TRIALS,
+    DDPArgs,
+    TaskRunner,
+    TrialScheduler,
+    TuningArgs,
+)
 from sparsify.auto.utils import (
+    PERFORMANCE_METRICS,
+    RUN_HISTORY_FILE_NAME,
+    BenchmarkConfig,
+    SuccessiveHalvingPruner,
     api_request_config,
+    api_request_tune,
     create_save_directory,
+    get_history_store,
+    get_trial_artifact_directory,
     initialize_banner_logger,
+    is_higher_better,
+    start_run_monitor,
 )
-from sparsify.schemas import APIArgs
+from sparsify.schemas import APIArgs, Metrics
 from sparsify.schemas.auto_api import SparsificationTrainingConfig
 from sparsify.utils import get_task_info
-from tensorboard.program import TensorBoard
-from tensorboard.util import tb_logging
 
 
 _LOGGER = logging.getLogger("auto_banner")
 
+# optional path to write per stage timings to, in the Prometheus text format. e.g. a
+# file read by the node exporter textfile collector
+PROMETHEUS_METRICS_PATH = os.environ.get("NM_AUTO_PROMETHEUS_METRICS_PATH")
+
 
 def main(api_args: APIArgs):
     initialize_banner_logger()
 
+    # benchmark scenarios are not training args, keep them out of the config request
+    benchmark_kwargs = api_args.kwargs.pop("benchmark", None)
+    run_benchmark = benchmark_kwargs is not None or any(
+        metric in PERFORMANCE_METRICS for metric in (api_args.optimizing_metric or [])
+    )
+    ddp_args = DDPArgs(**(api_args.distributed or {}))
+    tuning_args = TuningArgs(**(api_args.tuning or {}))
+    if tuning_args.is_tuning and ddp_args.is_multi_node:
+        raise ValueError(
+            "Trials are scheduled on the devices of a single node, tuning over "
+            f"{tuning_args.num_trials} trials is not supported for multi-node runs"
+        )
+
     # Set up directory for saving
     (
         train_directory,
@@ -51,38 +83,157 @@ def main(api_args: APIArgs):
         config = SparsificationTrainingConfig(
             task=api_args.task, dataset=api_args.dataset, base_model=None, recipe=None
         )
-        runner = TaskRunner.create(config)
+        runner = TaskRunner.create(config, ddp_args)
         runner.train(train_directory=train_directory, log_directory=log_directory)
         return
 
-    _suppress_tensorboard_logs()
-
-    # Launch tensorboard server
-    tensorboard_server = TensorBoard()
-    tensorboard_server.configure(argv=[None, "--logdir", log_directory])
-    url = tensorboard_server.launch()
-    _LOGGER.info(f"TensorBoard listening on {url}")
-
     # Request config from api and instantiate runner
 
     raw_config = api_request_config(api_args)
     config = SparsificationTrainingConfig(**raw_config)
 
-    runner = TaskRunner.create(config)
-    # Execute integration run and return metrics
-    metrics = runner.train(train_directory=train_directory, log_directory=log_directory)
+    # the monitor, e.g. TensorBoard, runs in its own process for the duration of
+    # training, on the primary node only
+    with start_run_monitor(
+        log_directory, name=None if ddp_args.is_primary_node else "none"
+    ) as run_monitor:
+        if run_monitor is not None:
+            _LOGGER.info(
+                f"{run_monitor.__class__.__name__} listening on {run_monitor.url}"
+            )
+        if tuning_args.is_tuning:
+            # the best trial is exported and deployed from its trial directories
+            trial_idx, config, metrics = _tune(
+                api_args, tuning_args, config, train_directory, log_directory
+            )
+            model_directory = get_trial_artifact_directory(train_directory, trial_idx)
+            runner = TaskRunner.create(config, ddp_args)
+            runner.set_run_directories(
+                model_directory, get_trial_artifact_directory(log_directory, trial_idx)
+            )
+        else:
+            # Execute integration run and return metrics
+            model_directory = train_directory
+            runner = TaskRunner.create(config, ddp_args)
+            metrics = runner.train(
+                train_directory=train_directory, log_directory=log_directory
+            )
+
+    # the other nodes of a multi-node run only take part in training. The node that
+    # exports is the one whose workers held global rank 0 and wrote the checkpoint
+    if not runner.is_primary_node:
+        return
 
-    yaml.safe_dump(
-        metrics.dict(), (Path(train_directory).parent / "metrics.yaml").open("w")
-    )
-    runner.export(model_directory=train_directory)
+    # saved before export so the training metrics survive a failed export or
+    # deployment, and rewritten with the instrumentation at the end of the run
+    metrics_path = Path(train_directory).parent / "metrics.yaml"
+    with metrics_path.open("w") as file:
+        yaml.safe_dump(metrics.dict(), file)
+
+    runner.export(model_directory=model_directory)
+    if run_benchmark:
+        metrics = runner.benchmark(
+            metrics, model_directory, BenchmarkConfig(**(benchmark_kwargs or {}))
+        )
     runner.create_deployment_directory(
-        train_directory=train_directory, deploy_directory=deploy_directory
+        train_directory=model_directory, deploy_directory=deploy_directory
+    )
+
+    with metrics_path.open("w") as file:
+        yaml.safe_dump(
+            {**metrics.dict(), "instrumentation": runner.instrumentation_report()},
+            file,
+        )
+    if PROMETHEUS_METRICS_PATH:
+        Path(PROMETHEUS_METRICS_PATH).write_text(runner.instrumentation_prometheus())
+
+
+def _tune(
+    api_args: APIArgs,
+    tuning_args: TuningArgs,
+    config: SparsificationTrainingConfig,
+    train_directory: str,
+    log_directory: str,
+) -> Tuple[int, SparsificationTrainingConfig, Metrics]:
+    """
+    Train the trials of the run in rounds of concurrent trials, one per trial slot.
+    The first round trains the initial config, and the configs of each later round
+    are requested from the tuning API with the results of the earlier rounds.
+    Completed trials are recorded in the run history as they finish
+
+    :param api_args: api args of the run
+    :param tuning_args: number of trials and how to schedule them
+    :param config: initial config of the run
+    :param train_directory: directory to create the trial artifact directories in
+    :param log_directory: directory to create the trial log directories in
+    :return: trial index, config and metrics of the best trial that completed
+    """
+    pruner = (
+        SuccessiveHalvingPruner(
+            min_epochs=tuning_args.prune_min_epochs,
+            reduction_factor=tuning_args.prune_reduction_factor,
+        )
+        if tuning_args.prune
+        else None
+    )
+    scheduler = TrialScheduler(
+        devices_per_trial=tuning_args.devices_per_trial,
+        cores_per_trial=tuning_args.cores_per_trial,
+        max_concurrent_trials=(
+            tuning_args.max_concurrent_trials or MAX_CONCURRENT_TRIALS
+        ),
+        pruner=pruner,
+    )
+    history_store = get_history_store(
+        os.path.join(os.path.dirname(train_directory), RUN_HISTORY_FILE_NAME)
+    )
+    if history_store.get_api_args() is None:
+        history_store.append_api_args(api_args.dict())
+
+    results = []
+    configs = [config]
+    while configs:
+        results.extend(
+            scheduler.run(
+                configs,
+                train_directory,
+                log_directory,
+                start_idx=len(results),
+                history_store=history_store,
+            )
+        )
+        history = [
+            (trial_config, metrics) for trial_config, metrics in results if metrics
+        ]
+        if not history:
+            raise RuntimeError(
+                "Trials failed with the initial config, see the trial logs in "
+                f"{log_directory}"
+            )
+        num_configs = min(tuning_args.num_trials - len(results), len(scheduler.slots))
+        configs = [
+            SparsificationTrainingConfig(**api_request_tune(history))
+            for _ in range(num_configs)
+        ]
+
+    # trials stopped early have no trained model to export
+    completed = [
+        (trial_idx, trial_config, metrics)
+        for trial_idx, (trial_config, metrics) in enumerate(results)
+        if metrics is not None and trial_idx not in scheduler.pruned_trials
+    ]
+    if not completed:
+        raise RuntimeError(
+            f"No trial completed training, see the trial logs in {log_directory}"
+        )
+    trial_idx, config, metrics = max(
+        completed, key=lambda trial: _objective_score(trial[2])
     )
+    _LOGGER.info(f"Trial {trial_idx} of {len(results)} is the best: {metrics}")
+    return trial_idx, config, metrics
 
 
-def _suppress_tensorboard_logs():
-    # set tensorboard logger to warning level
-    #  avoids a constant stream of logs from tensorboard
-    tb_logger = tb_logging.get_logger()
-    tb_logger.setLevel(logging.WARNING)
+def _objective_score(metrics: Metrics) -> float:
+    # signed so that higher is better, for lower is better objectives such as latency
+    value = metrics.metrics[metrics.objective_key]
+    return value if is_higher_better(metrics.objective_key) else -value
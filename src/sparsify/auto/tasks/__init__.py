@@ -17,3 +17,4 @@
 
 from .runner import *
 from .args import *
+from .scheduler import *
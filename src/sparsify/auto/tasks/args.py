@@ -12,12 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Optional
+import socket
+from typing import List, Optional, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
 
 
-__all__ = ["BaseArgs"]
+__all__ = ["BaseArgs", "DDPArgs", "TuningArgs"]
 
 
 class BaseArgs(BaseModel):
@@ -90,3 +91,198 @@ class BaseArgs(BaseModel):
         # e.g. --freeze-layers 0 10 15
         else:
             return [f"--{key}", map(str, value)]
+
+
+class DDPArgs(BaseModel):
+    """
+    Launch arguments for distributed training with `torch.distributed.run`. By
+    default, training runs on a single node with one process per device. Setting
+    `nnodes` above 1 launches the training processes of this node as part of a
+    multi-node job that meets at the rendezvous endpoint
+    """
+
+    nnodes: str = Field(
+        default="1",
+        description=(
+            "Number of nodes, or MIN_NODES:MAX_NODES for an elastic job that starts "
+            "once MIN_NODES have joined and continues if nodes drop out, as long as "
+            "MIN_NODES remain"
+        ),
+    )
+    nproc_per_node: str = Field(
+        default="auto",
+        description=(
+            "Number of training processes per node. 'auto' for one per GPU, or one "
+            "per NUMA node on CPU"
+        ),
+    )
+    node_rank: int = Field(
+        default=0,
+        description=(
+            "Rank of this node. Fixes the node order for the static rendezvous "
+            "backend, and node 0 runs the run monitor. With c10d, torch assigns node "
+            "ranks itself. For every backend, the node whose worker held global rank "
+            "0, and so wrote the checkpoint, exports and deploys the trained model"
+        ),
+    )
+    rdzv_backend: str = Field(
+        default="c10d",
+        description=(
+            "Rendezvous backend for multi-node jobs, 'c10d' (elastic, hosted by the "
+            "node at the endpoint) or 'static' (fixed node ranks)"
+        ),
+    )
+    rdzv_endpoint: Optional[str] = Field(
+        default=None,
+        description=(
+            "HOST:PORT of the rendezvous, shared by all nodes. Required for "
+            "multi-node jobs"
+        ),
+    )
+    rdzv_id: str = Field(
+        default="sparsify",
+        description="Id of the job, shared by all nodes of the job",
+    )
+    max_restarts: int = Field(
+        default=0,
+        description=(
+            "Number of times torch restarts all workers, with a new rendezvous, after "
+            "a worker or node fails, before the attempt is reported as failed"
+        ),
+    )
+
+    @validator("nnodes")
+    def nnodes_must_be_valid(cls, v):
+        min_nodes, max_nodes = _parse_nnodes(v)
+        if min_nodes < 1 or max_nodes < min_nodes:
+            raise ValueError(
+                f"nnodes must be a positive number or MIN:MAX range, given {v}"
+            )
+        return v
+
+    @property
+    def is_multi_node(self) -> bool:
+        """
+        :return: True if the job may span more than one node
+        """
+        return _parse_nnodes(self.nnodes)[1] > 1
+
+    @property
+    def is_primary_node(self) -> bool:
+        """
+        :return: True if this node was given node rank 0. Used before training,
+            e.g. to pick the node that runs the run monitor. After training, see
+            `TaskRunner.is_primary_node` for the node that exports
+        """
+        return self.node_rank == 0
+
+    def to_launch_args(self) -> List[str]:
+        """
+        :return: `torch.distributed.run` arguments, excluding the entrypoint. Single
+            node jobs rendezvous on a random open local port, so retried attempts
+            never collide with the port of a previous attempt
+        """
+        launch_args = [
+            "--nproc_per_node",
+            self.nproc_per_node,
+            "--max_restarts",
+            str(self.max_restarts),
+        ]
+        if not self.is_multi_node:
+            return launch_args + [f"--master_port={_get_open_port_()}"]
+
+        if not self.rdzv_endpoint:
+            raise ValueError("rdzv_endpoint must be set for multi-node training")
+        launch_args += [
+            "--nnodes",
+            self.nnodes,
+            "--rdzv_backend",
+            self.rdzv_backend,
+            "--rdzv_endpoint",
+            self.rdzv_endpoint,
+            "--rdzv_id",
+            self.rdzv_id,
+        ]
+        if self.rdzv_backend == "static":
+            launch_args += ["--node_rank", str(self.node_rank)]
+        return launch_args
+
+
+class TuningArgs(BaseModel):
+    """
+    Arguments for tuning the hyperparameters of a run over several trials. By
+    default, a single trial is trained with the initial config. With more trials,
+    the trials run concurrently on disjoint slots of the devices or CPU cores of
+    this node, and each round of trials is tuned from the results of the earlier
+    rounds
+    """
+
+    num_trials: int = Field(
+        default=1, description="Total number of trials to train, including the first"
+    )
+    devices_per_trial: int = Field(
+        default=1,
+        description="Number of CUDA devices of each trial, trained with DDP if above 1",
+    )
+    cores_per_trial: Optional[int] = Field(
+        default=None,
+        description="Number of CPU cores of each trial on CPU. Defaults to a socket",
+    )
+    max_concurrent_trials: Optional[int] = Field(
+        default=None,
+        description=(
+            "Optional cap on the number of trials that run at once. Defaults to "
+            "NM_AUTO_MAX_CONCURRENT_TRIALS, if set"
+        ),
+    )
+    prune: bool = Field(
+        default=False,
+        description=(
+            "Stop trials early with successive halving when their intermediate "
+            "evaluation metrics fall behind the other trials"
+        ),
+    )
+    prune_min_epochs: float = Field(
+        default=1.0, description="Epochs a trial trains for before it may be stopped"
+    )
+    prune_reduction_factor: int = Field(
+        default=3,
+        description="Fraction of trials kept at each pruning rung is 1 / this factor",
+    )
+
+    @validator("num_trials", "devices_per_trial")
+    def must_be_positive(cls, v):
+        if v < 1:
+            raise ValueError(f"must be a positive number, given {v}")
+        return v
+
+    @property
+    def is_tuning(self) -> bool:
+        """
+        :return: True if the run trains more than one trial
+        """
+        return self.num_trials > 1
+
+
+def _parse_nnodes(nnodes: str) -> Tuple[int, int]:
+    try:
+        bounds = [int(bound) for bound in str(nnodes).split(":")]
+    except ValueError:
+        raise ValueError(f"nnodes must be a number or MIN:MAX range, given {nnodes}")
+    if len(bounds) == 1:
+        return bounds[0], bounds[0]
+    if len(bounds) == 2:
+        return bounds[0], bounds[1]
+    raise ValueError(f"nnodes must be a number or MIN:MAX range, given {nnodes}")
+
+
+def _get_open_port_():
+    """
+    Find random open port. Used to circumvent issue with ddp trying to re-use
+    the same port between run attempts.
+    """
+    sock = socket.socket()
+    sock.bind(("", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
@@ -32,3 +32,7 @@ class FineTuneTrainArgs(BaseArgs):
         default=None,
         description="path to store logs",
     )
+    autoresume: bool = Field(
+        default=False,
+        description="resume from the latest checkpoint in the checkpoints directory",
+    )
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import logging
 import os
 from enum import Enum
@@ -76,11 +77,14 @@ class FineTuner:
         dataset_path: Union[str, Path],
         train_directory: Union[str, Path],
         log_dir: Union[str, Path],
+        autoresume: bool = False,
     ) -> None:
         """
         :param dataset_path: path to the llmfoundry compliant yaml file
         :param train_directory: path to log the checkpoints for the model
         :param log_dir: path to store the specified logger (such as tensorboard)
+        :param autoresume: if True, resume from the latest checkpoint saved to the
+            train directory, overriding the autoresume value of the yaml
 
         """
         if os.path.exists(dataset_path):
@@ -106,6 +110,8 @@ class FineTuner:
         self._train_config.save_folder = os.path.join(
             train_directory, Path(self._train_config.save_folder)
         )
+        if autoresume:
+            self._train_config.autoresume = True
         self._model_name = self._train_config["model"]["name"]
         self._validate_yaml()
 
@@ -170,8 +176,8 @@ class FineTuner:
         weights have already been pruned.
 
         :return: tuple including the model with weights loaded from the `load_path`
-        and with buffers attached for pruning masks. Also returns the MaskPrunedWeights
-        algorithm.
+        and with compact pruning masks attached to its sparse layers. Also returns the
+        MaskPrunedWeights algorithm.
         """
         model = self._build_model(tokenizer)
         try:
@@ -188,8 +194,24 @@ class FineTuner:
                 model = self._build_model(tokenizer)
             return model, None
 
-        attach_masks(model)
-        return model, MaskPrunedWeights()
+        report = attach_masks(
+            model,
+            min_sparsity=self._train_config.get("mask_min_sparsity", 0.05),
+            mask_format=self._train_config.get("compact_mask_format", "auto"),
+        )
+        report_path = None
+        if dist.get_global_rank() == 0:
+            os.makedirs(self._train_config.save_folder, exist_ok=True)
+            report_path = os.path.join(
+                self._train_config.save_folder, "pruning_masks.json"
+            )
+            with open(report_path, "w") as report_file:
+                json.dump(report, report_file, indent=4)
+        return model, MaskPrunedWeights(
+            mask_gradients=self._train_config.get("mask_gradients", False),
+            mask_format=self._train_config.get("mask_format", "auto"),
+            report_path=report_path,
+        )
 
     def _build_dataloaders(
         self,
@@ -350,10 +372,17 @@ class FineTuner:
     help="Path to directory to store checkpoints",
 )
 @click.option("--logging", default=None, type=str, help="Path to store log")
+@click.option(
+    "--autoresume",
+    is_flag=True,
+    default=False,
+    help="Resume from the latest checkpoint in the checkpoints directory",
+)
 def parse_args_and_run(
     yaml: Union[str, Path],
     checkpoints: Union[str, Path],
     logging: Union[str, Path],
+    autoresume: bool,
 ):
     """
     Serves as the entrypoint for ddp LLM finetuning.
@@ -361,12 +390,18 @@ def parse_args_and_run(
     :param yaml: path to the llmfoundry compliant yaml file
     :param checkpoints: path to log the checkpoints for the model
     :param logging: path to store the specified logger (such as tensorboard)
+    :param autoresume: resume from the latest checkpoint in `checkpoints`
     """
-    finetuner = FineTuner(yaml, checkpoints, logging)
+    finetuner = FineTuner(yaml, checkpoints, logging, autoresume=autoresume)
     finetuner.fine_tune()
 
 
 # train_hook
 def main(**kwargs):
-    finetuner = FineTuner(kwargs["yaml"], kwargs["checkpoints"], kwargs["logging"])
+    finetuner = FineTuner(
+        kwargs["yaml"],
+        kwargs["checkpoints"],
+        kwargs["logging"],
+        autoresume=kwargs.get("autoresume", False),
+    )
     finetuner.fine_tune()
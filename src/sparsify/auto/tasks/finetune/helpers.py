@@ -12,51 +12,116 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
 import torch
 
 from composer.core import Algorithm, Event
+from sparsify.auto.utils import PruningMasks, attach_compact_masks
+
 
+__all__ = ["attach_masks", "MaskPrunedWeights"]
 
-all = ["attach_masks", "MaskPrunedWeights"]
+_LOGGER = logging.getLogger(__name__)
 
 
 class MaskPrunedWeights(Algorithm):
     """
     Composer specific hook which allows us to mask weights after a specific event,
     in this case at the end of the batch. Provided as input to the Trainer while
-    finetuning. Note: can also mask weights before the forward pass by adding
-    `or event == Event.BATCH_START`
+    finetuning. The masked weights are collected on the first event, once the model
+    may have been wrapped by FSDP, and are then masked together with fused
+    multi-tensor ops
+
+    :param mask_gradients: True to mask the gradients of the pruned weights after
+        each backward pass, rather than the weights after each batch. Keeps the
+        pruned weights at zero for optimizers whose update is zero for a zero
+        gradient and a zero weight, such as SGD and Adam(W)
+    :param mask_format: how to store the masks, one of
+        `sparsify.auto.utils.MASK_FORMATS`
+    :param report_path: optional path to the JSON report of `attach_masks`, updated
+        with the format and bytes of each mask as held during training once the
+        masks are collected
     """
 
+    def __init__(
+        self,
+        mask_gradients: bool = False,
+        mask_format: str = "auto",
+        report_path: Optional[str] = None,
+    ):
+        self.mask_gradients = mask_gradients
+        self.report_path = report_path
+        self._masks = PruningMasks(mask_format=mask_format)
+        self._collected = False
+
     def match(self, event, state):
-        return event == Event.BATCH_END
+        return event == (
+            Event.AFTER_BACKWARD if self.mask_gradients else Event.BATCH_END
+        )
 
     @torch.no_grad()
     def apply(self, event, state, logger):
-        def mask_weights(module):
-            if hasattr(module, "constant_pruning_mask"):
-                module.weight *= module.constant_pruning_mask
+        if not self._collected:
+            self._masks.collect(state.model)
+            self._collected = True
+            _LOGGER.info(
+                f"Holding {self._masks.memory_bytes} bytes of masks during training"
+            )
+            if self.report_path is not None:
+                _update_mask_report(self.report_path, self._masks.report())
 
-        state.model.apply(mask_weights)
+        if self.mask_gradients:
+            self._masks.apply_to_gradients()
+        else:
+            self._masks.apply()
 
 
-def attach_masks(model: torch.nn.Module):
+def attach_masks(
+    model: torch.nn.Module, min_sparsity: float = 0.05, mask_format: str = "auto"
+) -> List[Dict[str, Any]]:
     """
-    Recursively attach masks to weights which have already been pruned to avoid
-    finetuning them further.
+    Attach masks to the weights of Linear layers which have already been pruned to
+    avoid finetuning them further. Masks are stored bit-packed or as CSR indices of
+    the unpruned weights, and only for layers of at least min_sparsity
 
-    :param model: torch.nnn.Module to recursively attach masks to if the weights are
-    already pruned
+    :param model: torch.nn.Module to attach masks to if the weights are already
+        pruned
+    :param min_sparsity: sparsity below which layers are not masked
+    :param mask_format: how to store the masks, one of
+        `sparsify.auto.utils.COMPACT_MASK_FORMATS`
+    :return: per layer report of the sparsity and the memory of its mask, compared
+        to a dense uint8 mask
     """
-    for _, module in model.named_children():
-        if isinstance(module, torch.nn.Linear):
-            constant_pruning_mask = torch.where(
-                module.weight == 0,
-                torch.tensor(0, dtype=torch.uint8),
-                torch.tensor(1, dtype=torch.uint8),
-            )
-            module.register_buffer(
-                "constant_pruning_mask", constant_pruning_mask, persistent=False
-            )
-        else:
-            attach_masks(module)
+    report = attach_compact_masks(
+        model, min_sparsity=min_sparsity, mask_format=mask_format
+    )
+    for layer in report:
+        _LOGGER.debug(
+            f"{layer['layer']}: sparsity {layer['sparsity']:.3f}, mask "
+            f"{layer['mask_format']} of {layer['mask_bytes']} bytes, saved "
+            f"{layer['saved_bytes']} bytes"
+        )
+    _LOGGER.info(
+        f"Attached masks to {sum(layer['mask_format'] is not None for layer in report)}"
+        f" of {len(report)} layers, using "
+        f"{sum(layer['mask_bytes'] for layer in report)} bytes, saving "
+        f"{sum(layer['saved_bytes'] for layer in report)} bytes over dense masks"
+    )
+    return report
+
+
+def _update_mask_report(report_path: str, held_report: List[Dict[str, Any]]):
+    # adds the format and bytes of the masks as held during training to the report
+    # of the attached masks, which only covers their compact storage
+    held = {layer["layer"]: layer for layer in held_report}
+    with open(report_path) as report_file:
+        report = json.load(report_file)
+    for layer in report:
+        held_layer = held.get(layer["layer"])
+        layer["held_mask_format"] = held_layer["mask_format"] if held_layer else None
+        layer["held_mask_bytes"] = held_layer["mask_bytes"] if held_layer else 0
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=4)
@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Tuple
+import glob
+import os
+from typing import Optional, Tuple
 
 from pydantic import BaseModel
+from sparsify.auto.tasks.args import DDPArgs
 from sparsify.auto.tasks.finetune.args import FineTuneTrainArgs
 from sparsify.auto.tasks.finetune.finetune import main as train_hook
 from sparsify.auto.tasks.runner import TaskRunner
@@ -39,8 +42,12 @@ class LLMFinetuner(TaskRunner):
     train_hook = staticmethod(train_hook)
     export_model_kwarg = "None"
 
-    def __init__(self, config: SparsificationTrainingConfig):
-        super().__init__(config)
+    def __init__(
+        self,
+        config: SparsificationTrainingConfig,
+        ddp_args: Optional[DDPArgs] = None,
+    ):
+        super().__init__(config, ddp_args)
 
     @classmethod
     def config_to_args(
@@ -59,8 +66,16 @@ class LLMFinetuner(TaskRunner):
     def _export_completion_check(self) -> bool:
         pass
 
+    def _get_last_checkpoint(self) -> Optional[str]:
+        # composer writes a symlink to the newest checkpoint of each rank
+        checkpoints = glob.glob(
+            os.path.join(self.run_directory, "**", "latest-rank0.pt"), recursive=True
+        )
+        checkpoints = [path for path in checkpoints if os.path.exists(path)]
+        return max(checkpoints, key=os.path.getmtime) if checkpoints else None
+
     def _update_train_args_post_failure(self, error_type: Exception):
-        pass
+        self.train_args.autoresume = self._get_last_checkpoint() is not None
 
     def _update_export_args_post_failure(self, error_type: Exception):
         pass
@@ -13,19 +13,29 @@
 # limitations under the License.
 
 
+import glob
 import json
 import os
-from typing import Tuple
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import onnx
 import torch
 
 from pydantic import BaseModel
+from sparseml.pytorch.datasets import DatasetRegistry
 from sparseml.pytorch.image_classification.export import main as export_hook
 from sparseml.pytorch.image_classification.train import main as train_hook
+from sparseml.pytorch.image_classification.utils.helpers import create_model
+from sparsify.auto.tasks.args import DDPArgs
 from sparsify.auto.tasks.image_classification.args import ImageClassificationExportArgs
 from sparsify.auto.tasks.runner import DDP_ENABLED, TaskRunner
-from sparsify.auto.utils import HardwareSpecs
+from sparsify.auto.utils import (
+    HardwareSpecs,
+    compare_onnx_to_torch,
+    inspect_checkpoint,
+    make_batch_size_probe,
+    validate_onnx_export,
+)
 from sparsify.schemas import Metrics, SparsificationTrainingConfig
 from sparsify.utils import TASK_REGISTRY
 
@@ -55,9 +65,15 @@ class ImageClassificationRunner(TaskRunner):
     export_hook = staticmethod(export_hook.callback)
     sparseml_train_entrypoint = "sparseml.pytorch.image_classification.train"
     export_model_kwarg = "checkpoint_path"
-
-    def __init__(self, config: SparsificationTrainingConfig):
-        super().__init__(config)
+    zoo_stub_artifact = "checkpoint"
+    zoo_stub_train_args = {"base_model": "checkpoint_path"}
+
+    def __init__(
+        self,
+        config: SparsificationTrainingConfig,
+        ddp_args: Optional[DDPArgs] = None,
+    ):
+        super().__init__(config, ddp_args)
         self._model_save_name = os.path.join(
             *self.export_args.checkpoint_path.split(os.sep)[-3:]
         )
@@ -134,11 +150,93 @@ class ImageClassificationRunner(TaskRunner):
         """
         Update run args in the event of an out of memory error, to reduce memory usage
         """
-        self.train_args.train_batch_size //= 2
-        self.train_args.init_lr //= 2
+        # gradient accumulation keeps the effective batch size, and so the LR, fixed
+        self._set_batch_size(max(1, self._get_batch_size() // 2))
         if self.train_args.test_batch_size > self.train_args.train_batch_size:
             self.train_args.test_batch_size //= 2
 
+    def _get_batch_size(self) -> int:
+        """
+        :return: per-device train batch size. sparseml splits the train batch size
+            across devices
+        """
+        return max(1, self.train_args.train_batch_size // self._num_train_devices())
+
+    def _set_batch_size(self, batch_size: int):
+        """
+        Set the per-device train batch size, scaling gradient accumulation to keep
+        the effective batch size constant
+
+        :param batch_size: new per-device train batch size
+        """
+        effective_batch_size = (
+            self.train_args.train_batch_size * self.train_args.gradient_accum_steps
+        )
+        self.train_args.train_batch_size = batch_size * self._num_train_devices()
+        self.train_args.gradient_accum_steps = max(
+            1, round(effective_batch_size / self.train_args.train_batch_size)
+        )
+
+    def _get_batch_size_probe_input_key(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: dictionary identifying the model and input size for the batch size
+            probe
+        """
+        return {
+            "model": str(self.train_args.checkpoint_path),
+            "arch_key": self.train_args.arch_key,
+            "image_size": self.train_args.image_size,
+            "mixed_precision": self.train_args.use_mixed_precision,
+        }
+
+    def _get_batch_size_probe_builder(self) -> Callable[[], Callable[[int], None]]:
+        """
+        :return: function that builds the model and returns a function running
+            training steps of the model on random images of the train image size
+        """
+        model_kwargs = dict(
+            checkpoint_path=self.train_args.checkpoint_path,
+            num_classes=self._get_num_classes(),
+            recipe_path=self.train_args.recipe_path,
+            arch_key=self.train_args.arch_key,
+            pretrained=self.train_args.pretrained,
+            pretrained_dataset=self.train_args.pretrained_dataset,
+            **{
+                key: value
+                for key, value in self.train_args.model_kwargs.items()
+                if key != "num_classes"
+            },
+        )
+        return partial(
+            _build_batch_size_probe,
+            model_kwargs,
+            self.train_args.image_size,
+            self.train_args.use_mixed_precision,
+        )
+
+    def _get_num_classes(self) -> int:
+        # mirrors the num_classes inference of the sparseml train script, without
+        # loading the dataset
+        if "num_classes" in self.train_args.model_kwargs:
+            return self.train_args.model_kwargs["num_classes"]
+        if self.train_args.dataset == "imagefolder":
+            train_path = os.path.join(self.train_args.dataset_path, "train")
+            return len(
+                [
+                    name
+                    for name in os.listdir(train_path)
+                    if os.path.isdir(os.path.join(train_path, name))
+                ]
+            )
+        return DatasetRegistry.attributes(self.train_args.dataset)["num_classes"]
+
+    def _num_train_devices(self) -> int:
+        return (
+            self.hardware_specs.device_count
+            if self.hardware_specs.cuda_available
+            else 1
+        )
+
     def _train_completion_check(self) -> bool:
         """
         Checks if train run completed successfully
@@ -149,45 +247,105 @@ class ImageClassificationRunner(TaskRunner):
         if not os.path.isfile(model_file):
             return False
 
-        # Check model file is loadable
+        # Check model file is loadable, without reading its weights
         try:
-            state_dict = torch.load(model_file)
-            assert "state_dict" in state_dict
-            assert "recipe" in state_dict
-            del state_dict
+            checkpoint = inspect_checkpoint(model_file)
+            assert "state_dict" in checkpoint
+            assert "recipe" in checkpoint
+            del checkpoint
         except Exception:
             return False
 
         return True
 
-    def _export_completion_check(self) -> bool:
+    def _deep_train_completion_check(self) -> bool:
         """
-        Checks if export run completed successfully
+        Checks the trained weights fully load
         """
-        onnx_file = os.path.join(
-            self.export_args.save_dir, self.export_args.model_tag, "model.onnx"
-        )
-
-        # Check mode file exists
-        if not os.path.isfile(onnx_file):
+        try:
+            checkpoint = torch.load(
+                self.export_args.checkpoint_path, map_location="cpu"
+            )
+            assert all(
+                isinstance(tensor, torch.Tensor)
+                for tensor in checkpoint["state_dict"].values()
+            )
+            del checkpoint
+        except Exception:
             return False
 
-        # Check onnx graph
+        return True
+
+    def _get_checkpoint_files(self) -> List[str]:
+        """
+        Return the path to the trained checkpoint
+        """
+        return [self.export_args.checkpoint_path]
+
+    def _export_completion_check(self) -> bool:
+        """
+        Checks if export run completed successfully
+        """
+        # Check onnx graph, with any external weights left on disk
         try:
-            model = onnx.load(onnx_file)
-            onnx.checker.check_model(model)
+            validate_onnx_export(self._get_exported_model_path())
         except Exception:
             return False
 
         return True
 
+    def _export_smoke_test(self):
+        """
+        Compare the exported model to the trained checkpoint on a fixed batch
+        """
+        model, _, _ = create_model(
+            checkpoint_path=self.export_args.checkpoint_path,
+            num_classes=self._get_num_classes(),
+            arch_key=self.export_args.arch_key,
+            **{
+                key: value
+                for key, value in (self.export_args.model_kwargs or {}).items()
+                if key != "num_classes"
+            },
+        )
+        compare_onnx_to_torch(self._get_exported_model_path(), model)
+
+    def _get_exported_model_path(self) -> str:
+        """
+        :return: path to the exported model.onnx
+        """
+        return os.path.join(
+            self.export_args.save_dir, self.export_args.model_tag, "model.onnx"
+        )
+
+    def _get_last_checkpoint(self) -> Optional[str]:
+        """
+        Return the path to the most recently saved `.pth` checkpoint (`model.pth`,
+        `checkpoint-best.pth` or an epoch checkpoint) under the training directory.
+        None if no checkpoint was saved yet
+        """
+        # sparseml increments the model tag directory if it already exists, so
+        # checkpoints from earlier attempts may live under a suffixed tag
+        checkpoints = glob.glob(
+            os.path.join(
+                self.run_directory, f"{self.train_args.model_tag}*", "training", "*.pth"
+            )
+        )
+        if not checkpoints:
+            return None
+
+        return max(checkpoints, key=os.path.getmtime)
+
     def _update_train_args_post_failure(self, error_type: Exception):
         """
         After a run throws an error or fails the the completion check, update args to
         reflect a resumed run. If specific error type is caught, update args to avoid
         error. e.g. for an Out of Memory error, the batch size may be reduced.
         """
-        pass
+        checkpoint = self._get_last_checkpoint()
+        if checkpoint is not None:
+            # sparseml restores weights and the applied recipe from the checkpoint
+            self.train_args.checkpoint_path = checkpoint
 
     def _update_export_args_post_failure(self, error_type: Exception):
         """
@@ -204,10 +362,8 @@ class ImageClassificationRunner(TaskRunner):
         results_path = os.path.join(
             self.train_args.save_dir, self.train_args.model_tag, "model.txt"
         )
-        with open(results_path) as f:
-            results = f.read().split("\n")
-        results = [tuple(result.strip().split(": ")[:2]) for result in results]
-        results = {key: val for key, val in results if "acc" in key.lower()}
+        results = _read_results_file(results_path)
+        results = {key: val for key, val in results.items() if "acc" in key.lower()}
 
         return Metrics(
             metrics=results,
@@ -215,6 +371,35 @@ class ImageClassificationRunner(TaskRunner):
             recovery=None,
         )
 
+    def _get_intermediate_metrics(self) -> Optional[Tuple[float, Metrics]]:
+        """
+        Retrieve the validation results of the most recently saved model. sparseml
+        writes `checkpoint-best.txt` whenever validation improves and `model.txt`
+        at the end of training
+        """
+        results_files = [
+            path
+            for path in glob.glob(
+                os.path.join(
+                    self.run_directory, f"{self.train_args.model_tag}*", "**", "*.txt"
+                ),
+                recursive=True,
+            )
+            if os.path.basename(path) in ("checkpoint-best.txt", "model.txt")
+        ]
+        if not results_files:
+            return None
+
+        results = _read_results_file(max(results_files, key=os.path.getmtime))
+        metrics = {key: val for key, val in results.items() if "acc" in key.lower()}
+        if "epoch" not in results or not metrics:
+            return None
+
+        # epochs are 0-indexed in the results files
+        return float(results["epoch"]) + 1, Metrics(
+            metrics=metrics, objective_key=list(metrics.keys())[0]
+        )
+
     def _get_default_deployment_directory(self, train_directory: str) -> str:
         """
         Return the path to where the deployment directory is created by export
@@ -223,3 +408,22 @@ class ImageClassificationRunner(TaskRunner):
             created. Used for relative pathing
         """
         return os.path.join(train_directory, self.train_args.model_tag, "deployment")
+
+
+def _build_batch_size_probe(
+    model_kwargs: Dict[str, Any], image_size: int, mixed_precision: bool
+) -> Callable[[int], None]:
+    model, _, _ = create_model(**model_kwargs)
+
+    def _make_inputs(batch_size: int) -> torch.Tensor:
+        return torch.randn(batch_size, 3, image_size, image_size)
+
+    return make_batch_size_probe(model, _make_inputs, mixed_precision=mixed_precision)
+
+
+def _read_results_file(path: str) -> Dict[str, str]:
+    # sparseml writes validation results as `key: value` lines
+    with open(path) as f:
+        results = f.read().split("\n")
+    results = [tuple(result.strip().split(": ")[:2]) for result in results]
+    return {result[0]: result[1] for result in results if len(result) == 2}
@@ -40,7 +40,10 @@ class _Yolov5BaseTrainArgs(BaseArgs):
     )
     imgsz: int = Field(default=640, description="train, val image size (pixels)")
     rect: bool = Field(default=False, description="rectangular training")
-    resume: bool = Field(default=False, description="resume most recent training")
+    resume: Union[bool, str] = Field(
+        default=False,
+        description="resume most recent training, or from the given last.pt path",
+    )
     nosave: bool = Field(default=False, description="only save final checkpoint")
     noval: bool = Field(default=False, description="only validate final epoch")
     noautoanchor: bool = Field(default=False, description="disable AutoAnchor")
@@ -16,18 +16,26 @@ import glob
 import os
 import re
 import shutil
-from typing import Tuple
-
-import onnx
-import torch
+from typing import List, Optional, Tuple
 
 import pandas
 from pydantic import BaseModel
 from sparseml.yolov5.scripts import export as export_hook
 from sparseml.yolov5.scripts import train as train_hook
+from sparsify.auto.tasks.args import DDPArgs
 from sparsify.auto.tasks.object_detection.yolov5 import Yolov5ExportArgs
 from sparsify.auto.tasks.runner import DDP_ENABLED, TaskRunner
-from sparsify.auto.utils import HardwareSpecs, create_yolo_data_yaml
+from sparsify.auto.utils import (
+    YOLO_DATASET_INDEX_ENABLED,
+    CSVMetricsTailer,
+    HardwareSpecs,
+    MetricsTailer,
+    compare_onnx_to_torch,
+    create_yolo_data_yaml,
+    index_yolo_dataset,
+    inspect_checkpoint,
+    validate_onnx_export,
+)
 from sparsify.schemas import Metrics, SparsificationTrainingConfig
 from sparsify.utils import TASK_REGISTRY
 from yolov5.models.experimental import attempt_load
@@ -64,9 +72,15 @@ class Yolov5Runner(TaskRunner):
     export_hook = staticmethod(export_hook)
     sparseml_train_entrypoint = "sparseml.yolov5.train"
     export_model_kwarg = "weights"
-
-    def __init__(self, config: SparsificationTrainingConfig):
-        super().__init__(config)
+    zoo_stub_artifact = "checkpoint"
+    zoo_stub_train_args = {"base_model": "weights"}
+
+    def __init__(
+        self,
+        config: SparsificationTrainingConfig,
+        ddp_args: Optional[DDPArgs] = None,
+    ):
+        super().__init__(config, ddp_args)
         self.dashed_cli_kwargs = True
         self._model_save_name = os.path.join("exp", "weights", "last.pt")
 
@@ -81,6 +95,9 @@ class Yolov5Runner(TaskRunner):
         :return: tuple of training and export arguments
         """
         dataset = create_yolo_data_yaml(config.dataset)
+        if YOLO_DATASET_INDEX_ENABLED:
+            # scanned once and shared by all trials through yolov5's label caches
+            index_yolo_dataset(dataset)
         train_args = Yolov5TrainArgs(
             weights=config.base_model,
             recipe=config.recipe,
@@ -157,56 +174,85 @@ class Yolov5Runner(TaskRunner):
         if not os.path.isfile(model_file):
             return False
 
-        # Check model file is loadable
+        # Check model file is loadable, without reading its weights
         try:
-            ckpt = torch.load(
-                (
-                    attempt_load(model_file)
-                    if not str(model_file).startswith("zoo:")
-                    else sparsezoo_download(model_file)
-                ),
-                map_location="cpu",
-            )  # load
-
+            ckpt = inspect_checkpoint(
+                model_file
+                if not str(model_file).startswith("zoo:")
+                else sparsezoo_download(model_file)
+            )
         except Exception:
             return False
 
-        # Test training ran to completion
-        if not ckpt.epochs == -1:
+        # Test training ran to completion, final checkpoints are saved with epoch -1
+        if not ckpt.get("epoch") == -1:
             return False
 
         return True
 
-    def _export_completion_check(self) -> bool:
+    def _deep_train_completion_check(self) -> bool:
         """
-        Checks if export run completed successfully
+        Checks the trained model fully loads
         """
-        onnx_file = self.export_args.weights.replace(".pt", ".onnx")
-
-        # Check mode file exists
-        if not os.path.isfile(onnx_file):
+        try:
+            attempt_load(self.export_args.weights)
+        except Exception:
             return False
 
-        # Check onnx graph
-        model = onnx.load(onnx_file)
+        return True
+
+    def _get_checkpoint_files(self) -> List[str]:
+        """
+        Return the path to the trained weights
+        """
+        return [self.export_args.weights]
+
+    def _export_completion_check(self) -> bool:
+        """
+        Checks if export run completed successfully
+        """
+        # Check onnx graph, with any external weights left on disk
         try:
-            onnx.checker.check_model(model)
+            validate_onnx_export(self._get_exported_model_path())
         except Exception:
             return False
 
         return True
 
+    def _export_smoke_test(self):
+        """
+        Compare the exported model to the trained weights on a fixed batch
+        """
+        model = attempt_load(self.export_args.weights).float()
+        compare_onnx_to_torch(self._get_exported_model_path(), model)
+
+    def _get_exported_model_path(self) -> str:
+        """
+        :return: path to the exported model.onnx
+        """
+        return self.export_args.weights.replace(".pt", ".onnx")
+
+    def _get_last_checkpoint(self) -> Optional[str]:
+        """
+        Return the path to the `last.pt` checkpoint yolov5 saves after every epoch.
+        None if no epoch was completed yet
+        """
+        model_file = self.export_args.weights
+        return model_file if os.path.isfile(model_file) else None
+
     def _update_train_args_post_failure(self, error_type: Exception):
         """
         After a run throws an error or fails the the completion check, update args to
         reflect a resumed run. If specific error type is caught, update args to avoid
         error. e.g. for an Out of Memory error, the batch size may be reduced.
         """
-        model_file = self.export_args.weights
+        checkpoint = self._get_last_checkpoint()
 
         # Check if at least one epoch was trained
-        if os.path.isfile(model_file):
-            self.train_args.resume = True
+        if checkpoint is not None:
+            # resume from an explicit path, yolov5 otherwise picks up the most recent
+            # run found under the current working directory
+            self.train_args.resume = checkpoint
         # If not, clear directory
         elif os.path.exists(self.train_args.project) and os.path.isdir(
             self.train_args.project
@@ -238,6 +284,41 @@ class Yolov5Runner(TaskRunner):
             recovery=None,
         )
 
+    def _get_intermediate_metrics(self) -> Optional[Tuple[float, Metrics]]:
+        """
+        Retrieve the metrics of the latest epoch from `results.csv`, which yolov5
+        appends to after every validation
+        """
+        results_path = os.path.join(self.log_directory, "results.csv")
+        if not os.path.isfile(results_path):
+            return None
+
+        results = pandas.read_csv(results_path, skipinitialspace=True)
+        if results.empty:
+            return None
+
+        # epochs are 0-indexed in the results file
+        return float(results["epoch"].iloc[-1]) + 1, Metrics(
+            metrics={
+                key.split("/")[1]: float(results[key].iloc[-1])
+                for key in _ACCURACY_KEYS
+            },
+            objective_key=_ACCURACY_KEYS[0].split("/")[1],
+        )
+
+    def _create_metrics_tailer(self) -> MetricsTailer:
+        """
+        :return: tailer of `results.csv`, which yolov5 appends a row to after every
+            validation
+        """
+        return CSVMetricsTailer(
+            os.path.join(self.log_directory, "results.csv"),
+            metric_columns={key: key.split("/")[1] for key in _ACCURACY_KEYS},
+            objective_key=_ACCURACY_KEYS[0].split("/")[1],
+            # epochs are 0-indexed in the results file
+            epoch_offset=1,
+        )
+
     def _get_default_deployment_directory(self, train_directory: str) -> str:
         """
         Return the path to where the deployment directory is created by export
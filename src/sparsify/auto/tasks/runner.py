@@ -17,23 +17,65 @@ import json
 import logging
 import os
 import pkgutil
-import shutil
-import socket
+import threading
+import time
+import uuid
 import warnings
 from abc import abstractmethod
+from contextlib import contextmanager
 from functools import wraps
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import torch
 from torch.distributed.run import main as launch_ddp
 
 from pydantic import BaseModel
-from sparsify.auto.utils import ErrorHandler, HardwareSpecs, analyze_hardware
-from sparsify.schemas import Metrics, SparsificationTrainingConfig
-from sparsify.utils import TASK_REGISTRY, TaskName, get_task_info
+from sparsify.auto.tasks.args import DDPArgs
+from sparsify.auto.utils import (
+    CPU_WORKER_CORES_ENV,
+    CPU_WORKER_LAUNCH_COMMAND,
+    DEEP_CHECKPOINT_CHECK,
+    EXPORT_SMOKE_TEST_ENABLED,
+    METRICS_STREAM_INTERVAL,
+    NODE_TOKEN_ENV,
+    PRIMARY_NODE_FILE_NAME,
+    PRIMARY_NODE_LAUNCH_COMMAND,
+    PRIMARY_NODE_MARKER_ENV,
+    BenchmarkConfig,
+    ErrorHandler,
+    HardwareSpecs,
+    MetricsTailer,
+    PollingMetricsTailer,
+    ResourceMonitor,
+    analyze_hardware,
+    assemble_deployment_directory,
+    batch_size_candidates,
+    format_cpu_worker_cores,
+    format_prometheus_metrics,
+    get_probe_device_key,
+    load_probed_batch_size,
+    measure_performance_metrics,
+    read_primary_node,
+    run_batch_size_probe,
+    save_probed_batch_size,
+    split_cpu_cores,
+    summarize_stage_records,
+    verify_checkpoint_manifest,
+    write_checkpoint_manifest,
+)
+from sparsify.schemas import Metrics, MetricsSnapshot, SparsificationTrainingConfig
+from sparsify.utils import (
+    ARTIFACT_CACHE_ENABLED,
+    TASK_REGISTRY,
+    TaskName,
+    get_artifact_cache,
+    get_task_info,
+)
 
 
 __all__ = [
+    "BATCH_SIZE_PROBE_ENABLED",
+    "CPU_DDP_ENABLED",
     "DDP_ENABLED",
     "MAX_RETRY_ATTEMPTS",
     "MAX_MEMORY_STEPDOWNS",
@@ -45,8 +87,15 @@ __all__ = [
 DDP_ENABLED = (
     not (os.environ.get("NM_AUTO_DISABLE_DDP", False)) and torch.cuda.is_available()
 )
-MAX_RETRY_ATTEMPTS = os.environ.get("NM_MAX_SCRIPT_RETRY_ATTEMPTS", 3)  # default: 3
-MAX_MEMORY_STEPDOWNS = os.environ.get("NM_MAX_SCRIPT_MEMORY_STEPDOWNS", 10)
+# gloo backed DDP with one worker per NUMA node, for hosts without CUDA devices
+CPU_DDP_ENABLED = (
+    not os.environ.get("NM_AUTO_DISABLE_DDP", False)
+    and not os.environ.get("NM_AUTO_DISABLE_CPU_DDP", False)
+    and not torch.cuda.is_available()
+)
+BATCH_SIZE_PROBE_ENABLED = not os.environ.get("NM_AUTO_DISABLE_BATCH_SIZE_PROBE")
+MAX_RETRY_ATTEMPTS = int(os.environ.get("NM_MAX_SCRIPT_RETRY_ATTEMPTS", 3))
+MAX_MEMORY_STEPDOWNS = int(os.environ.get("NM_MAX_SCRIPT_MEMORY_STEPDOWNS", 10))
 SUPPORTED_TASKS = [
     TASK_REGISTRY[task]
     for task in [
@@ -71,8 +120,7 @@ def retry_stage(stage: str):
     """
 
     def _decorator(func):
-        wraps(func)
-
+        @wraps(func)
         def _wrapper(self, *args, **kwargs):
             if not isinstance(self, TaskRunner):
                 raise RuntimeError(
@@ -80,16 +128,21 @@ def retry_stage(stage: str):
                 )
 
             # initialize error handling
-            error_handler = ErrorHandler(distributed_training=DDP_ENABLED)
+            error_handler = ErrorHandler(
+                distributed_training=self.use_distributed_training
+            )
 
             # attempt run and catch errors until success or maximum number of attempts
             # exceeded
             while not error_handler.max_attempts_exceeded():
-                out = func(self, *args, **kwargs)
-                try:
-                    exception = None
-                except Exception as e:
-                    exception = e
+                attempt_start = time.time()
+                with self._instrument(stage) as record:
+                    try:
+                        out = func(self, *args, **kwargs)
+                        exception = None
+                    except Exception as e:
+                        exception = e
+                    record["error"] = repr(exception) if exception else None
 
                 error_handler.save_error(exception)
 
@@ -114,10 +167,22 @@ def retry_stage(stage: str):
                         "Failed to fit model and data into memory. Cutting "
                         "batch size by half to reduce memory usage"
                     )
+                    self._record_out_of_memory()
                     self.memory_stepdown()
+                    record["memory_stepdown"] = True
+
+                # a node dropped out of the distributed run. The next attempt joins a
+                # new rendezvous round with the remaining nodes
+                if error_handler.is_node_failure():
+                    warnings.warn(
+                        "Lost a node of the distributed run. Re-joining the "
+                        f"rendezvous {self.ddp_args.rdzv_endpoint} to resume"
+                    )
+                    record["node_failure"] = True
 
                 # run did not succeed. Update args to attempt to resume run.
                 self.update_args_post_failure(stage, exception)
+                self._record_resume(stage, attempt_start, exception)
 
             # run failed - raise exception summary for user
             error_handler.raise_exception_summary()
@@ -134,13 +199,31 @@ class TaskRunner:
     at end of run for inference and deployment
 
     :param config: training config to base run on
+    :param ddp_args: optional launch args for distributed training, e.g. to train
+        across several nodes. Defaults to all devices of this node
     """
 
     # name of the field for the export model path. e.g. "model_path" for transformers
     export_model_kwarg: Optional[str] = None
-
-    def __init__(self, config: SparsificationTrainingConfig):
+    # True if the integration can train with gloo backed DDP on CPU
+    supports_cpu_distributed_training: bool = False
+    # zoo stub base models and teachers are fetched once per node through the
+    # artifact cache and passed as "training_directory", the directory of their
+    # training files, or "checkpoint", the checkpoint in it. None to pass the stubs
+    zoo_stub_artifact: Optional[str] = None
+    # names of the train args the base_model and distill_teacher of the config are
+    # passed as, which are set to the fetched files of zoo stubs
+    zoo_stub_train_args: Dict[str, str] = {}
+
+    def __init__(
+        self,
+        config: SparsificationTrainingConfig,
+        ddp_args: Optional[DDPArgs] = None,
+    ):
         self._config = config
+        self.ddp_args = ddp_args or DDPArgs()
+        # identifies the training workers of this node, see is_primary_node
+        self._node_token = uuid.uuid4().hex
 
         if self.export_model_kwarg is None:
             raise ValueError(
@@ -148,30 +231,55 @@ class TaskRunner:
                 f"{self.task}"
             )
 
-        # distributed training supported for torch>=1.9, as ddp error propagation was
-        # introduced in 1.9
-        self.use_distributed_training = DDP_ENABLED
         self.dashed_cli_kwargs = False  # True if CLI args require "-" as word separator
 
+        # records of failed attempts and the checkpoints they were resumed from
+        self.resume_history: List[Dict[str, Any]] = []
+        # wall time and resource usage of every stage attempt
+        self.stage_records: List[Dict[str, Any]] = []
+
         self.train_args, self.export_args = self.config_to_args(self.config)
+        if ARTIFACT_CACHE_ENABLED and self.zoo_stub_artifact is not None:
+            self._resolve_zoo_stubs()
         self.hardware_specs = analyze_hardware()
+
+        # distributed training supported for torch>=1.9, as ddp error propagation was
+        # introduced in 1.9. On CPU, one worker is launched per NUMA node
+        self.use_cpu_distributed_training = (
+            CPU_DDP_ENABLED
+            and self.supports_cpu_distributed_training
+            and (
+                len(self.hardware_specs.cpu_numa_nodes) > 1
+                or self.ddp_args.is_multi_node
+            )
+        )
+        self.use_distributed_training = DDP_ENABLED or self.use_cpu_distributed_training
+        if self.ddp_args.is_multi_node and not self.use_distributed_training:
+            raise ValueError(
+                "Multi-node training requires distributed training, which is disabled "
+                f"by NM_AUTO_DISABLE_DDP, or not supported on CPU for task {self.task}"
+            )
+
         self.tune_args_for_hardware(self.hardware_specs)
 
         self._apply_tuning_params()
 
     @staticmethod
-    def create(config: SparsificationTrainingConfig) -> "TaskRunner":
+    def create(
+        config: SparsificationTrainingConfig, ddp_args: Optional[DDPArgs] = None
+    ) -> "TaskRunner":
         """
         Return an initialized instance of the integration runner
 
         :param config: training config defining the run
+        :param ddp_args: optional launch args for distributed training
         """
 
         _dynamically_register_integration_runner(config.task)
 
         task_runner_constructor = _TASK_RUNNER_IMPLS[config.task]
 
-        return task_runner_constructor(config)
+        return task_runner_constructor(config, ddp_args)
 
     @classmethod
     def register_task(cls, task: TaskName):
@@ -226,6 +334,29 @@ class TaskRunner:
     def model_save_name(self):
         return self._model_save_name
 
+    def _resolve_zoo_stubs(self):
+        """
+        Pass the files in the artifact cache of the zoo stubs of the base model and
+        teacher to training, so the workers of the run and later trials share one
+        download instead of each resolving the stubs. Only the train args are
+        updated, the config and the run history keep the stubs
+        """
+        cache = get_artifact_cache()
+        for field, arg_name in self.zoo_stub_train_args.items():
+            stub = getattr(self.config, field, None)
+            if not (isinstance(stub, str) and stub.startswith("zoo:")):
+                continue
+            if getattr(self.train_args, arg_name, None) != stub:
+                continue
+            if self.zoo_stub_artifact == "checkpoint":
+                path = cache.get_training_checkpoint(stub)
+            else:
+                path = cache.get_training_directory(stub)
+            if path is None:
+                _LOGGER.warning(f"No checkpoint found for {stub}, passing the stub")
+                continue
+            setattr(self.train_args, arg_name, str(path))
+
     def _apply_tuning_params(self):
         """
         Apply sampled values for the tuned hyperparameters by updating recipe args
@@ -266,12 +397,17 @@ class TaskRunner:
         """
         Invoke sparseml training script via pytorch ddp API
         """
-        ddp_args = [
-            "--no_python",
-            "--nproc_per_node",
-            "auto",
-            f"--master_port={_get_open_port_()}",
-        ]
+        launch_args = self.ddp_args
+        if self.use_cpu_distributed_training:
+            launch_args = self._split_cpu_workers()
+
+        ddp_args = ["--no_python"] + launch_args.to_launch_args()
+        if self.ddp_args.is_multi_node:
+            os.environ[NODE_TOKEN_ENV] = self._node_token
+            os.environ[PRIMARY_NODE_MARKER_ENV] = self._primary_node_marker_path()
+            ddp_args += PRIMARY_NODE_LAUNCH_COMMAND
+        if self.use_cpu_distributed_training:
+            ddp_args += CPU_WORKER_LAUNCH_COMMAND
         if self._config.task in get_task_info("finetune").aliases:
             ddp_args += ["finetune"]
         else:
@@ -279,6 +415,45 @@ class TaskRunner:
         ddp_args += self.train_args.serialize_to_cli_string(self.dashed_cli_kwargs)
         launch_ddp(ddp_args)
 
+    @property
+    def is_primary_node(self) -> bool:
+        """
+        :return: True if this node should run the stages after training, such as
+            export and deployment. For multi-node jobs, that is the node whose
+            worker held global rank 0 and so wrote the trained checkpoint, which
+            under the c10d rendezvous need not be the node given node_rank 0
+        """
+        if not self.ddp_args.is_multi_node:
+            return True
+        return read_primary_node(self._primary_node_marker_path()) == self._node_token
+
+    def _primary_node_marker_path(self) -> str:
+        return os.path.join(self.run_directory, PRIMARY_NODE_FILE_NAME)
+
+    def _split_cpu_workers(self) -> DDPArgs:
+        """
+        Split the cores of this node between the CPU training workers, one per NUMA
+        node unless set otherwise. The split is passed to the workers through the
+        environment, for each to pin itself to its own cores
+
+        :return: launch args with the number of workers set
+        """
+        numa_nodes = (
+            self.hardware_specs.cpu_numa_nodes or self.hardware_specs.cpu_sockets
+        )
+        num_workers = (
+            len(numa_nodes)
+            if self.ddp_args.nproc_per_node == "auto"
+            else int(self.ddp_args.nproc_per_node)
+        )
+        worker_cores = split_cpu_cores(numa_nodes, num_workers)
+        os.environ[CPU_WORKER_CORES_ENV] = format_cpu_worker_cores(worker_cores)
+        _LOGGER.info(
+            f"Training with {num_workers} CPU workers of "
+            f"{[len(cores) for cores in worker_cores]} cores"
+        )
+        return self.ddp_args.copy(update={"nproc_per_node": str(num_workers)})
+
     @retry_stage(stage="train")
     def _train_api(self):
         """
@@ -292,20 +467,42 @@ class TaskRunner:
 
         "param log_directory: directory to save logs to
         """
-        self.run_directory = train_directory
-        self.log_directory = log_directory
-        self.update_run_directory_args()
+        self.set_run_directories(train_directory, log_directory)
 
         if self._config.task in get_task_info("finetune").aliases:
             self.train_args.checkpoints = self.run_directory
             self.train_args.logging = self.log_directory
 
+        if BATCH_SIZE_PROBE_ENABLED and self.hardware_specs.cuda_available:
+            with self._instrument("batch_size_probe"):
+                self.probe_batch_size()
+
         if self.use_distributed_training:
             self._train_distributed()
         else:
             self._train_api()
 
-        return self._get_metrics()
+        metrics = self._get_metrics()
+        if metrics is not None:
+            stage_summaries = self.stage_summaries()
+            metrics.train_time = sum(
+                stage_summaries[stage]["wall_time"]
+                for stage in ("batch_size_probe", "train")
+                if stage in stage_summaries
+            )
+        return metrics
+
+    def set_run_directories(self, train_directory: str, log_directory: str):
+        """
+        Point the run at its train and log directories. Called by `train`, and
+        directly to export a model trained by another process, e.g. a scheduled trial
+
+        :param train_directory: directory the model is trained into
+        :param log_directory: directory to save logs to
+        """
+        self.run_directory = train_directory
+        self.log_directory = log_directory
+        self.update_run_directory_args()
 
     @retry_stage(stage="export")
     def export(self, model_directory: str):
@@ -314,6 +511,12 @@ class TaskRunner:
 
         :param model_directory: directory of model to export
         """
+        if verify_checkpoint_manifest(model_directory) is False:
+            warnings.warn(
+                f"Checkpoint files in {model_directory} changed since training "
+                "completed and may be corrupted. Exporting them regardless"
+            )
+
         updated_export_args = self.export_args.copy()
         setattr(
             updated_export_args,
@@ -323,6 +526,30 @@ class TaskRunner:
 
         self.export_hook(**updated_export_args.dict())
 
+    def benchmark(
+        self,
+        metrics: Metrics,
+        model_directory: str,
+        config: Optional[BenchmarkConfig] = None,
+    ) -> Metrics:
+        """
+        Benchmark the exported ONNX model and add its latency, throughput,
+        compression, file size and memory usage to the metrics
+
+        :param metrics: metrics of the trained model to add to
+        :param model_directory: directory the model was exported from
+        :param config: benchmark scenarios to run. Defaults to `BenchmarkConfig()`
+        :return: the updated metrics
+        """
+        with self._instrument("benchmark"):
+            model_path = os.path.join(
+                self._get_default_deployment_directory(model_directory), "model.onnx"
+            )
+            performance_metrics = measure_performance_metrics(model_path, config)
+
+        metrics.metrics = {**(metrics.metrics or {}), **performance_metrics}
+        return metrics
+
     @staticmethod
     def supported_tasks() -> List[TaskName]:
         """
@@ -353,10 +580,26 @@ class TaskRunner:
         :param stage: name of stage to check
         """
         if stage == "train":
-            return self._train_completion_check()
+            complete = self._train_completion_check()
+            if complete and DEEP_CHECKPOINT_CHECK:
+                complete = self._deep_train_completion_check()
+            if complete:
+                # sizes, and with the deep check checksums, for later stages to
+                # verify the checkpoint is unchanged
+                write_checkpoint_manifest(
+                    self.run_directory, self._get_checkpoint_files()
+                )
+            return complete
 
         if stage == "export":
-            return self._export_completion_check()
+            complete = self._export_completion_check()
+            if complete and EXPORT_SMOKE_TEST_ENABLED:
+                try:
+                    self._export_smoke_test()
+                except Exception as smoke_test_error:
+                    warnings.warn(f"Export smoke test failed: {smoke_test_error}")
+                    complete = False
+            return complete
 
         raise ValueError(
             f"Unrecognized stage value: {stage}. Supported values are train and export"
@@ -383,6 +626,51 @@ class TaskRunner:
             f"Unrecognized stage value: {stage}. Supported values are train and export"
         )
 
+    @property
+    def compute_saved(self) -> float:
+        """
+        :return: total number of seconds of training that did not have to be re-run
+            because failed attempts were resumed from a checkpoint
+        """
+        return sum(record["compute_saved"] for record in self.resume_history)
+
+    def _record_resume(
+        self, stage: str, attempt_start: float, exception: Optional[Exception]
+    ):
+        """
+        Record a failed attempt and, if it will be resumed from a checkpoint, the
+        amount of compute that is recovered by not restarting from scratch. The
+        recovered compute is estimated as the time between the start of the failed
+        attempt and the last modification of the checkpoint being resumed from
+
+        :param stage: current stage name
+        :param attempt_start: timestamp of the start of the failed attempt
+        :param exception: exception raised by the failed attempt, if any
+        """
+        attempt_end = time.time()
+        checkpoint = self._get_last_checkpoint() if stage == "train" else None
+        compute_saved = 0.0
+
+        if checkpoint is not None and os.path.exists(checkpoint):
+            checkpoint_time = os.path.getmtime(checkpoint)
+            compute_saved = max(0.0, min(checkpoint_time, attempt_end) - attempt_start)
+            _LOGGER.info(
+                f"Resuming {stage} from checkpoint {checkpoint}. Recovered "
+                f"{compute_saved:.1f}s of the {attempt_end - attempt_start:.1f}s "
+                "failed attempt"
+            )
+
+        self.resume_history.append(
+            {
+                "stage": stage,
+                "attempt": len(self.resume_history),
+                "error": repr(exception) if exception is not None else None,
+                "attempt_time": attempt_end - attempt_start,
+                "checkpoint": checkpoint,
+                "compute_saved": compute_saved,
+            }
+        )
+
     def tune_args_for_hardware(self, hardware_specs: HardwareSpecs):
         """
         Update run args based on detected hardware specifications
@@ -399,30 +687,224 @@ class TaskRunner:
             f"memory_stepdown() missing implementation for task {self.task}"
         )
 
+    def probe_batch_size(self):
+        """
+        Pre-flight stage that finds the largest per-device train batch size, out of
+        the divisors of the configured one, that fits in device memory. Gradient
+        accumulation is scaled up to hold the effective batch size constant. The
+        probe runs in a subprocess, so this process holds no CUDA memory during
+        training. Results are cached per model, task, device and input size so later
+        runs can skip loading the model for the probe
+        """
+        if self._get_batch_size_probe_input_key() is None:
+            return
+
+        batch_size = self._get_batch_size()
+        try:
+            best = run_batch_size_probe(
+                self._get_batch_size_probe_builder(),
+                batch_size_candidates(batch_size),
+                self._get_batch_size_probe_key(),
+            )
+        except Exception as exception:
+            warnings.warn(
+                f"Batch size probe failed with {exception}. Continuing with the "
+                f"configured batch size {batch_size}"
+            )
+            return
+
+        if best is not None and best < batch_size:
+            _LOGGER.info(
+                f"Batch size {batch_size} does not fit in memory. Using batch size "
+                f"{best} with {batch_size // best}x gradient accumulation"
+            )
+            self._set_batch_size(best)
+
+    def _get_batch_size_probe_key(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: dictionary identifying the model, task, device and input size for
+            the batch size probe cache, or None if this runner does not support
+            probing or the device can not be identified
+        """
+        input_key = self._get_batch_size_probe_input_key()
+        device_key = get_probe_device_key()
+        if input_key is None or device_key is None:
+            return None
+
+        return {"task": str(self.task), **device_key, **input_key}
+
+    def _get_batch_size_probe_input_key(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: dictionary identifying the model and input size for the batch size
+            probe, or None if this runner does not support probing
+        """
+        return None
+
+    def _get_batch_size_probe_builder(self) -> Callable[[], Callable[[int], None]]:
+        """
+        :return: picklable function, e.g. a functools.partial of a module level
+            function, that builds the model and returns a function running training
+            steps on synthetic inputs at the given per-device batch size. Called in
+            the probe subprocess. See `make_batch_size_probe`
+        """
+        raise NotImplementedError(
+            f"_get_batch_size_probe_builder() missing implementation for task "
+            f"{self.task}"
+        )
+
+    def _get_batch_size(self) -> int:
+        """
+        :return: per-device train batch size
+        """
+        raise NotImplementedError(
+            f"_get_batch_size() missing implementation for task {self.task}"
+        )
+
+    def _set_batch_size(self, batch_size: int):
+        """
+        Set the per-device train batch size, scaling gradient accumulation to keep
+        the effective batch size constant
+
+        :param batch_size: new per-device train batch size
+        """
+        raise NotImplementedError(
+            f"_set_batch_size() missing implementation for task {self.task}"
+        )
+
+    def _record_out_of_memory(self):
+        """
+        Save the batch size that ran out of memory to the probe cache so later runs
+        start from a batch size that fits
+        """
+        cache_key = (
+            self._get_batch_size_probe_key()
+            if self.hardware_specs.cuda_available
+            else None
+        )
+        if cache_key is None:
+            return
+
+        max_fit, min_fail = load_probed_batch_size(cache_key)
+        failed_batch_size = self._get_batch_size()
+        min_fail = min(min_fail or failed_batch_size, failed_batch_size)
+        save_probed_batch_size(cache_key, min(max_fit, min_fail - 1), min_fail)
+
     def create_deployment_directory(self, train_directory: str, deploy_directory: str):
         """
         Creates and/or moves deployment directory to the deployment directory for the
-        mode corresponding to the trial_idx
+        mode corresponding to the trial_idx. Files are renamed when both directories
+        are on the same filesystem and otherwise copied in parallel, in kernel where
+        supported, and a manifest of their sizes and checksums is written alongside
         :post-condition: The deployment artifacts will be moved from
             origin_directory to deploy_directory
         :param train_directory: directory to grab the exported files from
         :param deploy_directory: directory to save the deployment files to
         """
-        origin_directory = self._get_default_deployment_directory(train_directory)
-        _LOGGER.info("Moving %s to %s" % (origin_directory, deploy_directory))
-        for filename in os.listdir(origin_directory):
-            source_file = os.path.join(origin_directory, filename)
-            target_file = os.path.join(deploy_directory, filename)
-            shutil.move(source_file, target_file)
+        with self._instrument("deployment"):
+            origin_directory = self._get_default_deployment_directory(train_directory)
+            readme_path = os.path.join(deploy_directory, "README.md")
+            instruc = pkgutil.get_data(
+                "sparsify.auto", "tasks/deployment_instructions.md"
+            )
+            with open(readme_path, "wb") as f:
+                f.write(instruc)
 
-        _LOGGER.info("Deleting %s" % origin_directory)
-        shutil.rmtree(origin_directory)
+            _LOGGER.info("Moving %s to %s" % (origin_directory, deploy_directory))
+            manifest_path = assemble_deployment_directory(
+                origin_directory, deploy_directory
+            )
+            _LOGGER.info(
+                "Deployment directory moved to %s, manifest written to %s"
+                % (deploy_directory, manifest_path)
+            )
 
-        readme_path = os.path.join(deploy_directory, "README.md")
-        instruc = pkgutil.get_data("sparsify.auto", "tasks/deployment_instructions.md")
-        with open(readme_path, "wb") as f:
-            f.write(instruc)
-        _LOGGER.info("Deployment directory moved to %s" % deploy_directory)
+    def stage_summaries(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: dict of stage name to the total wall time (seconds), peak resident
+            and GPU memory (MB), CPU utilization (percent) and number of attempts of
+            the stage
+        """
+        return dict(summarize_stage_records(self.stage_records))
+
+    def instrumentation_report(self) -> Dict[str, Any]:
+        """
+        :return: per stage summaries and per attempt records of the wall time and
+            resource usage of the run
+        """
+        return {
+            "stages": self.stage_summaries(),
+            "attempts": [dict(record) for record in self.stage_records],
+        }
+
+    def instrumentation_prometheus(self) -> str:
+        """
+        :return: per stage summaries in the Prometheus text exposition format
+        """
+        return format_prometheus_metrics(
+            self.stage_summaries(), labels={"task": str(self.task)}
+        )
+
+    def stream_metrics(
+        self,
+        poll_interval: float = METRICS_STREAM_INTERVAL,
+        stop_event: Optional[threading.Event] = None,
+    ) -> Iterator[MetricsSnapshot]:
+        """
+        Stream the metrics of the run as training writes them, e.g. to stop it early
+        or update a dashboard. Integration outputs are tailed, so each poll only
+        reads what was written since the previous one
+
+        :param poll_interval: seconds between reads of the training output
+        :param stop_event: optional event to end the stream, after a last read.
+            Otherwise the stream runs until the consumer stops iterating
+        :return: generator of the snapshots of the run, per epoch or evaluation
+            step, oldest first
+        """
+        tailer = None
+        while True:
+            stopping = stop_event is not None and stop_event.is_set()
+            try:
+                # created once training has set up the run directories
+                tailer = tailer or self._create_metrics_tailer()
+                snapshots = tailer.read()
+            except Exception as err:
+                # outputs may not exist yet or be mid-write, retried on the next poll
+                _LOGGER.debug(f"Could not read metrics of the run: {err}")
+                snapshots = []
+            yield from snapshots
+
+            if stopping:
+                return
+            if stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+    def _create_metrics_tailer(self) -> MetricsTailer:
+        """
+        :return: tailer of the metrics the integration writes while training.
+            Defaults to polling the latest intermediate metrics
+        """
+        return PollingMetricsTailer(self._get_intermediate_metrics)
+
+    @contextmanager
+    def _instrument(self, stage: str):
+        """
+        Measure the wall time and resource usage of the wrapped code and append it to
+        the stage records. Yields the record, so callers can add details to it
+        """
+        record = {
+            "stage": stage,
+            "attempt": 1
+            + sum(1 for previous in self.stage_records if previous["stage"] == stage),
+        }
+        monitor = ResourceMonitor()
+        try:
+            with monitor:
+                yield record
+        finally:
+            record.update(monitor.summary())
+            self.stage_records.append(record)
 
     @abstractmethod
     def _train_completion_check(self) -> bool:
@@ -433,6 +915,20 @@ class TaskRunner:
             f"_train_completion_check() missing implementation for task {self.task}"
         )
 
+    def _deep_train_completion_check(self) -> bool:
+        """
+        Opt-in check, through NM_AUTO_DEEP_CHECKPOINT_CHECK, that fully loads the
+        trained checkpoint. Runs after the lightweight train completion check passed
+        """
+        return True
+
+    def _get_checkpoint_files(self) -> List[str]:
+        """
+        Return the paths to the checkpoint files saved by training, recorded in the
+        checkpoint manifest once training is verified
+        """
+        return []
+
     @abstractmethod
     def _export_completion_check(self) -> bool:
         """
@@ -442,6 +938,14 @@ class TaskRunner:
             f"_export_completion_check() missing implementation for task {self.task}"
         )
 
+    def _export_smoke_test(self):
+        """
+        Opt-in check, through NM_AUTO_EXPORT_SMOKE_TEST, that the exported model
+        matches the outputs of the trained PyTorch model on a fixed batch. Raises if
+        they differ. Runs after the export completion check passed
+        """
+        pass
+
     @abstractmethod
     def _update_train_args_post_failure(self, error_type: Exception):
         """
@@ -454,6 +958,16 @@ class TaskRunner:
             f"{self.task}"
         )
 
+    @abstractmethod
+    def _get_last_checkpoint(self) -> Optional[str]:
+        """
+        Return the path to the most recent checkpoint saved by the train stage that a
+        new attempt can be resumed from. None if no checkpoint was saved yet
+        """
+        raise NotImplementedError(
+            f"_get_last_checkpoint() missing implementation for task {self.task}"
+        )
+
     @abstractmethod
     def _update_export_args_post_failure(self, error_type: Exception):
         """
@@ -475,6 +989,17 @@ class TaskRunner:
             f"_get_metrics() missing implementation for task {self.task}"
         )
 
+    def _get_intermediate_metrics(self) -> Optional[Tuple[float, Metrics]]:
+        """
+        Retrieve the latest evaluation metrics of an in-progress training run. Used
+        to stop poor hyperparameter trials early. Tasks that do not evaluate during
+        training return None
+
+        :return: tuple of the number of epochs trained and the metrics after those
+            epochs. None if no evaluation has completed yet
+        """
+        return None
+
     @abstractmethod
     def _get_default_deployment_directory(self, train_directory: str) -> str:
         """
@@ -520,15 +1045,3 @@ def _dynamically_register_integration_runner(task: str):
             "missing. Currently registered tasks: "
             f"{[str(task) for task in SUPPORTED_TASKS]}"
         )
-
-
-def _get_open_port_():
-    """
-    Find random open port. Used to circumvent issue with ddp trying to re-use
-    the same port between run attempts.
-    """
-    sock = socket.socket()
-    sock.bind(("", 0))
-    port = sock.getsockname()[1]
-    sock.close()
-    return port
@@ -0,0 +1,434 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Scheduler for running several hyperparameter trials concurrently, each on its own
+subset of the GPUs or CPU cores of the machine
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from sparsify.auto.tasks.runner import TaskRunner
+from sparsify.auto.utils import (
+    HardwareSpecs,
+    SuccessiveHalvingPruner,
+    TrialHistoryStore,
+    analyze_hardware,
+    get_trial_artifact_directory,
+)
+from sparsify.schemas import Metrics, SparsificationTrainingConfig
+
+
+__all__ = [
+    "MAX_CONCURRENT_TRIALS",
+    "TrialSlot",
+    "allocate_trial_slots",
+    "TrialScheduler",
+]
+
+MAX_CONCURRENT_TRIALS = int(os.environ.get("NM_AUTO_MAX_CONCURRENT_TRIALS", 0)) or None
+
+_CONFIG_FILE_NAME = "trial_config.json"
+_METRICS_FILE_NAME = "trial_metrics.json"
+_PROGRESS_FILE_NAME = "trial_progress.jsonl"
+_INSTRUMENTATION_FILE_NAME = "trial_instrumentation.json"
+_PROGRESS_INTERVAL = float(os.environ.get("NM_AUTO_TRIAL_PROGRESS_INTERVAL", 30))
+_STOP_TIMEOUT = 30
+_CPU_CORES_ENV = "NM_AUTO_TRIAL_CPU_CORES"
+# run by the trial interpreter before anything else is imported, so that torch and
+# the thread pools it starts are bound to the cores of the slot from the beginning
+_PIN_CORES_CODE = (
+    "import os\n"
+    f"cores = os.environ.get('{_CPU_CORES_ENV}')\n"
+    "if cores and hasattr(os, 'sched_setaffinity'):\n"
+    "    os.sched_setaffinity(0, [int(core) for core in cores.split(',')])\n"
+)
+_LOGGER = logging.getLogger(__name__)
+
+
+class TrialSlot(BaseModel):
+    """
+    Set of hardware resources that a single trial runs on
+    """
+
+    devices: List[int] = Field(
+        default_factory=list, description="Indices of the CUDA devices of the slot"
+    )
+    cpu_cores: List[int] = Field(
+        default_factory=list, description="Ids of the CPU cores of the slot"
+    )
+
+    def environment(self) -> Dict[str, str]:
+        """
+        :return: environment variables that restrict a trial process to the slot
+        """
+        environment = {}
+        if self.devices:
+            # map onto the devices visible to this process, if already restricted
+            visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+            visible = visible.split(",") if visible else None
+            environment["CUDA_VISIBLE_DEVICES"] = ",".join(
+                visible[device] if visible else str(device) for device in self.devices
+            )
+        if self.cpu_cores:
+            environment["OMP_NUM_THREADS"] = str(len(self.cpu_cores))
+            environment[_CPU_CORES_ENV] = ",".join(map(str, self.cpu_cores))
+        return environment
+
+
+def allocate_trial_slots(
+    hardware_specs: HardwareSpecs,
+    devices_per_trial: int = 1,
+    cores_per_trial: Optional[int] = None,
+    max_concurrent_trials: Optional[int] = MAX_CONCURRENT_TRIALS,
+) -> List[TrialSlot]:
+    """
+    Split the machine into disjoint slots for concurrent trials
+
+    :param hardware_specs: specs of the machine to split
+    :param devices_per_trial: number of CUDA devices to give each trial. Trials with
+        more than one device train with DDP across their devices
+    :param cores_per_trial: number of CPU cores to give each trial when running on
+        CPU. Defaults to one trial per socket. Slots never span sockets
+    :param max_concurrent_trials: optional cap on the number of slots
+    :return: list of disjoint trial slots
+    """
+    if hardware_specs.cuda_available:
+        devices = list(range(hardware_specs.device_count))
+        devices_per_trial = max(1, min(devices_per_trial, len(devices)))
+        slots = [
+            TrialSlot(devices=devices[start : start + devices_per_trial])
+            for start in range(
+                0, len(devices) - devices_per_trial + 1, devices_per_trial
+            )
+        ]
+    else:
+        sockets = hardware_specs.cpu_sockets or [list(range(os.cpu_count() or 1))]
+        slots = []
+        for cores in sockets:
+            size = max(1, min(cores_per_trial or len(cores), len(cores)))
+            slots.extend(
+                TrialSlot(cpu_cores=cores[start : start + size])
+                for start in range(0, len(cores) - size + 1, size)
+            )
+
+    return slots[:max_concurrent_trials] if max_concurrent_trials else slots
+
+
+class TrialScheduler:
+    """
+    Runs a queue of trial configs concurrently, one per trial slot. Each trial runs
+    in its own process, restricted to the devices or CPU cores of its slot, and
+    trains into its own trial artifact directory. Completed trials are appended to
+    the run history store as they finish.
+
+    If a pruner is given, trials report their intermediate evaluation metrics as
+    they train and are stopped as soon as the pruner decides they will not be
+    among the best trials. Stopped trials return their last reported metrics
+
+    :param hardware_specs: specs of the machine to schedule on. Detected if not given
+    :param devices_per_trial: number of CUDA devices to give each trial
+    :param cores_per_trial: number of CPU cores to give each trial on CPU
+    :param max_concurrent_trials: optional cap on the number of concurrent trials
+    :param pruner: optional successive halving pruner to stop poor trials early
+    :param poll_interval: seconds between checks of the trial progress when pruning
+    """
+
+    def __init__(
+        self,
+        hardware_specs: Optional[HardwareSpecs] = None,
+        devices_per_trial: int = 1,
+        cores_per_trial: Optional[int] = None,
+        max_concurrent_trials: Optional[int] = MAX_CONCURRENT_TRIALS,
+        pruner: Optional[SuccessiveHalvingPruner] = None,
+        poll_interval: float = _PROGRESS_INTERVAL,
+    ):
+        self.slots = allocate_trial_slots(
+            hardware_specs or analyze_hardware(),
+            devices_per_trial=devices_per_trial,
+            cores_per_trial=cores_per_trial,
+            max_concurrent_trials=max_concurrent_trials,
+        )
+        self.pruner = pruner
+        self.poll_interval = poll_interval
+        self.pruned_trials: List[int] = []
+        self._history_lock = threading.Lock()
+
+    def run(
+        self,
+        configs: List[SparsificationTrainingConfig],
+        train_directory: str,
+        log_directory: str,
+        stage: str = "tune",
+        start_idx: int = 0,
+        history_store: Optional[TrialHistoryStore] = None,
+    ) -> List[Tuple[SparsificationTrainingConfig, Optional[Metrics]]]:
+        """
+        Run all trial configs, blocking until they have completed
+
+        :param configs: trial configs to run, in queue order
+        :param train_directory: directory to create the trial artifact directories in
+        :param log_directory: directory to create the trial log directories in
+        :param stage: stage name to record the trials under in the history store
+        :param start_idx: trial index of the first config, so that indices continue
+            across calls
+        :param history_store: optional store to append completed trials to
+        :return: list of (config, metrics) pairs in the order of the configs. Metrics
+            are None for trials that failed
+        """
+        free_slots = queue.Queue()
+        for slot in self.slots:
+            free_slots.put(slot)
+
+        def _run_queued_trial(trial_idx: int, config: SparsificationTrainingConfig):
+            slot = free_slots.get()
+            try:
+                metrics = self._run_trial(
+                    trial_idx,
+                    config,
+                    slot,
+                    get_trial_artifact_directory(train_directory, trial_idx),
+                    get_trial_artifact_directory(log_directory, trial_idx),
+                )
+            finally:
+                free_slots.put(slot)
+
+            if metrics is not None and history_store is not None:
+                instrumentation = _read_instrumentation(
+                    get_trial_artifact_directory(train_directory, trial_idx)
+                )
+                with self._history_lock:
+                    history_store.append_trial(
+                        stage,
+                        trial_idx,
+                        config.dict(),
+                        metrics.dict(),
+                        instrumentation,
+                    )
+            return config, metrics
+
+        with ThreadPoolExecutor(max_workers=len(self.slots)) as executor:
+            futures = [
+                executor.submit(_run_queued_trial, start_idx + idx, config)
+                for idx, config in enumerate(configs)
+            ]
+            return [future.result() for future in futures]
+
+    def _run_trial(
+        self,
+        trial_idx: int,
+        config: SparsificationTrainingConfig,
+        slot: TrialSlot,
+        train_directory: str,
+        log_directory: str,
+    ) -> Optional[Metrics]:
+        """
+        Run a single trial in a subprocess restricted to the given slot
+
+        :return: metrics of the trial, None if it failed
+        """
+        os.makedirs(train_directory, exist_ok=True)
+        os.makedirs(log_directory, exist_ok=True)
+        config_path = os.path.join(train_directory, _CONFIG_FILE_NAME)
+        metrics_path = os.path.join(train_directory, _METRICS_FILE_NAME)
+        progress_path = os.path.join(train_directory, _PROGRESS_FILE_NAME)
+        with open(config_path, "w") as file:
+            file.write(config.json())
+
+        command = [
+            sys.executable,
+            "-c",
+            _PIN_CORES_CODE
+            + f"from {__name__} import _run_trial_process\n_run_trial_process()",
+            "--config",
+            config_path,
+            "--train-directory",
+            train_directory,
+            "--log-directory",
+            log_directory,
+            "--metrics-path",
+            metrics_path,
+        ]
+        if self.pruner is not None:
+            command += ["--progress-path", progress_path]
+
+        _LOGGER.info(f"Launching trial in {train_directory} on {slot}")
+        with open(os.path.join(log_directory, "trial.log"), "w") as log_file:
+            process = subprocess.Popen(
+                command,
+                env={**os.environ, **slot.environment()},
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                # own process group, so that stopping a trial also stops its DDP
+                # workers
+                start_new_session=True,
+            )
+            latest_metrics, pruned = self._monitor_trial(
+                trial_idx, process, progress_path
+            )
+
+        if pruned:
+            _LOGGER.info(f"Stopped trial in {train_directory} early: {latest_metrics}")
+            self.pruned_trials.append(trial_idx)
+            return latest_metrics
+
+        if process.returncode != 0 or not os.path.isfile(metrics_path):
+            warnings.warn(
+                f"Trial in {train_directory} failed with exit code "
+                f"{process.returncode}. See {log_file.name} for details"
+            )
+            return None
+
+        with open(metrics_path) as file:
+            return Metrics(**json.load(file))
+
+    def _monitor_trial(
+        self, trial_idx: int, process: subprocess.Popen, progress_path: str
+    ) -> Tuple[Optional[Metrics], bool]:
+        """
+        Wait for a trial process to exit, stopping it early if the pruner decides so
+        from the intermediate metrics it reports
+
+        :return: tuple of the latest reported metrics and whether the trial was
+            stopped early
+        """
+        if self.pruner is None:
+            process.wait()
+            return None, False
+
+        latest_metrics = None
+        offset = 0
+        while True:
+            try:
+                process.wait(timeout=self.poll_interval)
+                return latest_metrics, False
+            except subprocess.TimeoutExpired:
+                pass
+
+            reports, offset = _read_progress(progress_path, offset)
+            for epoch, metrics in reports:
+                latest_metrics = metrics
+                if self.pruner.report(
+                    trial_idx,
+                    epoch,
+                    metrics.metrics[metrics.objective_key],
+                    objective_key=metrics.objective_key,
+                ):
+                    _stop_process(process)
+                    return latest_metrics, True
+
+
+def _stop_process(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=_STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        process.wait()
+
+
+def _read_progress(
+    progress_path: str, offset: int
+) -> Tuple[List[Tuple[float, Metrics]], int]:
+    # read the complete progress lines written after the given offset
+    if not os.path.isfile(progress_path):
+        return [], offset
+    reports = []
+    with open(progress_path, "rb") as file:
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            report = json.loads(line)
+            reports.append((report["epoch"], Metrics(**report["metrics"])))
+    return reports, offset
+
+
+def _read_instrumentation(train_directory: str) -> Optional[Dict[str, Any]]:
+    instrumentation_path = os.path.join(train_directory, _INSTRUMENTATION_FILE_NAME)
+    if not os.path.isfile(instrumentation_path):
+        # trials stopped early do not write a report
+        return None
+    with open(instrumentation_path) as file:
+        return json.load(file)
+
+
+def _report_progress(
+    runner: TaskRunner, progress_path: str, stop_event: threading.Event
+):
+    # append the intermediate metrics of the run each time a new epoch is evaluated
+    for snapshot in runner.stream_metrics(
+        poll_interval=_PROGRESS_INTERVAL, stop_event=stop_event
+    ):
+        if snapshot.epoch is None:
+            continue
+        with open(progress_path, "a") as file:
+            file.write(
+                json.dumps(
+                    {"epoch": snapshot.epoch, "metrics": snapshot.metrics.dict()}
+                )
+            )
+            file.write("\n")
+
+
+def _run_trial_process():
+    # entrypoint of the trial subprocesses, launched with the slot environment
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", required=True)
+    parser.add_argument("--train-directory", required=True)
+    parser.add_argument("--log-directory", required=True)
+    parser.add_argument("--metrics-path", required=True)
+    parser.add_argument("--progress-path", default=None)
+    args = parser.parse_args()
+
+    with open(args.config) as file:
+        config = SparsificationTrainingConfig(**json.load(file))
+
+    runner = TaskRunner.create(config)
+
+    stop_event = threading.Event()
+    if args.progress_path:
+        threading.Thread(
+            target=_report_progress,
+            args=(runner, args.progress_path, stop_event),
+            daemon=True,
+        ).start()
+
+    try:
+        metrics = runner.train(
+            train_directory=args.train_directory, log_directory=args.log_directory
+        )
+    finally:
+        stop_event.set()
+
+    with open(args.metrics_path, "w") as file:
+        file.write(metrics.json())
+    with open(
+        os.path.join(args.train_directory, _INSTRUMENTATION_FILE_NAME), "w"
+    ) as file:
+        json.dump(runner.instrumentation_report(), file)
@@ -279,6 +279,11 @@ class _TransformersTrainArgs(BaseArgs):
     no_cuda: bool = Field(
         default=False, description="Do not use CUDA even when it is available"
     )
+    xpu_backend: Optional[str] = Field(
+        default=None,
+        description="The backend to use for CPU distributed training. Must be one of "
+        "`mpi`, `ccl` or `gloo`.",
+    )
     seed: int = Field(
         default=42,
         description="Random seed that will be set at the beginning of training.",
@@ -13,10 +13,12 @@
 # limitations under the License.
 
 import logging
+import os
 
 import click
 from sparseml.transformers.export import export as export_hook
 from sparsify.auto.tasks.transformers import TransformersExportArgs
+from sparsify.auto.utils import validate_onnx_export
 
 
 _LOGGER = logging.getLogger()
@@ -85,3 +87,12 @@ def llama_export(model_path: str, sequence_length: int, onnx_file_name: str):
     )
     _LOGGER.info("Exporting LLAMA model")
     export_hook(**export_args.dict())
+
+    # LLAMA exports keep their weights as external data, so the model is checked by
+    # path rather than loaded
+    onnx_file = os.path.join(model_path, "deployment", onnx_file_name)
+    if not os.path.isfile(onnx_file):
+        _LOGGER.warning(f"Could not find exported model {onnx_file} to verify")
+        return
+    validate_onnx_export(onnx_file)
+    _LOGGER.info(f"Verified exported model {onnx_file}")
@@ -17,9 +17,10 @@ import math
 import os
 import re
 import warnings
-from typing import Tuple, Union
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-import onnx
+import torch
 
 from pydantic import BaseModel
 from sparseml.pytorch.optim.manager import ScheduledModifierManager
@@ -28,6 +29,7 @@ from sparseml.transformers.question_answering import main as question_answering_
 from sparseml.transformers.text_classification import main as text_classification_hook
 from sparseml.transformers.token_classification import main as token_classification_hook
 from sparseml.transformers.utils import SparseAutoModel
+from sparsify.auto.tasks.args import DDPArgs
 from sparsify.auto.tasks.runner import TaskRunner
 from sparsify.auto.tasks.transformers import (
     QuestionAnsweringArgs,
@@ -35,7 +37,19 @@ from sparsify.auto.tasks.transformers import (
     TokenClassificationArgs,
     TransformersExportArgs,
 )
-from sparsify.auto.utils import HardwareSpecs
+from sparsify.auto.utils import (
+    DATASET_CACHE_ENABLED,
+    EventFileMetricsTailer,
+    HardwareSpecs,
+    MetricsTailer,
+    compare_onnx_to_torch,
+    dataset_cache_key,
+    get_tokenized_dataset_cache_dir,
+    inspect_checkpoint,
+    make_batch_size_probe,
+    use_datasets_cache_dir,
+    validate_onnx_export,
+)
 from sparsify.schemas import Metrics, SparsificationTrainingConfig
 from sparsify.utils import TASK_REGISTRY
 
@@ -54,11 +68,47 @@ class _TransformersRunner(TaskRunner):
 
     export_hook = staticmethod(export_hook)
     export_model_kwarg = "model_path"
+    supports_cpu_distributed_training = True
+    zoo_stub_artifact = "training_directory"
+    zoo_stub_train_args = {
+        "base_model": "model_name_or_path",
+        "distill_teacher": "distill_teacher",
+    }
 
-    def __init__(self, config: SparsificationTrainingConfig):
-        super().__init__(config)
+    def __init__(
+        self,
+        config: SparsificationTrainingConfig,
+        ddp_args: Optional[DDPArgs] = None,
+    ):
+        super().__init__(config, ddp_args)
         self._model_save_name = ""
 
+        # share the tokenized datasets between all trials, retries and workers. A
+        # cache_dir of the train args is used for models and datasets alike, so
+        # only the datasets cache is pointed at the tokenized dataset directory
+        self._datasets_cache_dir = None
+        if (
+            DATASET_CACHE_ENABLED
+            and self.train_args.cache_dir is None
+            and not self.train_args.overwrite_cache
+        ):
+            self._datasets_cache_dir = get_tokenized_dataset_cache_dir(
+                self._dataset_cache_key(self.train_args)
+            )
+
+    def train(self, train_directory: str, log_directory: str) -> Metrics:
+        """
+        Training entrypoint, loading the datasets through the tokenized dataset
+        cache of the run
+
+        :param train_directory: directory to save the trained model to
+        :param log_directory: directory to save logs to
+        """
+        with use_datasets_cache_dir(self._datasets_cache_dir):
+            return super().train(
+                train_directory=train_directory, log_directory=log_directory
+            )
+
     @classmethod
     def config_to_args(
         cls, config: SparsificationTrainingConfig
@@ -98,6 +148,30 @@ class _TransformersRunner(TaskRunner):
 
         return train_args, export_args
 
+    @classmethod
+    def _dataset_cache_key(cls, train_args: BaseModel) -> Dict[str, Any]:
+        """
+        :param train_args: train args of the run
+        :return: key of the tokenized datasets the train args produce
+        """
+        return dataset_cache_key(
+            dataset_name=train_args.dataset_name,
+            data_files=[
+                train_args.train_file,
+                train_args.validation_file,
+                train_args.test_file,
+            ],
+            tokenizer=train_args.tokenizer_name or train_args.model_name_or_path,
+            max_seq_length=train_args.max_seq_length,
+            pad_to_max_length=train_args.pad_to_max_length,
+            task=cls.task.name,
+            **{
+                field: getattr(train_args, field)
+                for field in _DATASET_CACHE_KEY_FIELDS
+                if hasattr(train_args, field)
+            },
+        )
+
     @classmethod
     def parse_data_args(cls, dataset: str) -> Tuple[Union[str, None], dict]:
         """
@@ -177,6 +251,15 @@ class _TransformersRunner(TaskRunner):
         Update run args based on detected hardware specifications
         """
         # self.train_args.fp16 = hardware_specs.fp16_available
+        if not hardware_specs.cuda_available:
+            # train on CPU, in bf16 mixed precision if the ISA supports it
+            self.train_args.no_cuda = True
+            self.train_args.bf16 = hardware_specs.bf16_available and not (
+                self.train_args.fp16
+            )
+            self.train_args.dataloader_pin_memory = False
+            if self.use_cpu_distributed_training:
+                self.train_args.xpu_backend = "gloo"
 
     def update_run_directory_args(self):
         """
@@ -190,28 +273,84 @@ class _TransformersRunner(TaskRunner):
         """
         Update run args in the event of an out of memory error, to reduce memory usage
         """
-        self.train_args.per_device_train_batch_size //= 2
-        self.train_args.gradient_accumulation_steps *= 2
+        self._set_batch_size(max(1, self._get_batch_size() // 2))
         if (
             self.train_args.per_device_eval_batch_size
             > self.train_args.per_device_train_batch_size
         ):
             self.train_args.per_device_eval_batch_size //= 2
 
+    def _get_batch_size(self) -> int:
+        """
+        :return: per-device train batch size
+        """
+        return self.train_args.per_device_train_batch_size
+
+    def _set_batch_size(self, batch_size: int):
+        """
+        Set the per-device train batch size, scaling gradient accumulation to keep
+        the effective batch size constant
+
+        :param batch_size: new per-device train batch size
+        """
+        effective_batch_size = (
+            self.train_args.per_device_train_batch_size
+            * self.train_args.gradient_accumulation_steps
+        )
+        self.train_args.per_device_train_batch_size = batch_size
+        self.train_args.gradient_accumulation_steps = max(
+            1, round(effective_batch_size / batch_size)
+        )
+
+    def _get_batch_size_probe_input_key(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: dictionary identifying the model and input size for the batch size
+            probe
+        """
+        return {
+            "model": self.train_args.model_name_or_path,
+            "teacher": self._get_distill_teacher(),
+            "sequence_length": self.train_args.max_seq_length,
+            "fp16": self.train_args.fp16,
+        }
+
+    def _get_batch_size_probe_builder(self) -> Callable[[], Callable[[int], None]]:
+        """
+        :return: function that builds the student model, and the distillation
+            teacher if any, and returns a function running training steps on random
+            token ids padded to the max sequence length
+        """
+        return partial(
+            _build_batch_size_probe,
+            self.train_args.model_name_or_path,
+            self._get_distill_teacher(),
+            self.task,
+            self.train_args.max_seq_length,
+            self.train_args.fp16,
+        )
+
+    def _get_distill_teacher(self) -> Optional[str]:
+        teacher = self.train_args.distill_teacher
+        return None if teacher in (None, "disable") else teacher
+
     def _train_completion_check(self) -> bool:
         """
         Checks if train run completed successfully
         """
         model_directory = self.export_args.model_path
-        model_file = os.path.join(model_directory, "pytorch_model.bin")
+        model_files = self._get_checkpoint_files()
 
         # Check model file exists
-        if not os.path.isfile(model_file):
+        if not any(path.endswith(_MODEL_FILE_NAMES) for path in model_files):
             return False
 
-        # Check model file is loadable
+        # Check config and weights index are loadable, without reading the weights
         try:
-            _ = _load_model_on_task(model_directory, "student", self.task)
+            with open(os.path.join(model_directory, "config.json")) as f:
+                json.load(f)
+            for model_file in model_files:
+                if model_file.endswith(_MODEL_FILE_NAMES):
+                    assert len(inspect_checkpoint(model_file)) > 0
         except Exception:
             return False
 
@@ -230,33 +369,84 @@ class _TransformersRunner(TaskRunner):
 
         return True
 
-    def _export_completion_check(self) -> bool:
+    def _deep_train_completion_check(self) -> bool:
         """
-        Checks if export run completed successfully
+        Checks the trained model fully loads
         """
+        try:
+            _ = _load_model_on_task(self.export_args.model_path, "student", self.task)
+        except Exception:
+            return False
 
-        onnx_file = os.path.join(self.run_directory, "deployment", "model.onnx")
+        return True
 
-        # Check mode file exists
-        if not os.path.isfile(onnx_file):
-            return False
+    def _get_checkpoint_files(self) -> List[str]:
+        """
+        Return the paths to the saved model weights and config
+        """
+        return [
+            os.path.join(self.export_args.model_path, name)
+            for name in ("config.json",) + _MODEL_FILE_NAMES
+            if os.path.isfile(os.path.join(self.export_args.model_path, name))
+        ]
 
-        # Check onnx graph
-        model = onnx.load(onnx_file)
+    def _export_completion_check(self) -> bool:
+        """
+        Checks if export run completed successfully
+        """
+        # Check onnx graph, with any external weights left on disk
         try:
-            onnx.checker.check_model(model)
+            validate_onnx_export(self._get_exported_model_path())
         except Exception:
             return False
 
         return True
 
+    def _export_smoke_test(self):
+        """
+        Compare the exported model to the trained model on a fixed batch
+        """
+        model = _load_model_on_task(self.export_args.model_path, "student", self.task)
+        compare_onnx_to_torch(
+            self._get_exported_model_path(), model, inputs_as_kwargs=True
+        )
+
+    def _get_exported_model_path(self) -> str:
+        """
+        :return: path to the exported model.onnx
+        """
+        return os.path.join(self.run_directory, "deployment", "model.onnx")
+
+    def _get_last_checkpoint(self) -> Optional[str]:
+        """
+        Return the path to the most recent complete HF `checkpoint-*` directory in the
+        train output directory. None if no checkpoint was saved yet
+        """
+        output_dir = self.train_args.output_dir
+        if not os.path.isdir(output_dir):
+            return None
+
+        checkpoints = []
+        for dirname in os.listdir(output_dir):
+            match = _CHECKPOINT_DIR_PATTERN.match(dirname)
+            if match and os.path.isdir(os.path.join(output_dir, dirname)):
+                checkpoints.append((int(match.group(1)), dirname))
+
+        # trainer state is written last, checkpoints without one were interrupted
+        for _, dirname in sorted(checkpoints, reverse=True):
+            checkpoint = os.path.join(output_dir, dirname)
+            if os.path.isfile(os.path.join(checkpoint, "trainer_state.json")):
+                return checkpoint
+
+        return None
+
     def _update_train_args_post_failure(self, error_type: Exception):
         """
         After a run throws an error or fails the the completion check, update args to
         reflect a resumed run. If specific error type is caught, update args to avoid
         error. e.g. for an Out of Memory error, the batch size may be reduced.
         """
-        pass
+        self.train_args.resume_from_checkpoint = self._get_last_checkpoint()
 
     def _update_export_args_post_failure(self, error_type: Exception):
         """
@@ -279,9 +469,7 @@ class _TransformersRunner(TaskRunner):
         with open(os.path.join(self.export_args.model_path, "eval_results.json")) as f:
             results = json.load(f)
 
-        objective_key = (
-            "eval_f1" if not self.task == "text_classification" else "eval_accuracy"
-        )
+        objective_key = self._objective_key
 
         return Metrics(
             metrics={objective_key: results[objective_key]},
@@ -289,6 +477,60 @@ class _TransformersRunner(TaskRunner):
             recovery=None,
         )
 
+    def _get_intermediate_metrics(self) -> Optional[Tuple[float, Metrics]]:
+        """
+        Retrieve the latest evaluation metrics from `eval_results.json` once training
+        has finished, or otherwise from the log history of the latest checkpoint
+        """
+        if self.train_args.one_shot:
+            return None
+
+        results_path = os.path.join(self.export_args.model_path, "eval_results.json")
+        if os.path.isfile(results_path):
+            with open(results_path) as f:
+                log_history = [json.load(f)]
+        else:
+            checkpoint = self._get_last_checkpoint()
+            if checkpoint is None:
+                return None
+            with open(os.path.join(checkpoint, "trainer_state.json")) as f:
+                log_history = json.load(f).get("log_history", [])
+
+        objective_key = self._objective_key
+        for entry in reversed(log_history):
+            if objective_key in entry and "epoch" in entry:
+                return entry["epoch"], Metrics(
+                    metrics={objective_key: entry[objective_key]},
+                    objective_key=objective_key,
+                )
+        return None
+
+    def _create_metrics_tailer(self) -> MetricsTailer:
+        """
+        :return: tailer of the TensorBoard logs of the trainer, which logs evaluation
+            metrics with an `eval/` prefix and the epoch as `train/epoch`. Falls back
+            to polling checkpoints if the trainer doesn't report to TensorBoard
+        """
+        report_to = self.train_args.report_to
+        if self.train_args.one_shot or (
+            report_to is not None and not {"all", "tensorboard"} & set(report_to)
+        ):
+            return super()._create_metrics_tailer()
+
+        objective_key = self._objective_key
+        return EventFileMetricsTailer(
+            self.log_directory,
+            metric_tags={
+                "eval/" + objective_key[len("eval_") :]: objective_key,
+            },
+            objective_key=objective_key,
+            epoch_tag="train/epoch",
+        )
+
+    @property
+    def _objective_key(self) -> str:
+        return "eval_f1" if not self.task == "text_classification" else "eval_accuracy"
+
     def _get_default_deployment_directory(self, train_directory: str) -> str:
         """
         Return the path to where the deployment directory is created by export
@@ -332,6 +574,21 @@ class QuestionAnsweringRunner(_TransformersRunner):
     sparseml_train_entrypoint = "sparseml.transformers.question_answering"
 
 
+# weights saved by HF, in torch or safetensors format
+_MODEL_FILE_NAMES = ("pytorch_model.bin", "model.safetensors")
+_CHECKPOINT_DIR_PATTERN = re.compile(r"^checkpoint-(\d+)$")
+
+# task specific train args that change the tokenized datasets
+_DATASET_CACHE_KEY_FIELDS = [
+    "dataset_config_name",
+    "task_name",
+    "doc_stride",
+    "version_2_with_negative",
+    "label_all_tokens",
+    "text_column_name",
+    "label_column_name",
+]
+
 _TASK_TO_EXPORT_TASK = {
     "question_answering": "qa",
     "text_classification": "glue",
@@ -356,6 +613,35 @@ _GLUE_TASK_NAMES = {
 }
 
 
+def _build_batch_size_probe(
+    model_name_or_path: str,
+    teacher: Optional[str],
+    task: str,
+    sequence_length: int,
+    fp16: bool,
+) -> Callable[[int], None]:
+    model = _load_model_on_task(model_name_or_path, "student", task)
+    vocab_size = model.config.vocab_size
+
+    def _make_inputs(batch_size: int) -> Dict[str, torch.Tensor]:
+        input_ids = torch.randint(vocab_size, (batch_size, sequence_length))
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+        }
+
+    return make_batch_size_probe(
+        model,
+        _make_inputs,
+        mixed_precision=fp16,
+        teacher=(
+            _load_model_on_task(teacher, "teacher", task)
+            if teacher is not None
+            else None
+        ),
+    )
+
+
 def _load_model_on_task(model_name_or_path, model_type, task, **model_kwargs):
     load_funcs = {
         "masked_language_modeling": SparseAutoModel.masked_language_modeling_from_pretrained,  # noqa
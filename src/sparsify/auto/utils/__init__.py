@@ -15,7 +15,22 @@
 # flake8: noqa
 # isort: skip_file
 
+from .history_store import *
 from .helpers import *
 from .error_handler import *
+from .batch_size_probe import *
+from .checkpoint_verification import *
+from .deployment import *
+from .pruning_masks import *
+from .dataset_cache import *
+from .yolo_dataset_index import *
+from .trial_pruner import *
+from .instrumentation import *
+from .run_monitor import *
+from .metrics_stream import *
+from .benchmark import *
+from .export_verification import *
+from .cpu_affinity import *
+from .primary_node import *
 from .hardware_analyzer import *
 from .nm_api import *
@@ -0,0 +1,363 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for finding the largest train batch size that fits in device memory by
+running a few training steps on synthetic inputs, before a full run is launched
+"""
+import gc
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Type, Union
+
+import torch
+
+from sparsify.auto.utils.error_handler import is_out_of_memory_error
+from sparsify.utils import get_sparsify_cache_path
+
+
+__all__ = [
+    "PROBE_MEMORY_MARGIN",
+    "batch_size_candidates",
+    "get_probe_device_key",
+    "make_batch_size_probe",
+    "probe_max_batch_size",
+    "run_batch_size_probe",
+    "load_probed_batch_size",
+    "save_probed_batch_size",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+_CACHE_FILE_NAME = "batch_size_probe.json"
+
+# fraction of device memory left free by the largest batch size the probe accepts,
+# for the allocations of training the probe does not reproduce, e.g. dataloader
+# workers, metrics and fragmentation
+PROBE_MEMORY_MARGIN = float(os.environ.get("NM_AUTO_BATCH_SIZE_PROBE_MARGIN", 0.1))
+
+
+def batch_size_candidates(batch_size: int) -> List[int]:
+    """
+    :param batch_size: configured batch size
+    :return: sorted list of the divisors of the batch size. Stepping down to one of
+        these keeps the effective batch size exact when gradient accumulation is
+        scaled up by the same factor
+    """
+    return [size for size in range(1, batch_size + 1) if batch_size % size == 0]
+
+
+def make_batch_size_probe(
+    model: torch.nn.Module,
+    make_inputs: Callable[[int], Any],
+    device: str = "cuda:0",
+    mixed_precision: bool = False,
+    num_steps: int = 2,
+    teacher: Optional[torch.nn.Module] = None,
+    optimizer_class: Optional[Type[torch.optim.Optimizer]] = torch.optim.AdamW,
+    memory_margin: float = PROBE_MEMORY_MARGIN,
+) -> Callable[[int], None]:
+    """
+    :param model: model to run the probe steps with
+    :param make_inputs: function that returns a synthetic input batch (tensor or
+        dict of tensors) for a given batch size
+    :param device: device to run the probe on
+    :param mixed_precision: True to run the forward pass under fp16 autocast
+    :param num_steps: number of training steps to run per batch size
+    :param teacher: optional distillation teacher, run forward only on the same
+        inputs before the model as during distillation
+    :param optimizer_class: optimizer stepped after each backward pass, so its state
+        is held in memory as during training. AdamW by default, as the largest state
+        of the optimizers used by the integrations. None to skip the optimizer step
+    :param memory_margin: fraction of the device memory the peak memory reserved by
+        a batch size must leave free for it to fit
+    :return: function that runs training steps at the given batch size, raising the
+        underlying exception if they fail
+    """
+    model.to(device)
+    model.train()
+    if teacher is not None:
+        teacher.to(device)
+        teacher.eval()
+    optimizer = (
+        # the probe model is discarded, the step size only needs to be valid
+        optimizer_class(model.parameters(), lr=1e-8)
+        if optimizer_class is not None
+        else None
+    )
+    is_cuda = torch.device(device).type == "cuda"
+
+    def _probe_step(batch_size: int):
+        try:
+            if is_cuda:
+                torch.cuda.reset_peak_memory_stats(device)
+            for _ in range(num_steps):
+                inputs = _to_device(make_inputs(batch_size), device)
+                with torch.autocast(
+                    device_type=torch.device(device).type, enabled=mixed_precision
+                ):
+                    teacher_outputs = None
+                    if teacher is not None:
+                        with torch.no_grad():
+                            teacher_outputs = _forward(teacher, inputs)
+                    outputs = _forward(model, inputs)
+                loss = _sum_outputs(outputs)
+                if isinstance(loss, torch.Tensor):
+                    loss.backward()
+                    if optimizer is not None:
+                        optimizer.step()
+                del inputs, outputs, teacher_outputs, loss
+            if is_cuda:
+                _check_memory_margin(device, memory_margin)
+        finally:
+            model.zero_grad(set_to_none=True)
+            _free_memory()
+
+    return _probe_step
+
+
+def run_batch_size_probe(
+    build_probe_step: Callable[[], Callable[[int], None]],
+    candidates: List[int],
+    cache_key: Optional[Dict[str, Any]] = None,
+    in_subprocess: bool = True,
+) -> Optional[int]:
+    """
+    Find the largest candidate batch size that fits in memory, reusing and updating
+    the bounds cached for the key. The probe runs in a spawned subprocess by
+    default, so its CUDA context and cached allocations are released when it exits
+    instead of being held by the launching process for the whole run. No process is
+    spawned if the cached bounds decide every candidate
+
+    :param build_probe_step: picklable function, e.g. a functools.partial of a
+        module level function, returning the probe step. See make_batch_size_probe
+    :param candidates: batch sizes to search over
+    :param cache_key: dictionary identifying the model, task, device and input size
+        in the probe cache. None to probe without the cache
+    :param in_subprocess: False to probe in the calling process
+    :return: largest fitting candidate, None if none fit
+    """
+    if in_subprocess and cache_key is not None:
+        max_fit, min_fail = load_probed_batch_size(cache_key)
+        in_subprocess = not all(
+            candidate <= max_fit or (min_fail is not None and candidate >= min_fail)
+            for candidate in candidates
+        )
+    if not in_subprocess:
+        return _run_probe(build_probe_step, candidates, cache_key)
+
+    # spawned rather than forked, as the launcher may be running threads
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_run_probe, (build_probe_step, candidates, cache_key))
+
+
+def get_probe_device_key() -> Optional[Dict[str, Any]]:
+    """
+    :return: name and total memory of the first GPU, as reported by nvidia-smi so
+        the launching process does not initialize CUDA. None if unavailable
+    """
+    try:
+        output = subprocess.run(
+            [
+                "nvidia-smi",
+                "--query-gpu=name,memory.total",
+                "--format=csv,noheader,nounits",
+                "--id=0",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=60,
+        ).stdout
+        name, memory = [value.strip() for value in output.strip().split(",")]
+        return {"device": name, "device_memory_mib": int(memory)}
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def probe_max_batch_size(
+    probe_step: Callable[[int], None],
+    candidates: List[int],
+    max_fit: int = 0,
+    min_fail: Optional[int] = None,
+) -> Tuple[Optional[int], int, Optional[int]]:
+    """
+    Binary search the candidate batch sizes for the largest one that fits in memory.
+    Known bounds from earlier probes are used to skip candidates that were already
+    decided
+
+    :param probe_step: function that runs training steps at a given batch size and
+        raises an out of memory error if it does not fit
+    :param candidates: batch sizes to search over
+    :param max_fit: largest batch size known to fit
+    :param min_fail: smallest batch size known to run out of memory
+    :return: tuple of the largest fitting candidate (None if none fit) and the
+        updated max_fit and min_fail bounds
+    """
+    candidates = sorted(candidates)
+    best = None
+    low, high = 0, len(candidates) - 1
+
+    while low <= high:
+        mid = (low + high) // 2
+        batch_size = candidates[mid]
+
+        if batch_size <= max_fit:
+            fits = True
+        elif min_fail is not None and batch_size >= min_fail:
+            fits = False
+        else:
+            fits = _fits_in_memory(probe_step, batch_size)
+            if fits:
+                max_fit = batch_size
+            else:
+                min_fail = batch_size
+
+        if fits:
+            best = batch_size
+            low = mid + 1
+        else:
+            high = mid - 1
+
+    return best, max_fit, min_fail
+
+
+def load_probed_batch_size(key: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+    """
+    :param key: dictionary identifying the model, task, device and input size
+    :return: tuple of the cached largest fitting and smallest failing batch sizes.
+        (0, None) if nothing was cached for the key
+    """
+    entry = _load_cache().get(_hash_key(key), {})
+    return entry.get("max_fit", 0), entry.get("min_fail")
+
+
+def save_probed_batch_size(
+    key: Dict[str, Any], max_fit: int, min_fail: Optional[int] = None
+):
+    """
+    :param key: dictionary identifying the model, task, device and input size
+    :param max_fit: largest batch size known to fit
+    :param min_fail: smallest batch size known to run out of memory
+    """
+    cache = _load_cache()
+    cache[_hash_key(key)] = {"key": key, "max_fit": max_fit, "min_fail": min_fail}
+
+    cache_path = os.path.join(get_sparsify_cache_path(), _CACHE_FILE_NAME)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(cache, file, indent=2)
+    os.replace(tmp_path, cache_path)
+
+
+def _run_probe(
+    build_probe_step: Callable[[], Callable[[int], None]],
+    candidates: List[int],
+    cache_key: Optional[Dict[str, Any]],
+) -> Optional[int]:
+    max_fit, min_fail = (
+        load_probed_batch_size(cache_key) if cache_key is not None else (0, None)
+    )
+    probe_step = None
+
+    def _lazy_probe_step(batch_size: int):
+        # the model is only built if the cache can not decide a candidate
+        nonlocal probe_step
+        if probe_step is None:
+            _LOGGER.info("Probing for the largest batch size that fits in memory")
+            probe_step = build_probe_step()
+        probe_step(batch_size)
+
+    try:
+        best, max_fit, min_fail = probe_max_batch_size(
+            _lazy_probe_step, candidates, max_fit, min_fail
+        )
+    finally:
+        probe_step = None
+        _free_memory()
+
+    if cache_key is not None:
+        save_probed_batch_size(cache_key, max_fit, min_fail)
+    return best
+
+
+def _check_memory_margin(device: str, memory_margin: float):
+    peak = torch.cuda.max_memory_reserved(device)
+    limit = (1 - memory_margin) * torch.cuda.get_device_properties(device).total_memory
+    if peak > limit:
+        # reported as an out of memory error, so the batch size is rejected
+        raise RuntimeError(
+            f"CUDA out of memory. Probe peak of {peak / 1024**3:.2f} GiB exceeds "
+            f"{limit / 1024**3:.2f} GiB, leaving less than {memory_margin:.0%} of "
+            "device memory free"
+        )
+
+
+def _fits_in_memory(probe_step: Callable[[int], None], batch_size: int) -> bool:
+    try:
+        probe_step(batch_size)
+    except Exception as exception:
+        if not is_out_of_memory_error(exception):
+            raise
+        _free_memory()
+        return False
+    return True
+
+
+def _load_cache() -> Dict[str, Any]:
+    cache_path = os.path.join(get_sparsify_cache_path(), _CACHE_FILE_NAME)
+    if not os.path.isfile(cache_path):
+        return {}
+    try:
+        with open(cache_path) as file:
+            return json.load(file)
+    except ValueError:
+        # corrupt cache files are rebuilt on the next save
+        return {}
+
+
+def _hash_key(key: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _to_device(inputs: Any, device: str) -> Any:
+    if isinstance(inputs, Mapping):
+        return {name: _to_device(value, device) for name, value in inputs.items()}
+    return inputs.to(device) if isinstance(inputs, torch.Tensor) else inputs
+
+
+def _forward(model: torch.nn.Module, inputs: Any) -> Any:
+    return model(**inputs) if isinstance(inputs, Mapping) else model(inputs)
+
+
+def _sum_outputs(outputs: Any) -> Union[torch.Tensor, int]:
+    # reduce arbitrary model outputs to a scalar for the backward pass
+    if isinstance(outputs, torch.Tensor):
+        return outputs.float().sum() if outputs.is_floating_point() else 0
+    if isinstance(outputs, Mapping):
+        outputs = list(outputs.values())
+    if isinstance(outputs, (list, tuple)):
+        return sum(_sum_outputs(output) for output in outputs)
+    return 0
+
+
+def _free_memory():
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
@@ -0,0 +1,326 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for measuring the inference performance of exported ONNX models on
+DeepSparse and ONNX Runtime CPU
+"""
+import importlib
+import logging
+import os
+import time
+import warnings
+from typing import Dict, List, Optional
+
+import numpy
+import onnx
+from onnx import external_data_helper, numpy_helper
+
+from pydantic import BaseModel, Field
+from sparsify.auto.utils.instrumentation import ResourceMonitor
+
+
+__all__ = [
+    "PERFORMANCE_METRICS",
+    "BenchmarkConfig",
+    "benchmark_onnx_model",
+    "measure_performance_metrics",
+]
+
+PERFORMANCE_METRICS = [
+    "latency",
+    "throughput",
+    "compression",
+    "file_size",
+    "memory_usage",
+]
+
+_LOGGER = logging.getLogger(__name__)
+_ONNX_TO_NUMPY_DTYPE = {
+    onnx.TensorProto.FLOAT: numpy.float32,
+    onnx.TensorProto.FLOAT16: numpy.float16,
+    onnx.TensorProto.DOUBLE: numpy.float64,
+    onnx.TensorProto.INT64: numpy.int64,
+    onnx.TensorProto.INT32: numpy.int32,
+    onnx.TensorProto.UINT8: numpy.uint8,
+    onnx.TensorProto.INT8: numpy.int8,
+    onnx.TensorProto.BOOL: numpy.bool_,
+}
+
+
+class BenchmarkConfig(BaseModel):
+    """
+    Class containing the scenarios to benchmark an exported model under. Every
+    combination of engine, batch size and core count is benchmarked
+    """
+
+    engines: List[str] = Field(
+        default=["deepsparse", "onnxruntime"],
+        description=(
+            "Engines to benchmark on, 'deepsparse' and/or 'onnxruntime' (CPU). "
+            "Engines that are not installed are skipped"
+        ),
+    )
+    batch_sizes: List[int] = Field(
+        default=[1, 64], description="Batch sizes to benchmark"
+    )
+    num_cores: List[Optional[int]] = Field(
+        default=[None],
+        description="Number of cores (threads) to benchmark with. None for all cores",
+    )
+    input_shapes: Optional[List[List[int]]] = Field(
+        default=None,
+        description=(
+            "Optional input shapes, excluding the batch dimension, overriding the "
+            "shapes of the model inputs. e.g. [[3, 320, 320]] for a larger image "
+            "size or [[256], [256], [256]] for a shorter sequence length. Requires "
+            "the model to have dynamic input dimensions, or an engine that can "
+            "override them"
+        ),
+    )
+    warmup_iterations: int = Field(
+        default=5, description="Number of untimed iterations before measuring"
+    )
+    iterations: int = Field(default=30, description="Number of timed iterations")
+
+
+def benchmark_onnx_model(
+    model_path: str,
+    engine: str,
+    batch_size: int = 1,
+    num_cores: Optional[int] = None,
+    input_shapes: Optional[List[List[int]]] = None,
+    warmup_iterations: int = 5,
+    iterations: int = 30,
+) -> Dict[str, float]:
+    """
+    Benchmark an ONNX model on random inputs
+
+    :param model_path: path to the ONNX model
+    :param engine: engine to run on, 'deepsparse' or 'onnxruntime'
+    :param batch_size: batch size to run with
+    :param num_cores: number of cores to run with, None for all cores
+    :param input_shapes: optional input shapes, excluding the batch dimension, to
+        override the model input shapes with
+    :param warmup_iterations: number of untimed iterations before measuring
+    :param iterations: number of timed iterations
+    :return: dict of the mean and 90th percentile batch latency (ms), the
+        throughput (items/second) and the memory used by the engine (MB)
+    """
+    model = onnx.load(model_path, load_external_data=False)
+    inputs = _generate_random_inputs(model, batch_size, input_shapes)
+    del model
+
+    with ResourceMonitor(sample_interval=0.1) as monitor:
+        run = _compile(model_path, engine, batch_size, num_cores, inputs)
+        for _ in range(warmup_iterations):
+            run(inputs)
+
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            run(inputs)
+            latencies.append(time.perf_counter() - start)
+        del run
+    resources = monitor.summary()
+
+    return {
+        "latency": 1000 * float(numpy.mean(latencies)),
+        "latency_p90": 1000 * float(numpy.percentile(latencies, 90)),
+        "throughput": batch_size * len(latencies) / sum(latencies),
+        "memory_usage": max(0.0, resources["peak_rss_mb"] - resources["start_rss_mb"]),
+    }
+
+
+def measure_performance_metrics(
+    model_path: str, config: Optional[BenchmarkConfig] = None
+) -> Dict[str, float]:
+    """
+    Measure the performance metrics of an exported model:
+
+    - `file_size`: size of the ONNX file and its external data, in MB
+    - `compression`: ratio of total to non-zero weights
+    - `latency`: batch latency (ms) of the first benchmark scenario
+    - `throughput`: highest throughput (items/second) across scenarios
+    - `memory_usage`: engine memory (MB) of the first benchmark scenario
+
+    Every scenario is also reported under `{engine}_bs{batch_size}_c{cores}_` keys
+
+    :param model_path: path to the ONNX model
+    :param config: benchmark scenarios. Defaults to `BenchmarkConfig()`
+    :return: dict of metric name to value
+    """
+    config = config or BenchmarkConfig()
+    metrics = {
+        "file_size": _model_file_size(model_path) / 1024**2,
+        "compression": _compression_ratio(model_path),
+    }
+
+    scenarios = [
+        (engine, batch_size, num_cores)
+        for engine in config.engines
+        if _engine_available(engine)
+        for batch_size in config.batch_sizes
+        for num_cores in config.num_cores
+    ]
+    for engine in config.engines:
+        if not _engine_available(engine):
+            warnings.warn(f"Skipping benchmark on {engine}, engine is not installed")
+
+    for engine, batch_size, num_cores in scenarios:
+        _LOGGER.info(
+            f"Benchmarking {model_path} on {engine} with batch size {batch_size} and "
+            f"{num_cores or 'all'} cores"
+        )
+        results = benchmark_onnx_model(
+            model_path,
+            engine,
+            batch_size=batch_size,
+            num_cores=num_cores,
+            input_shapes=config.input_shapes,
+            warmup_iterations=config.warmup_iterations,
+            iterations=config.iterations,
+        )
+        scenario_key = f"{engine}_bs{batch_size}_c{num_cores or 'all'}"
+        for name, value in results.items():
+            metrics[f"{scenario_key}_{name}"] = value
+
+        if "latency" not in metrics:
+            metrics["latency"] = results["latency"]
+            metrics["memory_usage"] = results["memory_usage"]
+        metrics["throughput"] = max(
+            metrics.get("throughput", 0.0), results["throughput"]
+        )
+
+    return metrics
+
+
+def _engine_available(engine: str) -> bool:
+    # engines are imported on first use, as this module is imported with
+    # sparsify.auto.utils
+    if engine not in ("deepsparse", "onnxruntime"):
+        raise ValueError(
+            f"Unsupported benchmark engine {engine}. Supported engines are "
+            "'deepsparse' and 'onnxruntime'"
+        )
+    try:
+        importlib.import_module(engine)
+    except Exception:
+        return False
+    return True
+
+
+def _compile(
+    model_path: str,
+    engine: str,
+    batch_size: int,
+    num_cores: Optional[int],
+    inputs: List[numpy.ndarray],
+):
+    if engine == "deepsparse":
+        import deepsparse
+
+        compiled = deepsparse.compile_model(
+            model_path,
+            batch_size=batch_size,
+            num_cores=num_cores,
+            input_shapes=[list(array.shape) for array in inputs],
+        )
+        return compiled.run
+
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if num_cores:
+        options.intra_op_num_threads = num_cores
+    session = onnxruntime.InferenceSession(
+        model_path, options, providers=["CPUExecutionProvider"]
+    )
+    input_names = [model_input.name for model_input in session.get_inputs()]
+
+    def _run(arrays: List[numpy.ndarray]):
+        return session.run(None, dict(zip(input_names, arrays)))
+
+    return _run
+
+
+def _generate_random_inputs(
+    model: onnx.ModelProto,
+    batch_size: int,
+    input_shapes: Optional[List[List[int]]] = None,
+) -> List[numpy.ndarray]:
+    initializer_names = {initializer.name for initializer in model.graph.initializer}
+    graph_inputs = [
+        graph_input
+        for graph_input in model.graph.input
+        if graph_input.name not in initializer_names
+    ]
+
+    arrays = []
+    for idx, graph_input in enumerate(graph_inputs):
+        tensor_type = graph_input.type.tensor_type
+        if input_shapes:
+            shape = [batch_size] + list(input_shapes[idx])
+        else:
+            # dynamic non-batch dimensions default to 1
+            shape = [batch_size] + [
+                dim.dim_value or 1 for dim in tensor_type.shape.dim[1:]
+            ]
+        dtype = _ONNX_TO_NUMPY_DTYPE.get(tensor_type.elem_type, numpy.float32)
+        if numpy.issubdtype(dtype, numpy.floating):
+            arrays.append(numpy.random.randn(*shape).astype(dtype))
+        else:
+            # 0/1 values are valid token ids, attention masks and token type ids
+            arrays.append(numpy.random.randint(0, 2, size=shape).astype(dtype))
+    return arrays
+
+
+def _model_file_size(model_path: str) -> int:
+    size = os.path.getsize(model_path)
+    model_directory = os.path.dirname(model_path)
+    model = onnx.load(model_path, load_external_data=False)
+    external_files = {
+        entry.value
+        for initializer in model.graph.initializer
+        if initializer.data_location == onnx.TensorProto.EXTERNAL
+        for entry in initializer.external_data
+        if entry.key == "location"
+    }
+    for external_file in external_files:
+        external_path = os.path.join(model_directory, external_file)
+        if os.path.isfile(external_path):
+            size += os.path.getsize(external_path)
+    return size
+
+
+def _compression_ratio(model_path: str) -> float:
+    # external weights are loaded one initializer at a time, so exports over 2GB
+    # are never held in memory at once
+    model = onnx.load(model_path, load_external_data=False)
+    model_directory = os.path.dirname(model_path)
+    total, nonzero = 0, 0
+    for initializer in model.graph.initializer:
+        tensor = initializer
+        if external_data_helper.uses_external_data(initializer):
+            # loaded into a copy, the model keeps only the external data references
+            tensor = onnx.TensorProto()
+            tensor.CopyFrom(initializer)
+            external_data_helper.load_external_data_for_tensor(tensor, model_directory)
+            tensor.data_location = onnx.TensorProto.DEFAULT
+            del tensor.external_data[:]
+        array = numpy_helper.to_array(tensor)
+        total += array.size
+        nonzero += int(numpy.count_nonzero(array))
+        del tensor, array
+    return total / nonzero if nonzero else 1.0
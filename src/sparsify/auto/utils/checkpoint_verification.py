@@ -0,0 +1,169 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for verifying saved checkpoints without loading their weights, by reading
+file headers and tensor indexes, memory mapping tensor data, and comparing the
+sizes, and optionally checksums, recorded once the checkpoint was saved
+"""
+import hashlib
+import inspect
+import json
+import os
+import struct
+import zipfile
+from typing import Any, Dict, List, Optional
+
+import torch
+
+
+__all__ = [
+    "CHECKPOINT_MANIFEST_NAME",
+    "DEEP_CHECKPOINT_CHECK",
+    "inspect_checkpoint",
+    "read_safetensors_header",
+    "write_checkpoint_manifest",
+    "verify_checkpoint_manifest",
+]
+
+# opt-in to fully loading checkpoints, e.g. into their model, when verifying them
+DEEP_CHECKPOINT_CHECK = bool(os.environ.get("NM_AUTO_DEEP_CHECKPOINT_CHECK"))
+CHECKPOINT_MANIFEST_NAME = "checkpoint_manifest.json"
+
+_HASH_CHUNK_SIZE = 2**20
+_TORCH_LOAD_PARAMETERS = inspect.signature(torch.load).parameters
+
+
+def inspect_checkpoint(path: str) -> Any:
+    """
+    Load a checkpoint without reading its tensor data. Safetensors files are
+    validated from their header, torch zip files are loaded with their tensors
+    memory mapped, so only the pickled metadata and the record index are read
+
+    :param path: path to a torch (.pt, .pth, .bin) or safetensors checkpoint
+    :return: the checkpoint, with lazily loaded tensors. For safetensors, the dtype,
+        shape and data offsets of each tensor
+    :raises ValueError: if the checkpoint is truncated or its index is invalid
+    """
+    if path.endswith(".safetensors"):
+        return read_safetensors_header(path)
+
+    kwargs = {"map_location": "cpu"}
+    if "weights_only" in _TORCH_LOAD_PARAMETERS:
+        # checkpoints may pickle recipes, models and optimizers
+        kwargs["weights_only"] = False
+    if "mmap" in _TORCH_LOAD_PARAMETERS and zipfile.is_zipfile(path):
+        kwargs["mmap"] = True
+    return torch.load(path, **kwargs)
+
+
+def read_safetensors_header(path: str) -> Dict[str, Any]:
+    """
+    :param path: path to a safetensors file
+    :return: the header of the file, mapping tensor names to their dtype, shape and
+        data offsets
+    :raises ValueError: if the header is invalid or the tensor data is truncated
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as fp:
+        size_bytes = fp.read(8)
+        if len(size_bytes) < 8:
+            raise ValueError(f"Truncated safetensors header in {path}")
+        (header_size,) = struct.unpack("<Q", size_bytes)
+        if header_size > file_size - 8:
+            raise ValueError(f"Truncated safetensors header in {path}")
+        header = json.loads(fp.read(header_size))
+
+    data_size = file_size - 8 - header_size
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        begin, end = info["data_offsets"]
+        if not 0 <= begin <= end <= data_size:
+            raise ValueError(
+                f"Tensor {name} of {path} at bytes [{begin}, {end}) is outside of the "
+                f"{data_size} bytes of tensor data"
+            )
+    return header
+
+
+def write_checkpoint_manifest(
+    directory: str, paths: List[str], checksums: bool = DEEP_CHECKPOINT_CHECK
+) -> str:
+    """
+    Record the size and modification time of checkpoint files, for later stages to
+    verify they are unchanged without reading them
+
+    :param directory: directory to write the manifest to. Paths are stored relative
+        to it, so the manifest stays valid if the directory is moved
+    :param paths: checkpoint files to record
+    :param checksums: True to also record the sha256 checksum of each file, which
+        reads it in full. Defaults to NM_AUTO_DEEP_CHECKPOINT_CHECK
+    :return: path to the manifest
+    """
+    manifest = {}
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if checksums:
+            record["sha256"] = _sha256(path)
+        manifest[os.path.relpath(path, directory)] = record
+
+    manifest_path = os.path.join(directory, CHECKPOINT_MANIFEST_NAME)
+    with open(manifest_path, "w") as fp:
+        json.dump(manifest, fp, indent=4)
+    return manifest_path
+
+
+def verify_checkpoint_manifest(
+    directory: str, checksums: bool = DEEP_CHECKPOINT_CHECK
+) -> Optional[bool]:
+    """
+    :param directory: directory with a manifest from write_checkpoint_manifest
+    :param checksums: True to also compare the recorded checksums, which reads every
+        file in full. Defaults to NM_AUTO_DEEP_CHECKPOINT_CHECK
+    :return: True if all recorded files are unchanged, False if any is missing or
+        differs in size, modification time or, if compared, checksum. None if there
+        is no manifest
+    """
+    manifest_path = os.path.join(directory, CHECKPOINT_MANIFEST_NAME)
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path) as fp:
+        manifest = json.load(fp)
+
+    for relative_path, record in manifest.items():
+        path = os.path.join(directory, relative_path)
+        if not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != record["size"] or stat.st_mtime_ns != record.get(
+            "mtime_ns", stat.st_mtime_ns
+        ):
+            return False
+    return not checksums or all(
+        _sha256(os.path.join(directory, relative_path)) == record["sha256"]
+        for relative_path, record in manifest.items()
+        if "sha256" in record
+    )
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
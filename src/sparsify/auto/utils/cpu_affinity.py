@@ -0,0 +1,108 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for pinning the workers of CPU distributed training to their own cores
+"""
+import os
+import sys
+from typing import List, Optional
+
+
+__all__ = [
+    "CPU_WORKER_CORES_ENV",
+    "CPU_WORKER_LAUNCH_COMMAND",
+    "split_cpu_cores",
+    "format_cpu_worker_cores",
+    "pin_cpu_worker",
+]
+
+# environment variable holding the cores of each local worker, ';' separated by
+# local rank, e.g. "0,1,2,3;4,5,6,7"
+CPU_WORKER_CORES_ENV = "NM_AUTO_CPU_WORKER_CORES"
+# prefix to a training command that pins it to the cores of its local rank before
+# running it
+CPU_WORKER_LAUNCH_COMMAND = [
+    sys.executable,
+    "-c",
+    "from sparsify.auto.utils.cpu_affinity import _run_cpu_worker; _run_cpu_worker()",
+]
+
+
+def split_cpu_cores(core_groups: List[List[int]], num_workers: int) -> List[List[int]]:
+    """
+    Split the cores of the machine between workers. With one worker per group, e.g.
+    per NUMA node, each worker gets a group. Otherwise the cores are split into
+    contiguous, equally sized chunks, so workers span as few groups as possible
+
+    :param core_groups: core ids per NUMA node or socket
+    :param num_workers: number of workers to split the cores between
+    :return: core ids of each worker
+    """
+    if num_workers < 1:
+        raise ValueError(f"num_workers must be positive, given {num_workers}")
+    if len(core_groups) == num_workers:
+        return [list(cores) for cores in core_groups]
+
+    cores = [core for group in core_groups for core in group]
+    if len(cores) < num_workers:
+        raise ValueError(
+            f"Can not split {len(cores)} cores between {num_workers} workers"
+        )
+    chunk_size, remainder = divmod(len(cores), num_workers)
+    worker_cores = []
+    start = 0
+    for worker in range(num_workers):
+        end = start + chunk_size + (1 if worker < remainder else 0)
+        worker_cores.append(cores[start:end])
+        start = end
+    return worker_cores
+
+
+def format_cpu_worker_cores(worker_cores: List[List[int]]) -> str:
+    """
+    :param worker_cores: core ids of each worker, by local rank
+    :return: value of the `NM_AUTO_CPU_WORKER_CORES` environment variable
+    """
+    return ";".join(",".join(str(core) for core in cores) for cores in worker_cores)
+
+
+def pin_cpu_worker(local_rank: Optional[int] = None) -> Optional[List[int]]:
+    """
+    Restrict this process, and the threads and data loader workers it starts, to the
+    cores of its local rank in `NM_AUTO_CPU_WORKER_CORES`. Sets the OpenMP and MKL
+    thread counts to the number of cores, as they are read when torch is imported
+
+    :param local_rank: local rank of this worker. Read from LOCAL_RANK if not given
+    :return: the cores this process was pinned to, None if no cores were set
+    """
+    worker_cores = os.environ.get(CPU_WORKER_CORES_ENV)
+    if not worker_cores or not hasattr(os, "sched_setaffinity"):
+        return None
+    if local_rank is None:
+        local_rank = int(os.environ.get("LOCAL_RANK", 0))
+
+    groups = worker_cores.split(";")
+    cores = [int(core) for core in groups[local_rank % len(groups)].split(",")]
+    os.sched_setaffinity(0, cores)
+    os.environ["OMP_NUM_THREADS"] = str(len(cores))
+    os.environ["MKL_NUM_THREADS"] = str(len(cores))
+    return cores
+
+
+def _run_cpu_worker():
+    # entrypoint of CPU_WORKER_LAUNCH_COMMAND. Pins this process, then replaces it
+    # with the training command so the affinity and environment are inherited
+    pin_cpu_worker()
+    os.execvp(sys.argv[1], sys.argv[1:])
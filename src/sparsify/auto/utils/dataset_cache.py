@@ -0,0 +1,190 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for a content addressed cache of tokenized datasets, shared by all trials,
+retries and distributed workers that tokenize the same data the same way
+"""
+import functools
+import hashlib
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sparsify.utils import get_sparsify_cache_path
+
+
+__all__ = [
+    "DATASET_CACHE_ENABLED",
+    "dataset_cache_key",
+    "get_tokenized_dataset_cache_dir",
+    "use_datasets_cache_dir",
+]
+
+DATASET_CACHE_ENABLED = not os.environ.get("NM_AUTO_DISABLE_DATASET_CACHE")
+
+_CACHE_DIR_NAME = "tokenized_datasets"
+# files that define the tokenization of a local tokenizer or model directory
+_TOKENIZER_FILES = [
+    "tokenizer.json",
+    "tokenizer_config.json",
+    "special_tokens_map.json",
+    "added_tokens.json",
+    "vocab.txt",
+    "vocab.json",
+    "merges.txt",
+    "spiece.model",
+    "sentencepiece.bpe.model",
+]
+_HASH_CHUNK_SIZE = 2**20
+# sidecars of the content hashes of local data files, by hash of the file path
+_FILE_HASHES_DIR_NAME = "file_hashes"
+_DATASETS_CACHE_ENV = "HF_DATASETS_CACHE"
+
+
+def dataset_cache_key(
+    dataset_name: Optional[str],
+    data_files: List[Optional[str]],
+    tokenizer: str,
+    max_seq_length: int,
+    pad_to_max_length: bool,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    :param dataset_name: name of the dataset on the HF hub, None for local files
+    :param data_files: paths to local train, validation and test files
+    :param tokenizer: name or local path of the tokenizer
+    :param max_seq_length: sequence length the samples are truncated to
+    :param pad_to_max_length: True if samples are padded to max_seq_length
+    :param kwargs: any other arguments that change the tokenized dataset, e.g. the
+        dataset config name or the doc stride of question answering
+    :return: key identifying the tokenized dataset. Local data files and tokenizer
+        directories are identified by the hash of their contents, so edits to them
+        invalidate the cache while copies or moves do not
+    """
+    return {
+        "dataset_name": dataset_name,
+        "data_files": [_file_hash(path) for path in data_files if path],
+        "tokenizer": _tokenizer_hash(tokenizer),
+        "max_seq_length": max_seq_length,
+        "pad_to_max_length": pad_to_max_length,
+        **kwargs,
+    }
+
+
+def get_tokenized_dataset_cache_dir(key: Dict[str, Any]) -> str:
+    """
+    :param key: key of the tokenized dataset, from dataset_cache_key
+    :return: path to the cache directory of the tokenized dataset. Used as the
+        HF datasets cache of training, see use_datasets_cache_dir, under which the
+        raw and tokenized datasets are stored as memory mapped Arrow files
+    """
+    digest = hashlib.sha1(
+        json.dumps(key, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    cache_dir = get_sparsify_cache_path().joinpath(_CACHE_DIR_NAME, digest)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key_path = cache_dir / "key.json"
+    if not key_path.exists():
+        # for inspecting the cache, not read back
+        key_path.write_text(json.dumps(key, indent=4, sort_keys=True, default=str))
+    return str(cache_dir)
+
+
+@contextmanager
+def use_datasets_cache_dir(cache_dir: Optional[str]):
+    """
+    Store the HF datasets loaded in this process, and in the training processes it
+    launches, under the given directory. Only the datasets cache is set, models and
+    tokenizers are still downloaded to the shared HF hub cache
+
+    :param cache_dir: datasets cache directory, e.g. from
+        get_tokenized_dataset_cache_dir. Nothing is changed if None
+    """
+    if cache_dir is None:
+        yield
+        return
+
+    previous_env = os.environ.get(_DATASETS_CACHE_ENV)
+    os.environ[_DATASETS_CACHE_ENV] = cache_dir
+    # the datasets config reads the environment on import, update it if imported
+    datasets_config = sys.modules.get("datasets.config")
+    previous_config = getattr(datasets_config, _DATASETS_CACHE_ENV, None)
+    if datasets_config is not None:
+        setattr(datasets_config, _DATASETS_CACHE_ENV, Path(cache_dir))
+    try:
+        yield
+    finally:
+        if previous_env is None:
+            os.environ.pop(_DATASETS_CACHE_ENV, None)
+        else:
+            os.environ[_DATASETS_CACHE_ENV] = previous_env
+        if datasets_config is not None:
+            setattr(datasets_config, _DATASETS_CACHE_ENV, previous_config)
+
+
+def _tokenizer_hash(tokenizer: str) -> str:
+    # hub names and zoo stubs are stable identifiers, local directories may change
+    if not os.path.isdir(tokenizer):
+        return tokenizer
+    files = [
+        os.path.join(tokenizer, name)
+        for name in _TOKENIZER_FILES
+        if os.path.isfile(os.path.join(tokenizer, name))
+    ]
+    if not files:
+        return os.path.abspath(tokenizer)
+    return hashlib.sha1(
+        "".join(_file_hash(path) for path in files).encode()
+    ).hexdigest()
+
+
+def _file_hash(path: str) -> str:
+    stat = os.stat(path)
+    return _hash_file_contents(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_file_contents(path: str, size: int, mtime_ns: int) -> str:
+    # memoized by size and modification time, in this process and in a sidecar in
+    # the sparsify cache, so each version of a file is read once across all trials
+    sidecar_path = get_sparsify_cache_path().joinpath(
+        _CACHE_DIR_NAME,
+        _FILE_HASHES_DIR_NAME,
+        f"{hashlib.sha1(path.encode()).hexdigest()}.json",
+    )
+    stat_key = {"path": path, "size": size, "mtime_ns": mtime_ns}
+    try:
+        sidecar = json.loads(sidecar_path.read_text())
+        if {key: sidecar.get(key) for key in stat_key} == stat_key:
+            return sidecar["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as fp:
+        for chunk in iter(lambda: fp.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    file_hash = digest.hexdigest()
+
+    # concurrent trials may hash the same file, replace the sidecar in one step
+    sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump({**stat_key, "sha256": file_hash}, file)
+    os.replace(tmp_path, sidecar_path)
+    return file_hash
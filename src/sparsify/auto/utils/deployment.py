@@ -0,0 +1,236 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for assembling deployment directories from exported files without copying
+data where the filesystem allows it, and for recording the size and checksum of
+each artifact so consumers can verify them without rehashing
+"""
+import errno
+import json
+import logging
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from sparsify.auto.utils.checkpoint_verification import _sha256
+
+
+__all__ = [
+    "DEPLOYMENT_MANIFEST_NAME",
+    "DEPLOYMENT_WORKERS",
+    "assemble_deployment_directory",
+    "verify_deployment_manifest",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+DEPLOYMENT_MANIFEST_NAME = "deployment_manifest.json"
+# number of threads transferring and hashing deployment files
+DEPLOYMENT_WORKERS = int(os.environ.get("NM_AUTO_DEPLOYMENT_WORKERS", 0)) or min(
+    8, os.cpu_count() or 1
+)
+
+_COPY_RANGE_SIZE = 2**30
+# copy_file_range errors meaning the filesystems can't copy in kernel
+_COPY_RANGE_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+}
+
+
+def assemble_deployment_directory(
+    source_directory: str,
+    target_directory: str,
+    move: bool = True,
+    max_workers: int = DEPLOYMENT_WORKERS,
+) -> str:
+    """
+    Transfer all files of source_directory into target_directory and write a
+    manifest of the size and sha256 checksum of every file in target_directory.
+    Each file is transferred by the cheapest method the filesystems allow: a rename
+    (move) or hardlink (no move) within a filesystem, otherwise copy_file_range,
+    which reflinks on copy on write filesystems and copies in kernel across them,
+    falling back to a regular copy. Files are transferred and hashed in parallel,
+    largest first
+
+    :param source_directory: directory with the exported deployment files
+    :param target_directory: directory to assemble the deployment in. Files already
+        in it, e.g. a README, are kept and recorded in the manifest
+    :param move: True to remove source_directory once assembled, False to keep it
+    :param max_workers: number of threads transferring and hashing files
+    :return: path to the manifest
+    """
+    transfers = []
+    for root, _, filenames in os.walk(source_directory):
+        relative_root = os.path.relpath(root, source_directory)
+        os.makedirs(os.path.join(target_directory, relative_root), exist_ok=True)
+        for filename in filenames:
+            source = os.path.join(root, filename)
+            transfers.append(
+                (
+                    source,
+                    os.path.normpath(
+                        os.path.join(target_directory, relative_root, filename)
+                    ),
+                )
+            )
+    transfers.sort(key=lambda transfer: os.path.getsize(transfer[0]), reverse=True)
+    transferred = {target for _, target in transfers}
+    existing = [
+        path
+        for path in _list_files(target_directory)
+        if path not in transferred
+        and os.path.basename(path) != DEPLOYMENT_MANIFEST_NAME
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        transfer_futures = [
+            executor.submit(_transfer_and_hash, source, target, move)
+            for source, target in transfers
+        ]
+        hash_futures = [executor.submit(_hash_file, path) for path in existing]
+        results = [future.result() for future in transfer_futures]
+        hashes = [future.result() for future in hash_futures]
+
+    if move:
+        shutil.rmtree(source_directory)
+
+    methods = Counter(method for _, _, method in results)
+    _LOGGER.info(
+        "Assembled %d deployment files in %s (%s)"
+        % (
+            len(results),
+            target_directory,
+            ", ".join(f"{count} by {method}" for method, count in methods.items()),
+        )
+    )
+
+    records = [(path, record) for path, record, _ in results] + hashes
+    manifest = {
+        os.path.relpath(path, target_directory): record for path, record in records
+    }
+    manifest_path = os.path.join(target_directory, DEPLOYMENT_MANIFEST_NAME)
+    with open(manifest_path, "w") as fp:
+        json.dump(dict(sorted(manifest.items())), fp, indent=4)
+    return manifest_path
+
+
+def verify_deployment_manifest(
+    directory: str,
+    check_checksums: bool = True,
+    max_workers: int = DEPLOYMENT_WORKERS,
+) -> Optional[bool]:
+    """
+    :param directory: directory with a manifest from assemble_deployment_directory
+    :param check_checksums: True to also rehash the files, False to only compare
+        their sizes
+    :param max_workers: number of threads hashing files
+    :return: True if all recorded files are unchanged, False if any is missing or
+        differs in size or checksum, None if there is no manifest
+    """
+    manifest_path = os.path.join(directory, DEPLOYMENT_MANIFEST_NAME)
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path) as fp:
+        manifest = json.load(fp)
+
+    for relative_path, record in manifest.items():
+        path = os.path.join(directory, relative_path)
+        if not os.path.isfile(path) or os.path.getsize(path) != record["size"]:
+            return False
+    if not check_checksums:
+        return True
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        checksums = executor.map(
+            _sha256,
+            [os.path.join(directory, relative_path) for relative_path in manifest],
+        )
+        return all(
+            checksum == record["sha256"]
+            for checksum, record in zip(checksums, manifest.values())
+        )
+
+
+def _list_files(directory: str) -> List[str]:
+    return [
+        os.path.join(root, filename)
+        for root, _, filenames in os.walk(directory)
+        for filename in filenames
+    ]
+
+
+def _hash_file(path: str) -> Tuple[str, Dict[str, object]]:
+    return path, {"size": os.path.getsize(path), "sha256": _sha256(path)}
+
+
+def _transfer_and_hash(
+    source: str, target: str, move: bool
+) -> Tuple[str, Dict[str, object], str]:
+    method = _transfer(source, target, move)
+    return (*_hash_file(target), method)
+
+
+def _transfer(source: str, target: str, move: bool) -> str:
+    # returns the method used, for logging
+    if move:
+        try:
+            os.rename(source, target)
+            return "rename"
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                raise
+    else:
+        if os.path.lexists(target):
+            os.remove(target)
+        try:
+            os.link(source, target)
+            return "hardlink"
+        except OSError:
+            pass
+
+    method = "copy_file_range" if _copy_file_range(source, target) else "copy"
+    if method == "copy":
+        shutil.copyfile(source, target)
+    shutil.copystat(source, target)
+    return method
+
+
+def _copy_file_range(source: str, target: str) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    with open(source, "rb") as source_fp, open(target, "wb") as target_fp:
+        remaining = os.fstat(source_fp.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(
+                    source_fp.fileno(),
+                    target_fp.fileno(),
+                    min(remaining, _COPY_RANGE_SIZE),
+                )
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError as err:
+            if err.errno in _COPY_RANGE_UNSUPPORTED:
+                return False
+            raise
+    return remaining == 0
@@ -17,6 +17,7 @@ import os
 from typing import List, Optional
 
 import torch
+from torch.distributed.elastic.rendezvous import RendezvousError
 
 
 # substrings of exception message that identify out of memory errors
@@ -26,6 +27,51 @@ MEMORY_ERROR_SUBSTRINGS = [
     "Unable to find a valid cuDNN algorithm to run convolution",
 ]
 
+# substrings of exception message that identify a node or its workers dropping out of
+# a distributed run, as reported by the surviving nodes
+NODE_FAILURE_ERROR_SUBSTRINGS = [
+    "Connection closed by peer",
+    "Connection reset by peer",
+    "Broken pipe",
+    "NCCL communicator was aborted",
+    "RendezvousClosedError",
+    "RendezvousConnectionError",
+    "RendezvousTimeoutError",
+]
+
+
+def is_out_of_memory_error(exception: Optional[BaseException]) -> bool:
+    """
+    :param exception: raised exception or None
+    :return: True if the exception message identifies an out of memory error
+    """
+    return (
+        isinstance(exception, RuntimeError)
+        and bool(exception.args)
+        and isinstance(exception.args[0], str)
+        and any(
+            memory_substring in exception.args[0]
+            for memory_substring in MEMORY_ERROR_SUBSTRINGS
+        )
+    )
+
+
+def is_node_failure_error(exception: Optional[BaseException]) -> bool:
+    """
+    :param exception: raised exception or None
+    :return: True if the exception is a rendezvous failure, or its message identifies
+        a peer node or worker that dropped out of a distributed run
+    """
+    if exception is None:
+        return False
+    if isinstance(exception, RendezvousError):
+        return True
+    message = str(exception)
+    return any(
+        failure_substring in message
+        for failure_substring in NODE_FAILURE_ERROR_SUBSTRINGS
+    )
+
 
 class ErrorHandler:
     """
@@ -35,10 +81,13 @@ class ErrorHandler:
     """
 
     def __init__(self, distributed_training=False):
-        self._max_retry_attempts = os.environ.get("NM_MAX_SCRIPT_RETRY_ATTEMPTS", 3)
-        self._max_memory_stepdowns = os.environ.get(
-            "NM_MAX_SCRIPT_MEMORY_STEPDOWNS", 10
+        self._max_retry_attempts = int(
+            os.environ.get("NM_MAX_SCRIPT_RETRY_ATTEMPTS", 3)
         )
+        self._max_memory_stepdowns = int(
+            os.environ.get("NM_MAX_SCRIPT_MEMORY_STEPDOWNS", 10)
+        )
+        self._max_node_failures = int(os.environ.get("NM_MAX_NODE_FAILURE_RETRIES", 3))
 
         # dictionary of built in python exceptions for rebuilding exceptions
         # caught by torch ddp
@@ -51,6 +100,8 @@ class ErrorHandler:
         self._caught_runtime_errors = []
         self._caught_memory_errors = []
         self._caught_memory_error_on_last_attempt = False
+        self._caught_node_failures = []
+        self._caught_node_failure_on_last_attempt = False
 
         self.distributed_training = distributed_training
 
@@ -69,6 +120,13 @@ class ErrorHandler:
         """
         return self._caught_memory_errors
 
+    @property
+    def caught_node_failures(self) -> List[Exception]:
+        """
+        List of errors caused by a node or worker dropping out of a distributed run
+        """
+        return self._caught_node_failures
+
     @property
     def max_retry_attempts(self) -> int:
         """
@@ -85,6 +143,14 @@ class ErrorHandler:
         """
         return self._max_memory_stepdowns
 
+    @property
+    def max_node_failures(self) -> int:
+        """
+        Maximum number of attempts to re-join the rendezvous after a node drops out
+        of a distributed run, before raising the node failures
+        """
+        return self._max_node_failures
+
     def max_attempts_exceeded(self) -> bool:
         """
         Returns True if termination criteria reached
@@ -92,6 +158,7 @@ class ErrorHandler:
         return (
             len(self._caught_runtime_errors) >= self._max_retry_attempts
             or len(self._caught_memory_errors) >= self._max_memory_stepdowns
+            or len(self._caught_node_failures) >= self._max_node_failures
         )
 
     def save_error(self, exception: Optional[Exception]):
@@ -100,10 +167,15 @@ class ErrorHandler:
 
         :param exception: raised exception or None (if the run was successful)
         """
+        self._caught_memory_error_on_last_attempt = False
+        self._caught_node_failure_on_last_attempt = False
         if exception is None:
-            self._caught_memory_error_on_last_attempt = False
             return
 
+        # classify node failures before reconstruction, which keeps only the
+        # message of the first failed worker
+        node_failure = self.distributed_training and is_node_failure_error(exception)
+
         # if torch distributed exception thrown, attempt to reconstruct
         # original exception
         if self.distributed_training and isinstance(
@@ -119,20 +191,18 @@ class ErrorHandler:
 
         # Check if an out of memory error was thrown by comparing error message with
         # substrings that are known to represent out of memory errors
-        if isinstance(exception, RuntimeError) and (
-            any(
-                [
-                    memory_substring in exception.args[0]
-                    for memory_substring in MEMORY_ERROR_SUBSTRINGS
-                ]
-            )
-        ):
+        if is_out_of_memory_error(exception):
             self._caught_memory_errors.append(exception)
             self._caught_memory_error_on_last_attempt = True
 
+        # a peer node dropped out. Surviving nodes re-join the rendezvous on the next
+        # attempt, with a budget separate from that of the errors of the run itself
+        elif node_failure:
+            self._caught_node_failures.append(exception)
+            self._caught_node_failure_on_last_attempt = True
+
         else:
             self._caught_runtime_errors.append(exception)
-            self._caught_memory_error_on_last_attempt = False
 
     def is_memory_error(self) -> bool:
         """
@@ -140,6 +210,13 @@ class ErrorHandler:
         """
         return self._caught_memory_error_on_last_attempt
 
+    def is_node_failure(self) -> bool:
+        """
+        Returns true if the last run failed because a node dropped out of the
+        distributed run
+        """
+        return self._caught_node_failure_on_last_attempt
+
     def raise_exception_summary(self):
         """
         Raise an exception that summarizes the exception history for run attempts
@@ -184,3 +261,11 @@ class ErrorHandler:
                 f"stepping down memory {len(self._caught_memory_errors)} "
                 "times"
             )
+
+        # Nodes kept dropping out of the distributed run
+        elif len(self._caught_node_failures) >= self._max_node_failures:
+            raise RuntimeError(
+                "Distributed run failed after re-joining the rendezvous "
+                f"{len(self._caught_node_failures)} times due to lost nodes. Last "
+                f"error: {self._caught_node_failures[-1]}"
+            )
@@ -0,0 +1,170 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for verifying exported ONNX models by path, leaving external weights on
+disk, and for comparing their outputs against the PyTorch model they came from
+"""
+import os
+from typing import Any, List, Mapping
+
+import numpy
+import onnx
+import torch
+
+from sparsify.auto.utils.benchmark import _generate_random_inputs
+
+
+__all__ = [
+    "EXPORT_SMOKE_TEST_ENABLED",
+    "EXPORT_SMOKE_TEST_ATOL",
+    "EXPORT_SMOKE_TEST_RTOL",
+    "validate_onnx_export",
+    "compare_onnx_to_torch",
+]
+
+# opt-in to running the exported model against the PyTorch model after export
+EXPORT_SMOKE_TEST_ENABLED = bool(os.environ.get("NM_AUTO_EXPORT_SMOKE_TEST"))
+EXPORT_SMOKE_TEST_ATOL = float(os.environ.get("NM_AUTO_EXPORT_SMOKE_TEST_ATOL", 1e-3))
+EXPORT_SMOKE_TEST_RTOL = float(os.environ.get("NM_AUTO_EXPORT_SMOKE_TEST_RTOL", 1e-2))
+
+_SMOKE_TEST_SEED = 0
+
+
+def validate_onnx_export(model_path: str):
+    """
+    Validate an exported ONNX model without loading its weights into memory. The
+    checker runs on the path, which supports models over 2GB, and the external data
+    of each initializer is checked to exist and fit within its file
+
+    :param model_path: path to the exported model.onnx
+    :raises ValueError: if the model has no inputs or outputs, or its external data
+        is missing or truncated
+    :raises onnx.checker.ValidationError: if the graph is invalid
+    """
+    if not os.path.isfile(model_path):
+        raise ValueError(f"No exported model found at {model_path}")
+
+    onnx.checker.check_model(model_path)
+
+    model = onnx.load(model_path, load_external_data=False)
+    if not model.graph.input or not model.graph.output:
+        raise ValueError(f"Exported model {model_path} has no inputs or outputs")
+
+    model_directory = os.path.dirname(os.path.abspath(model_path))
+    external_file_sizes = {}
+    for initializer in model.graph.initializer:
+        if initializer.data_location != onnx.TensorProto.EXTERNAL:
+            continue
+        external_data = {entry.key: entry.value for entry in initializer.external_data}
+        location = os.path.join(model_directory, external_data.get("location", ""))
+        if location not in external_file_sizes:
+            if not os.path.isfile(location):
+                raise ValueError(
+                    f"External data file {location} of initializer "
+                    f"{initializer.name} not found"
+                )
+            external_file_sizes[location] = os.path.getsize(location)
+        end = int(external_data.get("offset", 0)) + int(external_data.get("length", 0))
+        if end > external_file_sizes[location]:
+            raise ValueError(
+                f"External data of initializer {initializer.name} ends at byte {end} "
+                f"of {location}, which has {external_file_sizes[location]} bytes"
+            )
+
+
+def compare_onnx_to_torch(
+    model_path: str,
+    torch_model: torch.nn.Module,
+    inputs_as_kwargs: bool = False,
+    batch_size: int = 1,
+    atol: float = EXPORT_SMOKE_TEST_ATOL,
+    rtol: float = EXPORT_SMOKE_TEST_RTOL,
+) -> float:
+    """
+    Run the exported model in ONNX Runtime and the PyTorch model on the same fixed,
+    seeded batch and compare their outputs. Quantized exports are expected to drift
+    from their fake quantized PyTorch model, so may need larger tolerances
+
+    :param model_path: path to the exported model.onnx
+    :param torch_model: PyTorch model the export was created from
+    :param inputs_as_kwargs: True to pass inputs to the PyTorch model by the names
+        of the ONNX inputs, e.g. input_ids for transformers. Otherwise positionally
+    :param batch_size: batch size of the fixed batch
+    :param atol: absolute tolerance of the comparison
+    :param rtol: tolerance relative to the largest PyTorch output value
+    :return: largest absolute difference between the outputs
+    :raises ValueError: if any output differs by more than the tolerance
+    """
+    try:
+        # imported on first use, as this module is imported with sparsify.auto.utils
+        import onnxruntime
+    except Exception:
+        raise RuntimeError("onnxruntime is required to compare the exported model")
+
+    session = onnxruntime.InferenceSession(
+        model_path, providers=["CPUExecutionProvider"]
+    )
+    input_names = [graph_input.name for graph_input in session.get_inputs()]
+
+    state = numpy.random.get_state()
+    numpy.random.seed(_SMOKE_TEST_SEED)
+    try:
+        arrays = _generate_random_inputs(
+            onnx.load(model_path, load_external_data=False), batch_size
+        )
+    finally:
+        numpy.random.set_state(state)
+
+    onnx_outputs = session.run(None, dict(zip(input_names, arrays)))
+
+    tensors = [torch.from_numpy(array) for array in arrays]
+    torch_model.eval()
+    with torch.no_grad():
+        torch_outputs = (
+            torch_model(**dict(zip(input_names, tensors)))
+            if inputs_as_kwargs
+            else torch_model(*tensors)
+        )
+    torch_outputs = _flatten_outputs(torch_outputs)
+
+    max_difference = 0.0
+    # exports may drop trailing outputs, such as the train outputs of YOLOv5
+    for onnx_output, torch_output in zip(onnx_outputs, torch_outputs):
+        torch_output = torch_output.detach().float().cpu().numpy()
+        if onnx_output.shape != torch_output.shape:
+            raise ValueError(
+                f"Exported model output shape {onnx_output.shape} does not match the "
+                f"PyTorch output shape {torch_output.shape}"
+            )
+        difference = float(numpy.abs(onnx_output - torch_output).max(initial=0.0))
+        tolerance = atol + rtol * float(numpy.abs(torch_output).max(initial=0.0))
+        if difference > tolerance:
+            raise ValueError(
+                f"Exported model outputs differ from the PyTorch model by "
+                f"{difference}, more than the tolerance of {tolerance}"
+            )
+        max_difference = max(max_difference, difference)
+    return max_difference
+
+
+def _flatten_outputs(outputs: Any) -> List[torch.Tensor]:
+    # tensors of nested tuples, lists and dicts, e.g. HF ModelOutputs, in order
+    if isinstance(outputs, torch.Tensor):
+        return [outputs]
+    if isinstance(outputs, Mapping):
+        outputs = list(outputs.values())
+    if isinstance(outputs, (list, tuple)):
+        return [tensor for output in outputs for tensor in _flatten_outputs(output)]
+    return []
@@ -11,8 +11,10 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import glob
+import os
 import warnings
-from typing import List
+from typing import Dict, List
 
 import torch
 
@@ -31,21 +33,133 @@ class HardwareSpecs(BaseModel):
     device_count: int = Field(description="Number of devices detected")
     device_names: List[str] = Field(description="Names of devices available")
     fp16_available: bool = Field(description="True if mixed precision available")
+    cpu_sockets: List[List[int]] = Field(
+        default_factory=list,
+        description="Ids of the CPU cores available to this process, per socket",
+    )
+    cpu_numa_nodes: List[List[int]] = Field(
+        default_factory=list,
+        description=(
+            "Ids of the CPU cores available to this process, per NUMA node. Matches "
+            "the sockets if the NUMA topology is not available"
+        ),
+    )
+    bf16_available: bool = Field(
+        default=False,
+        description="True if the CPU has bf16 instructions for mixed precision",
+    )
 
 
 def analyze_hardware() -> HardwareSpecs:
     """
     Return a HardwareSpecs class filled with information on the local machine
     """
+    cuda_available = _cuda_available()
     return HardwareSpecs(
-        cuda_available=_cuda_available(),
+        cuda_available=cuda_available,
         device_count=torch.cuda.device_count() or 1,
         device_names=[f"cuda:{idx}" for idx in range(torch.cuda.device_count())]
         or (["CPU"]),
         fp16_available=torch.cuda.has_half,
+        cpu_sockets=_cpu_sockets(),
+        cpu_numa_nodes=_cpu_numa_nodes(),
+        # only used to train in bf16 on CPU
+        bf16_available=not cuda_available and _cpu_bf16_available(),
     )
 
 
+def _cpu_sockets() -> List[List[int]]:
+    """
+    Group the CPU cores this process may run on by their physical socket
+    """
+    cores = _available_cores()
+    sockets = {}
+    for core in cores:
+        try:
+            with open(
+                f"/sys/devices/system/cpu/cpu{core}/topology/physical_package_id"
+            ) as file:
+                socket_id = int(file.read())
+        except (OSError, ValueError):
+            socket_id = 0
+        sockets.setdefault(socket_id, []).append(core)
+    return [sockets[socket_id] for socket_id in sorted(sockets)]
+
+
+def _cpu_numa_nodes() -> List[List[int]]:
+    """
+    Group the CPU cores this process may run on by their NUMA node
+    """
+    cores = set(_available_cores())
+    core_nodes: Dict[int, int] = {}
+    for node_path in glob.glob("/sys/devices/system/node/node[0-9]*"):
+        try:
+            with open(os.path.join(node_path, "cpulist")) as file:
+                node_cores = _parse_cpu_list(file.read())
+        except (OSError, ValueError):
+            continue
+        node_id = int(os.path.basename(node_path)[len("node") :])
+        for core in node_cores:
+            core_nodes[core] = node_id
+
+    if not core_nodes:
+        return _cpu_sockets()
+
+    nodes = {}
+    for core in sorted(cores):
+        nodes.setdefault(core_nodes.get(core, 0), []).append(core)
+    return [nodes[node_id] for node_id in sorted(nodes)]
+
+
+def _cpu_bf16_available() -> bool:
+    """
+    Check the CPU instruction sets, as reported by /proc/cpuinfo or, where it is not
+    available, by deepsparse, for bf16 support
+    """
+    try:
+        with open("/proc/cpuinfo") as file:
+            for line in file:
+                if line.startswith("flags"):
+                    flags = line.split(":", 1)[1].split()
+                    return "avx512_bf16" in flags or "amx_bf16" in flags
+    except OSError:
+        pass
+
+    try:
+        # imported lazily, as it loads the inference engines
+        from sparsify.utils.system import get_ml_sys_info
+
+        sys_info = get_ml_sys_info()
+    except Exception:
+        return False
+    instructions = [
+        instruction.upper()
+        for instruction in sys_info.get("available_instructions", [])
+    ]
+    return sys_info.get("bf16") is True or any(
+        "BF16" in instruction or "AMX" in instruction for instruction in instructions
+    )
+
+
+def _available_cores() -> List[int]:
+    return (
+        sorted(os.sched_getaffinity(0))
+        if hasattr(os, "sched_getaffinity")
+        else list(range(os.cpu_count() or 1))
+    )
+
+
+def _parse_cpu_list(cpu_list: str) -> List[int]:
+    # e.g. "0-3,8-11"
+    cores = []
+    for cpu_range in cpu_list.strip().split(","):
+        if not cpu_range:
+            continue
+        start, _, end = cpu_range.partition("-")
+        cores.extend(range(int(start), int(end or start) + 1))
+    return cores
+
+
 def _cuda_available() -> bool:
     """
     Check that cuda is available and cuda operations pass as expected
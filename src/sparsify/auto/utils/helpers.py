@@ -16,15 +16,23 @@
 Generic helpers for sparsify.auto
 """
 import glob
+import json
 import logging
 import os
 import re
 from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import yaml
 
+from sparsify.auto.utils.history_store import (
+    RUN_HISTORY_FILE_NAME,
+    TrialHistoryStore,
+    get_history_store,
+)
+from sparsify.schemas import Metrics
+
 
 __all__ = [
     "SAVE_DIR",
@@ -121,7 +129,8 @@ def create_yolo_data_yaml(dataset: str) -> str:
             "present which includes a list of the classes for the dataset."
         )
 
-    data_file_args["path"] = dataset
+    # absolute, as yolov5 resolves relative paths against its own install
+    data_file_args["path"] = os.path.abspath(dataset)
 
     for d in os.listdir(image_path):
         current_path = os.path.join(image_dir, d)
@@ -178,67 +187,103 @@ def save_history(
     api_args: "APIArgs",  # noqa: F821
     stage: str,
     target_directory: str,
+    instrumentation: Optional[List[Optional[Dict[str, Any]]]] = None,
 ):
     """
-    Saves the stage and run history files, where trial history refers to the history of
-    one stage and run history refers to the history of all stages
+    Records the trial history of a stage to the run history store in the parent of
+    the target directory, and to the `stage_history.yaml` of the target directory.
+    Only trials that have not been recorded yet for the stage are appended, to both
+    files, and the store is shared across calls, so calling this after every trial
+    costs the same no matter how many trials were recorded
+
+    :param history: list of (config, metrics) pairs of the stage trials, in trial
+        order
+    :param api_args: api args of the run
+    :param stage: name of the stage the trials belong to
+    :param target_directory: stage artifact directory
+    :param instrumentation: optional list of the instrumentation report of each
+        trial, e.g. from `TaskRunner.instrumentation_report`, in trial order
     """
-    trial_history_dict = {
-        f"trial_{idx}": {"config": config.dict(), "metrics": metrics.dict()}
-        for idx, (config, metrics) in enumerate(history)
-    }
-
-    # Save stage history
-    with open(os.path.join(target_directory, "stage_history.yaml"), "w") as file:
-        yaml.safe_dump(
-            {**{"api_args": api_args.dict()}, **trial_history_dict},
-            file,
+    store = get_history_store(
+        os.path.join(os.path.dirname(target_directory), RUN_HISTORY_FILE_NAME)
+    )
+    if store.get_api_args() is None:
+        store.append_api_args(api_args.dict())
+
+    stage_history_path = os.path.join(target_directory, "stage_history.yaml")
+    if not os.path.isfile(stage_history_path):
+        os.makedirs(target_directory, exist_ok=True)
+        with open(stage_history_path, "w") as file:
+            yaml.safe_dump({"api_args": json.loads(api_args.json())}, file)
+
+    for idx, (config, metrics) in enumerate(history):
+        if store.has_trial(stage, idx):
+            continue
+        store.append_trial(
+            stage,
+            idx,
+            config.dict(),
+            metrics.dict(),
+            instrumentation[idx] if instrumentation else None,
         )
-
-    # Update run history file
-    filepath = os.path.join(os.path.dirname(target_directory), "run_history.yaml")
-    if os.path.exists(filepath):
-        with open(filepath, "r") as file:
-            run_history = yaml.safe_load(file)
-            run_history[stage] = trial_history_dict
-    else:
-        run_history = {
-            **{"api_args": api_args.dict()},
-            **{stage: trial_history_dict},
-        }
-
-    with open(filepath, "w") as file:
-        yaml.safe_dump(run_history, file)
+        # top level mapping entries can be appended to YAML, so the stage history
+        # keeps its layout without being rewritten
+        trial = {"config": json.loads(config.json()), "metrics": metrics.dict()}
+        with open(stage_history_path, "a") as file:
+            file.write(yaml.safe_dump({f"trial_{idx}": trial}))
 
 
 def load_raw_config_history(path: str) -> Dict[str, Any]:
     """
     Loads a raw dict of the run history from the specified run save path, within
-    which `run_history.yaml` will be found and loaded
+    which `run_history.jsonl` (or a legacy `run_history.yaml`) will be found and
+    loaded
     """
-    path = (
-        path
-        if os.path.isfile(path)
-        else os.path.join(path, "training", "run_artifacts", "run_history.yaml")
-    )
+    if not os.path.isfile(path):
+        run_artifacts = os.path.join(path, "training", "run_artifacts")
+        path = os.path.join(run_artifacts, RUN_HISTORY_FILE_NAME)
+        legacy_path = os.path.join(run_artifacts, "run_history.yaml")
+        if not os.path.exists(path) and os.path.exists(legacy_path):
+            path = legacy_path
     if not os.path.exists(path):
         raise ValueError(f"Run history file {path} not found")
 
-    with open(path, "r") as stream:
-        return yaml.safe_load(stream)
+    if path.endswith((".yaml", ".yml")):
+        with open(path, "r") as stream:
+            return yaml.safe_load(stream)
+    return TrialHistoryStore(path).to_dict()
 
 
 def best_n_trials_from_history(
-    history: List[Tuple["SparsificationTrainingConfig", "Metrics"]],  # noqa: F821
+    history: Union[
+        List[Tuple["SparsificationTrainingConfig", "Metrics"]],  # noqa: F821
+        TrialHistoryStore,
+    ],
     n: Union[int, float],
+    stage: Optional[str] = None,
 ):
     """
     Get the top n best trials by metrics from the run history
 
-    :param history: run history
+    :param history: run history, either as a list of (config, metrics) pairs or as
+        a history store. Stores are ranked from their metric index, only the metrics
+        of the returned trials are read from disk
     :param n: number of top trials to extract. Value of inf can be passed to extract all
     the trials
+    :param stage: stage to restrict the trials to, only used for history stores
+    :return: ordered dict of metrics of the top trials, keyed by rank. The
+        (stage, trial index) ids of the top trials of a store are given by
+        `TrialHistoryStore.best_trial_ids`
     """
+    if isinstance(history, TrialHistoryStore):
+        n = None if n == float("inf") else int(n)
+        return OrderedDict(
+            [
+                (rank, Metrics(**history.get_trial(*key)["metrics"]))
+                for rank, key in enumerate(history.best_trial_ids(n, stage=stage))
+            ]
+        )
+
     n = n if n != float("inf") else len(history)
     ordered_trials = sorted(history, key=lambda x: x[1])
     return OrderedDict(
@@ -0,0 +1,281 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Append-only, JSON-lines store for the trial history of a sparsify.auto run
+"""
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+__all__ = [
+    "RUN_HISTORY_FILE_NAME",
+    "TrialHistoryStore",
+    "get_history_store",
+]
+
+RUN_HISTORY_FILE_NAME = "run_history.jsonl"
+
+_API_ARGS_KEY = "api_args"
+# stores of this process by absolute history file path, see get_history_store
+_HISTORY_STORES: Dict[str, "TrialHistoryStore"] = {}
+
+
+class TrialHistoryStore:
+    """
+    Append-only trial history backed by a JSON-lines file. Each trial is written as
+    a single line with one write call, so recording a trial costs the same no matter
+    how long the history is, and a crash can at most leave a truncated final line,
+    which is ignored on read and dropped on the next append.
+
+    The file is scanned once, lazily, to build an index of trial id to file offset
+    and objective metric value. Lookups by trial id or metric then only parse the
+    lines they return
+
+    :param path: path to the history file, or to a directory that contains (or will
+        contain) a `run_history.jsonl` file
+    """
+
+    def __init__(self, path: str):
+        self._path = (
+            os.path.join(path, RUN_HISTORY_FILE_NAME) if os.path.isdir(path) else path
+        )
+        self._index: Optional[Dict[Tuple[str, int], Tuple[int, Optional[float]]]] = None
+        self._api_args_offset: Optional[int] = None
+        self._indexed_size = 0
+
+    @property
+    def path(self) -> str:
+        """
+        :return: path to the history file
+        """
+        return self._path
+
+    def append_api_args(self, api_args: Dict[str, Any]):
+        """
+        Record the api args of the run. The latest recorded value is used on read
+
+        :param api_args: dict of the run api args
+        """
+        self._append({_API_ARGS_KEY: api_args})
+
+    def append_trial(
+        self,
+        stage: str,
+        trial_idx: int,
+        config: Dict[str, Any],
+        metrics: Dict[str, Any],
+        instrumentation: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Record a single trial. Re-recording a trial id replaces the earlier record
+
+        :param stage: name of the stage the trial belongs to
+        :param trial_idx: index of the trial within the stage
+        :param config: dict of the trial config
+        :param metrics: dict of the trial metrics
+        :param instrumentation: optional dict of the wall time and resource usage of
+            the trial stages
+        """
+        record = {
+            "stage": stage,
+            "trial": trial_idx,
+            "config": config,
+            "metrics": metrics,
+        }
+        if instrumentation is not None:
+            record["instrumentation"] = instrumentation
+        self._append(record)
+
+    def trial_ids(self, stage: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        :param stage: optional stage name to restrict the ids to
+        :return: (stage, trial index) ids of the recorded trials, in record order
+        """
+        return [key for key in self._get_index() if stage is None or key[0] == stage]
+
+    def has_trial(self, stage: str, trial_idx: int) -> bool:
+        """
+        :param stage: name of the stage the trial belongs to
+        :param trial_idx: index of the trial within the stage
+        :return: True if the trial is recorded
+        """
+        return (stage, trial_idx) in self._get_index()
+
+    def get_trial(self, stage: str, trial_idx: int) -> Dict[str, Any]:
+        """
+        :param stage: name of the stage the trial belongs to
+        :param trial_idx: index of the trial within the stage
+        :return: dict with the `config` and `metrics` of the trial
+        """
+        key = (stage, trial_idx)
+        index = self._get_index()
+        if key not in index:
+            raise KeyError(f"Trial {trial_idx} of stage {stage} not found in history")
+        return self._read_record(index[key][0])
+
+    def get_api_args(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: the latest recorded api args, None if none were recorded
+        """
+        self._get_index()
+        if self._api_args_offset is None:
+            return None
+        return self._read_record(self._api_args_offset)[_API_ARGS_KEY]
+
+    def best_trial_ids(
+        self, n: Optional[int] = None, stage: Optional[str] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        :param n: number of trial ids to return, None for all
+        :param stage: optional stage name to restrict the trials to
+        :return: trial ids ordered by ascending objective metric value, matching the
+            ordering of `Metrics`. Trials without an objective value are skipped
+        """
+        ranked = sorted(
+            (
+                (value, key)
+                for key, (_, value) in self._get_index().items()
+                if value is not None and (stage is None or key[0] == stage)
+            ),
+            key=lambda item: item[0],
+        )
+        return [key for _, key in ranked[:n]]
+
+    def iter_trials(
+        self, stage: Optional[str] = None
+    ) -> Iterator[Tuple[Tuple[str, int], Dict[str, Any]]]:
+        """
+        :param stage: optional stage name to restrict the trials to
+        :return: iterator of (trial id, record) pairs, in record order. Records are
+            read from disk as the iterator is consumed
+        """
+        for key in self.trial_ids(stage):
+            yield key, self._read_record(self._index[key][0])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: history in the layout of the legacy `run_history.yaml`:
+            api args plus a dict of `trial_{idx}` entries for each stage, with the
+            trial instrumentation where recorded
+        """
+        history = {_API_ARGS_KEY: self.get_api_args()}
+        for (stage, trial_idx), record in self.iter_trials():
+            history.setdefault(stage, {})[f"trial_{trial_idx}"] = {
+                key: record[key]
+                for key in ("config", "metrics", "instrumentation")
+                if key in record
+            }
+        return history
+
+    def _append(self, record: Dict[str, Any]):
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        self._drop_partial_line()
+
+        fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        if self._index is not None and offset == self._indexed_size:
+            self._index_record(record, offset)
+            self._indexed_size = offset + len(line)
+        else:
+            # file was changed by another writer, rebuild on next read
+            self._index = None
+
+    def _drop_partial_line(self):
+        # a crash mid-write can leave an unterminated final line, which would
+        # otherwise be merged with the next record
+        if not os.path.isfile(self._path):
+            return
+        with open(self._path, "rb+") as file:
+            size = file.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            file.seek(size - 1)
+            if file.read(1) == b"\n":
+                return
+            position = size - 1
+            while position > 0:
+                chunk_start = max(0, position - 4096)
+                file.seek(chunk_start)
+                chunk = file.read(position - chunk_start)
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    file.truncate(chunk_start + newline + 1)
+                    break
+                position = chunk_start
+            else:
+                file.truncate(0)
+        self._index = None
+
+    def _get_index(self) -> Dict[Tuple[str, int], Tuple[int, Optional[float]]]:
+        if self._index is None:
+            self._index = {}
+            self._api_args_offset = None
+            self._indexed_size = 0
+            if os.path.isfile(self._path):
+                with open(self._path, "rb") as file:
+                    offset = 0
+                    for line in file:
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            record = None
+                        if isinstance(record, dict):
+                            self._index_record(record, offset)
+                        offset += len(line)
+                    self._indexed_size = offset
+        return self._index
+
+    def _index_record(self, record: Dict[str, Any], offset: int):
+        if _API_ARGS_KEY in record:
+            self._api_args_offset = offset
+            return
+        key = (record["stage"], record["trial"])
+        # pop so a re-recorded trial moves to the end of the record order
+        self._index.pop(key, None)
+        self._index[key] = (offset, _objective_value(record["metrics"]))
+
+    def _read_record(self, offset: int) -> Dict[str, Any]:
+        with open(self._path, "rb") as file:
+            file.seek(offset)
+            return json.loads(file.readline())
+
+
+def get_history_store(path: str) -> TrialHistoryStore:
+    """
+    :param path: path to the history file, or to a directory that contains (or will
+        contain) a `run_history.jsonl` file
+    :return: store of the history file, shared by every call in this process with
+        the same path. Its index is built once and kept up to date by its appends,
+        so recording trials through it never re-reads the file
+    """
+    store = TrialHistoryStore(path)
+    return _HISTORY_STORES.setdefault(os.path.abspath(store.path), store)
+
+
+def _objective_value(metrics: Dict[str, Any]) -> Optional[float]:
+    try:
+        return metrics["metrics"][metrics["objective_key"]]
+    except (KeyError, TypeError):
+        return None
@@ -0,0 +1,256 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for measuring the wall time and resource usage of the stages of a
+sparsify.auto run
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import torch
+
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+
+__all__ = [
+    "ResourceMonitor",
+    "summarize_stage_records",
+    "format_prometheus_metrics",
+]
+
+_BYTES_PER_MB = 1024**2
+_PROMETHEUS_METRICS = [
+    # (record key, metric name, description, scale)
+    ("wall_time", "wall_time_seconds", "Wall time spent in the stage", 1.0),
+    (
+        "peak_rss_mb",
+        "peak_rss_bytes",
+        "Peak resident memory of the process tree during the stage",
+        _BYTES_PER_MB,
+    ),
+    (
+        "peak_gpu_memory_mb",
+        "peak_gpu_memory_bytes",
+        "Peak GPU memory allocated by torch during the stage",
+        _BYTES_PER_MB,
+    ),
+    (
+        "cpu_utilization",
+        "cpu_utilization_ratio",
+        "Average fraction of the machine's CPU capacity used during the stage",
+        0.01,
+    ),
+    ("attempts", "attempts", "Number of attempts of the stage", 1.0),
+]
+
+
+class ResourceMonitor:
+    """
+    Context manager that measures the wall time, peak resident memory, peak GPU
+    memory and CPU utilization of the code it wraps.
+
+    Resident memory is sampled across the process and its children, such as DDP
+    workers, if psutil is installed. Otherwise the peak is taken from
+    `resource.getrusage`, which only covers this process and children that already
+    exited, and is not reset between stages. GPU memory is read from the torch
+    allocator of this process
+
+    :param sample_interval: seconds between resident memory samples
+    """
+
+    def __init__(self, sample_interval: float = 1.0):
+        self.sample_interval = sample_interval
+        self._start_time = None
+        self._start_cpu_time = None
+        self._start_rss = 0
+        self._peak_rss = 0
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._summary = None
+
+    def __enter__(self) -> "ResourceMonitor":
+        self._start_time = time.time()
+        self._start_cpu_time = _cpu_time()
+        self._start_rss = _process_tree_rss() if psutil is not None else _max_rss()
+        self._peak_rss = self._start_rss
+        self._summary = None
+
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            for device in range(torch.cuda.device_count()):
+                torch.cuda.reset_peak_memory_stats(device)
+
+        if psutil is not None:
+            self._stop_event.clear()
+            self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_time = time.time() - self._start_time
+        cpu_time = _cpu_time() - self._start_cpu_time
+
+        if self._sampler is not None:
+            self._stop_event.set()
+            self._sampler.join()
+            self._sampler = None
+            self._peak_rss = max(self._peak_rss, _process_tree_rss())
+        else:
+            self._peak_rss = _max_rss()
+
+        peak_gpu_memory = 0
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            peak_gpu_memory = sum(
+                torch.cuda.max_memory_allocated(device)
+                for device in range(torch.cuda.device_count())
+            )
+
+        self._summary = {
+            "wall_time": wall_time,
+            "start_rss_mb": self._start_rss / _BYTES_PER_MB,
+            "peak_rss_mb": self._peak_rss / _BYTES_PER_MB,
+            "peak_gpu_memory_mb": peak_gpu_memory / _BYTES_PER_MB,
+            "cpu_utilization": (
+                100.0 * cpu_time / (wall_time * (os.cpu_count() or 1))
+                if wall_time > 0
+                else 0.0
+            ),
+        }
+
+    def summary(self) -> Dict[str, float]:
+        """
+        :return: dict of the wall time (seconds), resident memory at the start and
+            peak (MB), peak GPU memory (MB) and CPU utilization (percent of all cores)
+            measured. Only available once the context has exited
+        """
+        if self._summary is None:
+            raise RuntimeError("ResourceMonitor summary requested before exit")
+        return dict(self._summary)
+
+    def _sample_rss(self):
+        while True:
+            self._peak_rss = max(self._peak_rss, _process_tree_rss())
+            if self._stop_event.wait(self.sample_interval):
+                return
+
+
+def summarize_stage_records(
+    records: List[Dict[str, Any]]
+) -> "OrderedDict[str, Dict[str, float]]":
+    """
+    :param records: per attempt records, each holding a `stage` name and the values
+        of a `ResourceMonitor` summary
+    :return: ordered dict of stage name to the total wall time, max peak memory,
+        wall time weighted CPU utilization and number of attempts of the stage
+    """
+    summaries = OrderedDict()
+    for record in records:
+        summary = summaries.setdefault(
+            record["stage"],
+            {
+                "wall_time": 0.0,
+                "peak_rss_mb": 0.0,
+                "peak_gpu_memory_mb": 0.0,
+                "cpu_utilization": 0.0,
+                "attempts": 0,
+            },
+        )
+        total_time = summary["wall_time"] + record["wall_time"]
+        if total_time > 0:
+            summary["cpu_utilization"] = (
+                summary["cpu_utilization"] * summary["wall_time"]
+                + record["cpu_utilization"] * record["wall_time"]
+            ) / total_time
+        summary["wall_time"] = total_time
+        summary["peak_rss_mb"] = max(summary["peak_rss_mb"], record["peak_rss_mb"])
+        summary["peak_gpu_memory_mb"] = max(
+            summary["peak_gpu_memory_mb"], record["peak_gpu_memory_mb"]
+        )
+        summary["attempts"] += 1
+    return summaries
+
+
+def format_prometheus_metrics(
+    stage_summaries: Dict[str, Dict[str, float]],
+    prefix: str = "sparsify_auto_stage",
+    labels: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    :param stage_summaries: stage summaries, as returned by `summarize_stage_records`
+    :param prefix: prefix of the metric names
+    :param labels: optional extra labels to add to every sample, e.g. the task
+    :return: summaries in the Prometheus text exposition format, with one gauge per
+        measurement labeled by stage
+    """
+    lines = []
+    for key, name, description, scale in _PROMETHEUS_METRICS:
+        metric_name = f"{prefix}_{name}"
+        lines.append(f"# HELP {metric_name} {description}")
+        lines.append(f"# TYPE {metric_name} gauge")
+        for stage, summary in stage_summaries.items():
+            sample_labels = {**(labels or {}), "stage": stage}
+            label_string = ",".join(
+                f'{label}="{_escape_label_value(value)}"'
+                for label, value in sample_labels.items()
+            )
+            lines.append(f"{metric_name}{{{label_string}}} {summary[key] * scale}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _cpu_time() -> float:
+    # user and system time of this process and of its waited for children
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _process_tree_rss() -> int:
+    try:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                # child exited between listing and sampling
+                pass
+        return rss
+    except psutil.Error:
+        return 0
+
+
+def _max_rss() -> int:
+    if resource is None:
+        return 0
+    # ru_maxrss is reported in kilobytes on linux
+    return 1024 * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
@@ -0,0 +1,221 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tailers reading the metrics of in-progress training runs from the files the
+integrations write them to, each reading only what was appended since its last read
+"""
+import csv
+import glob
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sparsify.schemas import Metrics, MetricsSnapshot
+
+
+__all__ = [
+    "METRICS_STREAM_INTERVAL",
+    "MetricsTailer",
+    "PollingMetricsTailer",
+    "CSVMetricsTailer",
+    "EventFileMetricsTailer",
+]
+
+# seconds between reads of the training output when streaming metrics
+METRICS_STREAM_INTERVAL = float(os.environ.get("NM_AUTO_METRICS_STREAM_INTERVAL", 10))
+
+_EVENT_FILE_PATTERN = "events.out.tfevents.*"
+
+
+class MetricsTailer(ABC):
+    """
+    Base class of metrics tailers, which return the snapshots of a training run that
+    were written since their last read
+    """
+
+    @abstractmethod
+    def read(self) -> List[MetricsSnapshot]:
+        """
+        :return: snapshots written since the last read, oldest first
+        """
+        raise NotImplementedError()
+
+
+class PollingMetricsTailer(MetricsTailer):
+    """
+    Tails outputs that are rewritten rather than appended to, e.g. results files
+    saved with each best checkpoint, by polling their latest metrics and returning
+    them only once per epoch
+
+    :param read_latest: function returning the number of epochs trained and the
+        latest metrics, or None if there are none yet
+    """
+
+    def __init__(self, read_latest: Callable[[], Optional[Tuple[float, Metrics]]]):
+        self._read_latest = read_latest
+        self._last_epoch = None
+
+    def read(self) -> List[MetricsSnapshot]:
+        latest = self._read_latest()
+        if latest is None or latest[0] == self._last_epoch:
+            return []
+        self._last_epoch, metrics = latest
+        return [MetricsSnapshot(epoch=self._last_epoch, metrics=metrics)]
+
+
+class CSVMetricsTailer(MetricsTailer):
+    """
+    Tails a csv file with a header and one row appended per epoch, e.g. the
+    results.csv of yolov5. Values may be padded with spaces
+
+    :param path: path to the csv file, which may not exist yet
+    :param metric_columns: columns of the metrics, mapped to their metric names
+    :param objective_key: metric name of the objective
+    :param epoch_column: column of the epoch of each row
+    :param epoch_offset: offset added to the epoch column to get the number of
+        epochs trained, e.g. 1 for 0-indexed epochs
+    """
+
+    def __init__(
+        self,
+        path: str,
+        metric_columns: Dict[str, str],
+        objective_key: str,
+        epoch_column: str = "epoch",
+        epoch_offset: float = 0.0,
+    ):
+        self.path = path
+        self.metric_columns = metric_columns
+        self.objective_key = objective_key
+        self.epoch_column = epoch_column
+        self.epoch_offset = epoch_offset
+        self._offset = 0
+        self._header: Optional[List[str]] = None
+
+    def read(self) -> List[MetricsSnapshot]:
+        snapshots = []
+        for line in self._read_lines():
+            row = [cell.strip() for cell in next(csv.reader([line]))]
+            if self._header is None:
+                self._header = row
+                continue
+            values = dict(zip(self._header, row))
+            snapshots.append(
+                MetricsSnapshot(
+                    epoch=float(values[self.epoch_column]) + self.epoch_offset,
+                    metrics=Metrics(
+                        metrics={
+                            key: float(values[column])
+                            for column, key in self.metric_columns.items()
+                        },
+                        objective_key=self.objective_key,
+                    ),
+                )
+            )
+        return snapshots
+
+    def _read_lines(self) -> List[str]:
+        # complete lines written after the offset, rereading rewritten files
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        if size < self._offset:
+            self._offset, self._header = 0, None
+
+        lines = []
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                self._offset += len(line)
+                if line.strip():
+                    lines.append(line.decode())
+        return lines
+
+
+class EventFileMetricsTailer(MetricsTailer):
+    """
+    Tails the TensorBoard event files in a log directory, returning a snapshot for
+    each step the objective was logged at. New event files, e.g. of a resumed run,
+    are picked up as they appear
+
+    :param log_directory: directory the event files are written to
+    :param metric_tags: tags of the scalars of the metrics, mapped to their metric
+        names
+    :param objective_key: metric name of the objective
+    :param epoch_tag: optional tag of a scalar logging the epoch, whose latest value
+        is used as the epoch of each snapshot
+    """
+
+    def __init__(
+        self,
+        log_directory: str,
+        metric_tags: Dict[str, str],
+        objective_key: str,
+        epoch_tag: Optional[str] = None,
+    ):
+        self.log_directory = log_directory
+        self.metric_tags = metric_tags
+        self.objective_key = objective_key
+        self.epoch_tag = epoch_tag
+        self._loaders: Dict[str, Any] = {}
+        self._epoch: Optional[float] = None
+
+    def read(self) -> List[MetricsSnapshot]:
+        # imported here, as tensorboard is slow to import and only needed to tail
+        from tensorboard.backend.event_processing.event_file_loader import (
+            LegacyEventFileLoader,
+        )
+
+        for path in sorted(
+            glob.glob(
+                os.path.join(self.log_directory, "**", _EVENT_FILE_PATTERN),
+                recursive=True,
+            )
+        ):
+            if path not in self._loaders:
+                self._loaders[path] = LegacyEventFileLoader(path)
+
+        steps: Dict[int, Dict[str, float]] = {}
+        epochs: Dict[int, float] = {}
+        for loader in self._loaders.values():
+            for event in loader.Load():
+                for value in event.summary.value:
+                    if value.WhichOneof("value") != "simple_value":
+                        continue
+                    if value.tag == self.epoch_tag:
+                        epochs[event.step] = value.simple_value
+                    elif value.tag in self.metric_tags:
+                        steps.setdefault(event.step, {})[
+                            self.metric_tags[value.tag]
+                        ] = value.simple_value
+
+        snapshots = []
+        for step in sorted(set(steps) | set(epochs)):
+            self._epoch = epochs.get(step, self._epoch)
+            metrics = steps.get(step, {})
+            if self.objective_key in metrics:
+                snapshots.append(
+                    MetricsSnapshot(
+                        epoch=self._epoch,
+                        step=step,
+                        metrics=Metrics(
+                            metrics=metrics, objective_key=self.objective_key
+                        ),
+                    )
+                )
+        return snapshots
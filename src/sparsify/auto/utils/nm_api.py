@@ -49,7 +49,8 @@ def api_request_config(api_args: APIArgs) -> dict:
     """
     response = (
         requests.post(
-            f"{get_base_url()}{_CONFIG_REQUEST_END_POINT}", json=api_args.dict()
+            f"{get_base_url()}{_CONFIG_REQUEST_END_POINT}",
+            json=api_args.dict(exclude={"distributed", "tuning"}),
         ).json()
         if SPARSIFY_SERVER
         else auto_training_config_initial(user_args=api_args).dict()
@@ -0,0 +1,96 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for finding the node of a multi-node job whose workers held global rank 0,
+and so wrote the trained checkpoint, once training is done. Under the elastic c10d
+rendezvous torch assigns node ranks itself, so the node rank given to sparsify does
+not identify it
+"""
+import os
+import sys
+from typing import Optional
+
+
+__all__ = [
+    "NODE_TOKEN_ENV",
+    "PRIMARY_NODE_MARKER_ENV",
+    "PRIMARY_NODE_FILE_NAME",
+    "PRIMARY_NODE_LAUNCH_COMMAND",
+    "record_primary_node",
+    "read_primary_node",
+]
+
+# environment variable holding a token unique to the launch of this node
+NODE_TOKEN_ENV = "NM_AUTO_NODE_TOKEN"
+# environment variable holding the path of the primary node marker file
+PRIMARY_NODE_MARKER_ENV = "NM_AUTO_PRIMARY_NODE_MARKER"
+PRIMARY_NODE_FILE_NAME = ".primary_node"
+# prefix to a training command that records the primary node before running it
+PRIMARY_NODE_LAUNCH_COMMAND = [
+    sys.executable,
+    "-c",
+    "from sparsify.auto.utils.primary_node import _run_node_worker; "
+    "_run_node_worker()",
+]
+
+
+def record_primary_node():
+    """
+    Run by each training worker on start. The worker of global rank 0 writes the
+    token of its node to the marker file, in the train directory of its node. The
+    first local worker of any other node removes a marker with its own token, left
+    by an earlier round of an elastic job in which this node held rank 0. Markers of
+    other nodes are kept, so the marker is correct with or without a filesystem
+    shared by the nodes
+    """
+    token = os.environ.get(NODE_TOKEN_ENV)
+    marker_path = os.environ.get(PRIMARY_NODE_MARKER_ENV)
+    if not token or not marker_path:
+        return
+
+    if os.environ.get("RANK") == "0":
+        os.makedirs(os.path.dirname(os.path.abspath(marker_path)), exist_ok=True)
+        tmp_path = f"{marker_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(token)
+        os.replace(tmp_path, marker_path)
+    elif (
+        os.environ.get("LOCAL_RANK", "0") == "0"
+        and read_primary_node(marker_path) == token
+    ):
+        try:
+            os.remove(marker_path)
+        except FileNotFoundError:
+            pass
+
+
+def read_primary_node(marker_path: str) -> Optional[str]:
+    """
+    :param marker_path: path to the primary node marker file
+    :return: token of the node whose worker held global rank 0, None if no marker
+        was written
+    """
+    try:
+        with open(marker_path) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _run_node_worker():
+    # entrypoint of PRIMARY_NODE_LAUNCH_COMMAND. Records the primary node, then
+    # replaces this process with the training command
+    record_primary_node()
+    os.execvp(sys.argv[1], sys.argv[1:])
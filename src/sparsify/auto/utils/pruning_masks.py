@@ -0,0 +1,620 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for keeping pruned weights at zero while finetuning, by attaching compact
+masks to the pruned weights, collecting the masked parameters once and masking
+them with multi-tensor ops every step
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import torch
+
+
+__all__ = [
+    "COMPACT_MASK_FORMATS",
+    "MASK_FORMATS",
+    "CompactMask",
+    "PruningMasks",
+    "attach_compact_masks",
+    "pack_bits",
+    "unpack_bits",
+]
+
+# bitmask: 1 bit per weight
+# csr: row pointers and column indices of the unpruned weights
+# auto: whichever of the two is smaller
+COMPACT_MASK_FORMATS = ["bitmask", "csr", "auto"]
+
+# dense: mask in the parameter dtype, applied with one fused multiply
+# bitmask: 1 bit per weight, unpacked chunk by chunk into reused buffers when applied
+# indices: indices of the unpruned weights, for highly sparse layers
+# auto: indices for layers of at least `indices_min_sparsity`, bitmask otherwise
+MASK_FORMATS = ["dense", "bitmask", "indices", "auto"]
+
+_BIT_SHIFTS = torch.arange(8, dtype=torch.uint8)
+# elements processed at a time when building masks
+_DEFAULT_CHUNK_SIZE = 2**24
+# bytes of a bitmask unpacked at a time when applied, so the unpacked values of a
+# chunk are still in cache when multiplied
+_UNPACK_CHUNK_BYTES = 2**14
+
+
+class CompactMask:
+    """
+    Mask of a pruned weight, where zeros are pruned, stored bit-packed or as CSR
+    style indices of the unpruned weights. Weights are viewed as 2D, with rows
+    along the first dimension, and are kept on CPU until collected by PruningMasks
+
+    :param shape: shape of the masked weight
+    :param mask_format: bitmask or csr
+    :param num_kept: number of unpruned weights
+    :param bits: bit-packed mask, for the bitmask format
+    :param crow_indices: index of the first unpruned weight of each row in
+        col_indices, for the csr format
+    :param col_indices: column of each unpruned weight, for the csr format
+    """
+
+    def __init__(
+        self,
+        shape: torch.Size,
+        mask_format: str,
+        num_kept: int,
+        bits: Optional[torch.Tensor] = None,
+        crow_indices: Optional[torch.Tensor] = None,
+        col_indices: Optional[torch.Tensor] = None,
+    ):
+        self.shape = torch.Size(shape)
+        self.mask_format = mask_format
+        self.num_kept = num_kept
+        self.bits = bits
+        self.crow_indices = crow_indices
+        self.col_indices = col_indices
+
+    @classmethod
+    @torch.no_grad()
+    def from_weight(
+        cls,
+        weight: torch.Tensor,
+        mask_format: str = "auto",
+        min_sparsity: float = 0.0,
+        chunk_size: int = _DEFAULT_CHUNK_SIZE,
+    ) -> Optional["CompactMask"]:
+        """
+        Build the mask of the zeros of a weight, reading at most chunk_size elements
+        of the weight at a time so no dense mask of the full weight is allocated
+
+        :param weight: pruned weight, or a dense mask of it
+        :param mask_format: how to store the mask, one of COMPACT_MASK_FORMATS
+        :param min_sparsity: sparsity below which no mask is created
+        :param chunk_size: number of elements to process at a time
+        :return: the mask, None if the weight is less sparse than min_sparsity
+        """
+        if mask_format not in COMPACT_MASK_FORMATS:
+            raise ValueError(
+                f"Unknown mask format {mask_format}, expected one of "
+                f"{COMPACT_MASK_FORMATS}"
+            )
+        matrix = weight.detach().reshape(weight.shape[0], -1)
+        num_rows, num_cols = matrix.shape
+        rows_per_chunk = max(1, chunk_size // max(num_cols, 1))
+
+        # first pass counts the unpruned weights of each row, the CSR row lengths
+        row_counts = torch.cat(
+            [
+                matrix[row : row + rows_per_chunk].ne(0).sum(dim=1).cpu()
+                for row in range(0, num_rows, rows_per_chunk)
+            ]
+        )
+        num_kept = int(row_counts.sum())
+        numel = matrix.numel()
+        if numel == 0 or 1.0 - num_kept / numel < min_sparsity:
+            return None
+
+        col_dtype = _index_dtype(num_cols)
+        if mask_format == "auto":
+            bitmask_bytes = (numel + 7) // 8
+            csr_bytes = (num_rows + 1) * 8 + num_kept * _element_size(col_dtype)
+            mask_format = "csr" if csr_bytes < bitmask_bytes else "bitmask"
+
+        if mask_format == "bitmask":
+            # chunks of whole bytes, so they pack independently
+            flat = matrix.reshape(-1)
+            elements_per_chunk = max(8, chunk_size - chunk_size % 8)
+            bits = torch.cat(
+                [
+                    pack_bits(flat[start : start + elements_per_chunk]).cpu()
+                    for start in range(0, numel, elements_per_chunk)
+                ]
+            )
+            return cls(weight.shape, "bitmask", num_kept, bits=bits)
+
+        crow_indices = torch.zeros(num_rows + 1, dtype=torch.int64)
+        torch.cumsum(row_counts, dim=0, out=crow_indices[1:])
+        col_indices = torch.empty(num_kept, dtype=col_dtype)
+        for row in range(0, num_rows, rows_per_chunk):
+            cols = matrix[row : row + rows_per_chunk].nonzero()[:, 1]
+            start = int(crow_indices[row])
+            col_indices[start : start + cols.numel()] = cols.to(col_dtype).cpu()
+        return cls(
+            weight.shape,
+            "csr",
+            num_kept,
+            crow_indices=crow_indices,
+            col_indices=col_indices,
+        )
+
+    @property
+    def numel(self) -> int:
+        """
+        :return: number of elements of the masked weight
+        """
+        return self.shape.numel()
+
+    @property
+    def sparsity(self) -> float:
+        """
+        :return: fraction of the weight that is pruned
+        """
+        return 1.0 - self.num_kept / max(self.numel, 1)
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        :return: bytes used to store the mask
+        """
+        return sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in (self.bits, self.crow_indices, self.col_indices)
+            if tensor is not None
+        )
+
+    def to_bool(self, start: int = 0, end: Optional[int] = None) -> torch.Tensor:
+        """
+        :param start: start of the range of the flattened weight to expand
+        :param end: end of the range, exclusive. Defaults to the end of the weight
+        :return: dense boolean mask of the range, True for unpruned weights
+        """
+        end = self.numel if end is None else end
+        if self.mask_format == "bitmask":
+            first_byte = start // 8
+            bits = unpack_bits(
+                self.bits[first_byte : (end + 7) // 8], end - first_byte * 8
+            )
+            return bits[start - first_byte * 8 :]
+
+        first_row, last_row, rows, cols = self._csr_range(start, end)
+        mask = torch.zeros((last_row - first_row) * self._num_cols, dtype=torch.bool)
+        mask[(rows - first_row) * self._num_cols + cols] = True
+        offset = first_row * self._num_cols
+        return mask[start - offset : end - offset]
+
+    def kept_indices(self, start: int = 0, end: Optional[int] = None) -> torch.Tensor:
+        """
+        :param start: start of the range of the flattened weight
+        :param end: end of the range, exclusive. Defaults to the end of the weight
+        :return: indices of the unpruned weights in the range, relative to its start
+        """
+        end = self.numel if end is None else end
+        if self.mask_format == "bitmask":
+            return self.to_bool(start, end).nonzero().flatten()
+
+        _, _, rows, cols = self._csr_range(start, end)
+        indices = rows * self._num_cols + cols
+        indices = indices[(indices >= start) & (indices < end)]
+        return indices - start
+
+    @property
+    def _num_cols(self) -> int:
+        return self.numel // max(self.shape[0], 1)
+
+    def _csr_range(
+        self, start: int, end: int
+    ) -> Tuple[int, int, torch.Tensor, torch.Tensor]:
+        # rows and columns of the unpruned weights of the rows overlapping the range
+        first_row = start // self._num_cols
+        last_row = min(-(-end // self._num_cols), self.shape[0])
+        row_counts = (
+            self.crow_indices[first_row + 1 : last_row + 1]
+            - self.crow_indices[first_row:last_row]
+        )
+        rows = torch.repeat_interleave(
+            torch.arange(first_row, last_row, dtype=torch.int64), row_counts
+        )
+        cols = self.col_indices[
+            int(self.crow_indices[first_row]) : int(self.crow_indices[last_row])
+        ].to(torch.int64)
+        return first_row, last_row, rows, cols
+
+
+class _MaskEntry(NamedTuple):
+    # name of the masked module
+    name: str
+    # parameter, or FSDP flat parameter, holding the masked values
+    param: torch.Tensor
+    # range of the masked values in the flattened parameter
+    start: int
+    end: int
+    mask: torch.Tensor
+    mask_format: str
+
+
+class PruningMasks:
+    """
+    Masks of pruned parameters, collected once from the mask buffers attached to
+    their modules and then applied to the weights or their gradients every step.
+    Masks stay compact by default, as bitmasks or, for highly sparse layers, indices
+    of the unpruned weights. Dense masks are only used if asked for. They are stored
+    in the parameter dtype, four times the memory of a uint8 mask for fp32, and
+    applied together through `torch._foreach_mul_`, avoiding a walk of the module
+    tree, dtype promotions and temporary allocations per layer.
+
+    Parameters sharded by FSDP are masked through the flat parameter of their FSDP
+    module, using only the slice of the mask for the local shard
+
+    :param mask_format: how to store the masks, one of MASK_FORMATS
+    :param indices_min_sparsity: sparsity from which layers store the indices of
+        their unpruned weights under the auto format
+    """
+
+    def __init__(self, mask_format: str = "auto", indices_min_sparsity: float = 0.95):
+        if mask_format not in MASK_FORMATS:
+            raise ValueError(
+                f"Unknown mask format {mask_format}, expected one of {MASK_FORMATS}"
+            )
+        self._mask_format = mask_format
+        self._indices_min_sparsity = indices_min_sparsity
+        self._entries: List[_MaskEntry] = []
+        # (device, dtype) -> lookup table of the 8 mask values of each byte value,
+        # unpacked values buffer and byte index buffer, reused by every bitmask
+        self._unpack_buffers: Dict[
+            Tuple[torch.device, torch.dtype],
+            Tuple[torch.Tensor, torch.Tensor, torch.Tensor],
+        ] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        :return: bytes used to store the collected masks
+        """
+        return sum(
+            entry.mask.numel() * entry.mask.element_size() for entry in self._entries
+        )
+
+    def report(self) -> List[Dict[str, Any]]:
+        """
+        :return: report of each masked layer, with the format its mask is held in
+            and the bytes it holds on its device. Only the local shard of FSDP
+            sharded weights is held
+        """
+        report = {}
+        for entry in self._entries:
+            layer = report.setdefault(
+                entry.name,
+                {
+                    "layer": entry.name,
+                    "mask_format": entry.mask_format,
+                    "mask_bytes": 0,
+                },
+            )
+            layer["mask_bytes"] += entry.mask.numel() * entry.mask.element_size()
+        return list(report.values())
+
+    @torch.no_grad()
+    def collect(
+        self, model: torch.nn.Module, mask_name: str = "constant_pruning_mask"
+    ) -> int:
+        """
+        Collect the masks of the weights of all modules of the model with a mask
+        buffer. The buffers are removed once collected, as the masks are then held
+        in their storage format by this object. Call after the model was wrapped by
+        FSDP, if it is
+
+        :param model: model to collect the masks of
+        :param mask_name: name of the mask buffers
+        :return: number of masked weights collected
+        """
+        masked_modules = []
+        module_names = {
+            id(module): _unwrapped_name(name) for name, module in model.named_modules()
+        }
+
+        # weights flattened into FSDP flat parameters, only the local shard is masked.
+        # Flat parameters are reachable from both the FSDP module and the module it
+        # wraps
+        flat_params = {}
+        for module in model.modules():
+            flat_param = getattr(module, "_flat_param", None)
+            if flat_param is not None and hasattr(flat_param, "_shard_param_infos"):
+                flat_params[id(flat_param)] = flat_param
+
+        for flat_param in flat_params.values():
+            for param_info, shard_info in zip(
+                flat_param._param_infos, flat_param._shard_param_infos
+            ):
+                owner = param_info.module
+                mask = _get_mask(owner, mask_name)
+                if param_info.param_name != "weight" or mask is None:
+                    continue
+                masked_modules.append(owner)
+                if not shard_info.in_shard:
+                    continue
+                self._add(
+                    module_names.get(id(owner), ""),
+                    flat_param,
+                    shard_info.offset_in_shard,
+                    shard_info.offset_in_shard + shard_info.numel_in_shard,
+                    mask,
+                    shard_info.intra_param_start_idx,
+                )
+
+        flat_masked_ids = {id(module) for module in masked_modules}
+        for module in model.modules():
+            mask = _get_mask(module, mask_name)
+            if mask is None or id(module) in flat_masked_ids:
+                continue
+            masked_modules.append(module)
+            self._add(
+                module_names[id(module)],
+                module.weight,
+                0,
+                module.weight.numel(),
+                mask,
+                0,
+            )
+
+        for module in masked_modules:
+            if mask_name in module._buffers:
+                del module._buffers[mask_name]
+            else:
+                delattr(module, mask_name)
+
+        return len(masked_modules)
+
+    @torch.no_grad()
+    def apply(self):
+        """
+        Zero the pruned weights
+        """
+        self._apply(gradients=False)
+
+    @torch.no_grad()
+    def apply_to_gradients(self):
+        """
+        Zero the gradients of the pruned weights, so optimizer steps keep them at
+        zero. Parameters without gradients are skipped
+        """
+        self._apply(gradients=True)
+
+    def _add(
+        self,
+        name: str,
+        param: torch.Tensor,
+        start: int,
+        end: int,
+        mask: CompactMask,
+        mask_start: int,
+    ):
+        # masks the values [start, end) of the flattened param with the mask of the
+        # flattened weight from mask_start
+        mask_end = mask_start + end - start
+        mask_format = self._mask_format
+        if mask_format == "auto":
+            kept = mask.kept_indices(mask_start, mask_end)
+            sparsity = 1.0 - kept.numel() / max(end - start, 1)
+            mask_format = (
+                "indices" if sparsity >= self._indices_min_sparsity else "bitmask"
+            )
+
+        if mask_format == "dense":
+            stored = mask.to_bool(mask_start, mask_end).to(
+                device=param.device, dtype=param.dtype
+            )
+        elif mask_format == "bitmask":
+            if mask.mask_format == "bitmask" and mask_start % 8 == 0:
+                stored = mask.bits[mask_start // 8 : (mask_end + 7) // 8]
+            else:
+                stored = pack_bits(mask.to_bool(mask_start, mask_end))
+            stored = stored.clone().to(param.device)
+        else:
+            stored = (
+                mask.kept_indices(mask_start, mask_end)
+                .to(_index_dtype(end - start, min_dtype=torch.int32))
+                .to(param.device)
+            )
+
+        self._entries.append(_MaskEntry(name, param, start, end, stored, mask_format))
+
+    def _apply(self, gradients: bool):
+        dense_targets = []
+        dense_masks = []
+        for entry in self._entries:
+            tensor = entry.param.grad if gradients else entry.param.detach()
+            if tensor is None:
+                continue
+            target = tensor.view(-1)[entry.start : entry.end]
+
+            if entry.mask_format == "dense":
+                dense_targets.append(target)
+                dense_masks.append(entry.mask)
+            elif entry.mask_format == "bitmask":
+                self._mul_bitmask(target, entry.mask)
+            else:
+                values = target.index_select(0, entry.mask)
+                target.zero_()
+                target.index_put_((entry.mask,), values)
+
+        if dense_targets:
+            torch._foreach_mul_(dense_targets, dense_masks)
+
+    def _mul_bitmask(self, target: torch.Tensor, bits: torch.Tensor):
+        # bytes are unpacked by a lookup into a table already in the target dtype,
+        # chunk by chunk into buffers shared by all layers, so masking allocates
+        # nothing and multiplies without a dtype promotion
+        table, values, indices = self._get_unpack_buffers(target)
+        num_bytes = target.numel() // 8
+        rows = target[: num_bytes * 8].view(num_bytes, 8)
+        for start in range(0, num_bytes, _UNPACK_CHUNK_BYTES):
+            end = min(start + _UNPACK_CHUNK_BYTES, num_bytes)
+            chunk_indices = indices[: end - start]
+            chunk_values = values[: end - start]
+            chunk_indices.copy_(bits[start:end])
+            torch.index_select(table, 0, chunk_indices, out=chunk_values)
+            rows[start:end].mul_(chunk_values)
+
+        remainder = target.numel() - num_bytes * 8
+        if remainder:
+            last_byte = bits[num_bytes:].to(torch.int64)
+            target[num_bytes * 8 :].mul_(table[last_byte][0, :remainder])
+
+    def _get_unpack_buffers(
+        self, target: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        key = (target.device, target.dtype)
+        if key not in self._unpack_buffers:
+            byte_values = torch.arange(256, dtype=torch.uint8).unsqueeze(-1)
+            table = ((byte_values >> _BIT_SHIFTS) & 1).to(
+                device=target.device, dtype=target.dtype
+            )
+            self._unpack_buffers[key] = (
+                table,
+                torch.empty(
+                    _UNPACK_CHUNK_BYTES, 8, device=target.device, dtype=target.dtype
+                ),
+                torch.empty(
+                    _UNPACK_CHUNK_BYTES, device=target.device, dtype=torch.int64
+                ),
+            )
+        return self._unpack_buffers[key]
+
+
+@torch.no_grad()
+def attach_compact_masks(
+    model: torch.nn.Module,
+    module_types: Tuple[type, ...] = (torch.nn.Linear,),
+    min_sparsity: float = 0.05,
+    mask_format: str = "auto",
+    chunk_size: int = _DEFAULT_CHUNK_SIZE,
+    mask_name: str = "constant_pruning_mask",
+) -> List[Dict[str, Any]]:
+    """
+    Attach a CompactMask of the zeros of the weight of each module of the given
+    types that is at least min_sparsity sparse, for PruningMasks to collect
+
+    :param model: model to attach the masks to
+    :param module_types: types of the modules to mask the weights of
+    :param min_sparsity: sparsity below which weights are not masked
+    :param mask_format: how to store the masks, one of COMPACT_MASK_FORMATS
+    :param chunk_size: number of weight elements to process at a time
+    :param mask_name: attribute to attach the masks as
+    :return: report of each layer of the given types, with its sparsity, mask
+        format (None if not masked) and the bytes of its mask compared to a dense
+        uint8 mask
+    """
+    report = []
+    for name, module in model.named_modules():
+        if not isinstance(module, module_types):
+            continue
+        mask = CompactMask.from_weight(
+            module.weight,
+            mask_format=mask_format,
+            min_sparsity=min_sparsity,
+            chunk_size=chunk_size,
+        )
+        # unmasked layers save their whole dense mask
+        mask_bytes = mask.memory_bytes if mask is not None else 0
+        report.append(
+            {
+                "layer": name,
+                "sparsity": (
+                    mask.sparsity
+                    if mask is not None
+                    else _sparsity(module.weight, chunk_size)
+                ),
+                "mask_format": mask.mask_format if mask is not None else None,
+                "mask_bytes": mask_bytes,
+                "dense_mask_bytes": module.weight.numel(),
+                "saved_bytes": module.weight.numel() - mask_bytes,
+            }
+        )
+        if mask is not None:
+            module._buffers.pop(mask_name, None)
+            setattr(module, mask_name, mask)
+    return report
+
+
+def pack_bits(mask: torch.Tensor) -> torch.Tensor:
+    """
+    :param mask: mask to pack, nonzero values are kept
+    :return: the flattened mask packed into uint8, 8 values per byte, little endian
+    """
+    mask = mask.flatten() != 0
+    padding = (-mask.numel()) % 8
+    if padding:
+        mask = torch.cat([mask, mask.new_zeros(padding)])
+    bits = mask.view(-1, 8).to(torch.uint8)
+    return (bits << _BIT_SHIFTS.to(bits.device)).sum(dim=1, dtype=torch.uint8)
+
+
+def unpack_bits(packed: torch.Tensor, numel: int) -> torch.Tensor:
+    """
+    :param packed: mask packed by pack_bits
+    :param numel: number of values of the mask
+    :return: the flattened boolean mask
+    """
+    shifts = _BIT_SHIFTS.to(packed.device)
+    return ((packed.unsqueeze(-1) >> shifts) & 1).view(-1)[:numel].bool()
+
+
+def _get_mask(module: torch.nn.Module, mask_name: str) -> Optional[CompactMask]:
+    # compact masks are plain attributes, dense masks are buffers
+    mask = module.__dict__.get(mask_name)
+    if isinstance(mask, CompactMask):
+        return mask
+    if mask_name in module._buffers:
+        return CompactMask.from_weight(module._buffers[mask_name])
+    return None
+
+
+def _unwrapped_name(name: str) -> str:
+    # module name before wrapping by FSDP or activation checkpointing
+    for wrapper in ("_fsdp_wrapped_module", "_checkpoint_wrapped_module"):
+        name = name.replace(f"{wrapper}.", "").replace(wrapper, "")
+    return name.rstrip(".")
+
+
+def _sparsity(weight: torch.Tensor, chunk_size: int) -> float:
+    flat = weight.detach().reshape(-1)
+    num_kept = sum(
+        int(flat[start : start + chunk_size].count_nonzero())
+        for start in range(0, flat.numel(), chunk_size)
+    )
+    return 1.0 - num_kept / max(flat.numel(), 1)
+
+
+def _index_dtype(size: int, min_dtype: torch.dtype = torch.int16) -> torch.dtype:
+    # smallest integer dtype that can index size elements
+    for dtype in (torch.int16, torch.int32):
+        if _element_size(dtype) >= _element_size(min_dtype) and size <= (
+            torch.iinfo(dtype).max
+        ):
+            return dtype
+    return torch.int64
+
+
+def _element_size(dtype: torch.dtype) -> int:
+    return torch.empty(0, dtype=dtype).element_size()
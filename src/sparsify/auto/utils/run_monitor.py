@@ -0,0 +1,368 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Run monitors serving the training logs of a run, e.g. TensorBoard, from a separate,
+lower priority process, so their file watching and HTTP threads don't compete with
+training for the GIL and CPU
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+
+__all__ = [
+    "RUN_MONITOR",
+    "RUN_MONITOR_RELOAD_INTERVAL",
+    "RUN_MONITOR_HOST",
+    "RUN_MONITOR_PORT",
+    "RUN_MONITOR_REGISTRY",
+    "RunMonitor",
+    "TensorBoardMonitor",
+    "MetricsMonitor",
+    "register_run_monitor",
+    "is_headless",
+    "start_run_monitor",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+# run monitor to launch: tensorboard, metrics or none. Defaults to tensorboard,
+# or none on headless and CI runs
+RUN_MONITOR = os.environ.get("NM_AUTO_RUN_MONITOR")
+# seconds between rereads of the training logs
+RUN_MONITOR_RELOAD_INTERVAL = float(
+    os.environ.get("NM_AUTO_RUN_MONITOR_RELOAD_INTERVAL", 30)
+)
+RUN_MONITOR_HOST = os.environ.get("NM_AUTO_RUN_MONITOR_HOST", "localhost")
+# 0 to pick a free port
+RUN_MONITOR_PORT = int(os.environ.get("NM_AUTO_RUN_MONITOR_PORT", 0))
+RUN_MONITOR_REGISTRY: Dict[str, Type["RunMonitor"]] = {}
+
+_NICENESS = 10
+_STOP_TIMEOUT = 10.0
+_CI_ENVIRONMENT_VARIABLES = [
+    "CI",
+    "GITHUB_ACTIONS",
+    "GITLAB_CI",
+    "JENKINS_URL",
+    "BUILDKITE",
+    "TF_BUILD",
+]
+_PR_SET_PDEATHSIG = 1
+
+
+def register_run_monitor(name: str):
+    """
+    Decorator to register a run monitor under the name selected through
+    NM_AUTO_RUN_MONITOR
+
+    :param name: name of the run monitor
+    """
+
+    def _register_run_monitor_decorator(monitor_class: Type["RunMonitor"]):
+        RUN_MONITOR_REGISTRY[name] = monitor_class
+        return monitor_class
+
+    return _register_run_monitor_decorator
+
+
+def is_headless() -> bool:
+    """
+    :return: True if running under CI or without an interactive terminal, where
+        nobody is around to open a monitor
+    """
+    if any(os.environ.get(variable) for variable in _CI_ENVIRONMENT_VARIABLES):
+        return True
+    return not (sys.stdout.isatty() or sys.stderr.isatty())
+
+
+class RunMonitor(ABC):
+    """
+    Base class of run monitors, each serving the training logs of a run over HTTP
+    from a child process. The child runs at a lower priority and is sent SIGTERM if
+    this process dies without stopping it
+
+    :param log_directory: directory the training logs are written to
+    :param reload_interval: seconds between rereads of the training logs
+    :param host: host to serve on
+    :param port: port to serve on, 0 to pick a free port
+    """
+
+    def __init__(
+        self,
+        log_directory: str,
+        reload_interval: float = RUN_MONITOR_RELOAD_INTERVAL,
+        host: str = RUN_MONITOR_HOST,
+        port: int = RUN_MONITOR_PORT,
+    ):
+        self.log_directory = log_directory
+        self.reload_interval = reload_interval
+        self.host = host
+        self.port = port or _free_port(host)
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr = None
+
+    @property
+    def url(self) -> str:
+        """
+        :return: url the monitor serves on
+        """
+        return f"http://{self.host}:{self.port}/"
+
+    @abstractmethod
+    def command(self) -> List[str]:
+        """
+        :return: command running the monitor in the foreground
+        """
+        raise NotImplementedError()
+
+    def start(self) -> str:
+        """
+        Launch the monitor without waiting for it to start serving
+
+        :return: url the monitor serves on
+        """
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            self.command(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr,
+            preexec_fn=_prepare_child if sys.platform.startswith("linux") else None,
+        )
+        return self.url
+
+    def stop(self):
+        """
+        Stop the monitor, terminating it and killing it if it doesn't exit in time.
+        Warns with the end of its output if it exited with an error before
+        """
+        if self._process is None:
+            return
+
+        returncode = self._process.poll()
+        if returncode is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=_STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        elif returncode != 0:
+            self._stderr.seek(0)
+            output = self._stderr.read().decode(errors="replace")[-2000:]
+            _LOGGER.warning(
+                f"{self.__class__.__name__} exited with code {returncode}:\n{output}"
+            )
+        self._stderr.close()
+        self._process = None
+
+    def __enter__(self) -> "RunMonitor":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+@register_run_monitor("tensorboard")
+class TensorBoardMonitor(RunMonitor):
+    """
+    Serves the full TensorBoard UI of the run
+    """
+
+    def command(self) -> List[str]:
+        return [
+            sys.executable,
+            "-m",
+            "tensorboard.main",
+            "--logdir",
+            self.log_directory,
+            "--host",
+            self.host,
+            "--port",
+            str(self.port),
+            "--reload_interval",
+            str(self.reload_interval),
+        ]
+
+
+@register_run_monitor("metrics")
+class MetricsMonitor(RunMonitor):
+    """
+    Serves the latest value of each scalar in the training logs, as JSON at / and in
+    the Prometheus text exposition format at /metrics. Reads the logs at most once
+    per reload interval, on request
+    """
+
+    def command(self) -> List[str]:
+        # runs this file as a script, which only imports the standard library and
+        # tensorboard's log reader, rather than the sparsify.auto package
+        return [
+            sys.executable,
+            "-c",
+            "import runpy, sys; sys.argv = sys.argv[1:]; "
+            "runpy.run_path(sys.argv[0], run_name='__main__')",
+            os.path.abspath(__file__),
+            self.log_directory,
+            self.host,
+            str(self.port),
+            str(self.reload_interval),
+        ]
+
+
+@contextmanager
+def start_run_monitor(
+    log_directory: str, name: Optional[str] = None, **kwargs
+) -> Iterator[Optional[RunMonitor]]:
+    """
+    Context manager running a run monitor for its duration
+
+    :param log_directory: directory the training logs are written to
+    :param name: registered name of the monitor, or none to disable it. Defaults to
+        NM_AUTO_RUN_MONITOR if set, else tensorboard, or none on headless and CI runs
+    :param kwargs: extra arguments of the monitor, e.g. reload_interval
+    :return: the running monitor, or None if disabled
+    """
+    name = name or RUN_MONITOR or ("none" if is_headless() else "tensorboard")
+    if name.lower() == "none":
+        yield None
+        return
+    if name not in RUN_MONITOR_REGISTRY:
+        raise ValueError(
+            f"Unknown run monitor {name}, expected one of "
+            f"{list(RUN_MONITOR_REGISTRY)} or none"
+        )
+
+    with RUN_MONITOR_REGISTRY[name](log_directory, **kwargs) as monitor:
+        yield monitor
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def _prepare_child():
+    # runs in the child before exec: lower its priority and have the kernel
+    # terminate it along with its parent
+    os.nice(_NICENESS)
+    try:
+        import ctypes
+
+        ctypes.CDLL("libc.so.6", use_errno=True).prctl(
+            _PR_SET_PDEATHSIG, signal.SIGTERM
+        )
+    except Exception:
+        pass
+
+
+def _read_latest_scalars(log_directory: str) -> Dict[str, Dict[str, Any]]:
+    # imported here, as only the metrics monitor process reads the logs
+    from tensorboard.backend.event_processing.event_multiplexer import (
+        EventMultiplexer,
+    )
+
+    multiplexer = EventMultiplexer(size_guidance={"scalars": 1})
+    multiplexer.AddRunsFromDirectory(log_directory)
+    multiplexer.Reload()
+
+    latest = {}
+    for run, tags in multiplexer.Runs().items():
+        for tag in tags.get("scalars", []):
+            event = multiplexer.Scalars(run, tag)[-1]
+            latest.setdefault(run, {})[tag] = {
+                "step": event.step,
+                "value": event.value,
+                "wall_time": event.wall_time,
+            }
+    return latest
+
+
+def _format_prometheus_scalars(latest: Dict[str, Dict[str, Any]]) -> str:
+    metric_name = "sparsify_auto_training_scalar"
+    lines = [
+        f"# HELP {metric_name} Latest value of a scalar in the training logs",
+        f"# TYPE {metric_name} gauge",
+    ]
+    for run, scalars in latest.items():
+        for tag, scalar in scalars.items():
+            lines.append(
+                f'{metric_name}{{run="{_escape_label_value(run)}",'
+                f'tag="{_escape_label_value(tag)}"}} {scalar["value"]}'
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _serve_metrics(log_directory: str, host: str, port: int, reload_interval: float):
+    # entry point of the metrics monitor process, see MetricsMonitor.command
+    state = {"latest": {}, "loaded": -float("inf")}
+    lock = threading.Lock()
+
+    def _latest() -> Dict[str, Dict[str, Any]]:
+        with lock:
+            if time.monotonic() - state["loaded"] >= reload_interval:
+                state["latest"] = _read_latest_scalars(log_directory)
+                state["loaded"] = time.monotonic()
+            return state["latest"]
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") == "/metrics":
+                body = _format_prometheus_scalars(_latest()).encode()
+                content_type = "text/plain; version=0.0.4"
+            elif self.path in ("/", ""):
+                body = json.dumps(_latest()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    # serve_forever returns once shutdown is called from another thread
+    signal.signal(
+        signal.SIGTERM,
+        lambda *_: threading.Thread(target=server.shutdown, daemon=True).start(),
+    )
+    server.serve_forever()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    _serve_metrics(sys.argv[1], sys.argv[2], int(sys.argv[3]), float(sys.argv[4]))
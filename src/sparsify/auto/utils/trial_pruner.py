@@ -0,0 +1,152 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Asynchronous successive halving for stopping poor hyperparameter trials early
+"""
+import math
+import threading
+from typing import Dict, List, Optional
+
+
+__all__ = ["LOWER_IS_BETTER_METRICS", "is_higher_better", "SuccessiveHalvingPruner"]
+
+# objectives for which lower values are better, e.g. the latency and memory metrics
+# of sparsify.auto.utils.benchmark and the evaluation loss of the integrations
+LOWER_IS_BETTER_METRICS = [
+    "latency",
+    "latency_p90",
+    "file_size",
+    "memory_usage",
+    "loss",
+]
+
+
+def is_higher_better(objective_key: str) -> bool:
+    """
+    :param objective_key: name of the objective metric. Prefixed names, such as
+        `eval_loss` or the `{engine}_bs{batch_size}_c{cores}_latency` benchmark
+        scenario keys, are matched by their suffix
+    :return: False if lower values of the objective are better, True otherwise
+    """
+    name = objective_key.lower().split("/")[-1]
+    return not any(
+        name == metric or name.endswith(f"_{metric}")
+        for metric in LOWER_IS_BETTER_METRICS
+    )
+
+
+class SuccessiveHalvingPruner:
+    """
+    Asynchronous successive halving (ASHA) pruner. Rung k is reached after
+    `min_epochs * reduction_factor ** k` epochs of training. When a trial reaches a
+    rung, its objective value is compared against the values every other trial had
+    at that rung, and the trial is pruned unless it is in the top
+    `1 / reduction_factor` of them. Decisions are made as soon as a trial reports,
+    without waiting for the other trials of the rung to finish.
+
+    :param min_epochs: number of epochs at the first rung
+    :param reduction_factor: fraction of trials kept at each rung is
+        1 / reduction_factor
+    :param min_trials_per_rung: number of trials that must have reached a rung
+        before any trial is pruned at it
+    :param higher_is_better: True if higher objective values are better, as for
+        accuracy, False if lower values are, as for latency or loss. If not given,
+        derived from the objective key of each report, see `is_higher_better`
+    """
+
+    def __init__(
+        self,
+        min_epochs: float = 1.0,
+        reduction_factor: int = 3,
+        min_trials_per_rung: int = 3,
+        higher_is_better: Optional[bool] = None,
+    ):
+        if min_epochs <= 0:
+            raise ValueError(f"min_epochs must be positive, given {min_epochs}")
+        if reduction_factor < 2:
+            raise ValueError(
+                f"reduction_factor must be at least 2, given {reduction_factor}"
+            )
+        self.min_epochs = min_epochs
+        self.reduction_factor = reduction_factor
+        self.min_trials_per_rung = max(min_trials_per_rung, reduction_factor)
+        self.higher_is_better = higher_is_better
+
+        # rung -> trial index -> objective value when the trial reached the rung
+        self._rungs: Dict[int, Dict[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def rung_epochs(self, rung: int) -> float:
+        """
+        :param rung: rung index
+        :return: number of training epochs at which the rung is reached
+        """
+        return self.min_epochs * self.reduction_factor**rung
+
+    def rung_values(self, rung: int) -> Dict[int, float]:
+        """
+        :param rung: rung index
+        :return: objective values recorded at the rung, by trial index
+        """
+        with self._lock:
+            return dict(self._rungs.get(rung, {}))
+
+    def report(
+        self,
+        trial_idx: int,
+        epoch: float,
+        value: float,
+        objective_key: Optional[str] = None,
+    ) -> bool:
+        """
+        Record an intermediate objective value of a trial
+
+        :param trial_idx: index of the reporting trial
+        :param epoch: number of epochs the trial has trained for
+        :param value: objective value after `epoch` epochs
+        :param objective_key: name of the objective, to derive whether higher values
+            are better when the pruner was not given `higher_is_better`
+        :return: True if the trial should be stopped
+        """
+        if epoch < self.min_epochs:
+            return False
+        higher_is_better = self.higher_is_better
+        if higher_is_better is None:
+            higher_is_better = objective_key is None or is_higher_better(objective_key)
+
+        rung = int(
+            math.floor(math.log(epoch / self.min_epochs, self.reduction_factor) + 1e-9)
+        )
+        with self._lock:
+            # a trial that skipped rungs between reports is recorded at each of them
+            for current_rung in range(rung + 1):
+                values = self._rungs.setdefault(current_rung, {})
+                if trial_idx in values:
+                    continue
+                values[trial_idx] = value
+                if self._is_below_cutoff(
+                    list(values.values()), value, higher_is_better
+                ):
+                    return True
+        return False
+
+    def _is_below_cutoff(
+        self, values: List[float], value: float, higher_is_better: bool
+    ) -> bool:
+        if len(values) < self.min_trials_per_rung:
+            return False
+        num_kept = max(1, len(values) // self.reduction_factor)
+        cutoff = sorted(values, reverse=higher_is_better)[num_kept - 1]
+        return value < cutoff if higher_is_better else value > cutoff
@@ -0,0 +1,377 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for a content hashed index of local YOLO datasets, built once in parallel,
+updated only for changed files, and shared by all trials through the label caches
+yolov5 reads before scanning a dataset itself
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+import yaml
+
+
+__all__ = [
+    "YOLO_DATASET_INDEX_ENABLED",
+    "YOLO_DATASET_INDEX_WORKERS",
+    "IMAGE_FORMATS",
+    "get_yolo_dataset_index_path",
+    "index_yolo_dataset",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+YOLO_DATASET_INDEX_ENABLED = not os.environ.get("NM_AUTO_DISABLE_YOLO_DATASET_INDEX")
+# threads scanning images and labels, defaults to the ThreadPoolExecutor default
+YOLO_DATASET_INDEX_WORKERS = (
+    int(os.environ.get("NM_AUTO_YOLO_DATASET_INDEX_WORKERS", 0)) or None
+)
+# image suffixes yolov5 loads
+IMAGE_FORMATS = ["bmp", "dng", "jpeg", "jpg", "mpo", "png", "tif", "tiff", "webp"]
+
+_INDEX_VERSION = 1
+_SPLITS = ["train", "val", "test"]
+_EXIF_ORIENTATION = 274
+_MIN_IMAGE_SIZE = 10
+
+
+def get_yolo_dataset_index_path(data_yaml_path: str) -> str:
+    """
+    :param data_yaml_path: path to a local yolov5 data yaml, e.g. data_local.yaml
+    :return: path of the index of its dataset, next to the yaml
+    """
+    return os.path.splitext(data_yaml_path)[0] + "_index.json"
+
+
+def index_yolo_dataset(
+    data_yaml_path: str, max_workers: Optional[int] = YOLO_DATASET_INDEX_WORKERS
+) -> Optional[Dict[str, Any]]:
+    """
+    Build or update the index of the images and labels of a local yolov5 dataset.
+    Each image is recorded with its size, checksum, EXIF corrected shape, label
+    count and labels, and flagged if it or its labels are corrupt, following the
+    checks of yolov5. Only images whose image or label file changed in size or
+    modification time since the last index are rescanned. The label caches yolov5
+    reads before scanning a dataset are then written from the index, so trials
+    skip the scan
+
+    :param data_yaml_path: path to a yolov5 data yaml. Datasets that are not local
+        directories, e.g. the names of public datasets, are not indexed
+    :param max_workers: number of threads scanning images and labels
+    :return: the index, None if the dataset is not local
+    """
+    if not os.path.isfile(data_yaml_path):
+        return None
+    with open(data_yaml_path) as fp:
+        data = yaml.safe_load(fp) or {}
+    root = Path(data.get("path") or os.path.dirname(data_yaml_path)).resolve()
+
+    split_directories = {}
+    for split in _SPLITS:
+        entries = data.get(split) or []
+        for entry in entries if isinstance(entries, list) else [entries]:
+            directory = (root / entry).resolve()
+            if directory.is_dir():
+                split_directories.setdefault(split, []).append(str(directory))
+    if not split_directories:
+        return None
+
+    index_path = get_yolo_dataset_index_path(data_yaml_path)
+    previous = _load_index(index_path)
+
+    image_files = sorted(
+        {
+            image_file
+            for directories in split_directories.values()
+            for directory in directories
+            for image_file in _list_images(directory)
+        }
+    )
+    entries = {}
+    rescan = []
+    for image_file in image_files:
+        key = os.path.relpath(image_file, root)
+        entry = previous.get(key)
+        if (
+            entry
+            and _unchanged(entry["image"], image_file)
+            and _unchanged(entry["label"], _image_to_label_path(image_file))
+        ):
+            entries[key] = entry
+        else:
+            rescan.append((key, image_file))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for key, entry in zip(
+            [key for key, _ in rescan],
+            executor.map(_scan_image, [image_file for _, image_file in rescan]),
+        ):
+            entries[key] = entry
+
+    index = {
+        "version": _INDEX_VERSION,
+        "fingerprint": _fingerprint(entries),
+        "splits": {
+            split: [os.path.relpath(directory, root) for directory in directories]
+            for split, directories in split_directories.items()
+        },
+        "images": dict(sorted(entries.items())),
+    }
+    num_corrupt = sum(1 for entry in entries.values() if entry["corrupt"])
+    _LOGGER.info(
+        f"Indexed {len(entries)} images of {root}, rescanned {len(rescan)}"
+        + (f", {num_corrupt} corrupt" if num_corrupt else "")
+    )
+
+    if rescan or len(entries) != len(previous):
+        _atomic_write(index_path, json.dumps(index).encode())
+    for directories in split_directories.values():
+        for directory in directories:
+            _write_yolov5_label_cache(directory, root, entries)
+    return index
+
+
+def _load_index(index_path: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(index_path) as fp:
+            index = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    return index.get("images", {}) if index.get("version") == _INDEX_VERSION else {}
+
+
+def _list_images(directory: str) -> List[str]:
+    # matches the image files yolov5 loads from a directory
+    return [
+        path.replace("/", os.sep)
+        for path in glob.glob(os.path.join(directory, "**", "*.*"), recursive=True)
+        if path.split(".")[-1].lower() in IMAGE_FORMATS
+    ]
+
+
+def _image_to_label_path(image_file: str) -> str:
+    images, labels = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    return labels.join(image_file.rsplit(images, 1)).rsplit(".", 1)[0] + ".txt"
+
+
+def _file_stats(path: str, checksum: bool = False) -> Optional[Dict[str, Any]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    stats = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if checksum:
+        with open(path, "rb") as fp:
+            stats["sha1"] = hashlib.sha1(fp.read()).hexdigest()
+    return stats
+
+
+def _unchanged(stats: Optional[Dict[str, Any]], path: str) -> bool:
+    current = _file_stats(path)
+    if stats is None or current is None:
+        return stats is None and current is None
+    return (stats["size"], stats["mtime_ns"]) == (current["size"], current["mtime_ns"])
+
+
+def _scan_image(image_file: str) -> Dict[str, Any]:
+    # mirrors the image and label checks of yolov5's verify_image_label
+    label_file = _image_to_label_path(image_file)
+    entry = {
+        "image": None,
+        "label": None,
+        "shape": None,
+        "num_labels": 0,
+        "labels": [],
+        "segments": [],
+        "missing_label": False,
+        "corrupt": None,
+    }
+    try:
+        entry["image"], entry["shape"] = _scan_image_file(image_file)
+        entry["label"] = _file_stats(label_file, checksum=True)
+        if entry["label"] is None:
+            entry["missing_label"] = True
+        else:
+            entry["labels"], entry["segments"] = _read_labels(label_file)
+            entry["num_labels"] = len(entry["labels"])
+    except Exception as err:
+        entry["corrupt"] = f"{type(err).__name__}: {err}"
+        entry["labels"], entry["segments"], entry["num_labels"] = [], [], 0
+    # stats are recorded even for corrupt files, so they are only rescanned once
+    # they change
+    for key, path in (("image", image_file), ("label", label_file)):
+        stats = _file_stats(path)
+        entry[key] = (
+            {**stats, "sha1": (entry[key] or {}).get("sha1")} if stats else None
+        )
+    return entry
+
+
+def _scan_image_file(image_file: str) -> Tuple[Dict[str, Any], List[int]]:
+    from io import BytesIO
+
+    from PIL import Image
+
+    with open(image_file, "rb") as fp:
+        content = fp.read()
+    with Image.open(BytesIO(content)) as image:
+        image.verify()
+        image_format = (image.format or "").lower()
+        shape = list(image.size)
+        try:
+            orientation = image.getexif().get(_EXIF_ORIENTATION)
+        except Exception:
+            orientation = None
+    if orientation in (6, 8):
+        shape = shape[::-1]
+    if min(shape) < _MIN_IMAGE_SIZE:
+        raise ValueError(f"image size {shape} < {_MIN_IMAGE_SIZE} pixels")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"invalid image format {image_format}")
+    return {"sha1": hashlib.sha1(content).hexdigest()}, shape
+
+
+def _read_labels(label_file: str) -> Tuple[List[List[float]], List[List[float]]]:
+    with open(label_file) as fp:
+        rows = [line.split() for line in fp.read().strip().splitlines() if line]
+    segments = []
+    if any(len(row) > 6 for row in rows):
+        # polygon labels are converted to the boxes that bound them
+        classes = numpy.array([row[0] for row in rows], dtype=numpy.float32)
+        segments = [
+            numpy.array(row[1:], dtype=numpy.float32).reshape(-1, 2) for row in rows
+        ]
+        boxes = [
+            [
+                (segment[:, 0].min() + segment[:, 0].max()) / 2,
+                (segment[:, 1].min() + segment[:, 1].max()) / 2,
+                segment[:, 0].max() - segment[:, 0].min(),
+                segment[:, 1].max() - segment[:, 1].min(),
+            ]
+            for segment in segments
+        ]
+        labels = numpy.concatenate(
+            (classes.reshape(-1, 1), numpy.array(boxes, dtype=numpy.float32)), 1
+        )
+    else:
+        labels = numpy.array(rows, dtype=numpy.float32)
+
+    if len(labels) == 0:
+        return [], []
+    if labels.ndim != 2 or labels.shape[1] != 5:
+        raise ValueError("labels require 5 columns")
+    if (labels < 0).any():
+        raise ValueError("negative label values")
+    if (labels[:, 1:] > 1).any():
+        raise ValueError("non-normalized or out of bounds coordinates")
+    # duplicate rows are dropped, as yolov5 does
+    _, unique = numpy.unique(labels, axis=0, return_index=True)
+    unique = sorted(unique)
+    return (
+        labels[unique].tolist(),
+        [segments[idx].tolist() for idx in unique] if segments else [],
+    )
+
+
+def _fingerprint(entries: Dict[str, Dict[str, Any]]) -> str:
+    digest = hashlib.sha1()
+    for key in sorted(entries):
+        entry = entries[key]
+        digest.update(key.encode())
+        for stats in (entry["image"], entry["label"]):
+            digest.update(((stats or {}).get("sha1") or "-").encode())
+    return digest.hexdigest()
+
+
+def _atomic_write(path: str, content: bytes):
+    # concurrent trials may index the same dataset, replace the file in one step
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as fp:
+        fp.write(content)
+    os.replace(temporary_path, path)
+
+
+def _write_yolov5_label_cache(
+    directory: str, root: Path, entries: Dict[str, Dict[str, Any]]
+):
+    # writes the label cache yolov5 loads instead of scanning the dataset, keyed
+    # by yolov5's own hash and cache version so it is ignored if they change
+    try:
+        from yolov5.utils.dataloaders import LoadImagesAndLabels, get_hash
+    except Exception:
+        try:
+            # yolov5 releases before 6.2
+            from yolov5.utils.datasets import LoadImagesAndLabels, get_hash
+        except Exception:
+            return
+
+    image_files = sorted(_list_images(directory))
+    if not image_files:
+        return
+    label_files = [_image_to_label_path(image_file) for image_file in image_files]
+    cache_path = Path(label_files[0]).parent.with_suffix(".cache")
+    cache_hash = get_hash(label_files + image_files)
+    try:
+        cache = numpy.load(str(cache_path), allow_pickle=True).item()
+        if (
+            cache["version"] == LoadImagesAndLabels.cache_version
+            and cache["hash"] == cache_hash
+        ):
+            return
+    except Exception:
+        pass
+
+    cache = {}
+    found, missing, empty, corrupt = 0, 0, 0, 0
+    messages = []
+    for image_file in image_files:
+        entry = entries.get(os.path.relpath(image_file, root))
+        if entry is None:
+            # added since the dataset was indexed
+            return
+        if entry["corrupt"]:
+            corrupt += 1
+            messages.append(f"WARNING: {image_file}: ignoring corrupt image/label")
+            continue
+        missing += entry["missing_label"]
+        found += not entry["missing_label"]
+        empty += not entry["missing_label"] and not entry["num_labels"]
+        cache[image_file] = [
+            numpy.array(entry["labels"], dtype=numpy.float32).reshape(-1, 5),
+            tuple(entry["shape"]),
+            [
+                numpy.array(segment, dtype=numpy.float32)
+                for segment in entry["segments"]
+            ],
+        ]
+    cache["hash"] = cache_hash
+    cache["results"] = found, missing, empty, corrupt, len(image_files)
+    cache["msgs"] = messages
+    cache["version"] = LoadImagesAndLabels.cache_version
+
+    try:
+        temporary_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.npy"
+        numpy.save(temporary_path, cache)
+        os.replace(temporary_path, cache_path)
+    except OSError as err:
+        _LOGGER.warning(f"Could not write yolov5 label cache {cache_path}: {err}")
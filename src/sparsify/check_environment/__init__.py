@@ -12,9 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-# flake8: noqa
-# isort: skip_file
+from sparsify.utils.lazy import lazy_exports
 
-from .gpu_device import *
-from .ort_health import *
-from .pathway_checks import *
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        "gpu_device": ["check_for_gpu"],
+        "ort_health": ["check_ort_health"],
+        "pathway_checks": ["one_shot_checks", "auto_checks"],
+    },
+)
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 
-from sparsify.check_environment import check_for_gpu, check_ort_health
+from sparsify.check_environment.gpu_device import check_for_gpu
 
 
 __all__ = ["one_shot_checks", "auto_checks"]
@@ -23,6 +23,9 @@ def one_shot_checks():
     """
     Check environment for compatibility with one-shot sparsification
     """
+    # imported on use, as it authenticates and imports sparsifyml and the engines
+    from sparsify.check_environment.ort_health import check_ort_health
+
     check_for_gpu()
     check_ort_health()
 
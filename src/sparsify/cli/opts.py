@@ -30,13 +30,23 @@ __all__ = [
     "EVAL_METRIC",
     "TRAIN_SAMPLES",
     "VAL_SAMPLES",
+    "CALIBRATION_SAMPLING",
     "DEPLOY_HARDWARE",
     "DEPLOY_ENGINE",
     "DEPLOY_SCENARIO",
     "RECIPE",
     "RECIPE_ARGS",
     "OPTIM_LEVEL",
+    "NNODES",
+    "NPROC_PER_NODE",
+    "NODE_RANK",
+    "RDZV_BACKEND",
+    "RDZV_ENDPOINT",
+    "RDZV_ID",
+    "MAX_RESTARTS",
+    "add_calibration_opts",
     "add_data_opts",
+    "add_distributed_opts",
     "add_deploy_opts",
     "add_info_opts",
     "add_model_opts",
@@ -135,6 +145,16 @@ VAL_SAMPLES = click.option(
         "None means the entire dataset."
     ),
 )
+CALIBRATION_SAMPLING = click.option(
+    "--calibration-sampling",
+    default="random",
+    type=click.Choice(["random", "stratified"]),
+    help=(
+        "How --train-samples are drawn from the dataset for calibration. "
+        "stratified draws from each group of samples with the same input shapes "
+        "in proportion to its size"
+    ),
+)
 
 DEPLOY_HARDWARE = click.option("--deploy-hardware", default=None, type=str)
 DEPLOY_ENGINE = click.option(
@@ -157,6 +177,102 @@ OPTIM_LEVEL = click.option(
 )
 TRAIN_KWARGS = click.option("--train-kwargs", default=None, type=str)
 
+NNODES = click.option(
+    "--nnodes",
+    default="1",
+    type=str,
+    help=(
+        "Number of nodes to train on, or MIN_NODES:MAX_NODES for an elastic run that "
+        "continues as long as MIN_NODES remain. Default 1"
+    ),
+)
+NPROC_PER_NODE = click.option(
+    "--nproc-per-node",
+    default="auto",
+    type=str,
+    help=(
+        "Number of training processes per node. Default auto, one per GPU, or one "
+        "per NUMA node on CPU"
+    ),
+)
+NODE_RANK = click.option(
+    "--node-rank",
+    default=0,
+    type=int,
+    help=(
+        "Rank of this node. Fixes the node order for the static rendezvous backend, "
+        "with c10d torch assigns node ranks itself. The node that exports and "
+        "deploys the trained model is the one whose worker held global rank 0, "
+        "recorded in the primary node marker of the run. Default 0"
+    ),
+)
+RDZV_BACKEND = click.option(
+    "--rdzv-backend",
+    default="c10d",
+    type=click.Choice(["c10d", "static"]),
+    help="Rendezvous backend of multi-node runs. Default c10d",
+)
+RDZV_ENDPOINT = click.option(
+    "--rdzv-endpoint",
+    default=None,
+    type=str,
+    help="HOST:PORT of the rendezvous, shared by all nodes of a multi-node run",
+)
+RDZV_ID = click.option(
+    "--rdzv-id",
+    default="sparsify",
+    type=str,
+    help="Id of the run, shared by all nodes of a multi-node run",
+)
+MAX_RESTARTS = click.option(
+    "--max-restarts",
+    default=0,
+    type=int,
+    help=(
+        "Number of times to restart the workers of all nodes with a new rendezvous "
+        "after a worker or node fails. Default 0"
+    ),
+)
+NUM_TRIALS = click.option(
+    "--num-trials",
+    default=1,
+    type=int,
+    help=(
+        "Number of hyperparameter trials to train. Trials run concurrently on "
+        "disjoint devices or CPU sockets of this node, and the best one is deployed. "
+        "Default 1"
+    ),
+)
+DEVICES_PER_TRIAL = click.option(
+    "--devices-per-trial",
+    default=1,
+    type=int,
+    help="Number of GPUs of each trial, when tuning over several trials. Default 1",
+)
+CORES_PER_TRIAL = click.option(
+    "--cores-per-trial",
+    default=None,
+    type=int,
+    help=(
+        "Number of CPU cores of each trial, when tuning over several trials on CPU. "
+        "Defaults to one CPU socket"
+    ),
+)
+MAX_CONCURRENT_TRIALS = click.option(
+    "--max-concurrent-trials",
+    default=None,
+    type=int,
+    help="Maximum number of trials to run at once. Defaults to one per device slot",
+)
+PRUNE_TRIALS = click.option(
+    "--prune-trials/--no-prune-trials",
+    default=False,
+    help=(
+        "Stop trials early when their evaluation metrics fall behind the other "
+        "trials. Default off"
+    ),
+)
+
 
 def add_info_opts(*, require_known_use_case=True):
     use_case = click.option(
@@ -199,6 +315,11 @@ def add_data_opts(f):
     return f
 
 
+def add_calibration_opts(f):
+    f = CALIBRATION_SAMPLING(f)
+    return f
+
+
 def add_deploy_opts(f):
     for fn in [DEPLOY_SCENARIO, DEPLOY_ENGINE, DEPLOY_HARDWARE]:
         f = fn(f)
@@ -218,3 +339,29 @@ def add_optim_opts(f):
 def add_kwarg_opts(f):
     f = TRAIN_KWARGS(f)
     return f
+
+
+def add_distributed_opts(f):
+    for fn in [
+        MAX_RESTARTS,
+        RDZV_ID,
+        RDZV_ENDPOINT,
+        RDZV_BACKEND,
+        NODE_RANK,
+        NPROC_PER_NODE,
+        NNODES,
+    ]:
+        f = fn(f)
+    return f
+
+
+def add_tuning_opts(f):
+    for fn in [
+        PRUNE_TRIALS,
+        MAX_CONCURRENT_TRIALS,
+        CORES_PER_TRIAL,
+        DEVICES_PER_TRIAL,
+        NUM_TRIALS,
+    ]:
+        f = fn(f)
+    return f
@@ -17,8 +17,6 @@ import json
 from pathlib import Path
 
 import click
-from sparsezoo import Model
-from sparsify.check_environment import auto_checks, one_shot_checks
 from sparsify.cli import opts
 
 
@@ -37,6 +35,7 @@ def main():
 @opts.add_info_opts(require_known_use_case=False)
 @opts.add_model_opts(require_model=True)
 @opts.add_data_opts
+@opts.add_calibration_opts
 @opts.add_deploy_opts
 @opts.add_optim_opts
 def one_shot(**kwargs):
@@ -45,19 +44,29 @@ def one_shot(**kwargs):
     """
     kwargs["optim_level"] = _validate_optim_level(kwargs.get("optim_level"))
 
+    # heavy imports are deferred so --help and argument validation return quickly
+    from sparsify.check_environment import one_shot_checks
+
     # raises exception if sparsifyml not installed
-    from sparsify.one_shot import one_shot
+    from sparsify.one_shot import get_calibration_dataset, one_shot
 
     one_shot_checks()
 
+    # sampled once and reused by runs at other optim levels
+    dataset_dir, num_samples = get_calibration_dataset(
+        kwargs["data"],
+        kwargs["train_samples"],
+        sampling=kwargs["calibration_sampling"],
+    )
+
     recipe_args = kwargs.get("recipe_args")
     if isinstance(recipe_args, str):
         recipe_args = json.loads(recipe_args)
 
     one_shot.one_shot(
         model=Path(_maybe_unwrap_zoo_stub(kwargs["model"])),
-        dataset_dir=Path(kwargs["data"]),
-        num_samples=kwargs["train_samples"] or None,
+        dataset_dir=dataset_dir,
+        num_samples=num_samples or None,
         deploy_dir=Path(kwargs["working_dir"]),
         eval_metric=kwargs["eval_metric"],
         optim_level=kwargs["optim_level"],
@@ -74,6 +83,8 @@ def one_shot(**kwargs):
 @opts.add_deploy_opts
 @opts.add_optim_opts
 @opts.add_kwarg_opts
+@opts.add_distributed_opts
+@opts.add_tuning_opts
 def sparse_transfer(**kwargs):
     """
     Run sparse transfer learning for a use case against a supported task and model
@@ -81,6 +92,7 @@ def sparse_transfer(**kwargs):
     kwargs["optim_level"] = _validate_optim_level(kwargs.get("optim_level"))
 
     from sparsify import auto
+    from sparsify.check_environment import auto_checks
 
     auto_checks()
 
@@ -95,6 +107,8 @@ def sparse_transfer(**kwargs):
 @opts.add_deploy_opts
 @opts.add_optim_opts
 @opts.add_kwarg_opts
+@opts.add_distributed_opts
+@opts.add_tuning_opts
 def training_aware(**kwargs):
     """
     Run training aware sparsification for a use case against a supported task and model
@@ -102,6 +116,7 @@ def training_aware(**kwargs):
     kwargs["optim_level"] = _validate_optim_level(kwargs.get("optim_level"))
 
     from sparsify import auto
+    from sparsify.check_environment import auto_checks
 
     auto_checks()
 
@@ -133,6 +148,25 @@ def _parse_run_args_to_auto(sparse_transfer: bool, **kwargs):
         distill_teacher=kwargs["teacher"] or "off",
         optimizing_metric=[kwargs["eval_metric"]],
         kwargs=train_kwargs,
+        distributed={
+            key: kwargs[key]
+            for key in [
+                "nnodes",
+                "nproc_per_node",
+                "node_rank",
+                "rdzv_backend",
+                "rdzv_endpoint",
+                "rdzv_id",
+                "max_restarts",
+            ]
+        },
+        tuning={
+            "num_trials": kwargs["num_trials"],
+            "devices_per_trial": kwargs["devices_per_trial"],
+            "cores_per_trial": kwargs["cores_per_trial"],
+            "max_concurrent_trials": kwargs["max_concurrent_trials"],
+            "prune": kwargs["prune_trials"],
+        },
         run_mode="sparse_transfer" if sparse_transfer else "training_aware",
     )
 
@@ -159,7 +193,9 @@ def _validate_optim_level(optim_level: float) -> float:
 
 def _maybe_unwrap_zoo_stub(model_path: str) -> str:
     if model_path.startswith("zoo:"):
-        return Model(model_path).onnx_model.path
+        from sparsify.utils import get_zoo_onnx_model_path
+
+        return get_zoo_onnx_model_path(model_path)
     return model_path
 
 
@@ -18,4 +18,5 @@ Interface and utilities for sparsify.create
 
 # flake8: noqa
 from .api import *
+from .recipe_cache import *
 from .schemas import *
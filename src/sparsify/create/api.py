@@ -23,8 +23,8 @@ import torch
 from torch.nn import Module
 
 from sparseml.pytorch.optim import ScheduledModifierManager
+from sparsify.create.recipe_cache import compile_recipe
 from sparsify.create.schemas import RecipeVariables
-from sparsifyml.create import create_recipe
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -76,10 +76,8 @@ def initialize(
         f"[sparsify] Creating recipe with pruning={pruning}, "
         f"quantization={quantization}, distilation={distillation}"
     )
-    if pruning in ["transfer", "sparse-transfer"]:
-        pruning = "constant"
-    recipe_variables = recipe_variables or RecipeVariables()  # get defaults
-    recipe = create_recipe(
+    # compiled once per model and options, shared by ranks and repeated runs
+    recipe = compile_recipe(
         model=model,
         pruning=pruning,
         quantization=quantization,
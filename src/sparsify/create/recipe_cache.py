@@ -0,0 +1,183 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cache of the recipes created for sparsify.create, shared by the ranks of a run and
+by later runs of the same model and recipe options
+"""
+
+import hashlib
+import json
+import logging
+import os
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import torch
+from torch.nn import Module
+
+from sparseml.pytorch.optim import ScheduledModifierManager
+from sparsify.create.schemas import RecipeVariables
+from sparsify.utils import file_lock, get_sparsify_cache_path
+from sparsifyml.create import create_recipe
+
+
+__all__ = [
+    "RECIPE_CACHE_ENABLED",
+    "get_recipe_fingerprint",
+    "compile_recipe",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+RECIPE_CACHE_ENABLED = not os.environ.get("SPARSIFY_DISABLE_RECIPE_CACHE")
+
+_CACHE_DIR_NAME = "recipes"
+_CACHE_VERSION = 2
+# compiled recipes of this process by fingerprint
+_COMPILED_RECIPES: Dict[str, str] = {}
+
+
+def get_recipe_fingerprint(
+    model: Module,
+    pruning: Union[str, bool, None] = True,
+    quantization: Union[bool, str] = True,
+    lr: str = "linear",
+    distillation: bool = False,
+    recipe_variables: Union[RecipeVariables, Dict[str, Any], None] = None,
+) -> str:
+    """
+    :param model: PyTorch Module the recipe is created for
+    :param pruning: pruning algorithm of the recipe, see sparsify.create.initialize
+    :param quantization: True if the recipe quantizes the model
+    :param lr: learning rate schedule function of the recipe
+    :param distillation: True if the recipe distills the model
+    :param recipe_variables: variables overriding the recipe defaults
+    :return: fingerprint of the recipe created for the arguments, from the names,
+        types and parameter shapes of the modules of the model, the recipe options
+        and the installed sparsifyml version. Recipes holding the sparsity of the
+        model constant, for sparse transfer, also key on the fraction of zeros of
+        each parameter, rounded to 2 decimals
+    """
+    if isinstance(recipe_variables, RecipeVariables):
+        recipe_variables = recipe_variables.dict()
+    architecture = [
+        [name, module.__class__.__name__] for name, module in model.named_modules()
+    ]
+    tensors = [
+        [name, list(tensor.shape), str(tensor.dtype)]
+        for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+    ]
+    key = {
+        "version": _CACHE_VERSION,
+        "sparsifyml": _sparsifyml_version(),
+        "architecture": architecture,
+        "tensors": tensors,
+        "pruning": pruning,
+        "quantization": quantization,
+        "lr": lr,
+        "distillation": distillation,
+        "recipe_variables": recipe_variables or RecipeVariables().dict(),
+    }
+    if pruning in ["constant", "transfer", "sparse-transfer"]:
+        key["sparsity"] = _sparsity_signature(model)
+    return hashlib.sha256(
+        json.dumps(key, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def compile_recipe(
+    model: Module,
+    pruning: Union[str, bool, None] = True,
+    quantization: Union[bool, str] = True,
+    lr: str = "linear",
+    distillation: bool = False,
+    recipe_variables: Union[RecipeVariables, Dict[str, Any], None] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> str:
+    """
+    Create the recipe of a model with sparsifyml and compile it with SparseML into
+    the YAML of its manager, with all recipe variables evaluated. Compiled recipes
+    are cached on disk by their fingerprint, so the ranks of a run and later runs
+    of the same model and options only load them. Call ahead of training, e.g.
+    before launching distributed workers, to pre-warm the cache
+
+    :param model: PyTorch Module to create the recipe for
+    :param pruning: pruning algorithm of the recipe, see sparsify.create.initialize
+    :param quantization: True if the recipe quantizes the model
+    :param lr: learning rate schedule function of the recipe
+    :param distillation: True if the recipe distills the model
+    :param recipe_variables: variables overriding the recipe defaults
+    :param cache_dir: directory of the cache. Defaults to the recipes directory of
+        the sparsify cache
+    :return: YAML of the compiled recipe, to create a manager from with
+        `ScheduledModifierManager.from_yaml`
+    """
+    if pruning in ["transfer", "sparse-transfer"]:
+        pruning = "constant"
+    recipe_variables = recipe_variables or RecipeVariables()  # get defaults
+    recipe_args = dict(
+        pruning=pruning,
+        quantization=quantization,
+        distillation=distillation,
+        lr=lr,
+        recipe_variables=recipe_variables,
+    )
+    if not RECIPE_CACHE_ENABLED:
+        return _compile(model, recipe_args)
+
+    fingerprint = get_recipe_fingerprint(model, **recipe_args)
+    if fingerprint in _COMPILED_RECIPES:
+        return _COMPILED_RECIPES[fingerprint]
+
+    cache_dir = Path(cache_dir or get_sparsify_cache_path() / _CACHE_DIR_NAME)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    recipe_path = cache_dir / f"{fingerprint}.yaml"
+    # the first rank compiles the recipe, the others wait and load it
+    with file_lock(recipe_path.with_suffix(".lock")):
+        if recipe_path.is_file():
+            _LOGGER.info(f"[sparsify] Loading cached recipe {recipe_path}")
+            recipe = recipe_path.read_text()
+        else:
+            recipe = _compile(model, recipe_args)
+            tmp_path = recipe_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(recipe)
+            os.replace(tmp_path, recipe_path)
+
+    _COMPILED_RECIPES[fingerprint] = recipe
+    return recipe
+
+
+def _compile(model: Module, recipe_args: Dict[str, Any]) -> str:
+    recipe = create_recipe(model=model, **recipe_args)
+    return str(ScheduledModifierManager.from_yaml(recipe))
+
+
+def _sparsity_signature(model: Module):
+    # constant pruning recipes mask the parameters that are already sparse, so the
+    # same architecture with different sparsity needs its own recipe
+    with torch.no_grad():
+        return [
+            [name, round(float((param == 0).sum()) / param.numel(), 2)]
+            for name, param in model.named_parameters()
+            if param.numel()
+        ]
+
+
+def _sparsifyml_version() -> Optional[str]:
+    try:
+        return version("sparsifyml")
+    except PackageNotFoundError:
+        return None
@@ -27,6 +27,7 @@ Options:
 """
 
 import importlib
+import importlib.metadata
 import json
 import logging
 import subprocess
@@ -34,13 +35,16 @@ import sys
 from types import ModuleType
 from typing import Optional
 
+import requests
+
 import click
-from sparsezoo.analyze.cli import CONTEXT_SETTINGS
 from sparsify.utils import (
     credentials_exists,
     get_access_token,
     get_authenticated_pypi_url,
     get_sparsify_credentials_path,
+    is_offline_mode,
+    load_cached_access_token,
     overwrite_credentials,
     set_log_level,
 )
@@ -56,9 +60,16 @@ __all__ = [
 
 
 _LOGGER = logging.getLogger(__name__)
+# matches the sparsezoo cli context settings, without importing sparsezoo
+_CONTEXT_SETTINGS = dict(
+    token_normalize_func=lambda x: x.replace("-", "_"),
+    show_default=True,
+    ignore_unknown_options=True,
+    allow_extra_args=True,
+)
 
 
-@click.command(context_settings=CONTEXT_SETTINGS)
+@click.command(context_settings=_CONTEXT_SETTINGS)
 @click.argument("api-key", type=str, required=True)
 @click.version_option(version=version_major_minor)
 @click.option("--debug/--no-debug", default=False, hidden=True)
@@ -98,6 +109,13 @@ def install_sparsifyml(access_token: str) -> None:
 
     :param access_token: The access token to use for authentication
     """
+    if _sparsifyml_version_matches():
+        _LOGGER.debug(
+            f"sparsifyml version {version_major_minor} is already installed, "
+            "skipping installation from neuralmagic pypi server"
+        )
+        return
+
     sparsifyml_spec = importlib.util.find_spec("sparsifyml")
 
     try:
@@ -149,10 +167,17 @@ def import_sparsifyml_authenticated() -> Optional[ModuleType]:
     return sparsifyml
 
 
-def authenticate() -> None:
+def authenticate(offline: Optional[bool] = None) -> None:
     """
     Authenticates with sparsify server using the credentials stored on disk.
 
+    A cached access token is used while it is valid, and the sparsifyml install is
+    only checked against the package metadata, so repeated calls, e.g. from every
+    DDP worker, make no network requests. In offline mode, or if the server can not
+    be reached, the installed sparsifyml is used as long as its version matches
+
+    :param offline: True to authenticate without any network requests. Defaults to
+        the SPARSIFY_OFFLINE environment variable
     :raises SparsifyLoginRequired: if no valid credentials are found
     """
     if not credentials_exists():
@@ -168,7 +193,47 @@ def authenticate() -> None:
             "No valid sparsify credentials found. Please run `sparsify.login`"
         )
 
-    login(api_key=credentials["api_key"])
+    offline = is_offline_mode() if offline is None else offline
+    access_token = load_cached_access_token(credentials["api_key"])
+
+    if access_token is None and not offline:
+        try:
+            access_token = get_access_token(credentials["api_key"])
+        except (requests.ConnectionError, requests.Timeout) as network_error:
+            if not _sparsifyml_version_matches():
+                raise
+            _LOGGER.warning(
+                "Unable to reach the sparsify authentication server, continuing "
+                f"offline with the installed sparsifyml. {network_error}"
+            )
+            return
+
+    # offline, a cached token is never used to install sparsifyml
+    if access_token is None or offline:
+        if not _sparsifyml_version_matches():
+            raise RuntimeError(
+                f"sparsifyml version {version_major_minor} must be installed to run "
+                "sparsify offline. Run `sparsify.login` with network access first"
+            )
+        return
+
+    install_sparsifyml(access_token)
+
+
+def _sparsifyml_version_matches() -> bool:
+    """
+    :return: True if the installed sparsifyml distribution matches the major and
+        minor version of sparsify. Reads the package metadata, without importing
+    """
+    for package_name in ["sparsifyml", "sparsifyml-nightly"]:
+        try:
+            installed_version = importlib.metadata.version(package_name)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+        installed_major_minor = ".".join(installed_version.split(".")[:2])
+        if installed_major_minor == version_major_minor:
+            return True
+    return False
 
 
 if __name__ == "__main__":
@@ -16,6 +16,19 @@
 Module for functionality related to ONNX one shot sparsification
 """
 
-# flake8: noqa
-# isort: skip_file
-from .api import *
+from sparsify.utils.lazy import lazy_exports
+
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        "api": ["one_shot"],
+        "calibration": [
+            "CALIBRATION_CACHE_ENABLED",
+            "SAMPLING_STRATEGIES",
+            "CalibrationStore",
+            "prepare_calibration_data",
+            "get_calibration_dataset",
+        ],
+    },
+)
@@ -16,9 +16,9 @@
 import argparse
 from pathlib import Path
 
-from sparsezoo import Model
 from sparsify.login import import_sparsifyml_authenticated
-from sparsify.utils import constants
+from sparsify.one_shot.calibration import SAMPLING_STRATEGIES, get_calibration_dataset
+from sparsify.utils import constants, get_zoo_onnx_model_path
 
 
 sparsifyml = import_sparsifyml_authenticated()
@@ -78,6 +78,16 @@ def main():
             "-1 means the entire dataset."
         ),
     )
+    data.add_argument(
+        "--calibration-sampling",
+        default=SAMPLING_STRATEGIES[0],
+        choices=SAMPLING_STRATEGIES,
+        help=(
+            "How --num-samples are drawn from the dataset for calibration. "
+            "stratified draws from each group of samples with the same input shapes "
+            "in proportion to its size"
+        ),
+    )
     data.add_argument(
         "--eval-metric",
         default="kl",
@@ -98,11 +108,15 @@ def main():
 
     args = parser.parse_args()
 
+    # sampled once and reused by runs at other optim levels
+    dataset_dir, num_samples = get_calibration_dataset(
+        args.dataset, args.num_samples, sampling=args.calibration_sampling
+    )
     one_shot.one_shot(
         task=args.task,
         model_file=Path(_maybe_unwrap_zoo_stub(args.model)),
-        dataset_dir=Path(args.dataset),
-        num_samples=args.num_samples,
+        dataset_dir=dataset_dir,
+        num_samples=num_samples if num_samples is not None else -1,
         deploy_dir=Path(args.deploy_dir),
         eval_metric=args.eval_metric,
         optim_level=args.optim_level,
@@ -112,7 +126,7 @@ def main():
 
 def _maybe_unwrap_zoo_stub(model_path: str) -> str:
     if model_path.startswith("zoo:"):
-        return Model(model_path).onnx_model.path
+        return get_zoo_onnx_model_path(model_path)
     return model_path
 
 
@@ -0,0 +1,398 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sampling cache of the calibration data of one-shot runs. When fewer samples than
+the dataset holds are requested, the samples drawn from an NPZ dataset are stored
+once per dataset and sampling, as hardlinks or copies of the sampled NPZ files, so
+runs at different optim levels calibrate on the same samples without drawing them
+again. The samples are not preprocessed, sparsifyml reads and preprocesses the
+stored NPZ files on each run. Runs on all samples read the dataset directly
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, suppress
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy
+
+from sparsify.utils.helpers import file_lock, get_sparsify_cache_path
+
+
+__all__ = [
+    "CALIBRATION_CACHE_ENABLED",
+    "SAMPLING_STRATEGIES",
+    "CalibrationStore",
+    "prepare_calibration_data",
+    "get_calibration_dataset",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+CALIBRATION_CACHE_ENABLED = not os.environ.get("SPARSIFY_DISABLE_CALIBRATION_CACHE")
+SAMPLING_STRATEGIES = ["random", "stratified"]
+# size in GB the cache is bounded to, the store of the current run is always kept
+_DEFAULT_MAX_SIZE_GB = float(os.environ.get("SPARSIFY_CALIBRATION_CACHE_MAX_SIZE", 10))
+
+_CACHE_DIR_NAME = "calibration"
+_MANIFEST_NAME = "manifest.json"
+_SAMPLES_DIR_NAME = "samples"
+_LEASE_SUFFIX = ".lease"
+_STORE_VERSION = 3
+_ARRAY_HEADER_READERS = {
+    (1, 0): numpy.lib.format.read_array_header_1_0,
+    (2, 0): numpy.lib.format.read_array_header_2_0,
+}
+
+# (name, shape, dtype) of each input of a sample, sorted by input name
+_Signature = Tuple[Tuple[str, Tuple[int, ...], str], ...]
+# shared locks on the lease files of the stores used by this process, by directory,
+# so other processes never evict them
+_LEASES: Dict[Path, ExitStack] = {}
+
+
+class CalibrationStore:
+    """
+    Calibration samples stored as one directory of NPZ files, in the layout
+    sparsifyml reads, with a manifest of the sampled files and their input shapes
+
+    :param directory: directory of the store, as created by prepare_calibration_data
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        with open(self.directory / _MANIFEST_NAME) as fp:
+            self.manifest = json.load(fp)
+
+    @property
+    def samples_directory(self) -> Path:
+        """
+        :return: directory of the sampled NPZ files, one per sample
+        """
+        return self.directory / _SAMPLES_DIR_NAME
+
+    @property
+    def num_samples(self) -> int:
+        """
+        :return: number of samples in the store
+        """
+        return len(self.manifest["samples"])
+
+    @property
+    def input_names(self) -> List[str]:
+        """
+        :return: names of the model inputs of the samples
+        """
+        return self.manifest["inputs"]
+
+    @property
+    def sample_paths(self) -> List[Path]:
+        """
+        :return: paths of the sampled NPZ files in the samples directory
+        """
+        return [
+            self.samples_directory / sample["name"]
+            for sample in self.manifest["samples"]
+        ]
+
+
+def prepare_calibration_data(
+    dataset_dir: Union[str, Path],
+    num_samples: Optional[int] = None,
+    sampling: str = SAMPLING_STRATEGIES[0],
+    seed: int = 0,
+    cache_dir: Optional[Union[str, Path]] = None,
+    max_workers: Optional[int] = None,
+    max_size_gb: Optional[float] = None,
+) -> Optional[CalibrationStore]:
+    """
+    Sample calibration data from a directory of NPZ files, one sample per file, and
+    store it in the sparsify cache. The store is keyed by the path of the dataset,
+    the names, sizes and modification times of its files and the sampling
+    arguments, so later runs with the same data and sampling reuse it and edits to
+    the data rebuild it. Only the sampled files are read. The least recently used
+    stores are evicted to keep the cache within its size
+
+    :param dataset_dir: directory of the NPZ samples
+    :param num_samples: number of samples to draw, None or non positive for all
+    :param sampling: random to draw samples uniformly, stratified to draw from each
+        group of samples with the same input shapes, e.g. sequence lengths or image
+        sizes, in proportion to its size
+    :param seed: seed of the sampling
+    :param cache_dir: directory to store calibration data in. Defaults to the
+        calibration directory of the sparsify cache
+    :param max_workers: number of threads reading samples
+    :param max_size_gb: size the cache is bounded to, in GB. Defaults to
+        SPARSIFY_CALIBRATION_CACHE_MAX_SIZE or 10
+    :return: the calibration store, None if the directory has no NPZ samples or
+        all of its samples are requested, in which case it is used as is
+    """
+    if sampling not in SAMPLING_STRATEGIES:
+        raise ValueError(
+            f"Unknown sampling {sampling}, expected one of {SAMPLING_STRATEGIES}"
+        )
+    dataset_dir = Path(dataset_dir)
+    files = sorted(dataset_dir.glob("*.npz")) if dataset_dir.is_dir() else []
+    if not files:
+        return None
+    if not num_samples or num_samples <= 0 or num_samples >= len(files):
+        return None
+
+    stats = [path.stat() for path in files]
+    source = str(dataset_dir.resolve())
+    key = {
+        "version": _STORE_VERSION,
+        "source": source,
+        "files": [
+            [path.name, stat.st_size, stat.st_mtime_ns]
+            for path, stat in zip(files, stats)
+        ],
+        "num_samples": num_samples,
+        "sampling": sampling,
+        "seed": seed,
+    }
+    cache_dir = Path(cache_dir or get_sparsify_cache_path() / _CACHE_DIR_NAME)
+    store_directory = (
+        cache_dir / hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    )
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # leased before it is built or read, so it can not be evicted meanwhile
+    _lease(store_directory)
+    if (store_directory / _MANIFEST_NAME).is_file():
+        _LOGGER.info(f"Reusing calibration data in {store_directory}")
+        # the manifest modification time orders stores for eviction
+        os.utime(store_directory / _MANIFEST_NAME)
+        return CalibrationStore(store_directory)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if sampling == "stratified":
+            signatures = list(executor.map(_read_npz_signature, files))
+            selected = _stratified_sample(signatures, num_samples, seed)
+        else:
+            selected = _random_sample(len(files), num_samples, seed)
+            signatures = dict(
+                zip(selected, executor.map(_read_npz_signature, _at(files, selected)))
+            )
+        selected_signatures = [signatures[idx] for idx in selected]
+
+        _build_store(
+            store_directory,
+            source=source,
+            files=_at(files, selected),
+            signatures=selected_signatures,
+            key=key,
+            executor=executor,
+        )
+    max_size_gb = _DEFAULT_MAX_SIZE_GB if max_size_gb is None else max_size_gb
+    _evict(cache_dir, int(max_size_gb * 1024**3), keep=store_directory)
+    return CalibrationStore(store_directory)
+
+
+def get_calibration_dataset(
+    dataset_dir: Union[str, Path],
+    num_samples: Optional[int] = None,
+    sampling: str = SAMPLING_STRATEGIES[0],
+) -> Tuple[Path, Optional[int]]:
+    """
+    :param dataset_dir: dataset directory given to a one-shot run
+    :param num_samples: number of samples given to the run, None or non positive
+        for all
+    :param sampling: sampling of the calibration data, see prepare_calibration_data
+    :return: tuple of the dataset directory and number of samples to pass to
+        sparsifyml. The samples directory of the calibration store, with all of its
+        samples, if fewer samples than the dataset holds are requested from an NPZ
+        directory and the cache is not disabled through
+        SPARSIFY_DISABLE_CALIBRATION_CACHE
+    """
+    if CALIBRATION_CACHE_ENABLED:
+        store = prepare_calibration_data(dataset_dir, num_samples, sampling=sampling)
+        if store is not None:
+            return store.samples_directory, None
+    return Path(dataset_dir), num_samples
+
+
+def _at(items: List[Any], indices: List[int]) -> List[Any]:
+    return [items[idx] for idx in indices]
+
+
+def _read_npz_signature(path: Path) -> _Signature:
+    # reads only the array headers of the archive, not the data
+    signature = []
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.namelist():
+            if not member.endswith(".npy"):
+                continue
+            with archive.open(member) as fp:
+                version = numpy.lib.format.read_magic(fp)
+                read_header = _ARRAY_HEADER_READERS.get(version)
+                if read_header is not None:
+                    shape, _, dtype = read_header(fp)
+                else:
+                    array = numpy.lib.format.read_array(fp)
+                    shape, dtype = array.shape, array.dtype
+            signature.append((member[: -len(".npy")], tuple(shape), dtype.str))
+    return tuple(sorted(signature))
+
+
+def _random_sample(num_files: int, num_samples: Optional[int], seed: int) -> List[int]:
+    if num_samples is None or num_samples >= num_files:
+        return list(range(num_files))
+    rng = numpy.random.default_rng(seed)
+    return sorted(rng.choice(num_files, size=num_samples, replace=False).tolist())
+
+
+def _stratified_sample(
+    signatures: List[_Signature], num_samples: Optional[int], seed: int
+) -> List[int]:
+    if num_samples is None or num_samples >= len(signatures):
+        return list(range(len(signatures)))
+
+    groups: Dict[_Signature, List[int]] = {}
+    for idx, signature in enumerate(signatures):
+        groups.setdefault(signature, []).append(idx)
+
+    # largest remainder allocation of the samples to the groups by size
+    quotas = {
+        signature: num_samples * len(members) / len(signatures)
+        for signature, members in groups.items()
+    }
+    counts = {signature: int(quota) for signature, quota in quotas.items()}
+    remaining = num_samples - sum(counts.values())
+    for signature in sorted(
+        quotas, key=lambda signature: quotas[signature] - counts[signature]
+    )[::-1][:remaining]:
+        counts[signature] += 1
+
+    rng = numpy.random.default_rng(seed)
+    selected = []
+    for signature, members in groups.items():
+        selected.extend(
+            rng.choice(members, size=counts[signature], replace=False).tolist()
+        )
+    return sorted(selected)
+
+
+def _build_store(
+    store_directory: Path,
+    source: str,
+    files: List[Path],
+    signatures: List[_Signature],
+    key: Dict[str, Any],
+    executor: ThreadPoolExecutor,
+):
+    # built in a temporary directory and renamed, so concurrent runs never see a
+    # partial store
+    build_directory = store_directory.with_name(
+        f"{store_directory.name}.{os.getpid()}.tmp"
+    )
+    shutil.rmtree(build_directory, ignore_errors=True)
+    samples_directory = build_directory / _SAMPLES_DIR_NAME
+    samples_directory.mkdir(parents=True)
+
+    input_names = sorted({name for signature in signatures for name, _, _ in signature})
+    samples = []
+    for position, (path, signature) in enumerate(zip(files, signatures)):
+        if sorted(name for name, _, _ in signature) != input_names:
+            raise ValueError(
+                f"Calibration sample {path} has inputs "
+                f"{[name for name, _, _ in signature]}, expected {input_names}"
+            )
+        samples.append(
+            {
+                "name": f"{position:06d}-{path.name}",
+                "source": path.name,
+                "size": path.stat().st_size,
+                "shapes": {
+                    input_name: list(shape) for input_name, shape, _ in signature
+                },
+            }
+        )
+
+    def _add_sample(position: int):
+        _link_or_copy(files[position], samples_directory / samples[position]["name"])
+
+    list(executor.map(_add_sample, range(len(files))))
+
+    with open(build_directory / _MANIFEST_NAME, "w") as fp:
+        json.dump(
+            {
+                "source": source,
+                "sampling": {
+                    name: value for name, value in key.items() if name != "files"
+                },
+                "inputs": input_names,
+                "samples": samples,
+            },
+            fp,
+            indent=4,
+        )
+
+    try:
+        os.rename(build_directory, store_directory)
+    except OSError:
+        # built concurrently by another run
+        shutil.rmtree(build_directory, ignore_errors=True)
+        if not (store_directory / _MANIFEST_NAME).is_file():
+            raise
+    _LOGGER.info(
+        f"Stored {len(files)} calibration samples of {source} in {store_directory}"
+    )
+
+
+def _lease(store_directory: Path):
+    if store_directory in _LEASES:
+        return
+    lease = ExitStack()
+    lease.enter_context(
+        file_lock(store_directory.with_suffix(_LEASE_SUFFIX), shared=True)
+    )
+    _LEASES[store_directory] = lease
+
+
+def _evict(cache_dir: Path, max_size_bytes: int, keep: Path):
+    entries = []
+    for manifest_path in cache_dir.glob(f"*/{_MANIFEST_NAME}"):
+        with open(manifest_path) as fp:
+            size = sum(sample.get("size", 0) for sample in json.load(fp)["samples"])
+        entries.append((manifest_path.stat().st_mtime, size, manifest_path.parent))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, directory in sorted(entries, key=lambda entry: entry[0]):
+        if total_size <= max_size_bytes:
+            break
+        if directory == keep:
+            continue
+        lease_path = directory.with_suffix(_LEASE_SUFFIX)
+        with file_lock(lease_path, blocking=False) as unleased:
+            # stores in use by any process are kept
+            if not unleased:
+                continue
+            _LOGGER.info(f"Evicting calibration data {directory}")
+            shutil.rmtree(directory, ignore_errors=True)
+            with suppress(OSError):
+                lease_path.unlink()
+            total_size -= size
+
+
+def _link_or_copy(source: Path, target: Path):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
@@ -36,6 +36,7 @@ __all__ = [
     "RunMode",
     "SparsificationTrainingConfig",
     "Metrics",
+    "MetricsSnapshot",
     "DEFAULT_OUTPUT_DIRECTORY",
 ]
 
@@ -114,6 +115,28 @@ class APIArgs(BaseModel):
         description="optional task specific arguments to add to config",
         default_factory=dict,
     )
+    distributed: Optional[Dict[str, Any]] = Field(
+        title="distributed",
+        description=(
+            "optional torch.distributed.run launch args for training across several "
+            "nodes, e.g. {'nnodes': '2', 'rdzv_endpoint': 'host:29400'}. Supported "
+            "keys are nnodes (number of nodes, or MIN:MAX for an elastic job), "
+            "nproc_per_node, node_rank, rdzv_backend, rdzv_endpoint, rdzv_id and "
+            "max_restarts"
+        ),
+        default_factory=dict,
+    )
+    tuning: Optional[Dict[str, Any]] = Field(
+        title="tuning",
+        description=(
+            "optional args to train several trials concurrently on this node and tune "
+            "the hyperparameters across them, e.g. {'num_trials': 8}. Supported keys "
+            "are num_trials, devices_per_trial, cores_per_trial, "
+            "max_concurrent_trials, prune, prune_min_epochs and "
+            "prune_reduction_factor. Defaults to a single trial"
+        ),
+        default_factory=dict,
+    )
     run_mode: RunMode = Field(
         title="run_mode",
         description=(
@@ -287,6 +310,22 @@ class Metrics(BaseModel):
         )
 
 
+class MetricsSnapshot(BaseModel):
+    """
+    Class containing the metrics of an in-progress training run after an epoch or
+    evaluation step, as streamed while it trains
+    """
+
+    epoch: Optional[float] = Field(
+        description="Number of epochs trained when the metrics were evaluated",
+        default=None,
+    )
+    step: Optional[int] = Field(
+        description="Training step the metrics were evaluated at", default=None
+    )
+    metrics: Metrics = Field(description="Metrics of the run at this point")
+
+
 def _add_schema_to_parser(parser: argparse.ArgumentParser, model: BaseModel):
     # populate ArgumentParser args from pydantic model
     fields = model.__fields__
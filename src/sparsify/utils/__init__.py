@@ -12,10 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-# flake8: noqa
-# isort: skip_file
+from .lazy import lazy_exports
 
-from .task_name import *
-from .constants import *
-from .nm_api import *
-from .helpers import *
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        "task_name": None,
+        "constants": None,
+        "nm_api": None,
+        "helpers": None,
+        "artifact_cache": None,
+    },
+)
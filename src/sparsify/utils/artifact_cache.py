@@ -0,0 +1,452 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local cache of the files of SparseZoo stubs, shared by every sparsify process on a
+machine. Downloads are resumable and verified, and the cache is bounded in size by
+evicting its least recently used stubs
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, suppress
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import requests
+
+from sparsify.utils.helpers import file_lock, get_sparsify_cache_path, strtobool
+
+
+__all__ = [
+    "ARTIFACT_CACHE_ENABLED",
+    "ArtifactCache",
+    "get_artifact_cache",
+    "get_zoo_onnx_model_path",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_ENABLED = not os.environ.get("SPARSIFY_DISABLE_ARTIFACT_CACHE")
+# True to check the sha256 of cached files on every fetch, not only their sizes
+_DEEP_CHECK = bool(os.environ.get("SPARSIFY_ARTIFACT_CACHE_DEEP_CHECK"))
+# size in GB the cache is bounded to, the most recently used stub is always kept
+_DEFAULT_MAX_SIZE_GB = float(os.environ.get("SPARSIFY_ARTIFACT_CACHE_MAX_SIZE", 50))
+
+_MANIFEST_NAME = "manifest.json"
+_FILES_DIR_NAME = "files"
+_PARTIAL_SUFFIX = ".partial"
+_LEASE_SUFFIX = ".lease"
+_CHUNK_SIZE = 8 * 1024**2
+_CHECKPOINT_SUFFIXES = (".pt", ".pth")
+
+
+class ArtifactCache:
+    """
+    Cache of the files of SparseZoo stubs. Each stub is stored in its own directory,
+    `<root>/<sha1 of stub>/files/<file type>/<file name>`, next to a manifest of the
+    size and sha256 of each file. Processes fetching the same stub, e.g. the ranks of
+    a distributed run, hold a lock file so only the first downloads it.
+
+    Files are downloaded in parallel, in chunks, to `.partial` files that are
+    resumed from where they stopped by later attempts and fetches. Each download is
+    checked against the size reported by the zoo and the md5 reported by the server,
+    if any, before being moved into place. Cached files are checked against the
+    sizes in the manifest on every fetch, and against their sha256 with deep checks,
+    and files that fail are downloaded again.
+
+    A process holds a shared lease on every stub it fetches, until it releases the
+    stub or exits, so the files of stubs in use, e.g. by the training workers of a
+    run, are never evicted by other processes.
+
+    In offline mode no requests are made and only stubs already in the cache can be
+    fetched, e.g. from a cache directory populated online and copied over
+
+    :param root: directory of the cache. Defaults to SPARSIFY_ARTIFACT_CACHE_DIR, or
+        the artifacts directory of the sparsify cache
+    :param max_size_gb: size the cache is bounded to, in GB. Defaults to
+        SPARSIFY_ARTIFACT_CACHE_MAX_SIZE or 50
+    :param offline: True to only read the cache. Defaults to
+        SPARSIFY_ARTIFACT_CACHE_OFFLINE
+    :param fetch_files: function returning the files of a stub, as dicts of their
+        `display_name`, `file_type`, `url` and, if known, `file_size`. Defaults to
+        querying the SparseZoo API
+    :param max_workers: number of files to download at once
+    :param retries: number of times to resume an interrupted download
+    :param deep_check: True to check the sha256 of cached files on every fetch.
+        Defaults to SPARSIFY_ARTIFACT_CACHE_DEEP_CHECK
+    """
+
+    def __init__(
+        self,
+        root: Optional[Union[str, Path]] = None,
+        max_size_gb: Optional[float] = None,
+        offline: Optional[bool] = None,
+        fetch_files: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+        max_workers: int = 4,
+        retries: int = 3,
+        deep_check: Optional[bool] = None,
+    ):
+        self.root = Path(
+            root
+            or os.environ.get("SPARSIFY_ARTIFACT_CACHE_DIR")
+            or get_sparsify_cache_path() / "artifacts"
+        )
+        self.max_size_bytes = int(
+            (max_size_gb if max_size_gb is not None else _DEFAULT_MAX_SIZE_GB)
+            * 1024**3
+        )
+        self.offline = (
+            strtobool(os.getenv("SPARSIFY_ARTIFACT_CACHE_OFFLINE", "false"))
+            if offline is None
+            else offline
+        )
+        self.fetch_files = fetch_files or _fetch_zoo_files
+        self.max_workers = max_workers
+        self.retries = retries
+        self.deep_check = _DEEP_CHECK if deep_check is None else deep_check
+        # shared locks on the lease files of stubs in use, by stub
+        self._leases: Dict[str, ExitStack] = {}
+
+    def fetch(self, stub: str, file_types: Optional[List[str]] = None) -> Path:
+        """
+        :param stub: SparseZoo stub to fetch the files of
+        :param file_types: types of the files to fetch, e.g. onnx, training or
+            recipe. None for all files of the stub
+        :return: directory of the stub's files, with a subdirectory per file type
+        :raises FileNotFoundError: in offline mode, if the files are not cached
+        """
+        entry_directory = self._entry_directory(stub)
+        with self._lock(stub):
+            manifest = _read_manifest(entry_directory)
+            if manifest is not None:
+                manifest = self._verify(entry_directory, manifest)
+            cached = manifest is not None and _covers(manifest, file_types)
+            if not cached:
+                if self.offline:
+                    raise FileNotFoundError(
+                        f"{stub} is not in the artifact cache at {self.root} and "
+                        "offline mode is set by SPARSIFY_ARTIFACT_CACHE_OFFLINE"
+                    )
+                manifest = self._download(stub, file_types, manifest)
+            # the manifest modification time orders stubs for eviction
+            os.utime(entry_directory / _MANIFEST_NAME)
+            # leased before the lock is released, so it can not be evicted between
+            self._lease(stub)
+
+        if not cached:
+            self._evict(keep=entry_directory)
+        return entry_directory / _FILES_DIR_NAME
+
+    def release(self, stub: str):
+        """
+        Release the lease of this process on a stub, so other processes may evict it
+
+        :param stub: SparseZoo stub fetched through this cache
+        """
+        lease = self._leases.pop(stub, None)
+        if lease is not None:
+            lease.close()
+
+    def get_onnx_model(self, stub: str) -> Path:
+        """
+        :param stub: SparseZoo stub of a model
+        :return: path to the cached ONNX model of the stub
+        """
+        directory = self.fetch(stub, ["onnx"]) / "onnx"
+        if (directory / "model.onnx").is_file():
+            return directory / "model.onnx"
+        models = sorted(directory.glob("*.onnx"))
+        if not models:
+            raise FileNotFoundError(f"No ONNX model found for {stub}")
+        return models[0]
+
+    def get_training_directory(self, stub: str) -> Path:
+        """
+        :param stub: SparseZoo stub of a model
+        :return: path to the cached directory of the stub's training files, i.e. its
+            framework checkpoint, config and tokenizer files
+        """
+        return self.fetch(stub, ["training"]) / "training"
+
+    def get_training_checkpoint(self, stub: str) -> Optional[Path]:
+        """
+        :param stub: SparseZoo stub of a model
+        :return: path to the cached framework checkpoint of the stub, preferring
+            files named model, None if its training files have no checkpoint
+        """
+        checkpoints = sorted(
+            (
+                path
+                for path in self.get_training_directory(stub).iterdir()
+                if path.suffix in _CHECKPOINT_SUFFIXES
+            ),
+            key=lambda path: (path.stem != "model", path.name),
+        )
+        return checkpoints[0] if checkpoints else None
+
+    def _entry_directory(self, stub: str) -> Path:
+        return self.root / hashlib.sha1(stub.encode()).hexdigest()
+
+    def _lock(self, stub: str, blocking: bool = True):
+        self.root.mkdir(parents=True, exist_ok=True)
+        return file_lock(
+            self._entry_directory(stub).with_suffix(".lock"), blocking=blocking
+        )
+
+    def _verify(
+        self, entry_directory: Path, manifest: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # drops the files that are missing, truncated or, with deep checks,
+        # corrupted from the manifest, so they are downloaded again
+        invalid = []
+        for name, record in manifest["files"].items():
+            path = entry_directory / _FILES_DIR_NAME / name
+            if not path.is_file() or path.stat().st_size != record["size"]:
+                invalid.append(name)
+            elif self.deep_check and _hash_file(path)[1] != record["sha256"]:
+                invalid.append(name)
+        if not invalid:
+            return manifest
+
+        _LOGGER.warning(
+            f"Cached files {invalid} of {manifest['stub']} failed verification, "
+            "downloading them again"
+        )
+        for name in invalid:
+            del manifest["files"][name]
+            (entry_directory / _FILES_DIR_NAME / name).unlink(missing_ok=True)
+        # the remaining files no longer cover the types they were fetched for
+        manifest["file_types"] = []
+        _write_manifest(entry_directory, manifest)
+        return manifest
+
+    def _lease(self, stub: str):
+        if stub in self._leases:
+            return
+        lease = ExitStack()
+        lease.enter_context(
+            file_lock(
+                self._entry_directory(stub).with_suffix(_LEASE_SUFFIX), shared=True
+            )
+        )
+        self._leases[stub] = lease
+
+    def _download(
+        self,
+        stub: str,
+        file_types: Optional[List[str]],
+        manifest: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        entry_directory = self._entry_directory(stub)
+        files_directory = entry_directory / _FILES_DIR_NAME
+        manifest = manifest or {"stub": stub, "file_types": [], "files": {}}
+
+        files = [
+            file
+            for file in self.fetch_files(stub)
+            if file_types is None or file["file_type"] in file_types
+        ]
+        # the same file may be listed under several types, e.g. the deployment ONNX
+        files = list(
+            {
+                f"{file['file_type']}/{file['display_name']}": file for file in files
+            }.items()
+        )
+        pending = [
+            (name, file) for name, file in files if name not in manifest["files"]
+        ]
+        _LOGGER.info(f"Downloading {len(pending)} files of {stub} to {entry_directory}")
+
+        def _download_file(item):
+            name, file = item
+            return name, self._download_file(
+                file["url"], files_directory / name, file.get("file_size")
+            )
+
+        pending.sort(key=lambda item: item[1].get("file_size") or 0, reverse=True)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for name, record in executor.map(_download_file, pending):
+                manifest["files"][name] = record
+
+        manifest["file_types"] = (
+            None
+            if file_types is None
+            else sorted(set(manifest["file_types"] or []) | set(file_types))
+        )
+        _write_manifest(entry_directory, manifest)
+        return manifest
+
+    def _download_file(
+        self, url: str, path: Path, size: Optional[int]
+    ) -> Dict[str, Any]:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = path.with_name(path.name + _PARTIAL_SUFFIX)
+        expected_md5 = None
+
+        for attempt in range(self.retries + 1):
+            try:
+                expected_md5 = (
+                    self._download_chunks(url, partial_path, size) or expected_md5
+                )
+                break
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if attempt == self.retries:
+                    raise
+                _LOGGER.warning(f"Resuming interrupted download of {url}: {err}")
+                time.sleep(2**attempt)
+
+        actual_size, sha256, md5 = _hash_file(partial_path)
+        if (size is not None and actual_size != size) or (
+            expected_md5 is not None and md5 != expected_md5
+        ):
+            # a corrupt partial file would otherwise be resumed from
+            os.remove(partial_path)
+            raise ValueError(
+                f"Download of {url} failed verification: expected {size} bytes "
+                f"and md5 {expected_md5}, found {actual_size} bytes and md5 {md5}"
+            )
+        os.replace(partial_path, path)
+        return {"url": url, "size": actual_size, "sha256": sha256}
+
+    def _download_chunks(
+        self, url: str, partial_path: Path, size: Optional[int]
+    ) -> Optional[str]:
+        # downloads the rest of a file to its partial path, returning the md5 of the
+        # full file if the server reports one
+        offset = partial_path.stat().st_size if partial_path.exists() else 0
+        if size is not None and offset >= size:
+            if offset == size:
+                return None
+            offset = 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 416 and offset:
+                # requested range starts at the end, the file is complete
+                return None
+            response.raise_for_status()
+            resumed = response.status_code == 206
+            with open(partial_path, "ab" if resumed else "wb") as file:
+                for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                    file.write(chunk)
+            return _response_md5(response, full_file=not resumed)
+
+    def _evict(self, keep: Path):
+        entries = []
+        for manifest_path in self.root.glob(f"*/{_MANIFEST_NAME}"):
+            with open(manifest_path) as fp:
+                size = sum(file["size"] for file in json.load(fp)["files"].values())
+            entries.append((manifest_path.stat().st_mtime, size, manifest_path.parent))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, directory in sorted(entries, key=lambda entry: entry[0]):
+            if total_size <= self.max_size_bytes:
+                break
+            if directory == keep:
+                continue
+            stub = _read_manifest(directory)["stub"]
+            lease_path = directory.with_suffix(_LEASE_SUFFIX)
+            with self._lock(stub, blocking=False) as locked, file_lock(
+                lease_path, blocking=False
+            ) as unleased:
+                # stubs being fetched or leased by any process are kept
+                if not (locked and unleased):
+                    continue
+                _LOGGER.info(f"Evicting {stub} from the artifact cache")
+                shutil.rmtree(directory, ignore_errors=True)
+                # removed while held, later holders lock new files, see file_lock.
+                # Open files can not be removed on Windows, where they are kept
+                with suppress(OSError):
+                    lease_path.unlink()
+                    directory.with_suffix(".lock").unlink()
+                total_size -= size
+
+
+@lru_cache(maxsize=1)
+def get_artifact_cache() -> ArtifactCache:
+    """
+    :return: the artifact cache configured by the environment, shared within the
+        process
+    """
+    return ArtifactCache()
+
+
+def get_zoo_onnx_model_path(stub: str) -> str:
+    """
+    :param stub: SparseZoo stub of a model
+    :return: local path to the ONNX model of the stub, downloaded through the
+        artifact cache unless disabled by SPARSIFY_DISABLE_ARTIFACT_CACHE
+    """
+    if ARTIFACT_CACHE_ENABLED:
+        return str(get_artifact_cache().get_onnx_model(stub))
+
+    from sparsezoo import Model
+
+    return Model(stub).onnx_model.path
+
+
+def _fetch_zoo_files(stub: str) -> List[Dict[str, Any]]:
+    from sparsezoo.model.utils import load_files_from_stub
+
+    return load_files_from_stub(stub)[0]
+
+
+def _covers(manifest: Dict[str, Any], file_types: Optional[List[str]]) -> bool:
+    # None file types in the manifest mean all files of the stub were downloaded
+    if manifest["file_types"] is None:
+        return True
+    return file_types is not None and set(file_types) <= set(manifest["file_types"])
+
+
+def _read_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(directory / _MANIFEST_NAME) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(directory: Path, manifest: Dict[str, Any]):
+    tmp_path = directory / f"{_MANIFEST_NAME}.tmp"
+    with open(tmp_path, "w") as fp:
+        json.dump(manifest, fp, indent=4)
+    os.replace(tmp_path, directory / _MANIFEST_NAME)
+
+
+def _hash_file(path: Path):
+    sha256, md5, size = hashlib.sha256(), hashlib.md5(), 0
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+            size += len(chunk)
+    return size, sha256.hexdigest(), base64.b64encode(md5.digest()).decode()
+
+
+def _response_md5(response: requests.Response, full_file: bool) -> Optional[str]:
+    # x-goog-hash describes the whole object, Content-MD5 only the returned bytes
+    for entry in response.headers.get("x-goog-hash", "").split(","):
+        algorithm, _, value = entry.strip().partition("=")
+        if algorithm == "md5":
+            return value
+    if full_file:
+        return response.headers.get("Content-MD5")
+    return None
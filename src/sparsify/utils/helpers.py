@@ -13,9 +13,14 @@
 # limitations under the License.
 
 
+import hashlib
 import json
 import logging
+import os
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import IO, Iterator, Optional, Union
 
 import requests
 
@@ -24,11 +29,17 @@ from sparsify.utils.exceptions import InvalidAPIKey
 
 __all__ = [
     "credentials_exists",
+    "file_lock",
     "get_access_token",
     "get_authenticated_pypi_url",
+    "get_sparsify_cache_path",
     "get_sparsify_credentials_path",
+    "get_sparsify_token_cache_path",
     "get_token_url",
+    "is_offline_mode",
+    "load_cached_access_token",
     "overwrite_credentials",
+    "save_access_token",
     "set_log_level",
     "strtobool",
 ]
@@ -48,6 +59,10 @@ _MAP = {
 }
 
 _LOGGER = logging.getLogger(__name__)
+# fallback lifetime of an access token, if the token server does not report one
+_DEFAULT_TOKEN_LIFETIME = 3600
+# cached tokens are refreshed this many seconds before they expire
+_TOKEN_EXPIRY_MARGIN = 300
 
 
 def strtobool(value):
@@ -78,6 +93,113 @@ def get_sparsify_credentials_path() -> Path:
     return Path.home().joinpath(".config", "neuralmagic", "credentials.json")
 
 
+def get_sparsify_token_cache_path() -> Path:
+    """
+    :return: The path to the access token cache, beside the credentials file
+    """
+    return get_sparsify_credentials_path().with_name("token.json")
+
+
+def get_sparsify_cache_path() -> Path:
+    """
+    :return: The path to the root directory for sparsify caches. Can be overridden
+        with the SPARSIFY_CACHE_DIR environment variable
+    """
+    cache_dir = os.getenv("SPARSIFY_CACHE_DIR")
+    if cache_dir:
+        return Path(cache_dir)
+    return Path.home().joinpath(".cache", "sparsify")
+
+
+@contextmanager
+def file_lock(
+    path: Union[str, Path], blocking: bool = True, shared: bool = False
+) -> Iterator[bool]:
+    """
+    Hold a lock on a lock file, shared by all processes on the machine. The lock is
+    released when the context exits or the process dies. On Windows, where only
+    exclusive locks are available, shared locks are not held
+
+    :param path: path to the lock file, created if it does not exist
+    :param blocking: True to wait for the lock, False to give up if it is held
+    :param shared: True to hold a shared lock, held by any number of processes at
+        once while no exclusive lock is held
+    :return: context yielding True if the lock is held, False if it was held by
+        another process and blocking is False
+    """
+    while True:
+        with open(path, "a") as lock_file:
+            if not _lock_file(lock_file, blocking, shared):
+                yield False
+                return
+            try:
+                # the lock file may be removed by its holder, e.g. on eviction of
+                # what it guards, in which case the lock is taken on the new file
+                if _is_same_file(lock_file, path):
+                    yield True
+                    return
+            finally:
+                _unlock_file(lock_file, shared)
+
+
+def _is_same_file(file: IO, path: Union[str, Path]) -> bool:
+    try:
+        path_stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    file_stat = os.fstat(file.fileno())
+    return (path_stat.st_dev, path_stat.st_ino) == (file_stat.st_dev, file_stat.st_ino)
+
+
+def _lock_file(lock_file: IO, blocking: bool, shared: bool) -> bool:
+    # fcntl is imported here as it is not available on Windows
+    try:
+        import fcntl
+    except ImportError:
+        return _lock_file_windows(lock_file, blocking, shared)
+
+    try:
+        fcntl.flock(
+            lock_file,
+            (fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            | (0 if blocking else fcntl.LOCK_NB),
+        )
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _lock_file_windows(lock_file: IO, blocking: bool, shared: bool) -> bool:
+    import msvcrt
+
+    if shared:
+        return True
+    # locks the first byte of the file, polling as msvcrt only waits up to 10s
+    lock_file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.1)
+
+
+def _unlock_file(lock_file: IO, shared: bool):
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+
+        if not shared:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 def credentials_exists() -> bool:
     """
     :return: True if the credentials file exists, False otherwise
@@ -100,13 +222,79 @@ def overwrite_credentials(api_key: str) -> None:
         json.dump(credentials, fp)
 
 
-def get_access_token(api_key: str) -> str:
+def is_offline_mode() -> bool:
     """
-    Get the access token for the given api key
+    :return: True if the SPARSIFY_OFFLINE environment variable is set, in which case
+        no requests are made to authenticate and the installed sparsifyml is used
+    """
+    return strtobool(os.getenv("SPARSIFY_OFFLINE", "false"))
+
+
+def load_cached_access_token(api_key: str) -> Optional[str]:
+    """
+    Load the cached access token for the given api key
+
+    :param api_key: The api key the token was requested with
+    :return: The cached access token, None if there is no cached token for the api
+        key or if it expires within the next few minutes
+    """
+    try:
+        with get_sparsify_token_cache_path().open() as fp:
+            cached = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cached, dict) or cached.get("api_key_hash") != _hash_api_key(
+        api_key
+    ):
+        return None
+    if cached.get("expires_at", 0) - _TOKEN_EXPIRY_MARGIN <= time.time():
+        return None
+    return cached.get("access_token")
+
+
+def save_access_token(
+    api_key: str, access_token: str, expires_in: Optional[float] = None
+) -> None:
+    """
+    Cache the access token for the given api key, readable only by the current user
+
+    :param api_key: The api key the token was requested with
+    :param access_token: The access token to cache
+    :param expires_in: Seconds until the token expires
+    """
+    token_cache_path = get_sparsify_token_cache_path()
+    token_cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cached = {
+        "api_key_hash": _hash_api_key(api_key),
+        "access_token": access_token,
+        "expires_at": time.time() + (expires_in or _DEFAULT_TOKEN_LIFETIME),
+    }
+
+    # write to a temporary file and rename, so concurrent readers, such as DDP
+    # workers, never see a partial file
+    temp_path = token_cache_path.with_name(f".{token_cache_path.name}.{os.getpid()}")
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as fp:
+        json.dump(cached, fp)
+    os.replace(temp_path, token_cache_path)
+
+
+def get_access_token(api_key: str, use_cache: bool = False) -> str:
+    """
+    Get the access token for the given api key. Requested tokens are cached until
+    they expire
 
     :param api_key: The api key to use for authentication
+    :param use_cache: True to return the cached token for the api key, if it has
+        not expired, instead of requesting a new one
     :return: The requested access token
     """
+    if use_cache:
+        access_token = load_cached_access_token(api_key)
+        if access_token is not None:
+            return access_token
+
     response = requests.post(
         get_token_url(),
         data={
@@ -132,7 +320,13 @@ def get_access_token(api_key: str) -> str:
         raise ValueError(f"Unknown response code {response.status_code}")
 
     _LOGGER.info("Successfully authenticated with Neural Magic Account API key")
-    return response.json()["access_token"]
+    response_json = response.json()
+    access_token = response_json["access_token"]
+    try:
+        save_access_token(api_key, access_token, response_json.get("expires_in"))
+    except OSError as cache_error:
+        _LOGGER.debug(f"Unable to cache access token: {cache_error}")
+    return access_token
 
 
 def get_authenticated_pypi_url(access_token: str) -> str:
@@ -155,3 +349,7 @@ def set_log_level(logger: logging.Logger, level: int) -> None:
     logging.basicConfig(level=level)
     for handler in logger.handlers:
         handler.setLevel(level=level)
+
+
+def _hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
@@ -0,0 +1,103 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Helpers for packages that re-export the names of their submodules, importing each
+submodule only once one of its names is accessed
+"""
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+__all__ = ["lazy_exports"]
+
+
+def lazy_exports(
+    package_name: str, submodules: Dict[str, Optional[List[str]]]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Create the module level `__getattr__` and `__dir__` (PEP 562) of a package that
+    re-exports the names of its submodules, replacing `from .submodule import *`.
+    Submodules are imported on first access of one of their names, and the value is
+    then set on the package so later accesses are plain attribute lookups.
+
+    `__all__` of the package is also resolved on access, for star imports
+
+    :param package_name: `__name__` of the package
+    :param submodules: submodule name, relative to the package, to the names it
+        exports. None for all names a star import of the submodule would export,
+        which are only known once imported. Such submodules are imported in order
+        when a name that is not listed is accessed
+    :return: tuple of the `__getattr__` and `__dir__` functions for the package
+    """
+    name_to_submodule = {}
+    for submodule, names in submodules.items():
+        for name in names or []:
+            name_to_submodule.setdefault(name, submodule)
+    star_submodules = [
+        submodule for submodule, names in submodules.items() if names is None
+    ]
+
+    def _import(submodule: str):
+        return importlib.import_module(f".{submodule}", package_name)
+
+    def _all_names() -> List[str]:
+        names = list(name_to_submodule)
+        for submodule in star_submodules:
+            names.extend(
+                name
+                for name in _exported_names(_import(submodule))
+                if name not in names
+            )
+        return names
+
+    def __getattr__(name: str) -> Any:
+        if name == "__all__":
+            value = _all_names()
+        elif name.startswith("__"):
+            # keep probes for module dunders, e.g. by inspect, from importing
+            raise AttributeError(f"module '{package_name}' has no attribute '{name}'")
+        elif name in name_to_submodule:
+            value = getattr(_import(name_to_submodule[name]), name)
+        else:
+            for submodule in star_submodules:
+                module = _import(submodule)
+                if name in _exported_names(module):
+                    value = getattr(module, name)
+                    break
+            else:
+                # submodules were attributes of the package once eagerly imported
+                if importlib.util.find_spec(f"{package_name}.{name}") is None:
+                    raise AttributeError(
+                        f"module '{package_name}' has no attribute '{name}'"
+                    )
+                value = _import(name)
+
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package_name])) | set(name_to_submodule))
+
+    return __getattr__, __dir__
+
+
+def _exported_names(module: ModuleType) -> List[str]:
+    # names exported by a star import of the module
+    if hasattr(module, "__all__"):
+        return list(module.__all__)
+    return [name for name in vars(module) if not name.startswith("_")]
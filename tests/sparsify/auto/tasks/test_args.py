@@ -0,0 +1,123 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.tasks import DDPArgs
+
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_ddp_args_single_node():
+    ddp_args = DDPArgs()
+    assert not ddp_args.is_multi_node
+    assert ddp_args.is_primary_node
+
+    launch_args = ddp_args.to_launch_args()
+    assert launch_args[:2] == ["--nproc_per_node", "auto"]
+    assert launch_args[-1].startswith("--master_port=")
+    assert "--rdzv_endpoint" not in launch_args
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_ddp_args_multi_node():
+    ddp_args = DDPArgs(nnodes="2:4", rdzv_endpoint="host:29400", node_rank=1)
+    assert ddp_args.is_multi_node
+    assert not ddp_args.is_primary_node
+
+    launch_args = ddp_args.to_launch_args()
+    assert launch_args[launch_args.index("--nnodes") + 1] == "2:4"
+    assert launch_args[launch_args.index("--rdzv_endpoint") + 1] == "host:29400"
+    assert launch_args[launch_args.index("--rdzv_backend") + 1] == "c10d"
+    # node rank is assigned by the c10d rendezvous
+    assert "--node_rank" not in launch_args
+
+    static_args = DDPArgs(
+        nnodes="2", rdzv_endpoint="host:29400", rdzv_backend="static", node_rank=1
+    ).to_launch_args()
+    assert static_args[static_args.index("--node_rank") + 1] == "1"
+
+    with pytest.raises(ValueError):
+        DDPArgs(nnodes="2").to_launch_args()
+    with pytest.raises(ValueError):
+        DDPArgs(nnodes="3:2")
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_ddp_args_launch_gloo_nodes(tmp_path):
+    # two local "nodes" of one CPU process each meet at the rendezvous and run a
+    # gloo all reduce
+    script = tmp_path / "all_reduce.py"
+    script.write_text(
+        textwrap.dedent(
+            """
+            import os
+            import torch
+            import torch.distributed as dist
+
+            dist.init_process_group("gloo")
+            value = torch.ones(1)
+            dist.all_reduce(value)
+            with open(os.environ["OUTPUT_PATH"] + os.environ["RANK"], "w") as file:
+                file.write(f"{dist.get_world_size()} {int(value.item())}")
+            dist.destroy_process_group()
+            """
+        )
+    )
+    sock = socket.socket()
+    sock.bind(("", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    processes = []
+    for node_rank in range(2):
+        ddp_args = DDPArgs(
+            nnodes="2",
+            nproc_per_node="1",
+            node_rank=node_rank,
+            rdzv_endpoint=f"localhost:{port}",
+            rdzv_id="test_gloo_nodes",
+        )
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "torch.distributed.run"]
+                + ddp_args.to_launch_args()
+                + [str(script)],
+                env={**os.environ, "OUTPUT_PATH": str(tmp_path / "rank")},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        )
+    for process in processes:
+        _, stderr = process.communicate(timeout=120)
+        assert process.returncode == 0, stderr.decode()
+
+    for rank in range(2):
+        assert (tmp_path / f"rank{rank}").read_text() == "2 2"
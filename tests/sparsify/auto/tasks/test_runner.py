@@ -0,0 +1,195 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import os
+import threading
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.tasks import BaseArgs, TaskRunner
+    from sparsify.schemas import Metrics, SparsificationTrainingConfig
+    from sparsify.utils import TASK_REGISTRY
+
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+"""
+Tests for the TaskRunner retry loop, using a stub runner with no integration
+dependencies
+"""
+
+
+class _StubTrainArgs(BaseArgs):
+    output_dir: str = ""
+    resume_from: Optional[str] = None
+
+
+class _StubRunner(TaskRunner):
+    export_model_kwarg = "model_path"
+    task = TASK_REGISTRY["image_classification"]
+
+    def __init__(self, config, failures: int = 1):
+        super().__init__(config)
+        self.use_distributed_training = False
+        self.failures = failures
+        self.resume_args = []
+
+    @classmethod
+    def config_to_args(cls, config):
+        return _StubTrainArgs(), None
+
+    def train_hook(self, output_dir: str, resume_from: Optional[str]):
+        self.resume_args.append(resume_from)
+        time.sleep(0.01)
+        Path(os.path.join(output_dir, "checkpoint.pt")).touch()
+        if self.failures > 0:
+            self.failures -= 1
+            raise ValueError("simulated failure")
+
+    def tune_args_for_hardware(self, hardware_specs):
+        pass
+
+    def update_run_directory_args(self):
+        self.train_args.output_dir = self.run_directory
+
+    def _train_completion_check(self) -> bool:
+        return True
+
+    def _get_last_checkpoint(self) -> Optional[str]:
+        checkpoint = os.path.join(self.train_args.output_dir, "checkpoint.pt")
+        return checkpoint if os.path.isfile(checkpoint) else None
+
+    def _update_train_args_post_failure(self, error_type: Exception):
+        self.train_args.resume_from = self._get_last_checkpoint()
+
+    def _get_metrics(self) -> Metrics:
+        return Metrics(metrics={"acc": 1.0}, objective_key="acc")
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_retry_stage_resumes_from_checkpoint(tmp_path):
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset="imagenette", base_model=None, recipe=None
+    )
+    runner = _StubRunner(config, failures=1)
+
+    metrics = runner.train(train_directory=str(tmp_path), log_directory=str(tmp_path))
+
+    assert metrics.metrics["acc"] == 1.0
+    checkpoint = os.path.join(str(tmp_path), "checkpoint.pt")
+    assert runner.resume_args == [None, checkpoint]
+
+    assert len(runner.resume_history) == 1
+    record = runner.resume_history[0]
+    assert record["stage"] == "train"
+    assert record["checkpoint"] == checkpoint
+    assert "simulated failure" in record["error"]
+    assert 0 < record["compute_saved"] <= record["attempt_time"]
+    assert runner.compute_saved == record["compute_saved"]
+
+    attempts = [record for record in runner.stage_records if record["stage"] == "train"]
+    assert [record["attempt"] for record in attempts] == [1, 2]
+    assert "simulated failure" in attempts[0]["error"]
+    assert attempts[1]["error"] is None
+    train_summary = runner.stage_summaries()["train"]
+    assert train_summary["attempts"] == 2
+    assert metrics.train_time == pytest.approx(train_summary["wall_time"])
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_retry_stage_raises_after_max_attempts(tmp_path):
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset="imagenette", base_model=None, recipe=None
+    )
+    runner = _StubRunner(config, failures=100)
+
+    with pytest.raises(RuntimeError, match="simulated failure"):
+        runner.train(train_directory=str(tmp_path), log_directory=str(tmp_path))
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_stream_metrics(tmp_path):
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset="imagenette", base_model=None, recipe=None
+    )
+    runner = _StubRunner(config)
+    epochs = iter([None, (1.0, 0.5), (1.0, 0.5), (2.0, 0.7)])
+
+    def _get_intermediate_metrics():
+        latest = next(epochs, None)
+        if latest is None:
+            return None
+        return latest[0], Metrics(metrics={"acc": latest[1]}, objective_key="acc")
+
+    runner._get_intermediate_metrics = _get_intermediate_metrics
+    snapshots = []
+    for snapshot in runner.stream_metrics(poll_interval=0):
+        snapshots.append(snapshot)
+        if len(snapshots) == 2:
+            break
+
+    # polled metrics are streamed once per epoch
+    assert [snapshot.epoch for snapshot in snapshots] == [1.0, 2.0]
+    assert snapshots[1].metrics.metrics["acc"] == 0.7
+
+    # set stop events end the stream after a last read
+    stop_event = threading.Event()
+    stop_event.set()
+    assert list(runner.stream_metrics(poll_interval=0, stop_event=stop_event)) == []
+
+
+class _StubCheckpointArgs(_StubTrainArgs):
+    checkpoint_path: Optional[str] = None
+
+
+class _StubZooRunner(_StubRunner):
+    zoo_stub_artifact = "checkpoint"
+    zoo_stub_train_args = {"base_model": "checkpoint_path"}
+
+    @classmethod
+    def config_to_args(cls, config):
+        return _StubCheckpointArgs(checkpoint_path=config.base_model), None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_resolve_zoo_stubs_keeps_config(tmp_path, monkeypatch):
+    from sparsify.auto.tasks import runner as runner_module
+
+    class _Cache:
+        def get_training_checkpoint(self, stub):
+            return tmp_path / "model.pth"
+
+    monkeypatch.setattr(runner_module, "ARTIFACT_CACHE_ENABLED", True)
+    monkeypatch.setattr(runner_module, "get_artifact_cache", _Cache)
+    stub = "zoo:cv/classification/resnet_v1-50/pytorch/sparseml/imagenet/base-none"
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset="imagenette", base_model=stub, recipe=None
+    )
+    runner = _StubZooRunner(config)
+
+    assert runner.train_args.checkpoint_path == str(tmp_path / "model.pth")
+    assert runner.config.base_model == stub
@@ -0,0 +1,169 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.tasks import TrialScheduler, allocate_trial_slots
+    from sparsify.auto.tasks.scheduler import _PIN_CORES_CODE, TrialSlot
+    from sparsify.auto.utils import (
+        HardwareSpecs,
+        SuccessiveHalvingPruner,
+        TrialHistoryStore,
+    )
+    from sparsify.schemas import Metrics, SparsificationTrainingConfig
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+def _hardware_specs(device_count: int = 0, cpu_sockets=None):
+    return HardwareSpecs(
+        cuda_available=device_count > 0,
+        device_count=device_count or 1,
+        device_names=[f"cuda:{idx}" for idx in range(device_count)] or ["CPU"],
+        fp16_available=device_count > 0,
+        cpu_sockets=cpu_sockets or [],
+    )
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize(
+    "specs_kwargs,slot_kwargs,expected",
+    [
+        ({"device_count": 8}, {}, [[idx] for idx in range(8)]),
+        ({"device_count": 8}, {"devices_per_trial": 3}, [[0, 1, 2], [3, 4, 5]]),
+        ({"device_count": 2}, {"devices_per_trial": 4}, [[0, 1]]),
+        ({"device_count": 8}, {"max_concurrent_trials": 2}, [[0], [1]]),
+        (
+            {"cpu_sockets": [[0, 1, 2, 3], [4, 5, 6, 7]]},
+            {},
+            [[0, 1, 2, 3], [4, 5, 6, 7]],
+        ),
+        (
+            {"cpu_sockets": [[0, 1, 2, 3], [4, 5, 6]]},
+            {"cores_per_trial": 2},
+            [[0, 1], [2, 3], [4, 5]],
+        ),
+    ],
+)
+def test_allocate_trial_slots(specs_kwargs, slot_kwargs, expected):
+    slots = allocate_trial_slots(_hardware_specs(**specs_kwargs), **slot_kwargs)
+    assert [slot.devices or slot.cpu_cores for slot in slots] == expected
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_trial_scheduler_runs_trials_on_disjoint_slots(tmp_path, monkeypatch):
+    scheduler = TrialScheduler(_hardware_specs(device_count=2))
+    active_slots = []
+    lock = threading.Lock()
+
+    def _run_trial(trial_idx, config, slot, train_directory, log_directory):
+        with lock:
+            assert slot not in active_slots
+            active_slots.append(slot)
+        time.sleep(0.05)
+        with lock:
+            active_slots.remove(slot)
+        if train_directory.endswith("trial_3"):
+            return None
+        return Metrics(metrics={"acc": float(train_directory[-1])}, objective_key="acc")
+
+    monkeypatch.setattr(scheduler, "_run_trial", _run_trial)
+    configs = [
+        SparsificationTrainingConfig(
+            task="image_classification",
+            dataset="imagenette",
+            base_model=None,
+            recipe=None,
+        )
+        for _ in range(4)
+    ]
+    store = TrialHistoryStore(str(tmp_path))
+
+    results = scheduler.run(
+        configs, str(tmp_path), str(tmp_path), stage="tune", history_store=store
+    )
+
+    assert [metrics and metrics.metrics["acc"] for _, metrics in results] == [
+        0.0,
+        1.0,
+        2.0,
+        None,
+    ]
+    assert sorted(store.trial_ids("tune")) == [("tune", 0), ("tune", 1), ("tune", 2)]
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_trial_scheduler_stops_pruned_trial(tmp_path):
+    pruner = SuccessiveHalvingPruner(min_epochs=1, reduction_factor=2)
+    for trial_idx, value in enumerate([0.9, 0.8]):
+        pruner.report(trial_idx, 1, value)
+    scheduler = TrialScheduler(
+        _hardware_specs(cpu_sockets=[[0]]), pruner=pruner, poll_interval=0.05
+    )
+
+    progress_path = str(tmp_path / "progress.jsonl")
+    report = {"epoch": 1, "metrics": {"metrics": {"acc": 0.1}, "objective_key": "acc"}}
+    with open(progress_path, "w") as file:
+        file.write(json.dumps(report) + "\n")
+    process = subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(60)"], start_new_session=True
+    )
+
+    start = time.time()
+    metrics, pruned = scheduler._monitor_trial(2, process, progress_path)
+
+    assert pruned
+    assert metrics.metrics["acc"] == 0.1
+    assert process.returncode is not None
+    assert time.time() - start < 30
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sched_setaffinity"), reason="CPU affinity not supported"
+)
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_trial_process_pins_itself_before_imports():
+    core = min(os.sched_getaffinity(0))
+    environment = TrialSlot(cpu_cores=[core]).environment()
+
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            _PIN_CORES_CODE
+            + "import sys\n"
+            + "print(sorted(os.sched_getaffinity(0)), 'torch' in sys.modules)",
+        ],
+        env={**os.environ, **environment},
+        text=True,
+    )
+
+    assert output.strip() == f"[{core}] False"
@@ -21,7 +21,9 @@ import pytest
 
 
 with suppress(ModuleNotFoundError):
-    from sparsify.schemas import Metrics
+    from sparsify.auto.scripts import main as main_module
+    from sparsify.auto.tasks import TuningArgs
+    from sparsify.schemas import APIArgs, Metrics, SparsificationTrainingConfig
 
 _SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
 
@@ -80,3 +82,59 @@ def _cleanup_directory():
 def _test_trial_artifact_directory(directory_path: str) -> bool:
     assert os.path.exists(directory_path), f"Directory not found: {directory_path}"
     assert os.listdir(directory_path), f"Directory empty:  {directory_path}"
+
+
+class _SchedulerMock:
+    # two slots, trial 2 fails and trial 3 is stopped early with the best value
+    def __init__(self, **kwargs):
+        self.slots = [0, 1]
+        self.pruned_trials = [3]
+        self.rounds = []
+
+    def run(self, configs, train_directory, log_directory, start_idx, history_store):
+        self.rounds.append(len(configs))
+        _SCHEDULERS.append(self)
+        results = []
+        for trial_idx, config in enumerate(configs, start=start_idx):
+            value = {0: 0.5, 1: 0.7, 3: 0.9}.get(trial_idx, 0.6)
+            metrics = Metrics(metrics={"acc": value}, objective_key="acc")
+            results.append((config, None if trial_idx == 2 else metrics))
+        return results
+
+
+_SCHEDULERS = []
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_tune_runs_rounds_of_trials(tmp_path, monkeypatch):
+    requests = []
+
+    def _api_request_tune(history):
+        requests.append(len(history))
+        return {**config.dict(), "recipe_args": {"request": len(requests)}}
+
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset="imagenette", base_model=None, recipe=None
+    )
+    monkeypatch.setattr(main_module, "TrialScheduler", _SchedulerMock)
+    monkeypatch.setattr(main_module, "api_request_tune", _api_request_tune)
+    train_directory = tmp_path / "training_artifacts"
+    train_directory.mkdir()
+
+    trial_idx, best_config, metrics = main_module._tune(
+        APIArgs(task="image_classification", dataset="imagenette"),
+        TuningArgs(num_trials=5),
+        config,
+        str(train_directory),
+        str(tmp_path / "logs"),
+    )
+
+    # rounds fill the two slots, each tuned from the trials that completed so far
+    assert _SCHEDULERS[-1].rounds == [1, 2, 2]
+    assert requests == [1, 1, 2, 2]
+    # the pruned trial is never picked, as it has no trained model
+    assert trial_idx == 1
+    assert best_config.recipe_args == {"request": 1}
+    assert metrics.metrics["acc"] == 0.7
@@ -0,0 +1,134 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+from contextlib import suppress
+
+import pytest
+import torch
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        batch_size_candidates,
+        load_probed_batch_size,
+        make_batch_size_probe,
+        probe_max_batch_size,
+        run_batch_size_probe,
+        save_probed_batch_size,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+def _make_probe_step(limit: int, probed: list):
+    def _probe_step(batch_size: int):
+        probed.append(batch_size)
+        if batch_size > limit:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+
+    return _probe_step
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize(
+    "batch_size,limit,expected",
+    [(32, 100, 32), (32, 20, 16), (24, 7, 6), (16, 0, None)],
+)
+def test_probe_max_batch_size(batch_size, limit, expected):
+    probed = []
+    best, max_fit, min_fail = probe_max_batch_size(
+        _make_probe_step(limit, probed), batch_size_candidates(batch_size)
+    )
+    assert best == expected
+    assert max_fit == (expected or 0)
+    assert len(probed) == len(set(probed))
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_probe_max_batch_size_reuses_bounds():
+    probed = []
+    best, _, _ = probe_max_batch_size(
+        _make_probe_step(20, probed), batch_size_candidates(32), max_fit=16, min_fail=32
+    )
+    assert best == 16
+    assert probed == []
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_probe_max_batch_size_raises_other_errors():
+    def _probe_step(batch_size: int):
+        raise ValueError("not a memory error")
+
+    with pytest.raises(ValueError):
+        probe_max_batch_size(_probe_step, batch_size_candidates(8))
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_probed_batch_size_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("SPARSIFY_CACHE_DIR", str(tmp_path))
+    key = {"task": "image_classification", "device": "A100", "image_size": 224}
+
+    assert load_probed_batch_size(key) == (0, None)
+    save_probed_batch_size(key, max_fit=64, min_fail=128)
+    assert load_probed_batch_size(key) == (64, 128)
+    assert load_probed_batch_size({**key, "image_size": 320}) == (0, None)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_make_batch_size_probe_steps_optimizer_and_teacher():
+    model = torch.nn.Linear(4, 2)
+    teacher = torch.nn.Linear(4, 2)
+    initial_weight = model.weight.detach().clone()
+    teacher_calls = []
+    teacher.register_forward_hook(lambda *args: teacher_calls.append(args))
+
+    probe_step = make_batch_size_probe(
+        model, lambda batch_size: torch.randn(batch_size, 4), "cpu", teacher=teacher
+    )
+    probe_step(8)
+    assert len(teacher_calls) == 2
+    assert not torch.equal(model.weight, initial_weight)
+    assert model.weight.grad is None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_run_batch_size_probe(tmp_path, monkeypatch):
+    monkeypatch.setenv("SPARSIFY_CACHE_DIR", str(tmp_path))
+    key = {"task": "image_classification", "device": "A100", "image_size": 224}
+    probed = []
+
+    best = run_batch_size_probe(
+        lambda: _make_probe_step(20, probed), batch_size_candidates(32), key, False
+    )
+    assert best == 16
+    assert load_probed_batch_size(key) == (16, 32)
+
+    # decided by the cache, so the unpicklable builder is never sent to a subprocess
+    probed.clear()
+    best = run_batch_size_probe(
+        lambda: _make_probe_step(20, probed), batch_size_candidates(32), key
+    )
+    assert best == 16
+    assert probed == []
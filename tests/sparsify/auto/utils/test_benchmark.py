@@ -0,0 +1,101 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import subprocess
+import sys
+from contextlib import suppress
+
+import numpy
+import onnx
+import pytest
+from onnx import TensorProto, helper, numpy_helper
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import BenchmarkConfig, measure_performance_metrics
+    from sparsify.auto.utils.benchmark import _compression_ratio
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+_ORT_INSTALLED: bool = importlib.util.find_spec("onnxruntime") is not None
+
+
+def _save_half_sparse_matmul_model(path: str, external_data: bool = False):
+    weight = numpy.random.randn(16, 8).astype(numpy.float32)
+    weight[::2] = 0.0
+    graph = helper.make_graph(
+        [helper.make_node("MatMul", inputs=["input", "weight"], outputs=["output"])],
+        "half_sparse_matmul",
+        inputs=[
+            helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", 16])
+        ],
+        outputs=[
+            helper.make_tensor_value_info("output", TensorProto.FLOAT, ["batch", 8])
+        ],
+        initializer=[numpy_helper.from_array(weight, name="weight")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path, save_as_external_data=external_data, size_threshold=0)
+
+
+@pytest.mark.skipif(
+    not (_SPARSIFYML_INSTALLED and _ORT_INSTALLED),
+    reason="`sparsifyml` and `onnxruntime` needed to run local tests",
+)
+def test_measure_performance_metrics(tmp_path):
+    model_path = str(tmp_path / "model.onnx")
+    _save_half_sparse_matmul_model(model_path)
+
+    metrics = measure_performance_metrics(
+        model_path,
+        BenchmarkConfig(
+            engines=["onnxruntime"],
+            batch_sizes=[1, 4],
+            num_cores=[1],
+            warmup_iterations=1,
+            iterations=3,
+        ),
+    )
+
+    assert metrics["compression"] == pytest.approx(2.0)
+    assert metrics["file_size"] > 0
+    assert metrics["latency"] == metrics["onnxruntime_bs1_c1_latency"]
+    assert metrics["throughput"] == max(
+        metrics["onnxruntime_bs1_c1_throughput"],
+        metrics["onnxruntime_bs4_c1_throughput"],
+    )
+    assert metrics["memory_usage"] >= 0
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_compression_ratio_external_data(tmp_path):
+    model_path = str(tmp_path / "model.onnx")
+    _save_half_sparse_matmul_model(model_path, external_data=True)
+    assert len(list(tmp_path.iterdir())) == 2
+    assert _compression_ratio(model_path) == pytest.approx(2.0)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_engines_imported_lazily():
+    code = (
+        "import sys, sparsify.auto.utils; "
+        "print(any(name in sys.modules for name in ('onnxruntime', 'deepsparse')))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "False"
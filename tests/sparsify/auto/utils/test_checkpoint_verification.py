@@ -0,0 +1,109 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import json
+import os
+import struct
+from contextlib import suppress
+
+import pytest
+import torch
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        inspect_checkpoint,
+        read_safetensors_header,
+        verify_checkpoint_manifest,
+        write_checkpoint_manifest,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+def _write_safetensors(path, data_size: int, end_offset: int):
+    header = json.dumps(
+        {"weight": {"dtype": "F32", "shape": [2], "data_offsets": [0, end_offset]}}
+    ).encode()
+    path.write_bytes(struct.pack("<Q", len(header)) + header + b"\0" * data_size)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_inspect_checkpoint(tmp_path):
+    checkpoint_path = tmp_path / "model.pth"
+    torch.save(
+        {"state_dict": {"weight": torch.ones(4)}, "recipe": "recipe", "epoch": -1},
+        checkpoint_path,
+    )
+    checkpoint = inspect_checkpoint(str(checkpoint_path))
+    assert checkpoint["recipe"] == "recipe"
+    assert checkpoint["epoch"] == -1
+    assert torch.equal(checkpoint["state_dict"]["weight"], torch.ones(4))
+
+    # truncated files fail on their record index
+    truncated_path = tmp_path / "truncated.pth"
+    truncated_path.write_bytes(checkpoint_path.read_bytes()[:-100])
+    with pytest.raises(Exception):
+        inspect_checkpoint(str(truncated_path))
+
+    safetensors_path = tmp_path / "model.safetensors"
+    _write_safetensors(safetensors_path, data_size=8, end_offset=8)
+    assert read_safetensors_header(str(safetensors_path))["weight"]["shape"] == [2]
+    _write_safetensors(safetensors_path, data_size=4, end_offset=8)
+    with pytest.raises(ValueError):
+        inspect_checkpoint(str(safetensors_path))
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_checkpoint_manifest(tmp_path):
+    assert verify_checkpoint_manifest(str(tmp_path)) is None
+
+    weights_path = tmp_path / "weights" / "model.pt"
+    weights_path.parent.mkdir()
+    weights_path.write_bytes(b"weights")
+    write_checkpoint_manifest(str(tmp_path), [str(weights_path)], checksums=True)
+    assert verify_checkpoint_manifest(str(tmp_path), checksums=True) is True
+
+    # moved directories keep their manifest valid
+    moved_path = tmp_path.rename(tmp_path.with_name("moved"))
+    assert verify_checkpoint_manifest(str(moved_path), checksums=True) is True
+
+    moved_weights_path = moved_path / "weights" / "model.pt"
+    stat = moved_weights_path.stat()
+    moved_weights_path.write_bytes(b"wrights")
+    os.utime(moved_weights_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    # same size and modification time, only caught by the checksums
+    assert verify_checkpoint_manifest(str(moved_path)) is True
+    assert verify_checkpoint_manifest(str(moved_path), checksums=True) is False
+    moved_weights_path.write_bytes(b"weight")
+    assert verify_checkpoint_manifest(str(moved_path)) is False
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_checkpoint_manifest_without_checksums(tmp_path):
+    weights_path = tmp_path / "model.pt"
+    weights_path.write_bytes(b"weights")
+    manifest_path = write_checkpoint_manifest(str(tmp_path), [str(weights_path)])
+    with open(manifest_path) as file:
+        assert "sha256" not in json.load(file)["model.pt"]
+    assert verify_checkpoint_manifest(str(tmp_path)) is True
+
+    stat = weights_path.stat()
+    os.utime(weights_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert verify_checkpoint_manifest(str(tmp_path)) is False
@@ -0,0 +1,69 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import os
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        CPU_WORKER_CORES_ENV,
+        format_cpu_worker_cores,
+        pin_cpu_worker,
+        split_cpu_cores,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize(
+    "core_groups,num_workers,expected",
+    [
+        ([[0, 1, 2, 3], [4, 5, 6, 7]], 2, [[0, 1, 2, 3], [4, 5, 6, 7]]),
+        ([[0, 1, 2, 3], [4, 5, 6, 7]], 4, [[0, 1], [2, 3], [4, 5], [6, 7]]),
+        ([[0, 1, 2], [3, 4]], 1, [[0, 1, 2, 3, 4]]),
+        ([[0, 1, 2, 3, 4]], 2, [[0, 1, 2], [3, 4]]),
+    ],
+)
+def test_split_cpu_cores(core_groups, num_workers, expected):
+    assert split_cpu_cores(core_groups, num_workers) == expected
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.skipif(
+    not hasattr(os, "sched_setaffinity"), reason="CPU affinity not supported"
+)
+def test_pin_cpu_worker(monkeypatch):
+    original_cores = os.sched_getaffinity(0)
+    core = min(original_cores)
+    monkeypatch.setenv(CPU_WORKER_CORES_ENV, format_cpu_worker_cores([[-1], [core]]))
+    monkeypatch.setenv("LOCAL_RANK", "1")
+    monkeypatch.setenv("OMP_NUM_THREADS", "")
+    monkeypatch.setenv("MKL_NUM_THREADS", "")
+
+    try:
+        assert pin_cpu_worker() == [core]
+        assert os.sched_getaffinity(0) == {core}
+        assert os.environ["OMP_NUM_THREADS"] == "1"
+    finally:
+        os.sched_setaffinity(0, original_cores)
+
+    monkeypatch.delenv(CPU_WORKER_CORES_ENV)
+    assert pin_cpu_worker() is None
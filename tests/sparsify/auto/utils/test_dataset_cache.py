@@ -0,0 +1,107 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import os
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        dataset_cache_key,
+        get_tokenized_dataset_cache_dir,
+        use_datasets_cache_dir,
+    )
+    from sparsify.auto.utils.dataset_cache import _file_hash, _hash_file_contents
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_tokenized_dataset_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SPARSIFY_CACHE_DIR", str(tmp_path / "cache"))
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    train_file = data_dir / "train.json"
+    train_file.write_text('{"text": "a"}\n')
+
+    def _cache_dir(**kwargs):
+        key = dataset_cache_key(
+            **{
+                "dataset_name": None,
+                "data_files": [str(train_file), None],
+                "tokenizer": "bert-base-uncased",
+                "max_seq_length": 128,
+                "pad_to_max_length": True,
+                **kwargs,
+            }
+        )
+        return get_tokenized_dataset_cache_dir(key)
+
+    cache_dir = _cache_dir()
+    assert os.path.isdir(cache_dir)
+    assert cache_dir.startswith(str(tmp_path / "cache"))
+    # stable across trials
+    assert _cache_dir() == cache_dir
+    # moved files keep their cache
+    moved_file = data_dir / "moved_train.json"
+    train_file.rename(moved_file)
+    assert _cache_dir(data_files=[str(moved_file)]) == cache_dir
+
+    # anything that changes the tokenized dataset changes the cache
+    assert _cache_dir(data_files=[str(moved_file)], max_seq_length=384) != cache_dir
+    assert _cache_dir(data_files=[str(moved_file)], tokenizer="gpt2") != cache_dir
+    moved_file.write_text('{"text": "b"}\n')
+    assert _cache_dir(data_files=[str(moved_file)]) != cache_dir
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_file_hash_sidecar(tmp_path, monkeypatch):
+    monkeypatch.setenv("SPARSIFY_CACHE_DIR", str(tmp_path / "cache"))
+    data_file = tmp_path / "train.json"
+    data_file.write_text('{"text": "a"}\n')
+    file_hash = _file_hash(str(data_file))
+
+    # a new process reads the hash from the sidecar while size and mtime match
+    _hash_file_contents.cache_clear()
+    stat = os.stat(data_file)
+    data_file.write_text('{"text": "b"}\n')
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert _file_hash(str(data_file)) == file_hash
+
+    # and hashes the contents again once the file changed
+    _hash_file_contents.cache_clear()
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert _file_hash(str(data_file)) != file_hash
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_use_datasets_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("HF_DATASETS_CACHE", raising=False)
+    monkeypatch.setenv("HF_HOME", str(tmp_path / "hf"))
+
+    with use_datasets_cache_dir(str(tmp_path / "datasets")):
+        assert os.environ["HF_DATASETS_CACHE"] == str(tmp_path / "datasets")
+        # model and tokenizer downloads keep their cache
+        assert os.environ["HF_HOME"] == str(tmp_path / "hf")
+    assert "HF_DATASETS_CACHE" not in os.environ
+
+    with use_datasets_cache_dir(None):
+        assert "HF_DATASETS_CACHE" not in os.environ
@@ -0,0 +1,82 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import errno
+import importlib
+import json
+import os
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        DEPLOYMENT_MANIFEST_NAME,
+        assemble_deployment_directory,
+        verify_deployment_manifest,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+def _cross_device(*args, **kwargs):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize("move", [True, False])
+@pytest.mark.parametrize("cross_device", [False, True])
+def test_assemble_deployment_directory(tmp_path, monkeypatch, move, cross_device):
+    source = tmp_path / "export" / "deployment"
+    (source / "tokenizer").mkdir(parents=True)
+    (source / "model.onnx").write_bytes(b"onnx")
+    (source / "model.data").write_bytes(os.urandom(2**16))
+    (source / "tokenizer" / "vocab.txt").write_text("vocab")
+    target = tmp_path / "deployment"
+    target.mkdir()
+    (target / "README.md").write_text("readme")
+
+    if cross_device:
+        monkeypatch.setattr(os, "rename", _cross_device)
+        monkeypatch.setattr(os, "link", _cross_device)
+
+    manifest_path = assemble_deployment_directory(str(source), str(target), move=move)
+    assert os.path.basename(manifest_path) == DEPLOYMENT_MANIFEST_NAME
+    assert source.exists() != move
+    assert (target / "tokenizer" / "vocab.txt").read_text() == "vocab"
+
+    with open(manifest_path) as fp:
+        manifest = json.load(fp)
+    assert sorted(manifest) == [
+        "README.md",
+        "model.data",
+        "model.onnx",
+        os.path.join("tokenizer", "vocab.txt"),
+    ]
+    assert manifest["model.data"]["size"] == 2**16
+    assert verify_deployment_manifest(str(target)) is True
+
+    (target / "model.onnx").write_bytes(b"onxx")
+    assert verify_deployment_manifest(str(target), check_checksums=False) is True
+    assert verify_deployment_manifest(str(target)) is False
+    (target / "model.onnx").write_bytes(b"on")
+    assert verify_deployment_manifest(str(target), check_checksums=False) is False
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_verify_deployment_manifest_missing(tmp_path):
+    assert verify_deployment_manifest(str(tmp_path)) is None
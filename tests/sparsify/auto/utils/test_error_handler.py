@@ -21,7 +21,13 @@ import pytest
 
 
 with suppress(ModuleNotFoundError):
-    from sparsify.auto.utils import MEMORY_ERROR_SUBSTRINGS, ErrorHandler
+    from torch.distributed.elastic.rendezvous import RendezvousTimeoutError
+
+    from sparsify.auto.utils import (
+        MEMORY_ERROR_SUBSTRINGS,
+        NODE_FAILURE_ERROR_SUBSTRINGS,
+        ErrorHandler,
+    )
 _SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
 
 
@@ -163,3 +169,34 @@ def test_error_handler(expected_outcome, errors, is_oom_error):
                 RuntimeError, match="Failed to fit model and data into memory after"
             ):
                 error_handler.raise_exception_summary()
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_error_handler_node_failures():
+    error_handler = ErrorHandler(distributed_training=True)
+    errors = [RendezvousTimeoutError("timed out")] + [
+        RuntimeError(f"filler {substring} text")
+        for substring in NODE_FAILURE_ERROR_SUBSTRINGS
+    ]
+    errors = list(islice(cycle(errors), error_handler.max_node_failures))
+
+    # node failures do not use up the retry budget of the run itself
+    error_handler.save_error(RuntimeError("Error 1"))
+    assert not error_handler.is_node_failure()
+    for error in errors:
+        assert not error_handler.max_attempts_exceeded()
+        error_handler.save_error(error)
+        assert error_handler.is_node_failure()
+        assert not error_handler.is_memory_error()
+    assert len(error_handler.caught_runtime_errors) == 1
+
+    assert error_handler.max_attempts_exceeded()
+    with pytest.raises(RuntimeError, match="due to lost nodes"):
+        error_handler.raise_exception_summary()
+
+    # single process runs have no peers to lose
+    error_handler = ErrorHandler(distributed_training=False)
+    error_handler.save_error(errors[-1])
+    assert not error_handler.is_node_failure()
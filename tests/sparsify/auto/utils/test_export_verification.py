@@ -0,0 +1,89 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+from contextlib import suppress
+
+import numpy
+import onnx
+import pytest
+import torch
+from onnx import TensorProto, helper, numpy_helper
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import compare_onnx_to_torch, validate_onnx_export
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.fixture
+def linear_export(tmp_path):
+    torch.manual_seed(0)
+    linear = torch.nn.Linear(16, 4)
+    weight = numpy_helper.from_array(
+        linear.weight.detach().numpy().T.copy(), name="weight"
+    )
+    bias = numpy_helper.from_array(linear.bias.detach().numpy(), name="bias")
+    graph = helper.make_graph(
+        [
+            helper.make_node("MatMul", ["input", "weight"], ["matmul"]),
+            helper.make_node("Add", ["matmul", "bias"], ["output"]),
+        ],
+        "linear",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [2, 16])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [2, 4])],
+        initializer=[weight, bias],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    model_path = tmp_path / "model.onnx"
+    onnx.save(
+        model,
+        str(model_path),
+        save_as_external_data=True,
+        location="model.data",
+        size_threshold=0,
+    )
+    return str(model_path), linear
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_validate_onnx_export(linear_export, tmp_path):
+    model_path, _ = linear_export
+    validate_onnx_export(model_path)
+
+    with pytest.raises(ValueError):
+        validate_onnx_export(str(tmp_path / "missing.onnx"))
+
+    external_data_path = tmp_path / "model.data"
+    external_data_path.write_bytes(external_data_path.read_bytes()[:-4])
+    with pytest.raises(ValueError):
+        validate_onnx_export(model_path)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_compare_onnx_to_torch(linear_export):
+    model_path, linear = linear_export
+    assert compare_onnx_to_torch(model_path, linear, batch_size=2) < 1e-5
+
+    with torch.no_grad():
+        linear.bias.add_(1.0)
+    with pytest.raises(ValueError):
+        compare_onnx_to_torch(model_path, linear, batch_size=2)
+    assert numpy.isfinite(
+        compare_onnx_to_torch(model_path, linear, batch_size=2, atol=2.0)
+    )
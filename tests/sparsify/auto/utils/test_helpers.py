@@ -0,0 +1,93 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import os
+from contextlib import suppress
+
+import pytest
+import yaml
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        TrialHistoryStore,
+        best_n_trials_from_history,
+        load_raw_config_history,
+        save_history,
+    )
+    from sparsify.schemas import APIArgs, Metrics, SparsificationTrainingConfig
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+def _trial(accuracy: float):
+    config = SparsificationTrainingConfig(
+        task="image_classification", dataset="imagenette", base_model=None, recipe=None
+    )
+    return config, Metrics(metrics={"acc": accuracy}, objective_key="acc")
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_save_history_appends_new_trials(tmp_path):
+    api_args = APIArgs(task="ic", dataset="imagenette")
+    stage_directory = os.path.join(str(tmp_path), "stage_0")
+    history = [_trial(0.7), _trial(0.5)]
+
+    save_history(history, api_args, "stage_0", stage_directory)
+    store_path = os.path.join(str(tmp_path), "run_history.jsonl")
+    with open(store_path) as file:
+        assert len(file.readlines()) == 3
+
+    history.append(_trial(0.9))
+    save_history(history, api_args, "stage_0", stage_directory)
+    save_history(history[:1], api_args, "stage_1", stage_directory)
+    with open(store_path) as file:
+        assert len(file.readlines()) == 5
+
+    with open(os.path.join(stage_directory, "stage_history.yaml")) as file:
+        stage_history = yaml.safe_load(file)
+    assert stage_history["api_args"]["dataset"] == "imagenette"
+    assert sorted(stage_history) == ["api_args", "trial_0", "trial_1", "trial_2"]
+    assert stage_history["trial_2"]["metrics"]["metrics"]["acc"] == 0.9
+
+    raw_history = load_raw_config_history(store_path)
+    assert raw_history["api_args"]["dataset"] == "imagenette"
+    assert list(raw_history["stage_0"]) == ["trial_0", "trial_1", "trial_2"]
+    assert raw_history["stage_1"]["trial_0"]["metrics"]["metrics"]["acc"] == 0.7
+
+    store = TrialHistoryStore(str(tmp_path))
+    best = best_n_trials_from_history(store, 2, stage="stage_0")
+    assert list(best) == [0, 1]
+    assert best[0].metrics["acc"] == 0.5
+    assert best_n_trials_from_history(history, 2) == best
+    assert store.best_trial_ids(2, stage="stage_0") == [("stage_0", 1), ("stage_0", 0)]
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_history_store_ignores_truncated_record(tmp_path):
+    store = TrialHistoryStore(str(tmp_path))
+    metrics = {"metrics": {"acc": 0.5}, "objective_key": "acc"}
+    store.append_trial("stage_0", 0, {}, metrics)
+    with open(store.path, "a") as file:
+        file.write('{"stage": "stage_0", "trial": 1, "con')
+
+    assert TrialHistoryStore(store.path).trial_ids() == [("stage_0", 0)]
+
+    store = TrialHistoryStore(store.path)
+    store.append_trial("stage_0", 1, {}, metrics)
+    assert store.trial_ids() == [("stage_0", 0), ("stage_0", 1)]
+    assert TrialHistoryStore(store.path).get_trial("stage_0", 1)["metrics"] == metrics
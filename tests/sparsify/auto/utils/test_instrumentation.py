@@ -0,0 +1,89 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import time
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        ResourceMonitor,
+        format_prometheus_metrics,
+        summarize_stage_records,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_resource_monitor():
+    with ResourceMonitor(sample_interval=0.01) as monitor:
+        time.sleep(0.05)
+    summary = monitor.summary()
+
+    assert summary["wall_time"] >= 0.05
+    assert summary["peak_rss_mb"] > 0
+    assert summary["peak_gpu_memory_mb"] >= 0
+    assert 0 <= summary["cpu_utilization"] <= 100
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_summarize_and_format_stage_records():
+    records = [
+        {
+            "stage": "train",
+            "wall_time": 30.0,
+            "peak_rss_mb": 100.0,
+            "peak_gpu_memory_mb": 2000.0,
+            "cpu_utilization": 10.0,
+        },
+        {
+            "stage": "train",
+            "wall_time": 10.0,
+            "peak_rss_mb": 200.0,
+            "peak_gpu_memory_mb": 1000.0,
+            "cpu_utilization": 50.0,
+        },
+        {
+            "stage": "export",
+            "wall_time": 5.0,
+            "peak_rss_mb": 50.0,
+            "peak_gpu_memory_mb": 0.0,
+            "cpu_utilization": 100.0,
+        },
+    ]
+    summaries = summarize_stage_records(records)
+
+    assert list(summaries) == ["train", "export"]
+    assert summaries["train"] == {
+        "wall_time": 40.0,
+        "peak_rss_mb": 200.0,
+        "peak_gpu_memory_mb": 2000.0,
+        "cpu_utilization": 20.0,
+        "attempts": 2,
+    }
+
+    text = format_prometheus_metrics(summaries, labels={"task": "ic"})
+    assert "# TYPE sparsify_auto_stage_wall_time_seconds gauge" in text
+    assert 'sparsify_auto_stage_wall_time_seconds{task="ic",stage="train"} 40.0' in text
+    assert (
+        'sparsify_auto_stage_peak_rss_bytes{task="ic",stage="export"} 52428800.0'
+        in text
+    )
+    assert 'sparsify_auto_stage_attempts{task="ic",stage="train"} 2' in text
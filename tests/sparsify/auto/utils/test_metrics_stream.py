@@ -0,0 +1,88 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import CSVMetricsTailer, EventFileMetricsTailer
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_csv_metrics_tailer(tmp_path):
+    results_path = tmp_path / "results.csv"
+    tailer = CSVMetricsTailer(
+        str(results_path),
+        metric_columns={"metrics/mAP_0.5": "mAP_0.5"},
+        objective_key="mAP_0.5",
+        epoch_offset=1,
+    )
+    # the file does not exist before the first epoch
+    assert tailer.read() == []
+
+    with open(results_path, "w") as file:
+        file.write("      epoch,   train/box_loss,  metrics/mAP_0.5\n")
+        file.write("          0,          0.1,              0.25\n")
+        # partially written rows are read once complete
+        file.write("          1,          0.09,")
+    snapshots = tailer.read()
+    assert [snapshot.epoch for snapshot in snapshots] == [1.0]
+    assert snapshots[0].metrics.metrics == {"mAP_0.5": 0.25}
+
+    with open(results_path, "a") as file:
+        file.write("             0.5\n")
+    snapshots = tailer.read()
+    assert [snapshot.epoch for snapshot in snapshots] == [2.0]
+    assert snapshots[0].metrics.metrics == {"mAP_0.5": 0.5}
+    assert tailer.read() == []
+
+    # rewritten files, e.g. of a restarted run, are read from the start
+    results_path.write_text("epoch,metrics/mAP_0.5\n0,0.3\n")
+    assert [snapshot.epoch for snapshot in tailer.read()] == [1.0]
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_event_file_metrics_tailer(tmp_path):
+    from torch.utils.tensorboard import SummaryWriter
+
+    tailer = EventFileMetricsTailer(
+        str(tmp_path),
+        metric_tags={"eval/f1": "eval_f1"},
+        objective_key="eval_f1",
+        epoch_tag="train/epoch",
+    )
+    assert tailer.read() == []
+
+    writer = SummaryWriter(str(tmp_path))
+    writer.add_scalar("train/loss", 1.0, 5)
+    writer.add_scalar("eval/f1", 0.5, 10)
+    writer.add_scalar("train/epoch", 1.0, 10)
+    writer.flush()
+    snapshots = tailer.read()
+    assert [(snapshot.step, snapshot.epoch) for snapshot in snapshots] == [(10, 1.0)]
+    assert snapshots[0].metrics.metrics == {"eval_f1": 0.5}
+
+    writer.add_scalar("train/epoch", 1.5, 15)
+    writer.add_scalar("eval/f1", 0.75, 20)
+    writer.close()
+    snapshots = tailer.read()
+    assert [(snapshot.step, snapshot.epoch) for snapshot in snapshots] == [(20, 1.5)]
+    assert tailer.read() == []
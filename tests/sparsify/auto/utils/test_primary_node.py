@@ -0,0 +1,103 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import os
+import socket
+import subprocess
+import sys
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.tasks import DDPArgs
+    from sparsify.auto.utils import (
+        NODE_TOKEN_ENV,
+        PRIMARY_NODE_LAUNCH_COMMAND,
+        PRIMARY_NODE_MARKER_ENV,
+        read_primary_node,
+        record_primary_node,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_record_primary_node(tmp_path, monkeypatch):
+    marker_path = str(tmp_path / "train" / ".primary_node")
+    monkeypatch.setenv(PRIMARY_NODE_MARKER_ENV, marker_path)
+
+    monkeypatch.setenv(NODE_TOKEN_ENV, "node_a")
+    monkeypatch.setenv("RANK", "0")
+    monkeypatch.setenv("LOCAL_RANK", "0")
+    record_primary_node()
+    assert read_primary_node(marker_path) == "node_a"
+
+    # on a shared filesystem, other nodes keep the marker of the primary node
+    monkeypatch.setenv(NODE_TOKEN_ENV, "node_b")
+    monkeypatch.setenv("RANK", "2")
+    record_primary_node()
+    assert read_primary_node(marker_path) == "node_a"
+
+    # a node that held rank 0 in an earlier round removes its stale marker
+    monkeypatch.setenv(NODE_TOKEN_ENV, "node_a")
+    record_primary_node()
+    assert read_primary_node(marker_path) is None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_primary_node_c10d(tmp_path):
+    # two local "nodes" with their own train directories meet at a c10d rendezvous,
+    # which assigns the node ranks. Exactly one holds global rank 0
+    sock = socket.socket()
+    sock.bind(("", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    processes, markers = [], []
+    for node in range(2):
+        marker_path = str(tmp_path / f"node_{node}" / ".primary_node")
+        markers.append((f"token_{node}", marker_path))
+        ddp_args = DDPArgs(
+            nnodes="2",
+            nproc_per_node="1",
+            rdzv_endpoint=f"localhost:{port}",
+            rdzv_id="test_primary_node",
+        )
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "torch.distributed.run", "--no_python"]
+                + ddp_args.to_launch_args()
+                + PRIMARY_NODE_LAUNCH_COMMAND
+                + ["true"],
+                env={
+                    **os.environ,
+                    NODE_TOKEN_ENV: f"token_{node}",
+                    PRIMARY_NODE_MARKER_ENV: marker_path,
+                },
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        )
+    for process in processes:
+        _, stderr = process.communicate(timeout=120)
+        assert process.returncode == 0, stderr.decode()
+
+    primary = [read_primary_node(path) == token for token, path in markers]
+    assert sorted(primary) == [False, True]
@@ -0,0 +1,232 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import time
+from contextlib import suppress
+
+import pytest
+import torch
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        CompactMask,
+        PruningMasks,
+        attach_compact_masks,
+        pack_bits,
+        unpack_bits,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+def _pruned_model(dtype: torch.dtype = torch.float32) -> torch.nn.Module:
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(
+        torch.nn.Linear(16, 16), torch.nn.ReLU(), torch.nn.Linear(16, 4)
+    ).to(dtype)
+    with torch.no_grad():
+        model[0].weight[:, ::2] = 0
+        # highly sparse layer
+        model[2].weight[:, 1:] = 0
+    for layer in (model[0], model[2]):
+        layer.register_buffer(
+            "constant_pruning_mask",
+            (layer.weight != 0).to(torch.uint8),
+            persistent=False,
+        )
+    return model
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize("mask_format", ["dense", "bitmask", "indices", "auto"])
+@pytest.mark.parametrize("dtype", [torch.float32, torch.bfloat16])
+def test_pruning_masks(mask_format, dtype):
+    model = _pruned_model(dtype)
+    expected_zeros = [model[0].weight == 0, model[2].weight == 0]
+
+    masks = PruningMasks(mask_format=mask_format)
+    assert masks.collect(model) == 2
+    # the buffers are replaced by the collected masks
+    assert not hasattr(model[0], "constant_pruning_mask")
+    assert masks.memory_bytes > 0
+
+    with torch.no_grad():
+        for param in model.parameters():
+            param.add_(1.0)
+    masks.apply()
+
+    for layer, zeros in zip((model[0], model[2]), expected_zeros):
+        assert layer.weight.dtype == dtype
+        assert (layer.weight[zeros] == 0).all()
+        assert (layer.weight[~zeros] != 0).all()
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_pruning_masks_gradients():
+    model = _pruned_model()
+    zeros = model[0].weight == 0
+    masks = PruningMasks()
+    masks.collect(model)
+
+    # parameters without gradients are skipped
+    masks.apply_to_gradients()
+
+    model[0](torch.randn(8, 16)).sum().backward()
+    masks.apply_to_gradients()
+    assert (model[0].weight.grad[zeros] == 0).all()
+    assert (model[0].weight.grad[~zeros] != 0).any()
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize("numel", [1, 8, 13, 64])
+def test_pack_bits(numel):
+    mask = torch.rand(numel) > 0.5
+    packed = pack_bits(mask)
+    assert packed.dtype == torch.uint8
+    assert packed.numel() == (numel + 7) // 8
+    assert torch.equal(unpack_bits(packed, numel), mask)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize("mask_format", ["bitmask", "csr", "auto"])
+def test_compact_mask(mask_format):
+    torch.manual_seed(0)
+    weight = torch.randn(12, 10) * (torch.rand(12, 10) > 0.7)
+    expected = weight.reshape(-1) != 0
+
+    # chunks smaller than a row and than the weight
+    for chunk_size in (4, 24, 2**20):
+        mask = CompactMask.from_weight(
+            weight, mask_format=mask_format, chunk_size=chunk_size
+        )
+        assert mask.num_kept == int(expected.sum())
+        assert torch.equal(mask.to_bool(), expected)
+        # ranges, e.g. of FSDP shards, not aligned to bytes or rows
+        assert torch.equal(mask.to_bool(13, 57), expected[13:57])
+        assert torch.equal(
+            mask.kept_indices(13, 57), expected[13:57].nonzero().flatten()
+        )
+
+    assert CompactMask.from_weight(weight, min_sparsity=0.9) is None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize("mask_format", ["dense", "bitmask", "indices", "auto"])
+def test_attach_compact_masks(mask_format):
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(torch.nn.Linear(64, 64), torch.nn.Linear(64, 64))
+    with torch.no_grad():
+        model[0].weight[:, :48] = 0
+    zeros = model[0].weight == 0
+
+    report = attach_compact_masks(model, min_sparsity=0.5)
+    # dense layers are not masked
+    assert [layer["mask_format"] is not None for layer in report] == [True, False]
+    assert not hasattr(model[1], "constant_pruning_mask")
+    assert report[0]["mask_bytes"] < report[0]["dense_mask_bytes"]
+    assert report[1]["saved_bytes"] == model[1].weight.numel()
+
+    masks = PruningMasks(mask_format=mask_format)
+    assert masks.collect(model) == 1
+    with torch.no_grad():
+        model[0].weight.add_(1.0)
+    masks.apply()
+    assert (model[0].weight[zeros] == 0).all()
+    assert (model[0].weight[~zeros] != 0).all()
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_pruning_masks_auto_stays_compact():
+    model = _pruned_model()
+
+    masks = PruningMasks(indices_min_sparsity=0.9)
+    masks.collect(model)
+    report = masks.report()
+    # half sparse layers keep a bitmask, highly sparse layers their indices, never
+    # a dense mask in the parameter dtype
+    assert [(layer["layer"], layer["mask_format"]) for layer in report] == [
+        ("0", "bitmask"),
+        ("2", "indices"),
+    ]
+    assert report[0]["mask_bytes"] == model[0].weight.numel() // 8
+    assert sum(layer["mask_bytes"] for layer in report) == masks.memory_bytes
+
+
+def _fastest_run(fn, repeats: int = 5) -> float:
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize("numel", [13, 2**20 + 5])
+def test_pruning_masks_bitmask_chunks(numel):
+    # spans several unpack chunks and ends in a partial byte
+    layer = torch.nn.Linear(numel, 1, bias=False)
+    with torch.no_grad():
+        layer.weight[torch.rand_like(layer.weight) > 0.5] = 0
+    zeros = layer.weight == 0
+    layer.constant_pruning_mask = CompactMask.from_weight(layer.weight, "bitmask")
+    masks = PruningMasks(mask_format="bitmask")
+    masks.collect(layer)
+
+    with torch.no_grad():
+        layer.weight.add_(1.0)
+    masks.apply()
+
+    assert (layer.weight[zeros] == 0).all()
+    assert (layer.weight[~zeros] != 0).all()
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_pruning_masks_bitmask_no_slower_than_dense_mask():
+    # size of the projections of a large transformer, larger than the CPU caches
+    torch.manual_seed(0)
+    layer = torch.nn.Linear(4096, 4096, bias=False)
+    with torch.no_grad():
+        layer.weight[torch.rand_like(layer.weight) > 0.5] = 0
+    dense_mask = (layer.weight != 0).to(torch.uint8)
+    layer.constant_pruning_mask = CompactMask.from_weight(layer.weight)
+    # default format, a bitmask at this sparsity
+    masks = PruningMasks()
+    masks.collect(layer)
+    assert masks.report()[0]["mask_format"] == "bitmask"
+
+    with torch.no_grad():
+        dense_time = _fastest_run(lambda: layer.weight.mul_(dense_mask))
+        bitmask_time = _fastest_run(masks.apply)
+
+    # 8 times less mask memory, at no more time than the dense uint8 mask
+    assert masks.memory_bytes * 8 == dense_mask.numel()
+    assert bitmask_time <= dense_time
@@ -0,0 +1,71 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import json
+import time
+import urllib.request
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import MetricsMonitor, is_headless, start_run_monitor
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+def _get(url: str, timeout: float = 60.0) -> bytes:
+    # the monitor starts serving in the background
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                return response.read()
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_metrics_monitor(tmp_path):
+    from torch.utils.tensorboard import SummaryWriter
+
+    with SummaryWriter(str(tmp_path / "train")) as writer:
+        for step in range(3):
+            writer.add_scalar("loss", 1.0 / (step + 1), step)
+
+    monitor = MetricsMonitor(str(tmp_path), reload_interval=0)
+    with monitor:
+        latest = json.loads(_get(monitor.url))
+        assert latest["train"]["loss"]["step"] == 2
+        assert 'tag="loss"' in _get(monitor.url + "metrics").decode()
+        process = monitor._process
+    assert process.poll() is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_start_run_monitor(tmp_path, monkeypatch):
+    monkeypatch.setenv("CI", "true")
+    assert is_headless()
+    # disabled by default on CI
+    with start_run_monitor(str(tmp_path)) as monitor:
+        assert monitor is None
+    with pytest.raises(ValueError):
+        with start_run_monitor(str(tmp_path), name="unknown"):
+            pass
@@ -0,0 +1,79 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+from contextlib import suppress
+
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import SuccessiveHalvingPruner, is_higher_better
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_successive_halving_pruner():
+    pruner = SuccessiveHalvingPruner(min_epochs=1, reduction_factor=3)
+
+    # trials are not pruned before the first rung or until the rung has enough trials
+    assert not pruner.report(0, 0.5, 0.1)
+    assert not pruner.report(0, 1, 0.5)
+    assert not pruner.report(1, 1, 0.7)
+
+    # bottom trials of a full rung are pruned, the top 1/3 continue
+    assert pruner.report(2, 1, 0.6)
+    assert not pruner.report(3, 1, 0.8)
+
+    # reports that skip a rung are recorded at every rung up to the reached one
+    assert not pruner.report(3, 3.5, 0.85)
+    assert pruner.rung_values(1) == {3: 0.85}
+    assert pruner.rung_epochs(2) == 9
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize(
+    "objective_key,expected",
+    [
+        ("top1acc", True),
+        ("eval_f1", True),
+        ("throughput", True),
+        ("latency", False),
+        ("deepsparse_bs1_call_latency", False),
+        ("eval_loss", False),
+        ("memory_usage", False),
+    ],
+)
+def test_is_higher_better(objective_key, expected):
+    assert is_higher_better(objective_key) is expected
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+@pytest.mark.parametrize(
+    "pruner_kwargs,objective_key",
+    [({"higher_is_better": False}, None), ({}, "latency")],
+)
+def test_successive_halving_pruner_lower_is_better(pruner_kwargs, objective_key):
+    pruner = SuccessiveHalvingPruner(min_epochs=1, reduction_factor=3, **pruner_kwargs)
+
+    assert not pruner.report(0, 1, 5.0, objective_key=objective_key)
+    assert not pruner.report(1, 1, 3.0, objective_key=objective_key)
+    # the slowest trial of a full rung is pruned, the fastest continues
+    assert pruner.report(2, 1, 4.0, objective_key=objective_key)
+    assert not pruner.report(3, 1, 1.0, objective_key=objective_key)
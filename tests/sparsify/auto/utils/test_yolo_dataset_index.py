@@ -0,0 +1,126 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import importlib
+import os
+import sys
+import types
+from contextlib import suppress
+
+import numpy
+import pytest
+
+
+with suppress(ModuleNotFoundError):
+    from sparsify.auto.utils import (
+        create_yolo_data_yaml,
+        index_yolo_dataset,
+        yolo_dataset_index,
+    )
+_SPARSIFYML_INSTALLED: bool = importlib.util.find_spec("sparsifyml") is not None
+
+
+@pytest.fixture
+def yolo_dataset(tmp_path):
+    from PIL import Image
+
+    for split in ("train", "val"):
+        (tmp_path / "images" / split).mkdir(parents=True)
+        (tmp_path / "labels" / split).mkdir(parents=True)
+        for idx in range(3):
+            Image.new("RGB", (32, 24)).save(tmp_path / "images" / split / f"{idx}.png")
+            (tmp_path / "labels" / split / f"{idx}.txt").write_text(
+                "0 0.5 0.5 0.2 0.2\n1 0.25 0.25 0.1 0.1\n"
+            )
+    (tmp_path / "images" / "train" / "corrupt.jpg").write_bytes(b"not an image")
+    (tmp_path / "labels" / "train" / "2.txt").write_text("0 0.5 0.5\n")
+    (tmp_path / "labels" / "val" / "1.txt").write_text("")
+    os.remove(tmp_path / "labels" / "val" / "2.txt")
+    (tmp_path / "classes.txt").write_text("cat\ndog\n")
+    return tmp_path
+
+
+def _fake_yolov5(monkeypatch):
+    def get_hash(paths):
+        size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+        digest = hashlib.md5(str(size).encode())
+        digest.update("".join(paths).encode())
+        return digest.hexdigest()
+
+    dataloaders = types.ModuleType("yolov5.utils.dataloaders")
+    dataloaders.get_hash = get_hash
+    dataloaders.LoadImagesAndLabels = type(
+        "LoadImagesAndLabels", (), {"cache_version": 0.6}
+    )
+    monkeypatch.setitem(sys.modules, "yolov5", types.ModuleType("yolov5"))
+    monkeypatch.setitem(sys.modules, "yolov5.utils", types.ModuleType("yolov5.utils"))
+    monkeypatch.setitem(sys.modules, "yolov5.utils.dataloaders", dataloaders)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_index_yolo_dataset(yolo_dataset, monkeypatch):
+    _fake_yolov5(monkeypatch)
+    data_yaml = create_yolo_data_yaml(str(yolo_dataset))
+    index = index_yolo_dataset(data_yaml)
+    assert os.path.isfile(os.path.join(yolo_dataset, "data_local_index.json"))
+
+    images = index["images"]
+    assert len(images) == 7
+    train = os.path.join("images", "train")
+    assert images[os.path.join(train, "0.png")]["num_labels"] == 2
+    assert images[os.path.join(train, "0.png")]["shape"] == [32, 24]
+    assert images[os.path.join(train, "corrupt.jpg")]["corrupt"]
+    assert images[os.path.join(train, "2.png")]["corrupt"]
+    assert images[os.path.join("images", "val", "2.png")]["missing_label"]
+
+    cache = numpy.load(
+        str(yolo_dataset / "labels" / "train.cache"), allow_pickle=True
+    ).item()
+    # found, missing, empty, corrupt, total
+    assert cache["results"] == (2, 0, 0, 2, 4)
+    assert cache[str(yolo_dataset / train / "0.png")][0].shape == (2, 5)
+    val_cache = numpy.load(
+        str(yolo_dataset / "labels" / "val.cache"), allow_pickle=True
+    ).item()
+    assert val_cache["results"] == (2, 1, 1, 0, 3)
+
+    # only changed files are rescanned
+    scanned = []
+    scan_image = yolo_dataset_index._scan_image
+    monkeypatch.setattr(
+        yolo_dataset_index,
+        "_scan_image",
+        lambda path: scanned.append(path) or scan_image(path),
+    )
+    assert index_yolo_dataset(data_yaml)["fingerprint"] == index["fingerprint"]
+    assert scanned == []
+
+    (yolo_dataset / "labels" / "train" / "2.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+    updated = index_yolo_dataset(data_yaml)
+    assert scanned == [str(yolo_dataset / train / "2.png")]
+    assert updated["fingerprint"] != index["fingerprint"]
+    assert updated["images"][os.path.join(train, "2.png")]["num_labels"] == 1
+    cache = numpy.load(
+        str(yolo_dataset / "labels" / "train.cache"), allow_pickle=True
+    ).item()
+    assert cache["results"] == (3, 0, 0, 1, 4)
+
+
+@pytest.mark.skipif(
+    not _SPARSIFYML_INSTALLED, reason="`sparsifyml` needed to run local tests"
+)
+def test_index_yolo_dataset_not_local():
+    assert index_yolo_dataset("coco128.yaml") is None
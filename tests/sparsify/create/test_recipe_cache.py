@@ -0,0 +1,73 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import torch
+from torch.nn import Conv2d, Linear, Sequential
+
+from sparseml.pytorch.optim import ScheduledModifierManager
+from sparsify.create import (
+    RecipeVariables,
+    compile_recipe,
+    get_recipe_fingerprint,
+    recipe_cache,
+)
+
+
+def _model(channels: int = 8):
+    return Sequential(Conv2d(3, channels, 3), Conv2d(channels, 4, 3), Linear(4, 2))
+
+
+def test_recipe_fingerprint():
+    fingerprint = get_recipe_fingerprint(_model())
+    assert fingerprint == get_recipe_fingerprint(_model())
+    assert fingerprint != get_recipe_fingerprint(_model(channels=16))
+    assert fingerprint != get_recipe_fingerprint(_model(), quantization=False)
+    assert fingerprint != get_recipe_fingerprint(
+        _model(), recipe_variables=RecipeVariables(sparsity=0.5)
+    )
+
+
+def test_recipe_fingerprint_constant_pruning():
+    dense, sparse = _model(), _model()
+    with torch.no_grad():
+        sparse[0].weight[:4] = 0
+    fingerprint = get_recipe_fingerprint(dense, pruning="constant")
+    assert fingerprint != get_recipe_fingerprint(sparse, pruning="constant")
+    assert fingerprint == get_recipe_fingerprint(_model(), pruning="constant")
+    # other recipes only depend on the architecture
+    assert get_recipe_fingerprint(dense) == get_recipe_fingerprint(sparse)
+
+
+def test_compile_recipe_cached(tmp_path, monkeypatch):
+    calls = []
+    create_recipe = recipe_cache.create_recipe
+    monkeypatch.setattr(
+        recipe_cache,
+        "create_recipe",
+        lambda **kwargs: calls.append(kwargs) or create_recipe(**kwargs),
+    )
+    monkeypatch.setattr(recipe_cache, "_COMPILED_RECIPES", {})
+
+    recipe = compile_recipe(_model(), cache_dir=tmp_path)
+    assert len(calls) == 1
+    assert ScheduledModifierManager.from_yaml(recipe).pruning_modifiers
+    assert len(list(tmp_path.glob("*.yaml"))) == 1
+
+    # other processes, e.g. the other ranks, load the recipe from disk
+    monkeypatch.setattr(recipe_cache, "_COMPILED_RECIPES", {})
+    assert compile_recipe(_model(), cache_dir=tmp_path) == recipe
+    assert len(calls) == 1
+
+    compile_recipe(_model(), quantization=False, cache_dir=tmp_path)
+    assert len(calls) == 2
@@ -0,0 +1,123 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import shutil
+
+import numpy
+import pytest
+
+from sparsify.one_shot import calibration
+from sparsify.one_shot.calibration import prepare_calibration_data
+from sparsify.utils.helpers import file_lock
+
+
+@pytest.fixture
+def npz_dataset(tmp_path):
+    dataset_dir = tmp_path / "data"
+    dataset_dir.mkdir()
+    # 6 samples of sequence length 8 and 2 of sequence length 16
+    for idx in range(8):
+        length = 8 if idx < 6 else 16
+        numpy.savez(
+            dataset_dir / f"inp-{idx:04d}.npz",
+            input_ids=numpy.full((1, length), idx, dtype=numpy.int64),
+            attention_mask=numpy.ones((1, length), dtype=numpy.int64),
+        )
+    return dataset_dir
+
+
+@pytest.mark.parametrize("sampling", ["random", "stratified"])
+def test_prepare_calibration_data(npz_dataset, tmp_path, sampling):
+    cache_dir = tmp_path / "cache"
+    store = prepare_calibration_data(
+        npz_dataset, num_samples=4, sampling=sampling, cache_dir=cache_dir
+    )
+    assert store.num_samples == 4
+    assert store.input_names == ["attention_mask", "input_ids"]
+    assert len(list(store.samples_directory.glob("*.npz"))) == 4
+
+    # the store holds the sampled files unchanged
+    for path in store.sample_paths:
+        source = npz_dataset / path.name.split("-", 1)[1]
+        assert path.read_bytes() == source.read_bytes()
+    if sampling == "stratified":
+        lengths = sorted(
+            sample["shapes"]["input_ids"][-1] for sample in store.manifest["samples"]
+        )
+        assert lengths == [8, 8, 8, 16]
+
+    # identical data and sampling reuse the store
+    assert (
+        prepare_calibration_data(
+            npz_dataset, num_samples=4, sampling=sampling, cache_dir=cache_dir
+        ).directory
+        == store.directory
+    )
+
+    # edited data is sampled again
+    numpy.savez(
+        npz_dataset / "inp-0000.npz",
+        input_ids=numpy.zeros((1, 4), dtype=numpy.int64),
+        attention_mask=numpy.ones((1, 4), dtype=numpy.int64),
+    )
+    assert (
+        prepare_calibration_data(
+            npz_dataset, num_samples=4, sampling=sampling, cache_dir=cache_dir
+        ).directory
+        != store.directory
+    )
+
+
+def test_prepare_calibration_data_all_samples(npz_dataset, tmp_path):
+    # runs on all samples read the dataset directly
+    cache_dir = tmp_path / "cache"
+    assert prepare_calibration_data(npz_dataset, cache_dir=cache_dir) is None
+    assert prepare_calibration_data(npz_dataset, 8, cache_dir=cache_dir) is None
+    assert not cache_dir.exists()
+
+
+def test_prepare_calibration_data_keyed_by_path(npz_dataset, tmp_path):
+    cache_dir = tmp_path / "cache"
+    copy = tmp_path / "copy"
+    shutil.copytree(npz_dataset, copy)
+    for source, target in zip(sorted(npz_dataset.iterdir()), sorted(copy.iterdir())):
+        shutil.copystat(source, target)
+
+    store = prepare_calibration_data(npz_dataset, 4, cache_dir=cache_dir)
+    other = prepare_calibration_data(copy, 4, cache_dir=cache_dir)
+    assert other.directory != store.directory
+
+
+def test_prepare_calibration_data_eviction(npz_dataset, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = prepare_calibration_data(npz_dataset, 4, cache_dir=cache_dir)
+    sample_size = first.sample_paths[0].stat().st_size
+    # in use by another process, the first store is kept
+    calibration._LEASES.pop(first.directory).close()
+    with file_lock(first.directory.with_suffix(".lease"), shared=True):
+        prepare_calibration_data(
+            npz_dataset, 3, cache_dir=cache_dir, max_size_gb=5 * sample_size / 1024**3
+        )
+        assert first.directory.exists()
+
+    # room for the stores of 3 and 2 samples only
+    last = prepare_calibration_data(
+        npz_dataset, 2, cache_dir=cache_dir, max_size_gb=5 * sample_size / 1024**3
+    )
+    assert not first.directory.exists()
+    assert not first.directory.with_suffix(".lease").exists()
+    assert last.directory.exists()
+
+
+def test_prepare_calibration_data_no_npz(tmp_path):
+    assert prepare_calibration_data(tmp_path, cache_dir=tmp_path / "cache") is None
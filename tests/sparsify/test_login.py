@@ -0,0 +1,125 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import json
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+import requests
+
+from sparsify.utils import (
+    get_sparsify_token_cache_path,
+    load_cached_access_token,
+    overwrite_credentials,
+    save_access_token,
+)
+
+
+# sparsify.login is shadowed by the login function on the package
+login_module = importlib.import_module("sparsify.login")
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("SPARSIFY_OFFLINE", raising=False)
+    overwrite_credentials(api_key="key")
+    return tmp_path
+
+
+def _token_response(access_token: str = "token", expires_in: int = 3600):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {
+        "access_token": access_token,
+        "expires_in": expires_in,
+    }
+    return response
+
+
+def test_token_cache(home):
+    assert load_cached_access_token("key") is None
+
+    save_access_token("key", "token", expires_in=3600)
+    assert load_cached_access_token("key") == "token"
+    # only the hash of the api key is stored
+    assert "key" not in json.loads(get_sparsify_token_cache_path().read_text()).values()
+    # tokens are not shared between api keys
+    assert load_cached_access_token("other_key") is None
+
+    # tokens about to expire are refreshed
+    save_access_token("key", "token", expires_in=10)
+    assert load_cached_access_token("key") is None
+
+
+def test_authenticate_uses_cached_token(home):
+    with mock.patch(
+        "sparsify.utils.helpers.requests.post", return_value=_token_response()
+    ) as post, mock.patch.object(login_module, "install_sparsifyml") as install:
+        login_module.authenticate()
+        login_module.authenticate()
+
+    # the token is requested once and reused
+    assert post.call_count == 1
+    assert install.call_args_list == [mock.call("token"), mock.call("token")]
+    assert json.loads(get_sparsify_token_cache_path().read_text())["access_token"]
+
+
+@pytest.mark.parametrize("version_matches", [True, False])
+def test_authenticate_offline(home, monkeypatch, version_matches):
+    monkeypatch.setattr(
+        login_module, "_sparsifyml_version_matches", lambda: version_matches
+    )
+    with mock.patch(
+        "sparsify.utils.helpers.requests.post",
+        side_effect=requests.ConnectionError("no network"),
+    ) as post, mock.patch.object(login_module, "install_sparsifyml") as install:
+        # unreachable server
+        if version_matches:
+            login_module.authenticate()
+        else:
+            with pytest.raises(requests.ConnectionError):
+                login_module.authenticate()
+
+        # explicit offline mode makes no requests
+        monkeypatch.setenv("SPARSIFY_OFFLINE", "1")
+        if version_matches:
+            login_module.authenticate()
+        else:
+            with pytest.raises(RuntimeError, match="offline"):
+                login_module.authenticate()
+
+        # a cached token does not install sparsifyml offline
+        save_access_token("key", "token", expires_in=3600)
+        if version_matches:
+            login_module.authenticate()
+        else:
+            with pytest.raises(RuntimeError, match="offline"):
+                login_module.authenticate()
+
+    assert post.call_count == 1
+    install.assert_not_called()
+
+
+def test_login_imports_without_fcntl():
+    # fcntl is not available on Windows
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; sys.modules['fcntl'] = None; import sparsify.login",
+        ],
+        check=True,
+    )
@@ -0,0 +1,202 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sparsify.utils.artifact_cache import ArtifactCache
+
+
+_FILES = {
+    "model.onnx": os.urandom(300_000),
+    "model.pt": os.urandom(200_000),
+    "config.json": b'{"model_type": "bert"}',
+}
+
+
+@pytest.fixture
+def zoo_server():
+    # stand-in for the zoo file storage, serving byte ranges and whole-object md5s
+    requests_log = []
+    corrupt = set()
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            name = self.path.lstrip("/")
+            requests_log.append((name, self.headers.get("Range")))
+            content = _FILES[name]
+            md5 = base64.b64encode(hashlib.md5(content).digest()).decode()
+            if name in corrupt:
+                content = content[::-1]
+            start = 0
+            if self.headers.get("Range"):
+                start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206 if start else 200)
+            self.send_header("Content-Length", str(len(content) - start))
+            self.send_header("x-goog-hash", f"crc32c=AAAAAA==,md5={md5}")
+            self.end_headers()
+            self.wfile.write(content[start:])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield url, requests_log, corrupt
+    server.shutdown()
+
+
+def _zoo_files(url):
+    def _fetch_files(stub):
+        return [
+            {
+                "display_name": "model.onnx",
+                "file_type": "onnx",
+                "url": f"{url}/model.onnx",
+                "file_size": len(_FILES["model.onnx"]),
+            },
+            {
+                "display_name": "model.pt",
+                "file_type": "training",
+                "url": f"{url}/model.pt",
+                "file_size": len(_FILES["model.pt"]),
+            },
+            {
+                "display_name": "config.json",
+                "file_type": "training",
+                "url": f"{url}/config.json",
+            },
+        ]
+
+    return _fetch_files
+
+
+def test_artifact_cache_fetch(tmp_path, zoo_server):
+    url, requests_log, _ = zoo_server
+    cache = ArtifactCache(tmp_path, offline=False, fetch_files=_zoo_files(url))
+
+    model_path = cache.get_onnx_model("zoo:model")
+    assert model_path.read_bytes() == _FILES["model.onnx"]
+    assert requests_log == [("model.onnx", None)]
+
+    # training files are fetched on first use, cached files are not fetched again
+    checkpoint = cache.get_training_checkpoint("zoo:model")
+    assert checkpoint.name == "model.pt"
+    assert checkpoint.read_bytes() == _FILES["model.pt"]
+    assert cache.get_onnx_model("zoo:model") == model_path
+    assert sorted(name for name, _ in requests_log) == [
+        "config.json",
+        "model.onnx",
+        "model.pt",
+    ]
+
+    # offline, pre-seeded caches are read without requests
+    offline_cache = ArtifactCache(tmp_path, offline=True, fetch_files=None)
+    assert offline_cache.get_training_directory("zoo:model") == checkpoint.parent
+    with pytest.raises(FileNotFoundError):
+        offline_cache.get_onnx_model("zoo:other")
+
+
+def test_artifact_cache_resume_and_verify(tmp_path, zoo_server):
+    url, requests_log, corrupt = zoo_server
+    cache = ArtifactCache(tmp_path, offline=False, fetch_files=_zoo_files(url))
+
+    # a previous download stopped after 100000 bytes
+    partial_path = (
+        cache._entry_directory("zoo:model") / "files" / "onnx" / "model.onnx.partial"
+    )
+    partial_path.parent.mkdir(parents=True)
+    partial_path.write_bytes(_FILES["model.onnx"][:100_000])
+    assert cache.get_onnx_model("zoo:model").read_bytes() == _FILES["model.onnx"]
+    assert requests_log == [("model.onnx", "bytes=100000-")]
+
+    corrupt.add("model.pt")
+    with pytest.raises(ValueError, match="failed verification"):
+        cache.get_training_directory("zoo:model")
+    assert not list(partial_path.parent.parent.glob("training/*.partial"))
+
+
+def test_artifact_cache_verifies_cached_files(tmp_path, zoo_server):
+    url, requests_log, _ = zoo_server
+    cache = ArtifactCache(tmp_path, offline=False, fetch_files=_zoo_files(url))
+    model_path = cache.get_onnx_model("zoo:model")
+
+    # truncated files are caught by their size
+    model_path.write_bytes(_FILES["model.onnx"][:1000])
+    assert cache.get_onnx_model("zoo:model").read_bytes() == _FILES["model.onnx"]
+    assert len(requests_log) == 2
+
+    # corrupted files of the same size only by deep checks
+    model_path.write_bytes(_FILES["model.onnx"][::-1])
+    assert cache.get_onnx_model("zoo:model").read_bytes() == _FILES["model.onnx"][::-1]
+    deep_cache = ArtifactCache(
+        tmp_path, offline=False, fetch_files=_zoo_files(url), deep_check=True
+    )
+    assert deep_cache.get_onnx_model("zoo:model").read_bytes() == _FILES["model.onnx"]
+    assert len(requests_log) == 3
+
+
+def test_artifact_cache_shared_download(tmp_path, zoo_server):
+    url, requests_log, _ = zoo_server
+    cache = ArtifactCache(tmp_path, offline=False, fetch_files=_zoo_files(url))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        paths = list(executor.map(cache.get_onnx_model, ["zoo:model"] * 4))
+    assert len(set(paths)) == 1
+    assert requests_log == [("model.onnx", None)]
+
+
+def test_artifact_cache_eviction(tmp_path, zoo_server):
+    url, _, _ = zoo_server
+    # room for one ONNX model only
+    cache = ArtifactCache(
+        tmp_path, max_size_gb=400_000 / 1024**3, fetch_files=_zoo_files(url)
+    )
+    first = cache.get_onnx_model("zoo:first")
+    cache.release("zoo:first")
+    second = cache.get_onnx_model("zoo:second")
+    assert not first.exists()
+    assert second.exists()
+
+
+def test_artifact_cache_keeps_leased_stubs(tmp_path, zoo_server):
+    url, _, _ = zoo_server
+    # room for one ONNX model only, the first stub stays in use by another process
+    max_size_gb = 400_000 / 1024**3
+    user = ArtifactCache(tmp_path, max_size_gb=max_size_gb, fetch_files=_zoo_files(url))
+    first = user.get_onnx_model("zoo:first")
+
+    cache = ArtifactCache(
+        tmp_path, max_size_gb=max_size_gb, fetch_files=_zoo_files(url)
+    )
+    cache.get_onnx_model("zoo:second")
+    assert first.exists()
+
+    user.release("zoo:first")
+    cache.get_onnx_model("zoo:third")
+    assert not first.exists()
+    # evicted stubs leave no lock files behind
+    assert sorted(path.suffix for path in tmp_path.iterdir() if path.is_file()) == [
+        ".lease",
+        ".lease",
+        ".lock",
+        ".lock",
+    ]
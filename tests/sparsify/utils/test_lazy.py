@@ -0,0 +1,74 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+
+@pytest.fixture
+def lazy_package(tmp_path, monkeypatch):
+    package = tmp_path / "lazy_package"
+    package.mkdir()
+    (package / "__init__.py").write_text(
+        textwrap.dedent(
+            """
+            from sparsify.utils.lazy import lazy_exports
+
+            __getattr__, __dir__ = lazy_exports(
+                __name__, {"listed": ["foo"], "starred": None}
+            )
+            """
+        )
+    )
+    (package / "listed.py").write_text("foo = 'foo'\n")
+    (package / "starred.py").write_text("__all__ = ['bar']\nbar = 'bar'\nbaz = 1\n")
+    (package / "other.py").write_text("")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "lazy_package"
+    for name in list(sys.modules):
+        if name.startswith("lazy_package"):
+            del sys.modules[name]
+
+
+def test_lazy_exports(lazy_package):
+    package = __import__(lazy_package)
+    assert f"{lazy_package}.listed" not in sys.modules
+    assert "foo" in dir(package)
+
+    assert package.foo == "foo"
+    assert f"{lazy_package}.listed" in sys.modules
+    assert f"{lazy_package}.starred" not in sys.modules
+
+    assert package.bar == "bar"
+    assert package.__all__ == ["foo", "bar"]
+    assert package.other.__name__ == f"{lazy_package}.other"
+    with pytest.raises(AttributeError):
+        package.baz
+    with pytest.raises(AttributeError):
+        package.__path_hooks__
+
+
+def test_cli_imports_no_heavy_dependencies():
+    heavy_modules = ["torch", "onnxruntime", "sparsezoo", "sparsifyml", "tensorboard"]
+    code = (
+        "import sys, json; import sparsify.cli.run; "
+        f"print(json.dumps([m for m in {heavy_modules!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert json.loads(result.stdout) == []